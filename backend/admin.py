@@ -3,12 +3,22 @@ Admin Dashboard Logic
 =====================
 Endpoints for system administration, analytics, and user management.
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from . import database, models, auth
-from typing import List, Dict
+from . import database, models, auth, quotas, schemas, prediction, pagination, stats, retention
+from .profiler import profiler
+from datetime import datetime
+from typing import List, Dict, Optional
 
 router = APIRouter(prefix="/admin", tags=["Admin Dashboard"])
+# Async versions of the CRUD routes, mounted instead of the sync ones when DB_ASYNC is on
+async_router = APIRouter(prefix="/admin", tags=["Admin Dashboard"])
 
 # --- Dependencies ---
 
@@ -19,6 +29,12 @@ def get_current_admin(current_user: models.User = Depends(auth.get_current_user)
     or check a role column if we added one. 
     Let's check if username is 'admin' or starts with 'admin_'.
     """
+    return _require_admin(current_user)
+
+async def get_current_admin_async(current_user: models.User = Depends(auth.get_current_user_async)):
+    return _require_admin(current_user)
+
+def _require_admin(current_user: models.User) -> models.User:
     if not (current_user.username == "admin" or current_user.username.startswith("admin_")):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -26,6 +42,74 @@ def get_current_admin(current_user: models.User = Depends(auth.get_current_user)
         )
     return current_user
 
+def stats_response(snapshot: Dict) -> Dict:
+    """Materialized counters (see backend/stats.py) plus live server state; `as_of` is when they were rolled up."""
+    return {
+        **snapshot,
+        "server_status": "Healthy",
+        "database_status": "Connected",
+        "tier_usage": quotas.usage_snapshot()
+    }
+
+USER_FIELDS = ("id", "username", "email", "full_name", "joined")
+
+def users_query(before: Optional[tuple], limit: int, skip: int = 0):
+    """Newest accounts first, keyset on id. Only the summary columns are read (no profile picture blobs)."""
+    u = models.User
+    query = select(u.id, u.username, u.email, u.full_name)
+    if before is not None:
+        query = query.where(pagination.seek((u.id,), before, descending=True))
+    elif skip:
+        query = query.offset(skip)  # Deprecated OFFSET paging, kept for old clients
+    return query.order_by(u.id.desc()).limit(limit)
+
+def users_response(request: Request, rows: list, fields: List[str], limit: int):
+    page, next_key = pagination.split_page(rows, limit, lambda row: (row.id,))
+    return pagination.page_response(request, [{f: s[f] for f in fields} for s in map(user_summary, page)], next_key)
+
+AUDIT_FIELDS = ("id", "timestamp", "action", "admin_id", "target_user_id", "details")
+
+def audit_query(action: Optional[str], user_id: Optional[int], since: Optional[datetime], until: Optional[datetime],
+                before: Optional[tuple], limit: int):
+    """Newest audit events first, keyset on (timestamp, id)."""
+    a = models.AuditLog.__table__
+    query = select(*(a.c[f] for f in AUDIT_FIELDS))
+    if action:
+        query = query.where(a.c.action == action)
+    if user_id is not None:
+        query = query.where(or_(a.c.admin_id == user_id, a.c.target_user_id == user_id))
+    if since:
+        query = query.where(a.c.timestamp >= since)
+    if until:
+        query = query.where(a.c.timestamp < until)
+    if before is not None:
+        query = query.where(pagination.seek((a.c.timestamp, a.c.id), before, descending=True))
+    return query.order_by(a.c.timestamp.desc(), a.c.id.desc()).limit(limit)
+
+def audit_response(request: Request, rows: list, limit: int, action: Optional[str], user_id: Optional[int],
+                   since: Optional[datetime], until: Optional[datetime], before: Optional[tuple], archived: bool):
+    """Live rows, continued from the retention archives once the table runs out (same cursor)."""
+    items = [dict(row._mapping) for row in rows]
+    if archived and len(items) <= limit:
+        def match(row: Dict) -> bool:
+            return (not action or row.get("action") == action) and \
+                (user_id is None or user_id in (row.get("admin_id"), row.get("target_user_id")))
+        last = (items[-1]["timestamp"], items[-1]["id"]) if items else before
+        items += retention.search_archive("audit_logs", match, before=last, since=since, until=until,
+                                          limit=limit + 1 - len(items))
+    page, next_key = pagination.split_page(items, limit, lambda r: (r["timestamp"], r["id"]))
+    return pagination.page_response(request, [{f: r.get(f) for f in AUDIT_FIELDS} for r in page], next_key)
+
+def user_summary(u: models.User) -> Dict:
+    # Sanitize passwords
+    return {
+        "id": u.id,
+        "username": u.username,
+        "email": u.email,
+        "full_name": u.full_name,
+        "joined": "2024-01-01" # TODO: Add created_at to User model in future
+    }
+
 # --- Endpoints ---
 
 @router.get("/stats")
@@ -33,39 +117,169 @@ def get_system_stats(
     db: Session = Depends(database.get_db),
     admin: models.User = Depends(get_current_admin)
 ) -> Dict:
-    """Get high-level system statistics."""
-    total_users = db.query(models.User).count()
-    total_records = db.query(models.HealthRecord).count()
-    total_chats = db.query(models.ChatLog).count()
-    
-    # Calculate mock revenue based on "Pro" users (future)
-    # For now, just return 0
-    
-    return {
-        "total_users": total_users,
-        "total_predictions": total_records,
-        "total_messages": total_chats,
-        "server_status": "Healthy",
-        "database_status": "Connected"
-    }
+    """Get high-level system statistics (refreshed every STATS_REFRESH_SECONDS, not counted per request)."""
+    return stats_response(stats.service.current(db))
 
 @router.get("/users")
 def get_recent_users(
-    skip: int = 0, 
-    limit: int = 20,
+    request: Request,
+    skip: int = Query(0, ge=0, deprecated=True, description="Use `cursor`"), 
+    limit: int = Query(20, ge=1, le=pagination.MAX_PAGE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(USER_FIELDS)}"),
     db: Session = Depends(database.get_db),
     admin: models.User = Depends(get_current_admin)
 ):
-    """List recent users for management."""
-    users = db.query(models.User).order_by(models.User.id.desc()).offset(skip).limit(limit).all()
-    # Sanitize passwords
-    safe_users = []
-    for u in users:
-        safe_users.append({
-            "id": u.id,
-            "username": u.username,
-            "email": u.email,
-            "full_name": u.full_name,
-            "joined": "2024-01-01" # TODO: Add created_at to User model in future
-        })
-    return safe_users
+    """List recent users for management, newest first (keyset-paginated)."""
+    columns = pagination.projection(fields, USER_FIELDS)
+    before = pagination.decode_cursor(cursor, (int,))
+    rows = db.execute(users_query(before, limit + 1, skip)).all()
+    return users_response(request, rows, columns, limit)
+
+@async_router.get("/stats")
+async def get_system_stats_async(
+    db: AsyncSession = Depends(database.get_async_db),
+    admin: models.User = Depends(get_current_admin_async)
+) -> Dict:
+    return stats_response(await db.run_sync(stats.service.current))
+
+@router.get("/audit")
+def get_audit_log(
+    request: Request,
+    action: Optional[str] = None,
+    user_id: Optional[int] = Query(None, description="Events by or about this user"),
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    archived: bool = Query(True, description="Continue into archived events (see backend/retention.py)"),
+    limit: int = Query(100, ge=1, le=pagination.MAX_PAGE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    db: Session = Depends(database.get_db),
+    admin: models.User = Depends(get_current_admin)
+):
+    """Audit events, newest first (keyset-paginated), including archived ones."""
+    since, until = retention.naive_utc(since), retention.naive_utc(until)
+    before = pagination.decode_cursor(cursor, (datetime, int))
+    rows = db.execute(audit_query(action, user_id, since, until, before, limit + 1)).all()
+    return audit_response(request, rows, limit, action, user_id, since, until, before, archived)
+
+@async_router.get("/audit")
+async def get_audit_log_async(
+    request: Request,
+    action: Optional[str] = None,
+    user_id: Optional[int] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    archived: bool = True,
+    limit: int = Query(100, ge=1, le=pagination.MAX_PAGE),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    admin: models.User = Depends(get_current_admin_async)
+):
+    since, until = retention.naive_utc(since), retention.naive_utc(until)
+    before = pagination.decode_cursor(cursor, (datetime, int))
+    rows = (await db.execute(audit_query(action, user_id, since, until, before, limit + 1))).all()
+    # Archive reads are file I/O
+    return await run_in_threadpool(audit_response, request, rows, limit, action, user_id, since, until, before, archived)
+
+@async_router.get("/users")
+async def get_recent_users_async(
+    request: Request,
+    skip: int = Query(0, ge=0, deprecated=True),
+    limit: int = Query(20, ge=1, le=pagination.MAX_PAGE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(database.get_async_db),
+    admin: models.User = Depends(get_current_admin_async)
+):
+    columns = pagination.projection(fields, USER_FIELDS)
+    before = pagination.decode_cursor(cursor, (int,))
+    rows = (await db.execute(users_query(before, limit + 1, skip))).all()
+    return users_response(request, rows, columns, limit)
+
+# --- Model Registry ---
+
+def _check_disease(disease: str):
+    if disease not in prediction.MODEL_FILES:
+        raise HTTPException(status_code=404, detail=f"Unknown model '{disease}'")
+
+@router.get("/models")
+def get_model_versions(admin: models.User = Depends(get_current_admin)) -> Dict:
+    """Active version, load state and rollback history per disease model."""
+    return {"versions": prediction.registry.versions(), "status": prediction.model_states()}
+
+@router.post("/reload_models")
+def reload_models(
+    disease: Optional[str] = None,
+    admin: models.User = Depends(get_current_admin)
+) -> Dict:
+    """
+    Reload models from disk (all, or one disease). New bundles are validated
+    off to the side and swapped in atomically; a bundle that fails validation
+    is rejected and the current version keeps serving.
+
+    Per-worker: only the worker process that serves this request reloads.
+    Other workers keep their models until they restart, so under several
+    workers roll a new version out with a restart or redeploy, not with
+    this endpoint. (gunicorn.conf.py loads models in the master, so a HUP
+    alone reforks workers with the old ones.)
+    """
+    if disease:
+        _check_disease(disease)
+    prediction.initialize_models([disease] if disease else None)
+    return {
+        "status": "Models Reloaded",
+        "scope": "worker",
+        "worker_pid": os.getpid(),
+        "versions": prediction.registry.versions(),
+        "models": prediction.model_states()
+    }
+
+@router.post("/models/{disease}/rollback")
+def rollback_model(disease: str, admin: models.User = Depends(get_current_admin)) -> Dict:
+    """
+    Reactivate the previously published version of one disease model.
+
+    Per-worker, like /admin/reload_models: only the worker serving this
+    request rolls back, from its own history.
+    """
+    _check_disease(disease)
+    try:
+        bundle = prediction.rollback_model(disease)
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"status": "Rolled Back", "disease": disease, "version": bundle.version,
+            "scope": "worker", "worker_pid": os.getpid()}
+
+# --- Profiling ---
+
+@router.post("/profile")
+def start_profiling(
+    settings: schemas.ProfileSessionRequest,
+    admin: models.User = Depends(get_current_admin)
+) -> Dict:
+    """Start a time-boxed sampling-profiler session (replaces any previous samples)."""
+    return profiler.start(
+        sample_rate=settings.sample_rate,
+        route=settings.route,
+        duration_seconds=settings.duration_seconds,
+        interval_ms=settings.interval_ms
+    )
+
+@router.get("/profile/status")
+def profiling_status(admin: models.User = Depends(get_current_admin)) -> Dict:
+    """Current session state and sample counts."""
+    return profiler.status()
+
+@router.get("/profile", response_class=PlainTextResponse)
+def download_profile(admin: models.User = Depends(get_current_admin)):
+    """Download aggregated samples as collapsed stacks (flamegraph.pl / speedscope)."""
+    return PlainTextResponse(
+        profiler.collapsed(),
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'}
+    )
+
+@router.delete("/profile")
+def stop_profiling(admin: models.User = Depends(get_current_admin)) -> Dict:
+    """Stop the active session early; collected samples remain downloadable."""
+    profiler.stop()
+    return profiler.status()
@@ -0,0 +1,317 @@
+"""
+Audit Sink
+==========
+Buffered, batched audit_logs writes, so logins and admin views no longer pay
+for an INSERT and a commit of their own.
+
+record() stamps the event with the current time, appends it to an in-memory
+buffer and returns. A background thread writes the buffer in one
+transaction when it holds AUDIT_FLUSH_SIZE events or every
+AUDIT_FLUSH_INTERVAL seconds, whichever comes first. On shutdown the
+lifespan stops the sink, which flushes whatever is left.
+
+Durability: with AUDIT_SPOOL_DIR set, each event is first appended to a
+per-process spool file (fsync'd unless AUDIT_SPOOL_FSYNC=false), so events
+survive a crash. At flush time the spool segment is rotated and deleted only
+after the batch has committed. If a flush fails, its events and segments
+stay pending for the next attempt. Spool files are named after a per-process
+owner id (pid plus a random token, as pids repeat across container restarts),
+and each owner holds an flock on its .lock file while it runs. On start, a
+worker replays the spool files of owners whose lock is free. Delivery is
+at-least-once: a crash between commit and segment removal replays that
+batch.
+
+Until start() has run (scripts, tests without the app lifespan) or with
+AUDIT_ASYNC=false, record() writes synchronously through the caller's
+session, as before.
+"""
+import json
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import metrics, models
+
+try:
+    import fcntl
+except ImportError:  # Windows: owners are checked by pid instead
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ASYNC = os.getenv("AUDIT_ASYNC", "true").lower() == "true"
+FLUSH_SIZE = int(os.getenv("AUDIT_FLUSH_SIZE", "100"))
+FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1.0"))
+SPOOL_DIR = os.getenv("AUDIT_SPOOL_DIR", "")  # Empty: no spool (events buffered in memory only)
+SPOOL_FSYNC = os.getenv("AUDIT_SPOOL_FSYNC", "true").lower() == "true"
+
+
+def event(action: str, target_user_id: Optional[int] = None, admin_id: Optional[int] = None,
+          details: Optional[str] = None) -> Dict[str, Any]:
+    return {"admin_id": admin_id, "target_user_id": target_user_id, "action": action,
+            "details": details, "timestamp": datetime.now(timezone.utc)}
+
+def _dumps(entry: Dict[str, Any]) -> str:
+    return json.dumps({**entry, "timestamp": entry["timestamp"].isoformat()})
+
+def _loads(line: str) -> Dict[str, Any]:
+    entry = json.loads(line)
+    entry["timestamp"] = datetime.fromisoformat(entry["timestamp"])
+    return entry
+
+def _new_owner() -> str:
+    return f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+def _owner_of(name: str) -> str:
+    """Owner id of a spool file: its writer, or the worker that claimed it for replay."""
+    if ".replaying-" in name:
+        return name.rsplit(".replaying-", 1)[1]
+    return name[len("audit-"):].split(".")[0]
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class AuditSink:
+    """Per-process buffer of audit events, flushed in batches by a background thread."""
+
+    def __init__(self, flush_size: Optional[int] = None, flush_interval: Optional[float] = None,
+                 spool_dir: Optional[str] = None, fsync: Optional[bool] = None):
+        self.flush_size = flush_size or FLUSH_SIZE
+        self.flush_interval = FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.spool_dir = SPOOL_DIR if spool_dir is None else spool_dir
+        self.fsync = SPOOL_FSYNC if fsync is None else fsync
+        self.engine: Optional[Engine] = None
+        self._buffer: List[Dict[str, Any]] = []
+        self._segments: List[str] = []  # Rotated spool files whose events are not committed yet
+        self._lock = threading.Lock()        # Buffer and spool file
+        self._flush_lock = threading.Lock()  # One flush at a time (thread vs. stop)
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._spool = None
+        self._owner_lock: Optional[int] = None
+        self._rotations = 0
+        self.owner = _new_owner()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    # --- Spool ---
+
+    def _spool_path(self) -> str:
+        return os.path.join(self.spool_dir, f"audit-{self.owner}.jsonl")
+
+    def _lock_path(self, owner: str) -> str:
+        return os.path.join(self.spool_dir, f"audit-{owner}.lock")
+
+    def _hold_owner_lock(self) -> None:
+        """Lock our .lock file for the life of the process (the kernel releases it on a crash)."""
+        if fcntl is None:
+            return
+        os.makedirs(self.spool_dir, exist_ok=True)
+        # Locked before it becomes visible, so no worker ever sees it free while we run
+        pending = os.path.join(self.spool_dir, f".audit-{self.owner}.lock")
+        self._owner_lock = os.open(pending, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._owner_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.replace(pending, self._lock_path(self.owner))
+
+    def _release_owner_lock(self) -> None:
+        if self._owner_lock is not None:
+            os.close(self._owner_lock)
+            self._owner_lock = None
+            os.remove(self._lock_path(self.owner))
+
+    def _owner_alive(self, owner: str) -> bool:
+        if owner == self.owner:
+            return True
+        if fcntl is None:
+            pid = owner.split("-")[0]
+            return pid.isdigit() and _pid_alive(int(pid))
+        try:
+            fd = os.open(self._lock_path(owner), os.O_RDWR)
+        except FileNotFoundError:
+            return False  # Lock files are only removed after a clean stop
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        finally:
+            os.close(fd)
+        return False
+
+    def _open_spool(self) -> None:
+        os.makedirs(self.spool_dir, exist_ok=True)
+        self._spool = open(self._spool_path(), "a", encoding="utf-8")
+
+    def _rotate(self) -> str:
+        """Move the active spool aside (caller holds _lock); its events are in the batch being flushed."""
+        self._spool.close()
+        self._rotations += 1
+        segment = f"{self._spool_path()}.{self._rotations}.flushing"
+        os.replace(self._spool_path(), segment)
+        self._open_spool()
+        return segment
+
+    def replay_orphans(self) -> int:
+        """Insert events spooled by processes that exited before flushing them."""
+        if not self.spool_dir or not os.path.isdir(self.spool_dir):
+            return 0
+        replayed, dead = 0, set()
+        for name in sorted(os.listdir(self.spool_dir)):
+            if not name.startswith("audit-"):
+                continue
+            owner = _owner_of(name)
+            if owner not in dead and self._owner_alive(owner):
+                continue
+            dead.add(owner)
+            if name.endswith(".lock"):
+                continue
+            path = os.path.join(self.spool_dir, name)
+            claimed = f"{path.split('.replaying-')[0]}.replaying-{self.owner}"
+            try:
+                os.replace(path, claimed)  # Only one worker claims each file
+            except FileNotFoundError:
+                continue
+            with open(claimed, encoding="utf-8") as f:
+                events = [_loads(line) for line in f if line.strip()]
+            if events:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(models.AuditLog.__table__), events)
+            os.remove(claimed)
+            replayed += len(events)
+        for owner in dead:
+            try:
+                os.remove(self._lock_path(owner))
+            except FileNotFoundError:
+                pass
+        if replayed:
+            logger.info(f"[AUDIT] Replayed {replayed} spooled events")
+        return replayed
+
+    # --- Recording ---
+
+    def record(self, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            if self._spool is not None:
+                self._spool.write(_dumps(entry) + "\n")
+                self._spool.flush()
+                if self.fsync:
+                    os.fsync(self._spool.fileno())
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.flush_size
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """Write buffered events in one transaction. Returns events written (0 if the write failed)."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+                if batch and self._spool is not None:
+                    self._segments.append(self._rotate())
+                segments = list(self._segments)
+            if not batch:
+                return 0
+            try:
+                with self.engine.begin() as conn:
+                    conn.execute(insert(models.AuditLog.__table__), batch)
+            except Exception as e:
+                logger.error(f"[AUDIT] Flush of {len(batch)} events failed, will retry: {e}")
+                metrics.AUDIT_EVENTS.inc(len(batch), result="retried")
+                with self._lock:
+                    self._buffer[:0] = batch
+                return 0
+            with self._lock:
+                self._segments = [s for s in self._segments if s not in segments]
+            for segment in segments:
+                os.remove(segment)
+            metrics.AUDIT_EVENTS.inc(len(batch), result="written")
+            return len(batch)
+
+    # --- Lifecycle ---
+
+    def start(self, engine: Engine) -> Optional[threading.Thread]:
+        if not ASYNC or self.running:
+            return self._thread
+        self.engine = engine
+        if self.spool_dir:
+            self.owner = _new_owner()  # Fresh after a fork, too
+            self._hold_owner_lock()
+            self.replay_orphans()
+            self._open_spool()
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def stop(self) -> None:
+        """Stop the thread and flush everything still buffered."""
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wake.set()
+        self._thread.join(timeout=10)
+        self._thread = None
+        self.flush()
+        with self._lock:
+            if self._spool is not None:
+                self._spool.close()
+                self._spool = None
+                if not self._buffer and os.path.exists(self._spool_path()) and not os.path.getsize(self._spool_path()):
+                    os.remove(self._spool_path())
+                if not self._buffer and not self._segments:
+                    self._release_owner_lock()  # Else leave it for a replay after we exit
+
+
+sink = AuditSink()
+
+
+def record(db: Session, action: str, target_user_id: Optional[int] = None, admin_id: Optional[int] = None,
+           details: Optional[str] = None) -> None:
+    """Log an audit event: buffered when the sink is running, else written through `db`. Never raises."""
+    entry = event(action, target_user_id, admin_id, details)
+    try:
+        if sink.running:
+            sink.record(entry)
+        else:
+            db.add(models.AuditLog(**entry))
+            db.commit()
+    except Exception as e:
+        logger.error(f"Audit Log Failed: {e}")
+
+async def record_async(db: Any, action: str, target_user_id: Optional[int] = None, admin_id: Optional[int] = None,
+                       details: Optional[str] = None) -> None:
+    """record() for AsyncSession routes."""
+    entry = event(action, target_user_id, admin_id, details)
+    try:
+        if sink.running and sink.spool_dir and sink.fsync:
+            await run_in_threadpool(sink.record, entry)  # fsync blocks
+        elif sink.running:
+            sink.record(entry)
+        else:
+            db.add(models.AuditLog(**entry))
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Audit Log Failed: {e}")
@@ -1,17 +1,20 @@
 from datetime import datetime, timedelta, timezone
 from typing import Optional, List, Dict, Any
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy.exc import IntegrityError
 import os
 import re
 import logging
 from dotenv import load_dotenv
 
-from . import models, database, schemas
+from . import audit, models, database, schemas
 
 # Initialize Logger
 logger = logging.getLogger(__name__)
@@ -28,6 +31,8 @@ pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 router = APIRouter()
+# Async versions of the CRUD routes, mounted instead of the sync ones when DB_ASYNC is on
+async_router = APIRouter()
 
 # --- Helper Functions ---
 
@@ -59,26 +64,117 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> models.User:
-    """
-    Dependency to get the current authenticated user from JWT.
-    """
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def token_username(token: str) -> str:
+    """Username (sub claim) of a valid JWT; raises 401 otherwise."""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-        
+        raise _credentials_exception()
+    return username
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> models.User:
+    """
+    Dependency to get the current authenticated user from JWT.
+    """
+    username = token_username(token)
     user = db.query(models.User).filter(models.User.username == username).first()
     if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    return user
+
+async def get_current_user_async(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_async_db)) -> models.User:
+    """Async-session version of get_current_user (DB_ASYNC routes)."""
+    username = token_username(token)
+    user = await db.scalar(select(models.User).where(models.User.username == username))
+    if user is None:
+        raise _credentials_exception()
+    return user
+
+def check_password_complexity(password: str) -> None:
+    # Password Complexity Check (Regex: 8+ chars, letters + numbers)
+    if not re.match(r"^(?=.*[A-Za-z])(?=.*\d)[A-Za-z\d@$!%*#?&]{8,}$", password):
+        raise HTTPException(
+            status_code=400, 
+            detail="Password must be at least 8 characters and contain both letters and numbers."
+        )
+
+def new_user(user: schemas.UserCreate, hashed_password: str) -> models.User:
+    return models.User(
+        username=user.username, 
+        hashed_password=hashed_password,
+        email=user.email,
+        full_name=user.full_name,
+        dob=user.dob,
+        existing_ailments="",
+        profile_picture="",
+        allow_data_collection=1
+    )
+
+def login_audit_event(user: models.User) -> Dict[str, Any]:
+    return dict(
+        admin_id=user.id, # Using admin_id field as 'actor_id'
+        target_user_id=user.id,
+        action="LOGIN_SUCCESS",
+        details=f"User logged in from API. Timestamp: {datetime.now(timezone.utc)}"
+    )
+
+def access_token_for(user: models.User) -> Dict[str, str]:
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": user.username}, expires_delta=access_token_expires
+    )
+    return {"access_token": access_token, "token_type": "bearer"}
+
+def profile_dict(user: models.User) -> Dict[str, Any]:
+    return {
+        "username": user.username,
+        "email": user.email,
+        "full_name": user.full_name,
+        "gender": user.gender,
+        "dob": user.dob,
+        "height": user.height,
+        "weight": user.weight,
+        "blood_type": user.blood_type,
+        "existing_ailments": user.existing_ailments,
+        "profile_picture": user.profile_picture,
+        "about_me": user.about_me,
+        "diet": user.diet,
+        "activity_level": user.activity_level,
+        "sleep_hours": user.sleep_hours,
+        "stress_level": user.stress_level,
+        "allow_data_collection": bool(user.allow_data_collection)
+    }
+
+def apply_profile_update(user: models.User, profile: schemas.UserProfileUpdate) -> None:
+    # Update fields if provided
+    for field, value in profile.model_dump(exclude_unset=True).items():
+         if field == 'allow_data_collection':
+             user.allow_data_collection = 1 if value else 0
+         elif hasattr(user, field):
+             setattr(user, field, value)
+
+def require_admin_username(user: models.User, detail: str = "Admin privileges required") -> None:
+    if user.username != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
+
+def redact_for_privacy(user: models.User) -> models.User:
+    # --- PRIVACY COMPLIANCE GATE ---
+    if not user.allow_data_collection:
+        # Redact Sensitive Data for privacy opted-out users
+        user.health_records = [] 
+        user.chat_logs = []
+        user.about_me = "[REDACTED - PRIVACY RESTRICTED]"
+        user.existing_ailments = "[REDACTED]"
     return user
 
 
@@ -91,12 +187,7 @@ def signup(user: schemas.UserCreate, db: Session = Depends(database.get_db)) ->
     Enforces password complexity and checks for duplicate username/email.
     """
     try:
-        # Password Complexity Check (Regex: 8+ chars, letters + numbers)
-        if not re.match(r"^(?=.*[A-Za-z])(?=.*\d)[A-Za-z\d@$!%*#?&]{8,}$", user.password):
-            raise HTTPException(
-                status_code=400, 
-                detail="Password must be at least 8 characters and contain both letters and numbers."
-            )
+        check_password_complexity(user.password)
 
         # Check Duplicate Username
         db_user = db.query(models.User).filter(models.User.username == user.username).first()
@@ -111,20 +202,11 @@ def signup(user: schemas.UserCreate, db: Session = Depends(database.get_db)) ->
 
         hashed_password = get_password_hash(user.password)
         
-        new_user = models.User(
-            username=user.username, 
-            hashed_password=hashed_password,
-            email=user.email,
-            full_name=user.full_name,
-            dob=user.dob,
-            existing_ailments="",
-            profile_picture="",
-            allow_data_collection=1
-        )
-        db.add(new_user)
+        db_new_user = new_user(user, hashed_password)
+        db.add(db_new_user)
         db.commit()
-        db.refresh(new_user)
-        return new_user
+        db.refresh(db_new_user)
+        return db_new_user
         
     except HTTPException as he:
         raise he
@@ -149,26 +231,13 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
         if not verify_password(form_data.password, user.hashed_password):
             raise HTTPException(status_code=401, detail="Incorrect username or password")
             
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": user.username}, expires_delta=access_token_expires
-        )
+        token = access_token_for(user)
         
         # --- AUDIT LOGGING ---
-        try:
-            audit_entry = models.AuditLog(
-                admin_id=user.id, # Using admin_id field as 'actor_id'
-                target_user_id=user.id,
-                action="LOGIN_SUCCESS",
-                details=f"User logged in from API. Timestamp: {datetime.now(timezone.utc)}"
-            )
-            db.add(audit_entry)
-            db.commit()
-        except Exception as e:
-            logger.error(f"Audit Log Failed: {e}")
-            # Do not fail login if audit fails, just log error
+        # Buffered by the audit sink; never fails the login
+        audit.record(db, **login_audit_event(user))
             
-        return {"access_token": access_token, "token_type": "bearer"}
+        return token
     except Exception as e:
         logger.error(f"Login Error: {e}")
         raise e
@@ -176,24 +245,7 @@ def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db:
 @router.get("/profile", response_model=Dict[str, Any])
 def get_user_profile(current_user: models.User = Depends(get_current_user)) -> Dict[str, Any]:
     """Return profile details for the currently logged-in user."""
-    return {
-        "username": current_user.username,
-        "email": current_user.email,
-        "full_name": current_user.full_name,
-        "gender": current_user.gender,
-        "dob": current_user.dob,
-        "height": current_user.height,
-        "weight": current_user.weight,
-        "blood_type": current_user.blood_type,
-        "existing_ailments": current_user.existing_ailments,
-        "profile_picture": current_user.profile_picture,
-        "about_me": current_user.about_me,
-        "diet": current_user.diet,
-        "activity_level": current_user.activity_level,
-        "sleep_hours": current_user.sleep_hours,
-        "stress_level": current_user.stress_level,
-        "allow_data_collection": bool(current_user.allow_data_collection)
-    }
+    return profile_dict(current_user)
 
 @router.put("/profile")
 def update_user_profile(
@@ -202,13 +254,7 @@ def update_user_profile(
     db: Session = Depends(database.get_db)
 ) -> Dict[str, Any]:
     """Update user profile fields."""
-    
-    # Update fields if provided
-    for field, value in profile.model_dump(exclude_unset=True).items():
-         if field == 'allow_data_collection':
-             current_user.allow_data_collection = 1 if value else 0
-         elif hasattr(current_user, field):
-             setattr(current_user, field, value)
+    apply_profile_update(current_user, profile)
     
     db.commit()
     db.refresh(current_user)
@@ -216,49 +262,97 @@ def update_user_profile(
     return {
         "status": "success", 
         "message": "Profile updated", 
-        "user": get_user_profile(current_user)
+        "user": profile_dict(current_user)
     }
 
 @router.get("/users", response_model=List[schemas.UserResponse])
 def get_all_users(current_user: models.User = Depends(get_current_user), db: Session = Depends(database.get_db)):
     """Admin only: Get all users."""
-    if current_user.username != "admin":
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Admin privileges required"
-        )
+    require_admin_username(current_user)
     users = db.query(models.User).all()
     return users
 
 @router.get("/users/{user_id}/full", response_model=schemas.UserFullResponse)
 def get_user_full_details(user_id: int, current_user: models.User = Depends(get_current_user), db: Session = Depends(database.get_db)):
     """Admin only: Get full user details including health records and chat logs (Audit Logged)."""
-    if current_user.username != "admin":
-        raise HTTPException(status_code=403, detail="Admin access only")
+    require_admin_username(current_user, "Admin access only")
     
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
     # --- AUDIT LOGGING ---
+    audit.record(db, "VIEW_SENSITIVE_DATA", target_user_id=user_id, admin_id=current_user.id,
+                 details="Accessed full dossier")
+
+    return redact_for_privacy(user)
+
+
+# --- Async Endpoints (DB_ASYNC) ---
+# Same contracts as above on an AsyncSession. bcrypt runs in the threadpool so
+# hashing never blocks the event loop.
+
+@async_router.post("/signup", response_model=schemas.UserResponse)
+async def signup_async(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_async_db)) -> models.User:
+    check_password_complexity(user.password)
+    if await db.scalar(select(models.User.id).where(models.User.username == user.username)):
+        raise HTTPException(status_code=400, detail="Username already registered")
+    if user.email and await db.scalar(select(models.User.id).where(models.User.email == user.email)):
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    db_new_user = new_user(user, await run_in_threadpool(get_password_hash, user.password))
+    db.add(db_new_user)
     try:
-        audit_entry = models.AuditLog(
-            admin_id=current_user.id,
-            target_user_id=user_id,
-            action="VIEW_SENSITIVE_DATA",
-            details="Accessed full dossier"
-        )
-        db.add(audit_entry)
-        db.commit()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Username or Email already registered.")
     except Exception as e:
-        logger.error(f"Audit Log Error: {e}")
+        await db.rollback()
+        logger.error(f"Signup Exception: {e}")
+        raise HTTPException(status_code=500, detail=f"Signup Failed: {str(e)}")
+    await db.refresh(db_new_user)
+    return db_new_user
 
-    # --- PRIVACY COMPLIANCE GATE ---
-    if not user.allow_data_collection:
-        # Redact Sensitive Data for privacy opted-out users
-        user.health_records = [] 
-        user.chat_logs = []
-        user.about_me = "[REDACTED - PRIVACY RESTRICTED]"
-        user.existing_ailments = "[REDACTED]"
-        
-    return user
+@async_router.post("/token", response_model=schemas.Token)
+async def login_for_access_token_async(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_async_db)) -> Dict[str, str]:
+    user = await db.scalar(select(models.User).where(models.User.username == form_data.username))
+    if not user or not await run_in_threadpool(verify_password, form_data.password, user.hashed_password):
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+    token = access_token_for(user)
+    await audit.record_async(db, **login_audit_event(user))
+    return token
+
+@async_router.get("/profile", response_model=Dict[str, Any])
+async def get_user_profile_async(current_user: models.User = Depends(get_current_user_async)) -> Dict[str, Any]:
+    return profile_dict(current_user)
+
+@async_router.put("/profile")
+async def update_user_profile_async(
+    profile: schemas.UserProfileUpdate,
+    current_user: models.User = Depends(get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> Dict[str, Any]:
+    apply_profile_update(current_user, profile)
+    await db.commit()
+    await db.refresh(current_user)
+    return {"status": "success", "message": "Profile updated", "user": profile_dict(current_user)}
+
+@async_router.get("/users", response_model=List[schemas.UserResponse])
+async def get_all_users_async(current_user: models.User = Depends(get_current_user_async), db: AsyncSession = Depends(database.get_async_db)):
+    require_admin_username(current_user)
+    return (await db.scalars(select(models.User))).all()
+
+@async_router.get("/users/{user_id}/full", response_model=schemas.UserFullResponse)
+async def get_user_full_details_async(user_id: int, current_user: models.User = Depends(get_current_user_async), db: AsyncSession = Depends(database.get_async_db)):
+    require_admin_username(current_user, "Admin access only")
+    # Relationships are loaded up front: lazy loads cannot run on an AsyncSession
+    user = await db.scalar(
+        select(models.User).where(models.User.id == user_id)
+        .options(selectinload(models.User.health_records), selectinload(models.User.chat_logs))
+    )
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    await audit.record_async(db, "VIEW_SENSITIVE_DATA", target_user_id=user_id, admin_id=current_user.id,
+                             details="Accessed full dossier")
+    return redact_for_privacy(user)
@@ -0,0 +1,102 @@
+"""
+Probability Calibration
+=======================
+Maps a model's raw positive-class probability to a calibrated risk score.
+
+Calibrators are fitted offline on held-out data (mlops/model_training.py) and
+saved next to the model artifact as `<model>.calibration.json`, so they are
+versioned and hot-swapped together with the model. Serving applies them with
+plain NumPy (no sklearn objects to unpickle):
+
+    platt     sigmoid(a * p + b)           small datasets
+    isotonic  piecewise-linear over (x, y)  large datasets
+
+Only binary classifiers that have POSITIVE_CLASS among their classes_ get a
+risk score. Its predict_proba column is looked up in classes_ and is not
+assumed to be the second column.
+"""
+import os
+import json
+import math
+from typing import Any, Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+CALIBRATION_SUFFIX = ".calibration.json"
+METHODS = ("platt", "isotonic")
+POSITIVE_CLASS = 1
+
+
+def positive_column(classes: Sequence[Any], positive: Any = POSITIVE_CLASS) -> Optional[int]:
+    """predict_proba column of `positive` for a binary classifier; None for anything else."""
+    classes = list(classes)
+    if len(classes) != 2 or positive not in classes:
+        return None
+    return classes.index(positive)
+
+
+class Calibrator(NamedTuple):
+    method: str
+    params: Dict[str, Any]
+
+    def apply(self, p: float) -> float:
+        if self.method == "platt":
+            return 1.0 / (1.0 + math.exp(-(self.params["a"] * p + self.params["b"])))
+        return float(np.interp(p, self.params["x"], self.params["y"]))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"method": self.method, "params": self.params}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Calibrator":
+        if data.get("method") not in METHODS:
+            raise ValueError(f"Unknown calibration method: {data.get('method')}")
+        return cls(data["method"], data["params"])
+
+    def save(self, model_path: str) -> str:
+        path = calibration_path(model_path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f)
+        return path
+
+
+def calibration_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + CALIBRATION_SUFFIX
+
+
+def load_calibration(model_path: Optional[str]) -> Optional[Calibrator]:
+    """Calibrator saved next to a model artifact, if there is one."""
+    if not model_path or not os.path.exists(calibration_path(model_path)):
+        return None
+    with open(calibration_path(model_path), encoding="utf-8") as f:
+        return Calibrator.from_dict(json.load(f))
+
+
+# --- Fitting (training time; needs scikit-learn) ---
+
+def fit_platt(scores: Sequence[float], labels: Sequence[int]) -> Calibrator:
+    from sklearn.linear_model import LogisticRegression
+    lr = LogisticRegression(C=1e6).fit(np.asarray(scores, dtype=float).reshape(-1, 1), labels)
+    return Calibrator("platt", {"a": float(lr.coef_[0][0]), "b": float(lr.intercept_[0])})
+
+
+def fit_isotonic(scores: Sequence[float], labels: Sequence[int]) -> Calibrator:
+    from sklearn.isotonic import IsotonicRegression
+    iso = IsotonicRegression(out_of_bounds="clip", y_min=0.0, y_max=1.0).fit(scores, labels)
+    return Calibrator("isotonic", {"x": iso.X_thresholds_.tolist(), "y": iso.y_thresholds_.tolist()})
+
+
+def fit(scores: Sequence[float], labels: Sequence[int], method: Optional[str] = None) -> Calibrator:
+    """Isotonic needs plenty of data to avoid overfitting; fall back to Platt below 1000 rows."""
+    method = method or ("isotonic" if len(labels) >= 1000 else "platt")
+    return fit_isotonic(scores, labels) if method == "isotonic" else fit_platt(scores, labels)
+
+
+def fit_model(model, X, y, positive: Any = POSITIVE_CLASS, method: Optional[str] = None) -> Calibrator:
+    """Calibrate `model`'s positive-class probability on held-out (X, y); ValueError unless it is binary."""
+    classes = list(getattr(model, "classes_", ()))
+    column = positive_column(classes, positive)
+    if column is None:
+        raise ValueError(f"calibration needs a binary classifier with class {positive!r}, got classes {classes}")
+    scores = np.asarray(model.predict_proba(X))[:, column]
+    return fit(scores, (np.asarray(y) == positive).astype(int), method)
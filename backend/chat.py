@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select
+from sqlalchemy.sql import Select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from langchain_core.messages import HumanMessage, AIMessage
-from . import models, database, auth, rag, agent, schemas
+from . import models, database, auth, rag, agent, schemas, quotas, tracing, measurements, trends, pagination, chat_store
 import json
 import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from collections import defaultdict
 import logging
 
@@ -14,6 +17,8 @@ logger = logging.getLogger(__name__)
 
 # --- Router Definition ---
 router = APIRouter()
+# Async versions of the CRUD routes, mounted instead of the sync ones when DB_ASYNC is on
+async_router = APIRouter()
 
 # --- Schemas ---
 
@@ -34,6 +39,77 @@ class RecordCreate(BaseModel):
     data: Dict[str, Any]
     prediction: str
 
+# --- Helpers (shared by the sync and async routes) ---
+
+LOG_LIMIT = 100
+HISTORY_FIELDS = ("id", "role", "content", "timestamp")
+HISTORY_DEFAULT_FIELDS = ("role", "content", "timestamp")
+RECORD_FIELDS = ("id", "record_type", "prediction", "timestamp", "data")
+# Keyset pagination sort key: (timestamp, id), served by the per-user timeline indexes
+TIMELINE_KEY = (datetime.datetime, int)
+
+def timeline_key(row) -> tuple:
+    return row.timestamp, row.id
+
+def timeline_columns(model, fields: List[str]) -> list:
+    # The sort key is always selected so the cursor can be built from the last row
+    return [getattr(model, f) for f in dict.fromkeys([*fields, "timestamp", "id"])]
+
+def history_query(user_id: int, fields: List[str], before: Optional[tuple], limit: int) -> Select:
+    """Chat messages newest first, starting below the `before` key."""
+    key = (models.ChatLog.timestamp, models.ChatLog.id)
+    query = select(*timeline_columns(models.ChatLog, fields)).where(models.ChatLog.user_id == user_id)
+    if before is not None:
+        query = query.where(pagination.seek(key, before, descending=True))
+    return query.order_by(*pagination.ordering(key, descending=True)).limit(limit)
+
+def history_response(request: Request, rows: list, fields: List[str], limit: int):
+    page, next_key = pagination.split_page(rows, limit, timeline_key)
+    # Reverse to show oldest first in UI; the next page holds older messages
+    return pagination.page_response(request, pagination.project(reversed(page), fields), next_key)
+
+def records_query(user_id: int, record_type: Optional[str], fields: List[str], after: Optional[tuple], limit: int) -> Select:
+    """Health records oldest first, starting above the `after` key."""
+    key = (models.HealthRecord.timestamp, models.HealthRecord.id)
+    query = select(*timeline_columns(models.HealthRecord, fields)).where(models.HealthRecord.user_id == user_id)
+    if record_type:
+        query = query.where(models.HealthRecord.record_type == record_type)
+    if after is not None:
+        query = query.where(pagination.seek(key, after))
+    return query.order_by(*pagination.ordering(key)).limit(limit)
+
+def records_response(request: Request, rows: list, fields: List[str], limit: int):
+    page, next_key = pagination.split_page(rows, limit, timeline_key)
+    return pagination.page_response(request, pagination.project(page, fields), next_key)
+
+def new_record(user: models.User, record: RecordCreate) -> models.HealthRecord:
+    db_record = models.HealthRecord(
+        user_id=user.id,
+        record_type=record.record_type,
+        data=json.dumps(record.data),
+        prediction=record.prediction,
+        timestamp=datetime.datetime.now(datetime.timezone.utc)
+    )
+    # Numeric fields go to health_measurements in the same flush
+    db_record.measurements = measurements.for_record(db_record, record.data)
+    return db_record
+
+def trend_params(metrics: List[str], buckets: int, record_type: Optional[str]) -> tuple:
+    names = tuple(dict.fromkeys(metrics))
+    if len(names) > trends.MAX_METRICS:
+        raise HTTPException(status_code=422, detail=f"At most {trends.MAX_METRICS} metrics per request")
+    return names, buckets, record_type
+
+def index_record(db_record: models.HealthRecord, data: Dict[str, Any]) -> None:
+    rag.add_checkup_to_db(
+        user_id=str(db_record.user_id),
+        record_id=str(db_record.id),
+        record_type=db_record.record_type,
+        data=data,
+        prediction=db_record.prediction,
+        timestamp=str(db_record.timestamp)
+    )
+
 # --- Endpoints ---
 
 @router.delete("/chat/history")
@@ -50,6 +126,10 @@ def delete_chat_history(
 
 @router.get("/chat/history", response_model=List[Dict[str, Any]])
 def get_chat_history(
+    request: Request,
+    limit: int = Query(LOG_LIMIT, ge=1, le=pagination.MAX_PAGE),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page (older messages)"),
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(HISTORY_FIELDS)}"),
     current_user: models.User = Depends(auth.get_current_user), 
     db: Session = Depends(database.get_db)
 ) -> List[Dict[str, Any]]:
@@ -57,19 +137,16 @@ def get_chat_history(
     Retrieve past chat interactions for the timeline UI.
     
     Returns:
-        List of dicts: [{"role": "user", "content": "..."}]
+        The newest `limit` messages, oldest first: [{"role": "user", "content": "...", "timestamp": ...}].
+        X-Next-Cursor is set when older messages remain.
     """
-    LOG_LIMIT = 100
-    logs = db.query(models.ChatLog).filter(
-        models.ChatLog.user_id == current_user.id
-    ).order_by(models.ChatLog.timestamp.desc()).limit(LOG_LIMIT).all()
-    
-    # Reverse to show oldest first in UI
-    logs.reverse()
-    
-    return [{"role": log.role, "content": log.content, "timestamp": log.timestamp} for log in logs]
+    columns = pagination.projection(fields, HISTORY_FIELDS, HISTORY_DEFAULT_FIELDS)
+    before = pagination.decode_cursor(cursor, TIMELINE_KEY)
+    rows = db.execute(history_query(current_user.id, columns, before, limit + 1)).all()
+    return history_response(request, rows, columns, limit)
 
-@router.post("/chat")
+@router.post("/chat", dependencies=[Depends(quotas.tier_limit("chat", auth.get_current_user))])
+@tracing.traced("chat.endpoint")
 def chat_endpoint(
     request: ChatRequest, 
     current_user: models.User = Depends(auth.get_current_user), 
@@ -97,18 +174,11 @@ def chat_endpoint(
         f"About Me: {current_user.about_me or 'None'}"
     )
 
-    # Save User Message to DB
-    if save_data:
-        try:
-            user_log = models.ChatLog(user_id=current_user.id, role="user", content=request.message, timestamp=datetime.datetime.now(datetime.timezone.utc))
-            db.add(user_log)
-            db.commit()
-            db.refresh(user_log)
-            rag.add_interaction_to_db(str(current_user.id), str(user_log.id), "user", request.message, str(user_log.timestamp))
-        except Exception as e:
-            logger.error(f"Error saving user log: {e}")
+    # User message is persisted with the reply, in one transaction (save_turn)
+    turn = [("user", request.message, datetime.datetime.now(datetime.timezone.utc))]
 
     # 2. Build Agent Graph Context
+    HumanMessage, AIMessage = agent.lc_messages.HumanMessage, agent.lc_messages.AIMessage
     graph_messages = []
     for msg in request.history:
         if msg.role == "user":
@@ -129,9 +199,10 @@ def chat_endpoint(
                 context_str += f"- {k}: {pred}\n"
     
     # B. Historical Context (From DB) - Optimised to last 50 records
-    all_records = db.query(models.HealthRecord).filter(
-        models.HealthRecord.user_id == current_user.id
-    ).order_by(models.HealthRecord.timestamp.desc()).limit(50).all()
+    with tracing.start_span("chat.history_query"):
+        all_records = db.query(models.HealthRecord).filter(
+            models.HealthRecord.user_id == current_user.id
+        ).order_by(models.HealthRecord.timestamp.desc()).limit(50).all()
     
     if all_records:
         context_str += "\n--- MEDICAL HISTORY ---\n"
@@ -203,28 +274,36 @@ def chat_endpoint(
             "conversation_count": len(graph_messages)  # Track engagement
         }
         
-        result = agent.medical_agent.invoke(inputs)
+        with tracing.start_span("agent.invoke", **{"agent.message_count": len(graph_messages)}):
+            result = agent.medical_agent.invoke(inputs)
         
         last_msg = result['messages'][-1]
         response_text = last_msg.content
         
-        # Save AI Response
+        # Save the turn (user message + AI response)
+        turn.append(("assistant", response_text, datetime.datetime.now(datetime.timezone.utc)))
         if save_data:
-            try:
-                ai_log = models.ChatLog(user_id=current_user.id, role="assistant", content=response_text, timestamp=datetime.datetime.now(datetime.timezone.utc))
-                db.add(ai_log)
-                db.commit()
-                db.refresh(ai_log)
-                rag.add_interaction_to_db(str(current_user.id), str(ai_log.id), "assistant", response_text, str(ai_log.timestamp))
-            except Exception as e:
-                print(f"Error saving AI log: {e}")
+            save_turn(db, current_user.id, turn)
 
         return {"response": response_text}
 
     except Exception as e:
         print(f"AGENT ERROR: {e}")
+        if save_data:
+            save_turn(db, current_user.id, turn)
         return {"response": "I'm having trouble analyzing your files right now. Please try again later.", "error": str(e)}
 
+def save_turn(db: Session, user_id: int, turn: List[Tuple[str, str, datetime.datetime]]) -> None:
+    """Chat logs for a turn in one transaction, then one vector-store write. Failures are logged, never raised."""
+    try:
+        ids = chat_store.save_turn(db, user_id, turn)
+    except Exception as e:
+        logger.error(f"Error saving chat turn: {e}")
+        return
+    rag.add_interactions_to_db(str(user_id), [
+        (str(log_id), role, content, str(timestamp)) for log_id, (role, content, timestamp) in zip(ids, turn)
+    ])
+
 # --- Record Management Endpoints ---
 
 @router.post("/records")
@@ -236,39 +315,68 @@ def save_health_record(
     """
     Save a prediction result (Diabetes/Heart/Liver) to DB and Vector Index.
     """
-    db_record = models.HealthRecord(
-        user_id=current_user.id,
-        record_type=record.record_type,
-        data=json.dumps(record.data),
-        prediction=record.prediction
-    )
+    db_record = new_record(current_user, record)
     db.add(db_record)
     db.commit()
     db.refresh(db_record)
+    trends.cache.invalidate(current_user.id)
     
     # Sync to Chroma/RAG
-    rag.add_checkup_to_db(
-        user_id=str(current_user.id),
-        record_id=str(db_record.id),
-        record_type=db_record.record_type,
-        data=record.data,
-        prediction=db_record.prediction,
-        timestamp=str(db_record.timestamp)
-    )
+    index_record(db_record, record.data)
     
     return {"status": "success", "message": "Health record saved."}
 
 @router.get("/records", response_model=List[schemas.HealthRecordResponse])
 def get_health_records(
+    request: Request,
     record_type: Optional[str] = None, 
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE, description="Page size; omit to stream the full history"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    fields: Optional[str] = Query(None, description=f"Comma-separated subset of: {', '.join(RECORD_FIELDS)}"),
     current_user: models.User = Depends(auth.get_current_user), 
     db: Session = Depends(database.get_db)
 ) -> List[schemas.HealthRecordResponse]:
-    """Retrieve health records, optionally filtered by type."""
-    query = db.query(models.HealthRecord).filter(models.HealthRecord.user_id == current_user.id)
-    if record_type:
-        query = query.filter(models.HealthRecord.record_type == record_type)
-    return query.order_by(models.HealthRecord.timestamp.asc()).all()
+    """
+    Retrieve health records oldest first, optionally filtered by type.
+    With `limit`, one page (X-Next-Cursor set when more remain); without, the
+    whole history streamed as a JSON array in keyset batches.
+    """
+    columns = pagination.projection(fields, RECORD_FIELDS)
+    after = pagination.decode_cursor(cursor, TIMELINE_KEY)
+
+    def fetch(after: Optional[tuple], size: int) -> list:
+        return db.execute(records_query(current_user.id, record_type, columns, after, size)).all()
+
+    if limit is None:
+        pages = (pagination.project(rows, columns) for rows in pagination.iter_pages(fetch, timeline_key, after))
+        return pagination.stream_array(pages, close=db.close)
+    return records_response(request, fetch(after, limit + 1), columns, limit)
+
+@router.get("/records/trends")
+def get_health_trends(
+    metrics: List[str] = Query(list(trends.DEFAULT_METRICS)),
+    buckets: int = Query(trends.DEFAULT_BUCKETS, ge=1, le=trends.MAX_BUCKETS),
+    record_type: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+) -> Dict[str, Any]:
+    """
+    Downsampled time series per metric: up to `buckets` points, each with
+    count/min/max/mean, aggregated in SQL and cached until the next record write.
+    """
+    params = trend_params(metrics, buckets, record_type)
+    cached, generation = trends.cache.get(current_user.id, params)
+    if cached is not None:
+        return cached
+    names = params[0]
+    first, last = db.execute(trends.span_query(current_user.id, names, record_type)).one()
+    span, rows = None, []
+    if first is not None:
+        span = trends.window(first, last, buckets)
+        rows = db.execute(trends.bucket_query(current_user.id, names, record_type, *span, db.get_bind().dialect.name)).all()
+    result = trends.payload(names, buckets, span, rows)
+    trends.cache.put(current_user.id, params, generation, result)
+    return result
 
 @router.delete("/records/{record_id}")
 def delete_health_record(
@@ -286,6 +394,7 @@ def delete_health_record(
     # SQL Delete
     db.delete(record)
     db.commit()
+    trends.cache.invalidate(current_user.id)
     
     # Vector Delete
     rag.delete_record_from_db(str(record_id))
@@ -295,7 +404,6 @@ def delete_health_record(
 
 # --- PDF Report Download Endpoint ---
 from fastapi.responses import Response
-from . import pdf_generator
 
 @router.get("/download/health-report")
 def download_health_report(
@@ -313,6 +421,9 @@ def download_health_report(
         models.HealthRecord.user_id == current_user.id
     ).order_by(models.HealthRecord.timestamp.desc()).limit(50).all()
     
+    return health_report_response(current_user, records)
+
+def health_report_response(user: models.User, records: List[models.HealthRecord]) -> Response:
     # Convert to dict format
     records_list = [
         {
@@ -325,24 +436,141 @@ def download_health_report(
     
     # Build user profile
     user_profile = {
-        "height": current_user.height,
-        "weight": current_user.weight,
-        "dob": str(current_user.dob) if current_user.dob else "N/A",
-        "blood_type": current_user.blood_type
+        "height": user.height,
+        "weight": user.weight,
+        "dob": str(user.dob) if user.dob else "N/A",
+        "blood_type": user.blood_type
     }
     
-    # Generate PDF
+    # Generate PDF (fpdf is only imported when a report is requested)
+    from . import pdf_generator
     pdf_bytes = pdf_generator.generate_health_report(
-        user_name=current_user.full_name or current_user.username,
+        user_name=user.full_name or user.username,
         user_profile=user_profile,
         health_records=records_list
     )
     
     # Return as downloadable file
-    filename = f"health_report_{current_user.username}_{datetime.datetime.now().strftime('%Y%m%d')}.pdf"
+    filename = f"health_report_{user.username}_{datetime.datetime.now().strftime('%Y%m%d')}.pdf"
     
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
+
+
+# --- Async Endpoints (DB_ASYNC) ---
+# Same contracts as the CRUD routes above on an AsyncSession. The chat turn
+# itself (agent + RAG) stays on the sync router. Vector-store and PDF work is
+# blocking, so it runs in the threadpool.
+
+@async_router.delete("/chat/history")
+async def delete_chat_history_async(
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> Dict[str, str]:
+    await db.execute(delete(models.ChatLog).where(models.ChatLog.user_id == current_user.id))
+    await db.commit()
+    return {"status": "success", "message": "Chat history cleared"}
+
+@async_router.get("/chat/history", response_model=List[Dict[str, Any]])
+async def get_chat_history_async(
+    request: Request,
+    limit: int = Query(LOG_LIMIT, ge=1, le=pagination.MAX_PAGE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> List[Dict[str, Any]]:
+    columns = pagination.projection(fields, HISTORY_FIELDS, HISTORY_DEFAULT_FIELDS)
+    before = pagination.decode_cursor(cursor, TIMELINE_KEY)
+    rows = (await db.execute(history_query(current_user.id, columns, before, limit + 1))).all()
+    return history_response(request, rows, columns, limit)
+
+@async_router.post("/records")
+async def save_health_record_async(
+    record: RecordCreate,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> Dict[str, str]:
+    db_record = new_record(current_user, record)
+    db.add(db_record)
+    await db.commit()
+    await db.refresh(db_record)
+    trends.cache.invalidate(current_user.id)
+    await run_in_threadpool(index_record, db_record, record.data)
+    return {"status": "success", "message": "Health record saved."}
+
+@async_router.get("/records", response_model=List[schemas.HealthRecordResponse])
+async def get_health_records_async(
+    request: Request,
+    record_type: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=pagination.MAX_PAGE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> List[schemas.HealthRecordResponse]:
+    columns = pagination.projection(fields, RECORD_FIELDS)
+    after = pagination.decode_cursor(cursor, TIMELINE_KEY)
+
+    async def fetch(after: Optional[tuple], size: int) -> list:
+        return (await db.execute(records_query(current_user.id, record_type, columns, after, size))).all()
+
+    if limit is None:
+        async def pages():
+            async for rows in pagination.aiter_pages(fetch, timeline_key, after):
+                yield pagination.project(rows, columns)
+        return pagination.stream_array_async(pages(), close=db.close)
+    return records_response(request, await fetch(after, limit + 1), columns, limit)
+
+@async_router.get("/records/trends")
+async def get_health_trends_async(
+    metrics: List[str] = Query(list(trends.DEFAULT_METRICS)),
+    buckets: int = Query(trends.DEFAULT_BUCKETS, ge=1, le=trends.MAX_BUCKETS),
+    record_type: Optional[str] = None,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> Dict[str, Any]:
+    params = trend_params(metrics, buckets, record_type)
+    cached, generation = trends.cache.get(current_user.id, params)
+    if cached is not None:
+        return cached
+    names = params[0]
+    first, last = (await db.execute(trends.span_query(current_user.id, names, record_type))).one()
+    span, rows = None, []
+    if first is not None:
+        span = trends.window(first, last, buckets)
+        rows = (await db.execute(trends.bucket_query(current_user.id, names, record_type, *span, db.get_bind().dialect.name))).all()
+    result = trends.payload(names, buckets, span, rows)
+    trends.cache.put(current_user.id, params, generation, result)
+    return result
+
+@async_router.delete("/records/{record_id}")
+async def delete_health_record_async(
+    record_id: int,
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> Dict[str, str]:
+    record = await db.scalar(select(models.HealthRecord).where(
+        models.HealthRecord.id == record_id, models.HealthRecord.user_id == current_user.id
+    ))
+    if not record:
+        raise HTTPException(status_code=404, detail="Record not found")
+    await db.delete(record)
+    await db.commit()
+    trends.cache.invalidate(current_user.id)
+    await run_in_threadpool(rag.delete_record_from_db, str(record_id))
+    return {"status": "success", "message": "Record deleted"}
+
+@async_router.get("/download/health-report")
+async def download_health_report_async(
+    current_user: models.User = Depends(auth.get_current_user_async),
+    db: AsyncSession = Depends(database.get_async_db)
+) -> Response:
+    records = (await db.scalars(
+        select(models.HealthRecord).where(models.HealthRecord.user_id == current_user.id)
+        .order_by(models.HealthRecord.timestamp.desc()).limit(50)
+    )).all()
+    return await run_in_threadpool(health_report_response, current_user, records)
@@ -0,0 +1,132 @@
+"""
+Chat Log Persistence
+====================
+Writes a chat turn (the user's message and the assistant's reply) to
+chat_logs as one multi-row INSERT ... RETURNING id and one commit, instead of
+add/commit/refresh per message. Timestamps are set client-side and ids come
+back from RETURNING, so nothing is re-selected.
+
+Group commit (optional): with CHAT_GROUP_COMMIT_MS > 0, turns are handed to a
+per-worker writer thread that waits up to that many milliseconds for other
+requests' turns and writes the whole group in one transaction (at most
+CHAT_GROUP_COMMIT_MAX turns). Under concurrent load that turns N fsyncs into
+one, at the price of up to CHAT_GROUP_COMMIT_MS added latency per turn; a
+failed group fails every turn in it. scripts/benchmarks/chat_turn_writes.py
+compares the modes.
+"""
+import datetime
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import metrics, models
+
+logger = logging.getLogger(__name__)
+
+GROUP_COMMIT_MS = float(os.getenv("CHAT_GROUP_COMMIT_MS", "0"))
+GROUP_COMMIT_MAX = int(os.getenv("CHAT_GROUP_COMMIT_MAX", "64"))
+
+Message = Tuple[str, str, datetime.datetime]  # (role, content, timestamp)
+
+
+def rows_for(user_id: int, messages: Sequence[Message]) -> List[Dict[str, Any]]:
+    return [{"user_id": user_id, "role": role, "content": content, "timestamp": timestamp} for role, content, timestamp in messages]
+
+def insert_rows(conn: Any, rows: List[Dict[str, Any]]) -> List[int]:
+    """One INSERT ... RETURNING id for all rows (Connection or Session); ids in row order."""
+    table = models.ChatLog.__table__
+    # Ids are allocated in VALUES order (rowid / sequence); only the order RETURNING
+    # emits them in is unspecified. sort_by_parameter_order would make SQLAlchemy
+    # fall back to one INSERT per row on SQLite, so sort here instead.
+    return sorted(conn.execute(insert(table).returning(table.c.id), rows).scalars())
+
+
+class GroupCommitWriter:
+    """Batches turns from concurrent requests into shared transactions."""
+
+    def __init__(self, engine: Engine, window_ms: float = GROUP_COMMIT_MS, max_turns: int = GROUP_COMMIT_MAX):
+        self.engine = engine
+        self.window = window_ms / 1000
+        self.max_turns = max_turns
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="chat-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows: List[Dict[str, Any]]) -> List[int]:
+        """Blocks until the group holding these rows has committed; returns their ids."""
+        future: Future = Future()
+        self._queue.put((rows, future))
+        return future.result()
+
+    def _collect(self) -> List[Tuple[List[Dict[str, Any]], Future]]:
+        first = self._queue.get()
+        if first is None:
+            return []
+        group = [first]
+        deadline = time.monotonic() + self.window
+        while len(group) < self.max_turns:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Finish this group, then stop
+                break
+            group.append(item)
+        return group
+
+    def _run(self) -> None:
+        while True:
+            group = self._collect()
+            if not group:
+                return
+            try:
+                with self.engine.begin() as conn:
+                    ids = insert_rows(conn, [row for rows, _ in group for row in rows])
+            except Exception as e:
+                for _, future in group:
+                    future.set_exception(e)
+                continue
+            metrics.CHAT_GROUP_COMMIT_TURNS.observe(len(group))
+            for rows, future in group:
+                future.set_result(ids[:len(rows)])
+                ids = ids[len(rows):]
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+_writer: Optional[GroupCommitWriter] = None
+
+def start(engine: Engine, window_ms: Optional[float] = None) -> Optional[GroupCommitWriter]:
+    """Start the group-commit writer if CHAT_GROUP_COMMIT_MS (or `window_ms`) is set."""
+    global _writer
+    window_ms = GROUP_COMMIT_MS if window_ms is None else window_ms
+    if window_ms > 0 and _writer is None:
+        _writer = GroupCommitWriter(engine, window_ms)
+        logger.info(f"[CHAT] Group commit on: {window_ms:g} ms window, up to {_writer.max_turns} turns")
+    return _writer
+
+def stop() -> None:
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+def save_turn(db: Session, user_id: int, messages: Sequence[Message]) -> List[int]:
+    """Persist a turn's messages in one transaction (the request's own, or a shared group commit)."""
+    rows = rows_for(user_id, messages)
+    if _writer is not None:
+        return _writer.submit(rows)
+    ids = insert_rows(db, rows)
+    db.commit()
+    return ids
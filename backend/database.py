@@ -1,7 +1,28 @@
-from sqlalchemy import create_engine
+"""
+Database Engines
+================
+The sync engine (SessionLocal / get_db) serves every endpoint by default.
+
+With DB_ASYNC=true, the CRUD routes in auth.py, chat.py and admin.py are
+served by their async versions instead (see main.include_crud_routes). Those
+use an async engine (aiosqlite for SQLite, asyncpg for Postgres) through
+get_async_db, so a request waiting for a pooled connection no longer holds a
+threadpool thread. Both engines share the pool settings below and report
+checkout waits to /metrics, labelled by engine.
+"""
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from typing import TYPE_CHECKING, AsyncIterator
 import os
+import time
+from . import metrics, tracing
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncSession
 
 # Allow override via env var for deployment, default to local SQLite
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
@@ -12,6 +33,58 @@ if not SQLALCHEMY_DATABASE_URL:
 if SQLALCHEMY_DATABASE_URL.startswith("postgres://"):
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# --- Pool Configuration ---
+ASYNC_DB = os.getenv("DB_ASYNC", "false").lower() == "true"
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))          # Small pool for free tier
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "0"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))  # Seconds a checkout may wait
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))   # Recycle connections every 5 mins
+
+def async_url(url: str) -> str:
+    """Same database through its asyncio driver."""
+    for sync_prefix, async_prefix in (("sqlite://", "sqlite+aiosqlite://"), ("postgresql://", "postgresql+asyncpg://"),
+                                      ("postgresql+psycopg2://", "postgresql+asyncpg://")):
+        if url.startswith(sync_prefix):
+            return async_prefix + url[len(sync_prefix):]
+    return url
+
+class _TimedCheckout:
+    """Records how long each checkout waits for a connection (and timeouts)."""
+    engine_label = "sync"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            metrics.DB_POOL_TIMEOUTS.inc(engine=self.engine_label)
+            raise
+        finally:
+            metrics.DB_POOL_CHECKOUT_WAIT.observe(time.perf_counter() - start, engine=self.engine_label)
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    engine_label = "sync"
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+def pool_options(url: str) -> dict:
+    if url.startswith("sqlite") and ":memory:" in url:
+        return {}  # Single shared connection; nothing to pool
+    return {
+        "pool_pre_ping": True,  # Check connection liveness
+        "pool_recycle": POOL_RECYCLE,
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+    }
+
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    # Enable WAL Mode for Performance (SQLite Only)
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.close()
+
 connect_args = {}
 if "sqlite" in SQLALCHEMY_DATABASE_URL:
     connect_args = {"check_same_thread": False}
@@ -19,20 +92,16 @@ if "sqlite" in SQLALCHEMY_DATABASE_URL:
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
     connect_args=connect_args,
-    pool_pre_ping=True,  # Check connection liveness
-    pool_recycle=300,    # Recycle connections every 5 mins
-    pool_size=5,         # Small pool for free tier
-    max_overflow=0
+    poolclass=TimedQueuePool,
+    **pool_options(SQLALCHEMY_DATABASE_URL)
 )
 
-# Enable WAL Mode for Performance (SQLite Only)
 if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    from sqlalchemy import event
-    @event.listens_for(engine, "connect")
-    def set_sqlite_pragma(dbapi_connection, connection_record):
-        cursor = dbapi_connection.cursor()
-        cursor.execute("PRAGMA journal_mode=WAL")
-        cursor.close()
+    event.listen(engine, "connect", set_sqlite_pragma)
+
+# db.query spans for every engine (including test engines and async engines' sync core)
+tracing.instrument_sqlalchemy(Engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -43,3 +112,39 @@ def get_db():
         yield db
     finally:
         db.close()
+
+# --- Async Engine ---
+# Created on first use so the async drivers are only needed when DB_ASYNC is on.
+
+async_engine = None
+AsyncSessionLocal = None
+
+def create_async_db_engine(url: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    url = async_url(url)
+    options = pool_options(url)
+    if options:
+        options["poolclass"] = TimedAsyncQueuePool
+    new_engine = create_async_engine(url, **options)
+    if url.startswith("sqlite"):
+        event.listen(new_engine.sync_engine, "connect", set_sqlite_pragma)
+    return new_engine
+
+def get_async_sessionmaker():
+    global async_engine, AsyncSessionLocal
+    if AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import async_sessionmaker
+        async_engine = create_async_db_engine(SQLALCHEMY_DATABASE_URL)
+        # No expire on commit: attribute access after commit would need an awaited refresh
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    return AsyncSessionLocal
+
+async def get_async_db() -> AsyncIterator["AsyncSession"]:
+    async with get_async_sessionmaker()() as db:
+        yield db
+
+async def dispose_async_engine() -> None:
+    global async_engine, AsyncSessionLocal
+    if async_engine is not None:
+        await async_engine.dispose()
+    async_engine = AsyncSessionLocal = None
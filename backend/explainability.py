@@ -1,13 +1,16 @@
-# Optional heavy imports - not available on lite deployment
+# Optional heavy imports - not available on lite deployment.
+# Deferred until the first explanation request (shap alone is ~2s to import).
+from .lazy import lazy_import
+
 try:
-    import shap
+    shap = lazy_import("shap")
     SHAP_AVAILABLE = True
 except ImportError:
     SHAP_AVAILABLE = False
     shap = None
 
 try:
-    import matplotlib.pyplot as plt
+    plt = lazy_import("matplotlib.pyplot")
     MATPLOTLIB_AVAILABLE = True
 except ImportError:
     MATPLOTLIB_AVAILABLE = False
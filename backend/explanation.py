@@ -1,9 +1,12 @@
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
-import google.generativeai as genai
 import os
 import logging
 from dotenv import load_dotenv
+from . import quotas, metrics
+from .lazy import lazy_import
+
+genai = lazy_import("google.generativeai")
 
 # Load Env
 load_dotenv()
@@ -54,7 +57,7 @@ class ExplanationResponse(BaseModel):
 
 from typing import Optional, Any
 
-@router.post("/", response_model=ExplanationResponse)
+@router.post("/", response_model=ExplanationResponse, dependencies=[Depends(quotas.tier_limit("explain"))])
 async def explain_prediction(req: ExplanationRequest, injected_model: Optional[Any] = None):
     """
     Uses Gemini to explain WHY a prediction was made in plain English.
@@ -89,7 +92,8 @@ async def explain_prediction(req: ExplanationRequest, injected_model: Optional[A
         """
         
         # Call Gemini
-        response = model.generate_content(prompt)
+        with metrics.track(metrics.LLM_LATENCY, metrics.LLM_ERRORS, caller="explain"):
+            response = model.generate_content(prompt)
         text = response.text
         
         # Naive parsing (could be improved with structured output mode if available)
@@ -0,0 +1,271 @@
+"""
+Feature Schemas
+===============
+Single declarative source of truth for every disease model's inputs: column
+order, the request field feeding each column, dtype, valid range, encoder
+and pre-scaling transform. Serving pipelines (backend/features.py), request
+validation (backend/schemas.py), SHAP feature names, training (mlops/model_training.py) and placeholder generation
+(scripts/generate_placeholder_models.py) are all derived from it.
+
+Training writes each schema next to its model artifact
+(`<model>.schema.json`). At load, validate_artifacts() compares the artifact,
+its scaler and that sidecar against the registry, so a model trained on a
+different column order is rejected instead of silently mispredicting.
+"""
+import os
+import json
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .features import FeaturePipeline
+
+SCHEMA_SUFFIX = ".schema.json"
+
+
+def get_age_bucket(age: float) -> int:
+    """Map Age (Years) to BRFSS Age Bucket (1-13)."""
+    if age <= 24: return 1
+    elif age <= 29: return 2
+    elif age <= 34: return 3
+    elif age <= 39: return 4
+    elif age <= 44: return 5
+    elif age <= 49: return 6
+    elif age <= 54: return 7
+    elif age <= 59: return 8
+    elif age <= 64: return 9
+    elif age <= 69: return 10
+    elif age <= 74: return 11
+    elif age <= 79: return 12
+    else: return 13
+
+
+# Named so schemas stay serializable
+ENCODERS: Dict[str, Callable] = {
+    "age_bucket": get_age_bucket,
+}
+TRANSFORMS = ("log1p",)
+
+
+class Feature(NamedTuple):
+    """
+    One model column. Ranges apply to the column value (after encoding, before
+    transforms); requests outside them are rejected (schemas.FeatureInput).
+    """
+    name: str
+    field: str
+    dtype: str = "float"
+    min: Optional[float] = None
+    max: Optional[float] = None
+    encoder: Optional[str] = None
+    transform: Optional[str] = None
+    source: Optional[str] = None  # Training-data column, when named differently
+
+
+def binary(name: str, field: str, source: Optional[str] = None) -> Feature:
+    return Feature(name, field, "int", 0, 1, source=source)
+
+
+class DiseaseSchema(NamedTuple):
+    name: str
+    features: Tuple[Feature, ...]
+
+    @property
+    def feature_names(self) -> List[str]:
+        return [f.name for f in self.features]
+
+    @property
+    def input_fields(self) -> List[str]:
+        return [f.field for f in self.features]
+
+    @property
+    def source_columns(self) -> List[str]:
+        return [f.source or f.name for f in self.features]
+
+    @property
+    def log1p_features(self) -> List[str]:
+        return [f.name for f in self.features if f.transform == "log1p"]
+
+    @property
+    def screening_fields(self) -> List[str]:
+        """Fields of the combined screening profile (schemas.ScreeningInput) feeding each column."""
+        aliases = SCREENING_ALIASES.get(self.name, {})
+        return [aliases.get(field, field) for field in self.input_fields]
+
+    def field_ranges(self, screening: bool = False) -> Dict[str, Tuple[float, float]]:
+        """
+        (min, max) of each request field (screening profile field if `screening`)
+        feeding a column directly. Encoded columns are in range by construction,
+        so their fields are not bounded here.
+        """
+        fields = self.screening_fields if screening else self.input_fields
+        return {field: (f.min, f.max) for field, f in zip(fields, self.features)
+                if not f.encoder and f.min is not None and f.max is not None}
+
+    @property
+    def encoders(self) -> Dict[str, Callable]:
+        return {f.name: ENCODERS[f.encoder] for f in self.features if f.encoder}
+
+    def pipeline(self, scaler=None) -> FeaturePipeline:
+        return FeaturePipeline(self.feature_names, self.input_fields, self.encoders, self.log1p_features, scaler)
+
+    def midpoint(self) -> List[float]:
+        """A valid, representative row (used for warm-up and checks)."""
+        return [(f.min + f.max) / 2 if f.min is not None and f.max is not None else 0.0 for f in self.features]
+
+    # --- Persistence ---
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"name": self.name, "features": [f._asdict() for f in self.features]}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DiseaseSchema":
+        return cls(data["name"], tuple(Feature(**f) for f in data["features"]))
+
+    def save(self, model_path: str) -> str:
+        """Write the schema sidecar next to a model artifact."""
+        path = sidecar_path(model_path)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        return path
+
+    # --- Validation ---
+
+    def validate_artifacts(self, model, scaler=None, sidecar: Optional["DiseaseSchema"] = None) -> None:
+        """Raise ValueError if the model/scaler/sidecar disagree with this schema."""
+        expected = len(self.features)
+        for label, obj in (("model", model), ("scaler", scaler)):
+            n = getattr(obj, "n_features_in_", None)
+            if isinstance(n, int) and n != expected:
+                raise ValueError(f"{self.name} {label} expects {n} features, schema has {expected}")
+            names = getattr(obj, "feature_names_in_", None)
+            if isinstance(names, np.ndarray):
+                names = names.tolist()
+            if isinstance(names, (list, tuple)) and list(names) not in (self.feature_names, self.source_columns):
+                raise ValueError(f"{self.name} {label} was fitted on columns {list(names)}, schema has {self.feature_names}")
+        if sidecar is not None and sidecar.feature_names != self.feature_names:
+            raise ValueError(f"{self.name} artifact schema {sidecar.feature_names} does not match {self.feature_names}")
+        for feature in self.features:
+            if feature.encoder and feature.encoder not in ENCODERS:
+                raise ValueError(f"Unknown encoder '{feature.encoder}' for {self.name}.{feature.name}")
+            if feature.transform and feature.transform not in TRANSFORMS:
+                raise ValueError(f"Unknown transform '{feature.transform}' for {self.name}.{feature.name}")
+
+
+def sidecar_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + SCHEMA_SUFFIX
+
+
+def load_sidecar(model_path: Optional[str]) -> Optional[DiseaseSchema]:
+    """Schema saved next to a model artifact, if there is one."""
+    if not model_path or not os.path.exists(sidecar_path(model_path)):
+        return None
+    with open(sidecar_path(model_path), encoding="utf-8") as f:
+        return DiseaseSchema.from_dict(json.load(f))
+
+
+# --- Registry ---
+
+SCHEMAS: Dict[str, DiseaseSchema] = {
+    # BRFSS 2015; training columns are the raw survey names
+    "diabetes": DiseaseSchema("diabetes", (
+        binary("Hypertension", "hypertension", source="HighBP"),
+        binary("HighChol", "high_chol"),
+        Feature("BMI", "bmi", "float", 10, 80),
+        binary("Smoking", "smoking_history", source="Smoker"),
+        binary("HeartDisease", "heart_disease", source="HeartDiseaseorAttack"),
+        binary("PhysActivity", "physical_activity"),
+        Feature("GenHlth", "general_health", "int", 1, 5),
+        binary("Gender", "gender", source="Sex"),
+        Feature("AgeBucket", "age", "int", 1, 13, encoder="age_bucket", source="Age"),
+    )),
+    "heart": DiseaseSchema("heart", (
+        binary("HighBP", "high_bp", source="high_bp"),
+        binary("HighChol", "high_chol", source="high_chol"),
+        Feature("BMI", "bmi", "float", 10, 80, source="bmi"),
+        binary("Smoker", "smoker", source="smoker"),
+        binary("Stroke", "stroke", source="stroke"),
+        binary("Diabetes", "diabetes", source="diabetes"),
+        binary("PhysActivity", "phys_activity", source="phys_activity"),
+        binary("HvyAlcohol", "hvy_alcohol", source="hvy_alcohol"),
+        Feature("GenHlth", "gen_hlth", "int", 1, 5, source="gen_hlth"),
+        binary("Gender", "gender", source="sex"),
+        Feature("AgeBucket", "age", "int", 1, 13, encoder="age_bucket", source="age"),
+    )),
+    # ILPD; skewed enzyme/bilirubin columns are log-transformed before scaling
+    "liver": DiseaseSchema("liver", (
+        Feature("Age", "age", "float", 1, 120, source="age"),
+        binary("Gender", "gender", source="gender"),
+        Feature("Total_Bilirubin", "total_bilirubin", "float", 0, 75, transform="log1p", source="total_bilirubin"),
+        Feature("Direct_Bilirubin", "direct_bilirubin", "float", 0, 25, source="direct_bilirubin"),
+        Feature("Alkaline_Phosphotase", "alkaline_phosphotase", "float", 0, 2500, transform="log1p", source="alkaline_phosphotase"),
+        Feature("Alamine_Aminotransferase", "alamine_aminotransferase", "float", 0, 2500, transform="log1p", source="alamine_aminotransferase"),
+        Feature("Aspartate_Aminotransferase", "aspartate_aminotransferase", "float", 0, 5000, source="aspartate_aminotransferase"),
+        Feature("Total_Proteins", "total_proteins", "float", 0, 10, source="total_proteins"),
+        Feature("Albumin", "albumin", "float", 0, 10, source="albumin"),
+        Feature("Albumin_and_Globulin_Ratio", "albumin_and_globulin_ratio", "float", 0, 10, transform="log1p", source="albumin_and_globulin_ratio"),
+    )),
+    # UCI CKD; categorical columns are 0/1 encoded in mlops/data_processing.py
+    "kidney": DiseaseSchema("kidney", (
+        Feature("age", "age", "float", 1, 120),
+        Feature("bp", "bp", "float", 50, 200),
+        Feature("sg", "sg", "float", 1.005, 1.025),
+        Feature("al", "al", "float", 0, 5),
+        Feature("su", "su", "float", 0, 5),
+        binary("rbc", "rbc"),
+        binary("pc", "pc"),
+        binary("pcc", "pcc"),
+        binary("ba", "ba"),
+        Feature("bgr", "bgr", "float", 20, 500),
+        Feature("bu", "bu", "float", 1, 400),
+        Feature("sc", "sc", "float", 0, 80),
+        Feature("sod", "sod", "float", 4, 200),
+        Feature("pot", "pot", "float", 1, 50),
+        Feature("hemo", "hemo", "float", 3, 20),
+        Feature("pcv", "pcv", "float", 5, 60),
+        Feature("wc", "wc", "float", 1000, 30000),
+        Feature("rc", "rc", "float", 1, 10),
+        binary("htn", "htn"),
+        binary("dm", "dm"),
+        binary("cad", "cad"),
+        binary("appet", "appet"),
+        binary("pe", "pe"),
+        binary("ane", "ane"),
+    )),
+    "lungs": DiseaseSchema("lungs", (
+        binary("GENDER", "gender"),
+        Feature("AGE", "age", "float", 0, 120),
+        binary("SMOKING", "smoking"),
+        binary("YELLOW_FINGERS", "yellow_fingers"),
+        binary("ANXIETY", "anxiety"),
+        binary("PEER_PRESSURE", "peer_pressure"),
+        binary("CHRONIC_DISEASE", "chronic_disease"),
+        binary("FATIGUE", "fatigue"),
+        binary("ALLERGY", "allergy"),
+        binary("WHEEZING", "wheezing"),
+        binary("ALCOHOL_CONSUMING", "alcohol"),
+        binary("COUGHING", "coughing"),
+        binary("SHORTNESS_OF_BREATH", "shortness_of_breath"),
+        binary("SWALLOWING_DIFFICULTY", "swallowing_difficulty"),
+        binary("CHEST_PAIN", "chest_pain"),
+    )),
+}
+
+# Per-disease request fields that mean the same thing as a differently named
+# field of the screening profile, so /predict/screen asks for each value once.
+SCREENING_ALIASES: Dict[str, Dict[str, str]] = {
+    "diabetes": {"smoking_history": "smoker"},
+    "heart": {"high_bp": "hypertension", "phys_activity": "physical_activity", "gen_hlth": "general_health"},
+    "kidney": {"htn": "hypertension", "dm": "diabetes"},
+    "lungs": {"smoking": "smoker"},
+}
+
+
+def screening_ranges() -> Dict[str, Tuple[float, float]]:
+    """Range of each screening profile field: valid for every model column it feeds."""
+    ranges: Dict[str, Tuple[float, float]] = {}
+    for schema in SCHEMAS.values():
+        for field, (low, high) in schema.field_ranges(screening=True).items():
+            known_low, known_high = ranges.get(field, (low, high))
+            ranges[field] = (max(low, known_low), min(high, known_high))
+    return ranges
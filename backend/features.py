@@ -0,0 +1,133 @@
+"""
+Feature Pipelines
+=================
+Maps a validated request schema straight to a model's input row.
+
+Building a one-row pandas DataFrame per request (to satisfy scaler
+feature-name checks) costs more than the model call itself. A pipeline is
+compiled once per model bundle instead: request fields are read in training
+order into a float64 row, skewed columns are log1p-transformed by index, and a
+fitted StandardScaler is folded into precomputed offset/scale arrays.
+
+Folding is checked against scaler.transform on a probe row at compile time;
+scalers that cannot be folded (other types, mocks, failed checks) are called
+on the row directly, wrapped in a DataFrame only if they were fitted with
+feature names.
+"""
+import copy
+import logging
+import operator
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+from .lazy import lazy_import
+
+pd = lazy_import("pandas")
+
+logger = logging.getLogger(__name__)
+
+
+class FeaturePipeline:
+    """
+    Args:
+        feature_names: Model input columns, in training order.
+        fields: Request attribute feeding each column (same order).
+        derived: Column name -> function applied to that column's field value.
+        log1p: Columns log1p-transformed before scaling.
+        scaler: Fitted scaler applied last, if any.
+    """
+
+    def __init__(
+        self,
+        feature_names: Sequence[str],
+        fields: Sequence[str],
+        derived: Optional[Dict[str, Callable]] = None,
+        log1p: Sequence[str] = (),
+        scaler=None,
+    ):
+        if len(fields) != len(feature_names):
+            raise ValueError(f"{len(fields)} fields for {len(feature_names)} features")
+        self.feature_names = list(feature_names)
+        self.fields = tuple(fields)
+        self.derived = dict(derived or {})
+        self.log1p = tuple(log1p)
+        self.scaler = scaler
+        self._get = operator.attrgetter(*self.fields)
+        self._derived = [(self.feature_names.index(c), func) for c, func in self.derived.items()]
+        self._log1p_idx = np.array([self.feature_names.index(c) for c in self.log1p], dtype=np.intp)
+        self._offset: Optional[np.ndarray] = None
+        self._scale: Optional[np.ndarray] = None
+        self.folded = False
+        if scaler is not None:
+            self.folded = self._fold(scaler)
+
+    def with_scaler(self, scaler) -> "FeaturePipeline":
+        """Compile the same mapping against a (new) fitted scaler."""
+        return FeaturePipeline(self.feature_names, self.fields, self.derived, self.log1p, scaler)
+
+    def with_fields(self, fields: Sequence[str]) -> "FeaturePipeline":
+        """Same compiled pipeline reading differently named request fields (no recompilation)."""
+        if len(fields) != len(self.feature_names):
+            raise ValueError(f"{len(fields)} fields for {len(self.feature_names)} features")
+        clone = copy.copy(self)
+        clone.fields = tuple(fields)
+        clone._get = operator.attrgetter(*clone.fields)
+        return clone
+
+    # --- Compilation ---
+
+    def _fold(self, scaler) -> bool:
+        try:
+            from sklearn.preprocessing import StandardScaler
+        except ImportError:
+            return False
+        if not isinstance(scaler, StandardScaler) or getattr(scaler, "n_features_in_", None) != len(self.feature_names):
+            return False
+        self._offset = np.array(scaler.mean_, dtype=np.float64) if scaler.with_mean else None
+        self._scale = np.array(scaler.scale_, dtype=np.float64) if scaler.with_std else None
+
+        probe = np.arange(1, len(self.feature_names) + 1, dtype=np.float64).reshape(1, -1)
+        expected = np.asarray(scaler.transform(self._framed(probe, scaler)), dtype=np.float64)
+        if not np.allclose(self._apply_folded(probe.copy()), expected, rtol=1e-9, atol=1e-12):
+            logger.warning("Folded scaling does not match scaler.transform; using the scaler directly")
+            return False
+        return True
+
+    def _framed(self, row: np.ndarray, scaler):
+        names = getattr(scaler, "feature_names_in_", None)
+        if names is None:
+            return row
+        # The scaler's own column names: it may be fitted on source or schema names
+        names = list(names) if isinstance(names, (np.ndarray, list, tuple)) else []
+        return pd.DataFrame(row, columns=names if len(names) == row.shape[1] else self.feature_names)
+
+    def _apply_folded(self, row: np.ndarray) -> np.ndarray:
+        if self._offset is not None:
+            row -= self._offset
+        if self._scale is not None:
+            row /= self._scale
+        return row
+
+    # --- Transform ---
+
+    def values(self, data) -> list:
+        """Raw feature values of one request, in training order."""
+        values = list(self._get(data)) if len(self.fields) > 1 else [self._get(data)]
+        for idx, func in self._derived:
+            values[idx] = func(values[idx])
+        return values
+
+    def transform_values(self, values: Sequence[float]) -> np.ndarray:
+        """Model-ready (1, n_features) float64 row from raw feature values."""
+        row = np.array(values, dtype=np.float64).reshape(1, -1)
+        if self._log1p_idx.size:
+            row[0, self._log1p_idx] = np.log1p(row[0, self._log1p_idx])
+        if self.folded:
+            return self._apply_folded(row)
+        if self.scaler is not None:
+            return self.scaler.transform(self._framed(row, self.scaler))
+        return row
+
+    def transform(self, data) -> np.ndarray:
+        return self.transform_values(self.values(data))
@@ -0,0 +1,64 @@
+"""
+Deferred Imports
+================
+`lazy_import("pandas")` returns a stand-in module immediately and performs the
+real import on first attribute access. Heavy, rarely-used dependencies (LLM
+SDKs, SHAP, sklearn, pandas, payment/PDF libraries) therefore cost nothing at
+process start, which keeps cold starts on small instances fast.
+
+The stand-in forwards every attribute read/write/delete to the real module, so
+`mock.patch("backend.agent.genai")` and `mock.patch("backend.explainability.shap.X")`
+keep working. It does not use importlib.util.LazyLoader: the stand-in is a
+plain ModuleType proxy that is never put in sys.modules, and the real import
+goes through importlib.import_module. The first load is serialized with a
+lock, so worker threads racing on first use never see a half-initialized
+module (e.g. the concurrent model loaders in prediction.py).
+"""
+import importlib
+import importlib.util
+import sys
+import threading
+from types import ModuleType
+
+
+class _LazyModule(ModuleType):
+    def __init__(self, name: str):
+        super().__init__(name)
+        object.__setattr__(self, "_lazy_target", None)
+        object.__setattr__(self, "_lazy_lock", threading.Lock())
+
+    def _lazy_load(self) -> ModuleType:
+        target = object.__getattribute__(self, "_lazy_target")
+        if target is None:
+            with object.__getattribute__(self, "_lazy_lock"):
+                target = object.__getattribute__(self, "_lazy_target")
+                if target is None:
+                    target = importlib.import_module(self.__name__)
+                    object.__setattr__(self, "_lazy_target", target)
+        return target
+
+    def __getattr__(self, attr: str):
+        return getattr(self._lazy_load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self._lazy_load(), attr, value)
+
+    def __delattr__(self, attr: str) -> None:
+        delattr(self._lazy_load(), attr)
+
+    def __dir__(self):
+        return dir(self._lazy_load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if object.__getattribute__(self, "_lazy_target") is not None else "not loaded"
+        return f"<lazy module '{self.__name__}' ({state})>"
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return `name` without importing it yet; raises ImportError if it is not installed."""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    return _LazyModule(name)
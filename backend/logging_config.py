@@ -0,0 +1,166 @@
+"""
+Logging Configuration
+=====================
+Non-blocking, structured logging for the API process.
+
+Request handlers only enqueue records (QueueHandler); a single background
+QueueListener thread formats them and does the disk/stdout I/O, so the event
+loop never waits on a write. Records carry the current request ID via a
+ContextVar, which also follows sync endpoints into the threadpool.
+
+Environment:
+    LOG_LEVEL        DEBUG | INFO | WARNING ... (default INFO)
+    LOG_FORMAT       json | text (default json)
+    LOG_FILE         Path of the rotating log file (default app.log, '' to disable)
+    LOG_MAX_BYTES    Rotate after this many bytes (default 10 MB)
+    LOG_BACKUP_COUNT Rotated files to keep (default 5)
+    LOG_SAMPLE_RATE  Fraction of successful requests to log (default 1.0)
+"""
+import os
+import sys
+import json
+import atexit
+import copy
+import queue
+import random
+import logging
+import logging.handlers
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+
+# Attributes every LogRecord has; anything else was passed via `extra=`
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+_EXC_FORMATTER = logging.Formatter()
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamp each record with the request ID of the context that emitted it."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "src": f"{record.filename}:{record.lineno}",
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text  # Rendered before queueing (StructuredQueueHandler)
+        return json.dumps(payload, default=str)
+
+
+class StructuredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler.prepare() formats the record and folds the traceback into
+    the message. This keeps the message and traceback apart: the traceback
+    is rendered into exc_text (traceback objects must not cross the queue),
+    so formatters still see it as exception info.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = record.exc_text or _EXC_FORMATTER.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - [%(request_id)s] - %(message)s"
+
+
+def should_log_success() -> bool:
+    """Sampling decision for a successful request's access log line."""
+    return SAMPLE_RATE >= 1.0 or random.random() < SAMPLE_RATE
+
+
+def configure_logging() -> Optional[logging.handlers.QueueListener]:
+    """
+    Route the root logger through a queue to stdout and a rotating file.
+    Idempotent: repeated calls (e.g. reloads, tests) keep the first listener.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    formatter: logging.Formatter
+    if os.getenv("LOG_FORMAT", "json").lower() == "text":
+        formatter = logging.Formatter(TEXT_FORMAT)
+    else:
+        formatter = JsonFormatter()
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = os.getenv("LOG_FILE", "app.log")
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            backupCount=int(os.getenv("LOG_BACKUP_COUNT", "5")),
+            encoding="utf-8",
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = _queue_handler = StructuredQueueHandler(log_queue)
+    # Filter on the producer side: the ContextVar is only visible there
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _listener
+
+
+def _restart_after_fork() -> None:
+    """
+    The listener thread does not survive fork() (gunicorn preload_app): give
+    the child its own queue and listener, or its records are never written.
+    """
+    global _listener
+    if _listener is None or _queue_handler is None:
+        return
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+    _listener.start()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_restart_after_fork)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
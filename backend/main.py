@@ -5,30 +5,20 @@ Orchestrates the FastAPI application, middleware, and database connections.
 """
 import sys
 import os
-import uuid
-import traceback
 import logging
-import time
-from sqlalchemy import text
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import APIRouter, FastAPI, Request, HTTPException
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.gzip import GZipMiddleware
-from starlette.middleware.base import BaseHTTPMiddleware
 
 # Add root directory to path to ensure modules can be found
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 # --- Logging Configuration ---
-logging.basicConfig(
-    level=logging.DEBUG, 
-    format='%(asctime)s - %(name)s - %(levelname)s - [%(filename)s:%(lineno)d] - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('app.log')
-    ]
-)
+# Queue-based JSON logging; see backend/logging_config.py for env options.
+from .logging_config import configure_logging
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Suppress Deprecation Warnings (e.g. google.generativeai)
@@ -42,6 +32,7 @@ logger.info("--> Importing models...")
 from . import models
 logger.info("--> Importing database...")
 from . import database
+from . import migrations
 logger.info("--> Importing auth...")
 from . import auth
 logger.info("--> Importing chat...")
@@ -52,61 +43,60 @@ logger.info("--> Importing prediction...")
 from . import prediction
 logger.info("--> Importing report...")
 from . import report
-logger.info("--> Importing pdf_service...")
-from .pdf_service import generate_medical_report
 logger.info("--> Importing admin...")
 from . import admin
 logger.info("--> Importing payments...")
 from . import payments
+from . import metrics
+from . import stats
+from . import chat_store
+from . import retention
+from . import audit
 logger.info("[SUCCESS] All Modules Imported Successfully.")
 
-# --- Database Initialization ---
-models.Base.metadata.create_all(bind=database.engine)
+# --- Database Schema ---
+# Versioned migrations live in backend/migrations.py and are applied once per
+# deploy (`python -m backend.migrations upgrade`). Startup only reads the
+# schema version and fails fast if it is behind. DB_MIGRATE_ON_START=true
+# (local dev opt-in) migrates instead (one leader, others wait on the lock).
 
-def run_migrations():
-    """Run lightweight schema migrations on startup."""
-    try:
-        with database.engine.connect() as conn:
-            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_health_records_timestamp ON health_records (timestamp)"))
-            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_logs_timestamp ON chat_logs (timestamp)"))
-            
-            # Add Lifestyle Columns if missing
-            columns = [
-                ("about_me", "TEXT"),
-                ("diet", "TEXT"),
-                ("activity_level", "TEXT"),
-                ("sleep_hours", "FLOAT"),
-                ("stress_level", "TEXT"),
-                ("psych_profile", "TEXT"),
-                ("last_analysis_date", "DATETIME"),
-                ("plan_tier", "VARCHAR"),
-                ("subscription_expiry", "DATETIME"),
-                ("razorpay_customer_id", "VARCHAR")
-            ]
-            
-            for col_name, col_type in columns:
-                try:
-                    conn.execute(text(f"ALTER TABLE users ADD COLUMN {col_name} {col_type}"))
-                except Exception:
-                    pass # Column likely exists
-                
-            conn.commit()
-    except Exception as e:
-        logger.warning(f"Index/Schema Creation Warning: {e}")
+schema_version = 0
 
-run_migrations()
+def init_db():
+    global schema_version
+    schema_version = migrations.ensure_schema(database.engine, migrate=migrations.MIGRATE_ON_START)
+    if schema_version < migrations.HEAD:
+        raise RuntimeError(f"Database schema is at version {schema_version}, code expects {migrations.HEAD}. "
+                           "Run `python -m backend.migrations upgrade` (or set DB_MIGRATE_ON_START=true for local dev).")
 
 # --- App Definition ---
 from contextlib import asynccontextmanager
 
+startup_complete = False
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Load models
-    logger.info("[STARTUP] Loading AI Models...")
-    prediction.initialize_models()
+    global startup_complete
+    # Startup: schema first (requests need it), then warm models in the
+    # background so the port opens immediately. /readyz tracks warm-up.
+    logger.info("[STARTUP] Checking database schema...")
+    init_db()
+    logger.info("[STARTUP] Loading AI Models in background...")
+    prediction.start_warmup()
+    # Admin stats are rolled up off the request path (backend/stats.py)
+    stats.service.start(database.engine)
+    chat_store.start(database.engine)  # No-op unless CHAT_GROUP_COMMIT_MS > 0
+    retention.job.start(database.engine)  # No-op on SQLite unless a RETENTION_*_DAYS policy is set
+    audit.sink.start(database.engine)  # Audit events are written in batches (backend/audit.py)
+    startup_complete = True
     yield
     # Shutdown: Clean resources if needed
     logger.info("[SHUTDOWN] Cleaning up...")
+    stats.service.stop()
+    chat_store.stop()  # Flushes the pending group
+    retention.job.stop()
+    audit.sink.stop()  # Last: flushes the events logged during shutdown too
+    await database.dispose_async_engine()
 
 app = FastAPI(
     title="AI Healthcare System API", 
@@ -115,34 +105,23 @@ app = FastAPI(
 )
 
 # --- Middleware ---
+# Pure ASGI middleware only (no BaseHTTPMiddleware) so streaming responses
+# pass through unbuffered. Last added = outermost.
 
 from . import security
+from .middleware import RequestContextMiddleware, RateLimitMiddleware, ProfilingMiddleware
+from .profiler import profiler
 
-# 0. Rate Limiting Middleware
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        # Identify by IP
-        client_ip = request.client.host if request.client else "unknown"
-        path = request.url.path
-        
-        # Skip static resources or health checks if needed (optional)
-        if path != "/" and path != "/docs" and path != "/openapi.json":
-             try:
-                 security.limiter.check(request, client_ip)
-             except HTTPException as e:
-                 return ORJSONResponse(
-                     status_code=e.status_code,
-                     content={"detail": e.detail}
-                 )
-        
-        return await call_next(request)
+# 0. Sampling profiler hook (no-op unless an admin started a session via /admin/profile)
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
 
-app.add_middleware(RateLimitMiddleware)
+# 1. Rate Limiting (inside the header/CORS layers, so 429s still get CORS + security headers)
+app.add_middleware(RateLimitMiddleware, limiter=security.limiter)
 
-# 1. Trusted Host
+# 2. Trusted Host
 app.add_middleware(TrustedHostMiddleware, allowed_hosts=["localhost", "127.0.0.1", "::1", "aio-health-backend.onrender.com"])
 
-# 2. CORS - Allow Streamlit Cloud and local development
+# 3. CORS - Allow Streamlit Cloud and local development
 origins = [
     "http://localhost:8501",
     "http://127.0.0.1:8501",
@@ -159,89 +138,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 3. Security Headers
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        response = await call_next(request)
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        response.headers["Content-Security-Policy"] = "default-src 'self'; img-src 'self' data: https:; script-src 'self' 'unsafe-inline' 'unsafe-eval'; style-src 'self' 'unsafe-inline';"
-        return response
+# 4. Compression
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# 5. Request ID, Logging, X-Process-Time, Security Headers & Global Exception Handler
+# Exception catching is skipped in pytest so tracebacks surface.
+app.add_middleware(RequestContextMiddleware, catch_exceptions=not os.getenv("TESTING"))
 
-app.add_middleware(SecurityHeadersMiddleware)
+# --- Routes ---
 
-# 4. Global Exception Handler
-class CatchExceptionsMiddleware(BaseHTTPMiddleware):
+def include_crud_routes(app: FastAPI, router: APIRouter, async_router: APIRouter, **kwargs):
     """
-    Catches unhandled exceptions, logs them with a reference ID, 
-    and returns a safe 500 JSON response to the client.
+    Mount a module's routes. With DB_ASYNC on, its async CRUD routes replace
+    the sync routes with the same path and method; the rest stay sync.
     """
-    async def dispatch(self, request: Request, call_next):
-        try:
-            return await call_next(request)
-        except Exception as e:
-            error_id = str(uuid.uuid4())
-            logger.error(f"Unhandled Exception ID {error_id}: {str(e)}")
-            logger.error(traceback.format_exc())
-            return ORJSONResponse(
-                status_code=500,
-                content={"detail": f"Internal Server Error. Reference ID: {error_id}"}
-            )
-
-# Only enable in Production/Live Dev (Skip in pytest to see tracebacks)
-if not os.getenv("TESTING"):
-    app.add_middleware(CatchExceptionsMiddleware)
-
-# 5. Compression
-app.add_middleware(GZipMiddleware, minimum_size=1000)
-
-# 6. Advanced Request Logging & Monitoring Middleware
-class RequestLoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
-        request_id = str(uuid.uuid4())
-        # Add request ID to headers for tracing
-        # We can't easily modify request headers here without recreating the request, 
-        # so we just pass it in the logging context if we had one.
-        logger.info(f"Incoming Request: {request.method} {request.url.path} | ReqID: {request_id} | IP: {request.client.host}")
-        
-        start_time = time.time()
-        
-        try:
-            response = await call_next(request)
-            process_time = (time.time() - start_time) * 1000
-            
-            # Log successful response metrics
-            logger.info(
-                f"Request Completed: {request.method} {request.url.path} | "
-                f"Status: {response.status_code} | "
-                f"Latency: {process_time:.2f}ms | "
-                f"ReqID: {request_id}"
-            )
-            
-            # Add X-Process-Time header for client monitoring
-            response.headers["X-Process-Time"] = str(process_time)
-            return response
-            
-        except Exception as e:
-            process_time = (time.time() - start_time) * 1000
-            logger.error(
-                f"Request Failed: {request.method} {request.url.path} | "
-                f"Latency: {process_time:.2f}ms | "
-                f"ReqID: {request_id} | Error: {str(e)}"
-            )
-            raise e
-
-app.add_middleware(RequestLoggingMiddleware)
+    if not database.ASYNC_DB:
+        app.include_router(router, **kwargs)
+        return
+    app.include_router(async_router, **kwargs)
+    replaced = {(route.path, method) for route in async_router.routes for method in route.methods}
+    remaining = APIRouter()
+    remaining.routes = [
+        route for route in router.routes
+        if not any((route.path, method) in replaced for method in getattr(route, "methods", ()))
+    ]
+    app.include_router(remaining, **kwargs)
 
-# --- Routes ---
-app.include_router(auth.router, tags=["Authentication"])
-app.include_router(chat.router, tags=["Chat & Records"])
+include_crud_routes(app, auth.router, auth.async_router, tags=["Authentication"])
+include_crud_routes(app, chat.router, chat.async_router, tags=["Chat & Records"])
 app.include_router(prediction.router, tags=["AI Prediction"])
 app.include_router(explanation.router)
 app.include_router(report.router, tags=["Smart Lab Analyzer"])
-app.include_router(admin.router)
+include_crud_routes(app, admin.router, admin.async_router)
 app.include_router(payments.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def read_root():
@@ -249,12 +179,32 @@ def read_root():
 
 @app.get("/healthz")
 def health_check():
-    """Health check endpoint for Render.com monitoring."""
-    return {"status": "ok"}
+    """
+    Liveness: the process is up and serving. Always 200; per-model state
+    (pending/loading/ready/unavailable/failed) is informational.
+    """
+    return {"status": "ok", "models": prediction.model_states()}
+
+@app.get("/readyz")
+def readiness_check():
+    """Readiness: startup finished and model loading has settled."""
+    schema_current = schema_version >= migrations.HEAD
+    ready = startup_complete and schema_current and prediction.models_ready.is_set()
+    body = {
+        "status": "ready" if ready else "warming",
+        "database": startup_complete and schema_current,
+        "schema_version": schema_version,
+        "models": {name: status["state"] for name, status in prediction.model_states().items()},
+    }
+    if prediction.warmup_error:
+        body["status"] = "failed"
+        body["error"] = prediction.warmup_error
+    return ORJSONResponse(body, status_code=200 if ready else 503)
 
 @app.post("/generate_report")
 async def get_medical_report(request: Request):
     """Generates a downloadable PDF medical report."""
+    from .pdf_service import generate_medical_report
     try:
         data = await request.json()
         pdf_bytes = generate_medical_report(
@@ -0,0 +1,93 @@
+"""
+Health Measurements
+===================
+Numeric values from `HealthRecord.data` (a JSON string) stored one per row in
+`health_measurements`, so trends, aggregates and cohort queries can filter,
+group and order in SQL using indexes instead of loading and parsing every
+record in Python.
+
+Rows are written alongside their record (chat.new_record) and removed with it
+through the ORM cascade. Records from before the table existed are filled in
+by backfill(). Migration 7 runs it after its schema step has committed, in
+id-ordered batches that each commit on their own, so memory stays flat and no
+lock is held for longer than one batch however large health_records is. `data` stays the source of truth;
+non-numeric fields are only kept there.
+"""
+import json
+import math
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import exists, insert, select
+from sqlalchemy.engine import Engine
+
+from . import models
+
+BACKFILL_BATCH = 1000
+
+
+def numeric_values(data: Any) -> Dict[str, float]:
+    """Top-level numeric fields of a record's data; booleans become 0/1, numeric strings are parsed."""
+    if not isinstance(data, dict):
+        return {}
+    values = {}
+    for name, raw in data.items():
+        if isinstance(raw, (bool, int, float)):
+            value = float(raw)
+        elif isinstance(raw, str):
+            try:
+                value = float(raw)
+            except ValueError:
+                continue
+        else:
+            continue
+        if math.isfinite(value):
+            values[name] = value
+    return values
+
+def parse_data(data: Optional[str]) -> Dict[str, float]:
+    try:
+        return numeric_values(json.loads(data or "{}"))
+    except (TypeError, ValueError):
+        return {}
+
+def for_record(record: models.HealthRecord, data: Dict[str, Any]) -> List[models.Measurement]:
+    """Measurement rows for a record that is about to be saved."""
+    return [
+        models.Measurement(user_id=record.user_id, record_type=record.record_type,
+                           timestamp=record.timestamp, name=name, value=value)
+        for name, value in numeric_values(data).items()
+    ]
+
+def rows_for(record_id: int, user_id: Optional[int], record_type: Optional[str],
+             timestamp: Optional[datetime], data: Optional[str]) -> Iterable[Dict[str, Any]]:
+    for name, value in parse_data(data).items():
+        yield {"record_id": record_id, "user_id": user_id, "record_type": record_type,
+               "timestamp": timestamp, "name": name, "value": value}
+
+
+def backfill(engine: Engine, batch_size: Optional[int] = None) -> int:
+    """
+    Derive measurements for every record that has none, reading health_records
+    in id order `batch_size` (default BACKFILL_BATCH) rows at a time, one
+    transaction per batch. Idempotent, so an interrupted run can simply be
+    repeated (`python -m backend.migrations backfill`). Returns rows written.
+    """
+    records, measurements = models.HealthRecord.__table__, models.Measurement.__table__
+    pending = (
+        select(records.c.id, records.c.user_id, records.c.record_type, records.c.timestamp, records.c.data)
+        .where(~exists().where(measurements.c.record_id == records.c.id))
+        .order_by(records.c.id)
+        .limit(batch_size or BACKFILL_BATCH)
+    )
+    last_id, written = 0, 0
+    while True:
+        with engine.begin() as conn:
+            batch = conn.execute(pending.where(records.c.id > last_id)).all()
+            if not batch:
+                return written
+            rows = [row for record in batch for row in rows_for(*record)]
+            if rows:
+                conn.execute(insert(measurements), rows)
+                written += len(rows)
+        last_id = batch[-1].id
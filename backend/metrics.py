@@ -0,0 +1,206 @@
+"""
+Metrics Registry
+================
+Minimal in-process Prometheus-style registry (counters + histograms) and the
+/metrics endpoint rendering it in the text exposition format.
+
+Kept dependency-free and cheap on the hot path: an observation is a dict
+lookup, a bisect into the bucket bounds and a few adds under a per-metric lock.
+Values are per worker process; Prometheus aggregates across scrape targets.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+LabelValues = Tuple[str, ...]
+
+# Latency buckets in seconds (sub-ms model calls up to multi-second LLM calls)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = ['%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " ")) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels[n]) for n in self.labelnames), 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}_total{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels[n]) for n in self.labelnames)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            series[idx] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        series = self._values.get(tuple(str(labels[n]) for n in self.labelnames))
+        return int(sum(series[:-1])) if series else 0
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            cumulative += series[len(self.buckets)]
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+REGISTRY = Registry()
+
+# --- Metric Definitions ---
+
+HTTP_REQUEST_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ("method", "route", "status"))
+MODEL_INFERENCE_LATENCY = REGISTRY.histogram(
+    "model_inference_duration_seconds", "Model predict() latency per disease model.", ("model",))
+MODEL_BATCH_SIZE = REGISTRY.histogram(
+    "model_inference_batch_size", "Rows per model predict() call.", ("model",), buckets=BATCH_BUCKETS)
+RAG_SEARCH_LATENCY = REGISTRY.histogram(
+    "rag_search_duration_seconds", "Vector store similarity search latency.")
+EMBEDDING_LATENCY = REGISTRY.histogram(
+    "embedding_request_duration_seconds", "Gemini embedding call latency.", ("task",))
+EMBEDDING_ERRORS = REGISTRY.counter(
+    "embedding_request_errors", "Failed Gemini embedding calls.", ("task",))
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Gemini generate_content latency by caller.", ("caller",))
+LLM_ERRORS = REGISTRY.counter(
+    "llm_request_errors", "Failed Gemini generate_content calls by caller.", ("caller",))
+DB_POOL_CHECKOUT_WAIT = REGISTRY.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled DB connection.", ("engine",))
+DB_POOL_TIMEOUTS = REGISTRY.counter(
+    "db_pool_checkout_timeouts", "Checkouts that gave up after DB_POOL_TIMEOUT seconds.", ("engine",))
+TRENDS_CACHE_REQUESTS = REGISTRY.counter(
+    "trends_cache_requests", "/records/trends lookups by cache result.", ("result",))
+RATE_LIMIT_REJECTIONS = REGISTRY.counter(
+    "rate_limit_rejections", "Requests rejected by the rate limiter / tier quotas.", ("limiter", "bucket"))
+AUDIT_EVENTS = REGISTRY.counter(
+    "audit_events", "Audit events flushed by the batched sink, by result (written / retried).", ("result",))
+CHAT_GROUP_COMMIT_TURNS = REGISTRY.histogram(
+    "chat_group_commit_turns", "Chat turns written per group commit (CHAT_GROUP_COMMIT_MS).", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+
+@contextmanager
+def track(histogram: Histogram, errors: Counter = None, **labels: str) -> Iterator[None]:
+    """Time a block into `histogram` and count exceptions into `errors`."""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        if errors is not None:
+            errors.inc(**labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+# --- Endpoint ---
+
+router = APIRouter(tags=["Monitoring"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics_endpoint() -> PlainTextResponse:
+    """Prometheus scrape target."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
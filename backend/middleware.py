@@ -0,0 +1,195 @@
+"""
+ASGI Middleware
+===============
+Pure ASGI replacements for the former BaseHTTPMiddleware stack.
+
+BaseHTTPMiddleware runs every downstream call in a separate task and wraps the
+response body in its own stream, which costs per-request overhead and buffers
+streaming/SSE responses. These classes only wrap `send`, so body chunks are
+forwarded the moment the app produces them.
+"""
+import time
+import uuid
+import logging
+from typing import Iterable, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import metrics, tracing
+from .logging_config import request_id_var, should_log_success
+
+logger = logging.getLogger(__name__)
+
+SECURITY_HEADERS: Tuple[Tuple[str, str], ...] = (
+    ("X-Frame-Options", "DENY"),
+    ("X-Content-Type-Options", "nosniff"),
+    ("Strict-Transport-Security", "max-age=31536000; includeSubDomains"),
+    ("Content-Security-Policy", "default-src 'self'; img-src 'self' data: https:; script-src 'self' 'unsafe-inline' 'unsafe-eval'; style-src 'self' 'unsafe-inline';"),
+)
+
+
+def client_ip(scope: Scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def header_value(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def route_template(scope: Scope) -> str:
+    """Matched route path (e.g. /records/{record_id}) to keep label cardinality bounded."""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class RequestContextMiddleware:
+    """
+    Single-pass request pipeline: request ID, root trace span, access logging,
+    latency header, security headers and (optionally) the global exception handler.
+    Successful requests are logged subject to LOG_SAMPLE_RATE; 4xx/5xx always are.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        catch_exceptions: bool = True,
+        security_headers: Iterable[Tuple[str, str]] = SECURITY_HEADERS,
+    ):
+        self.app = app
+        self.catch_exceptions = catch_exceptions
+        self.security_headers = tuple(security_headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = str(uuid.uuid4())
+        token = request_id_var.set(request_id)
+        method = scope["method"]
+        path = scope["path"]
+        logger.debug("Incoming Request: %s %s | IP: %s", method, path, client_ip(scope))
+
+        span = tracing.new_span(
+            f"{method} {path}", kind="SERVER",
+            traceparent=header_value(scope, b"traceparent"),
+            **{"http.method": method, "http.target": path}
+        )
+
+        start_time = time.perf_counter()
+        response_started = False
+        status_code = 500
+        log_completion = True  # Off for the synthetic 500: the failure is already logged
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_started, status_code
+            if message["type"] == "http.response.start":
+                response_started = True
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                for name, value in self.security_headers:
+                    headers[name] = value
+                headers["X-Request-ID"] = request_id
+                headers["X-Trace-ID"] = span.trace_id
+                headers["traceparent"] = span.traceparent
+                # Time to first byte; streaming bodies are not waited on
+                headers["X-Process-Time"] = str((time.perf_counter() - start_time) * 1000)
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                elapsed = time.perf_counter() - start_time
+                route = route_template(scope)
+                metrics.HTTP_REQUEST_LATENCY.observe(elapsed, method=method, route=route, status=status_code)
+                span.name = f"{method} {route}"
+                span.set_attribute("http.route", route)
+                span.set_attribute("http.status_code", status_code)
+                if status_code >= 500:
+                    span.status = "ERROR"
+                span.end()
+                if log_completion and (status_code >= 400 or should_log_success()):
+                    process_time = elapsed * 1000
+                    logger.log(
+                        logging.WARNING if status_code >= 500 else logging.INFO,
+                        "Request Completed: %s %s | Status: %s | Latency: %.2fms",
+                        method, path, status_code, process_time,
+                        extra={"method": method, "path": path, "status": status_code,
+                               "latency_ms": round(process_time, 2), "client_ip": client_ip(scope)}
+                    )
+            await send(message)
+
+        try:
+            with tracing.use_span(span):
+                await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            span.record_exception(e)
+            process_time = (time.perf_counter() - start_time) * 1000
+            handled = self.catch_exceptions and not response_started
+            error_id = str(uuid.uuid4()) if handled else None
+            # One record; the traceback goes to the structured `exc` field
+            logger.exception(
+                "Unhandled exception: %s %s | Latency: %.2fms | Error: %s",
+                method, path, process_time, e,
+                extra={"method": method, "path": path, "status": 500,
+                       "latency_ms": round(process_time, 2), "client_ip": client_ip(scope), "error_id": error_id}
+            )
+            if not handled:
+                raise
+
+            log_completion = False
+            response = ORJSONResponse(
+                status_code=500,
+                content={"detail": f"Internal Server Error. Reference ID: {error_id}"}
+            )
+            await response(scope, receive, send_wrapper)
+        finally:
+            span.end()  # No-op if already ended with the response
+            request_id_var.reset(token)
+
+
+class RateLimitMiddleware:
+    """Per-client rate limiting in front of the routers, keyed by IP."""
+
+    def __init__(self, app: ASGIApp, limiter, exempt_paths: Optional[Set[str]] = None):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = exempt_paths if exempt_paths is not None else {"/", "/docs", "/openapi.json", "/metrics", "/healthz", "/readyz"}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and scope["path"] not in self.exempt_paths:
+            try:
+                await self.limiter.check_path_async(scope["path"], client_ip(scope), scope["method"])
+            except HTTPException as e:
+                metrics.RATE_LIMIT_REJECTIONS.inc(limiter="ip", bucket=self.limiter.resolve(scope["path"], scope["method"])[0])
+                response = ORJSONResponse(
+                    status_code=e.status_code,
+                    content={"detail": e.detail},
+                    headers=e.headers
+                )
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
+
+
+class ProfilingMiddleware:
+    """Marks requests selected by the active profiling session (see backend/profiler.py)."""
+
+    def __init__(self, app: ASGIApp, profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.profiler.should_profile(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        self.profiler.begin_request()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.end_request()
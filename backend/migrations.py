@@ -0,0 +1,312 @@
+"""
+Schema Migrations
+=================
+Versioned, idempotent schema steps recorded in a `schema_version` table.
+
+    python -m backend.migrations upgrade      # apply pending steps
+    python -m backend.migrations current      # applied version / head
+    python -m backend.migrations check        # exit 1 if steps are pending
+    python -m backend.migrations history
+    python -m backend.migrations backfill     # re-run data backfills (idempotent)
+
+Run `upgrade` once per deploy (render.yaml start command, Procfile release
+phase, gunicorn master, docker-compose). App startup then only reads the
+current version and refuses to start if the schema is behind. No DDL runs on
+the serving start path unless DB_MIGRATE_ON_START=true is set explicitly
+(local dev).
+
+Only one process migrates at a time: a Postgres advisory lock (or SQLite's
+database-wide write lock) is held while steps run, so workers starting
+together wait for the leader and then find nothing left to do. Every step
+checks before it changes anything, so a step can also be re-run safely on
+databases created by the old startup ALTERs.
+
+Large data backfills are not schema steps: a migration's `after` hook runs
+once its version has committed and the lock is released, in short batched
+transactions, so it never holds the write lock for the whole table.
+
+To add a migration, append a Migration with the next version number. Never
+edit or renumber one that has shipped.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Iterator, List, NamedTuple, Optional
+
+from sqlalchemy import (Column, DateTime, Float, Integer, MetaData, String, Table, Text,
+                        create_engine, inspect, text)
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.types import TypeEngine
+
+from . import measurements, models, retention
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_ON_START = os.getenv("DB_MIGRATE_ON_START", "false").lower() == "true"  # Opt-in, for local dev
+LOCK_TIMEOUT = float(os.getenv("DB_MIGRATION_LOCK_TIMEOUT", "120"))
+ADVISORY_LOCK_KEY = 726_300_042  # Arbitrary, fixed app-wide Postgres advisory lock id
+
+_version_metadata = MetaData()
+schema_version = Table(
+    "schema_version", _version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[Connection], None]
+    after: Optional[Callable[[Engine], Any]] = None  # Batched data step, outside the migration lock
+
+
+# --- Idempotent Step Helpers ---
+
+def has_column(conn: Connection, table: str, column: str) -> bool:
+    return column in {c["name"] for c in inspect(conn).get_columns(table)}
+
+def add_column(conn: Connection, table: str, column: str, type_: TypeEngine) -> None:
+    if not has_column(conn, table, column):
+        # Types are compiled per dialect (DateTime is DATETIME on SQLite, TIMESTAMP on Postgres)
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {type_.compile(dialect=conn.dialect)}"))
+
+def create_index(conn: Connection, name: str, table: str, columns: str) -> None:
+    conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+def drop_index(conn: Connection, name: str) -> None:
+    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+def create_tables(conn: Connection, *tables: Table) -> None:
+    models.Base.metadata.create_all(conn, tables=list(tables), checkfirst=True)
+
+
+# --- Migrations ---
+
+def _base_tables(conn: Connection) -> None:
+    create_tables(conn, models.User.__table__, models.HealthRecord.__table__,
+                  models.ChatLog.__table__, models.AuditLog.__table__)
+
+def _timestamp_indexes(conn: Connection) -> None:
+    create_index(conn, "ix_health_records_timestamp", "health_records", "timestamp")
+    create_index(conn, "ix_chat_logs_timestamp", "chat_logs", "timestamp")
+
+def _user_lifestyle_columns(conn: Connection) -> None:
+    for column, type_ in (
+        ("about_me", Text()),
+        ("diet", Text()),
+        ("activity_level", Text()),
+        ("sleep_hours", Float()),
+        ("stress_level", Text()),
+        ("psych_profile", Text()),
+        ("last_analysis_date", DateTime()),
+    ):
+        add_column(conn, "users", column, type_)
+
+def _user_subscription_columns(conn: Connection) -> None:
+    for column, type_ in (
+        ("plan_tier", String()),
+        ("subscription_expiry", DateTime()),
+        ("razorpay_customer_id", String()),
+    ):
+        add_column(conn, "users", column, type_)
+
+def _user_risk_thresholds(conn: Connection) -> None:
+    add_column(conn, "users", "risk_thresholds", Text())
+
+def _timeline_indexes(conn: Connection) -> None:
+    create_index(conn, "ix_health_records_user_timestamp", "health_records", "user_id, timestamp")
+    create_index(conn, "ix_health_records_user_type_timestamp", "health_records", "user_id, record_type, timestamp")
+    create_index(conn, "ix_chat_logs_user_timestamp", "chat_logs", "user_id, timestamp")
+
+def _health_measurements(conn: Connection) -> None:
+    create_tables(conn, models.Measurement.__table__)
+
+def _keyset_timeline_indexes(conn: Connection) -> None:
+    create_index(conn, "ix_health_records_user_timestamp_id", "health_records", "user_id, timestamp, id")
+    create_index(conn, "ix_health_records_user_type_timestamp_id", "health_records", "user_id, record_type, timestamp, id")
+    create_index(conn, "ix_chat_logs_user_timestamp_id", "chat_logs", "user_id, timestamp, id")
+    for name in ("ix_health_records_user_timestamp", "ix_health_records_user_type_timestamp", "ix_chat_logs_user_timestamp"):
+        drop_index(conn, name)
+
+def _daily_stats(conn: Connection) -> None:
+    create_tables(conn, models.DailyStat.__table__)
+
+def _retention(conn: Connection) -> None:
+    create_index(conn, "ix_audit_logs_timestamp_id", "audit_logs", "timestamp, id")
+    # Postgres only: monthly range partitions, so expired months are dropped instead of deleted
+    for table in ("chat_logs", "audit_logs"):
+        retention.partition_table(conn, table)
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create users, health_records, chat_logs, audit_logs", _base_tables),
+    Migration(2, "Timestamp indexes on health_records and chat_logs", _timestamp_indexes),
+    Migration(3, "User profile and lifestyle columns", _user_lifestyle_columns),
+    Migration(4, "User subscription columns", _user_subscription_columns),
+    Migration(5, "Per-account risk thresholds", _user_risk_thresholds),
+    Migration(6, "Composite (user_id, [record_type,] timestamp) timeline indexes", _timeline_indexes),
+    Migration(7, "health_measurements table, backfilled from health_records.data", _health_measurements,
+              after=measurements.backfill),
+    Migration(8, "Timeline indexes end in id for (timestamp, id) keyset pagination", _keyset_timeline_indexes),
+    Migration(9, "daily_stats table for materialized admin statistics", _daily_stats),
+    Migration(10, "audit_logs (timestamp, id) index; monthly partitions for chat_logs and audit_logs on Postgres", _retention),
+]
+
+HEAD = MIGRATIONS[-1].version
+
+
+# --- Runner ---
+
+def current_version(conn: Connection) -> int:
+    """Highest applied version (0 for an unmanaged database). Read-only."""
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+
+def applied_versions(conn: Connection) -> List[int]:
+    if not inspect(conn).has_table("schema_version"):
+        return []
+    return [row[0] for row in conn.execute(text("SELECT version FROM schema_version ORDER BY version"))]
+
+@contextmanager
+def leader_lock(conn: Connection) -> Iterator[None]:
+    """Hold the migration lock for the duration of the block."""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY})
+        conn.commit()
+        try:
+            yield
+        finally:
+            conn.rollback()
+            conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+            conn.commit()
+    elif dialect == "sqlite":
+        # An immediate transaction is SQLite's database-wide writer lock; the
+        # steps run inside it (SQLite DDL is transactional) and commit together.
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while True:
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                break
+            except OperationalError as e:
+                conn.rollback()
+                if "locked" not in str(e).lower() or time.monotonic() > deadline:
+                    raise
+                time.sleep(0.1)
+        try:
+            yield
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    else:
+        logger.warning(f"No migration lock for dialect '{dialect}'; run migrations from a single process")
+        yield
+
+def upgrade(engine: Engine, target: Optional[int] = None) -> List[int]:
+    """Apply pending migrations up to `target` (default: head). Returns the versions applied."""
+    target = HEAD if target is None else target
+    applied_now: List[int] = []
+    with engine.connect() as conn:
+        if current_version(conn) >= target:
+            conn.rollback()
+            return applied_now  # Fast path: nothing to do, no lock taken
+        conn.rollback()
+        with leader_lock(conn):
+            schema_version.create(conn, checkfirst=True)
+            done = set(applied_versions(conn))
+            for migration in MIGRATIONS:
+                if migration.version in done or migration.version > target:
+                    continue
+                logger.info(f"[MIGRATE] {migration.version}: {migration.description}")
+                migration.upgrade(conn)
+                conn.execute(schema_version.insert().values(
+                    version=migration.version,
+                    description=migration.description,
+                    applied_at=datetime.now(timezone.utc),
+                ))
+                if conn.dialect.name != "sqlite":
+                    conn.commit()  # Each step is its own transaction while the advisory lock is held
+                applied_now.append(migration.version)
+    run_backfills(engine, applied_now)
+    return applied_now
+
+def run_backfills(engine: Engine, versions: Optional[List[int]] = None) -> None:
+    """Run the `after` data steps of `versions` (default: every migration), each in its own batches."""
+    for migration in MIGRATIONS:
+        if migration.after is not None and (versions is None or migration.version in versions):
+            logger.info(f"[MIGRATE] {migration.version}: backfill")
+            migration.after(engine)
+
+def ensure_schema(engine: Engine, migrate: bool = MIGRATE_ON_START) -> int:
+    """
+    Startup check: read the schema version and, only if it is behind and
+    `migrate` is set, bring it up to date. Returns the resulting version.
+    """
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version >= HEAD:
+        return version
+    if not migrate:
+        logger.error(f"Database schema is at version {version}, code expects {HEAD}. "
+                     "Run `python -m backend.migrations upgrade`.")
+        return version
+    upgrade(engine)
+    with engine.connect() as conn:
+        return current_version(conn)
+
+
+# --- CLI ---
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.migrations", description="Database schema migrations")
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL / the app's database")
+    sub = parser.add_subparsers(dest="command", required=True)
+    up = sub.add_parser("upgrade", help="Apply pending migrations")
+    up.add_argument("--to", type=int, default=None, help="Stop at this version")
+    sub.add_parser("current", help="Show applied and head versions")
+    sub.add_parser("check", help="Exit 1 if migrations are pending")
+    sub.add_parser("history", help="List migrations and whether each is applied")
+    sub.add_parser("backfill", help="Re-run the data backfills of applied migrations (idempotent)")
+    args = parser.parse_args(argv)
+
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from .database import engine
+
+    if args.command == "upgrade":
+        applied = upgrade(engine, args.to)
+        print(f"Applied {applied}" if applied else "Already up to date")
+        return 0
+    if args.command == "backfill":
+        with engine.connect() as conn:
+            done = applied_versions(conn)
+        run_backfills(engine, done)
+        print("Backfills complete")
+        return 0
+    with engine.connect() as conn:
+        done = set(applied_versions(conn))
+    version = max(done, default=0)
+    if args.command == "current":
+        print(f"current={version} head={HEAD}")
+        return 0
+    if args.command == "check":
+        pending = [m.version for m in MIGRATIONS if m.version not in done]
+        print(f"Pending: {pending}" if pending else "Up to date")
+        return 1 if pending else 0
+    for migration in MIGRATIONS:
+        print(f"[{'x' if migration.version in done else ' '}] {migration.version:>3}  {migration.description}")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    sys.exit(main())
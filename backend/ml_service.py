@@ -18,8 +18,8 @@ class MLService:
             # Map Gender
             g_val = 1 if str(gender).lower() == 'male' else 0
             
-            # Map smoking string to int (0-5)
-            s_map = {'never': 0, 'current': 1, 'former': 2, 'ever': 3, 'not current': 4}
+            # Map smoking string to the model's 0/1 (ever smoked) column
+            s_map = {'never': 0, 'current': 1, 'former': 1, 'ever': 1, 'not current': 1}
             s_val = s_map.get(str(smoking_history).lower(), 0)
             
             data = schemas.DiabetesInput(
@@ -34,7 +34,7 @@ class MLService:
                 general_health=3 # Default 'Good'
             )
             
-            result = prediction.predict_diabetes(data)
+            result = prediction.predict_diabetes(data, user=None)
             return result["prediction"]
             
         except Exception as e:
@@ -62,7 +62,7 @@ class MLService:
                 gen_hlth=3
             )
              
-            result = prediction.predict_heart(data)
+            result = prediction.predict_heart(data, user=None)
             return result["prediction"]
         except Exception as e:
              logger.error(f"Legacy Heart Predict Error: {e}")
@@ -86,7 +86,7 @@ class MLService:
                 albumin=3.0
             )
             
-            result = prediction.predict_liver(data)
+            result = prediction.predict_liver(data, user=None)
             return result["prediction"]
         except Exception as e:
             logger.error(f"Legacy Liver Predict Error: {e}")
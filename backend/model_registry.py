@@ -0,0 +1,100 @@
+"""
+Model Registry
+==============
+Versioned disease model bundles with atomic hot-swap and rollback.
+
+A bundle holds everything one prediction needs (model, scaler, feature order,
+compiled feature pipeline) under a content-hash version. New bundles are loaded and
+validated off to the side; publishing replaces the registry's mapping with a
+new dict in a single reference assignment. A request that fetched a bundle
+therefore always uses a matching model/scaler pair, even if a reload lands
+mid-request. Replaced bundles are kept (bounded) for rollback.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+UNLOADED_VERSION = "unloaded"
+FALLBACK_VERSION = "fallback"
+
+
+class ModelBundle(NamedTuple):
+    name: str
+    version: str
+    model: Any
+    scaler: Any = None
+    feature_names: Tuple[str, ...] = ()
+    pipeline: Any = None  # features.FeaturePipeline compiled against `scaler`
+    calibrator: Any = None  # calibration.Calibrator, if one was saved with the model
+    files: Tuple[str, ...] = ()
+    loaded_at: float = 0.0
+
+
+def artifact_version(paths: List[str]) -> str:
+    """Short content hash over the artifact files (stable across restarts and workers)."""
+    if not paths:
+        return FALLBACK_VERSION
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode())
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+class ModelRegistry:
+    """Active bundle per disease plus a short history for rollback."""
+
+    def __init__(self, history_size: int = 3):
+        self.history_size = history_size
+        self._active: Dict[str, ModelBundle] = {}
+        self._history: Dict[str, Deque[ModelBundle]] = {}
+        self._write_lock = threading.Lock()  # Readers never lock
+
+    def get(self, name: str) -> Optional[ModelBundle]:
+        return self._active.get(name)
+
+    def publish(self, bundle: ModelBundle) -> Optional[ModelBundle]:
+        """Make `bundle` active; returns the bundle it replaced."""
+        with self._write_lock:
+            previous = self._active.get(bundle.name)
+            if previous is not None:
+                self._history.setdefault(bundle.name, deque(maxlen=self.history_size)).append(previous)
+            self._swap(bundle)
+            return previous
+
+    def rollback(self, name: str) -> ModelBundle:
+        """Reactivate the previously published bundle; the current one is discarded."""
+        with self._write_lock:
+            history = self._history.get(name)
+            if not history:
+                raise LookupError(f"No previous version of '{name}' to roll back to")
+            previous = history.pop()
+            self._swap(previous)
+            return previous
+
+    def _swap(self, bundle: ModelBundle) -> None:
+        active = dict(self._active)
+        active[bundle.name] = bundle
+        self._active = active  # Single reference assignment
+
+    def versions(self) -> Dict[str, Dict[str, Any]]:
+        active = self._active
+        return {
+            name: {
+                "version": bundle.version,
+                "loaded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(bundle.loaded_at)),
+                "files": [os.path.basename(f) for f in bundle.files],
+                "previous": [b.version for b in reversed(self._history.get(name, ()))],
+            }
+            for name, bundle in active.items()
+        }
+
+    def clear(self) -> None:
+        with self._write_lock:
+            self._active = {}
+            self._history = {}
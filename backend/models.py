@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime, timezone
@@ -35,6 +35,9 @@ class User(Base):
     plan_tier = Column(String, default="free") # free, pro, clinic
     subscription_expiry = Column(DateTime, nullable=True)
     razorpay_customer_id = Column(String, nullable=True)
+
+    # Prediction settings
+    risk_thresholds = Column(Text, nullable=True) # JSON {disease: threshold}
     
     # AI Memory
     psych_profile = Column(Text, nullable=True) # Long term memory summary
@@ -54,6 +57,36 @@ class HealthRecord(Base):
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
 
     owner = relationship("User", back_populates="health_records")
+    measurements = relationship("Measurement", back_populates="record", cascade="all, delete-orphan")
+
+    # Per-user timelines: filter by user (and type), ordered and keyset-paginated
+    # by (timestamp, id) straight from the index, no sort step
+    __table_args__ = (
+        Index("ix_health_records_user_timestamp_id", "user_id", "timestamp", "id"),
+        Index("ix_health_records_user_type_timestamp_id", "user_id", "record_type", "timestamp", "id"),
+    )
+
+
+class Measurement(Base):
+    """One numeric value from a HealthRecord's data, queryable and indexable in SQL."""
+    __tablename__ = "health_measurements"
+
+    id = Column(Integer, primary_key=True)
+    record_id = Column(Integer, ForeignKey("health_records.id", ondelete="CASCADE"), nullable=False)
+    # Copied from the record so trends and cohorts need no join
+    user_id = Column(Integer, ForeignKey("users.id"))
+    record_type = Column(String)
+    timestamp = Column(DateTime)
+    name = Column(String, nullable=False) # Request field, e.g. 'bmi', 'total_bilirubin'
+    value = Column(Float, nullable=False)
+
+    record = relationship("HealthRecord", back_populates="measurements")
+
+    __table_args__ = (
+        Index("ix_health_measurements_user_name_timestamp", "user_id", "name", "timestamp"),
+        Index("ix_health_measurements_type_name_value", "record_type", "name", "value"),
+        Index("ix_health_measurements_record_id", "record_id"),
+    )
 
 
 class ChatLog(Base):
@@ -67,6 +100,10 @@ class ChatLog(Base):
 
     owner = relationship("User", back_populates="chat_logs")
 
+    __table_args__ = (
+        Index("ix_chat_logs_user_timestamp_id", "user_id", "timestamp", "id"),
+    )
+
 class AuditLog(Base):
     __tablename__ = "audit_logs"
 
@@ -76,3 +113,17 @@ class AuditLog(Base):
     action = Column(String) # VIEW_FULL, DELETE, BAN
     timestamp = Column(DateTime, default=lambda: datetime.now(timezone.utc))
     details = Column(String, nullable=True)
+
+    __table_args__ = (
+        Index("ix_audit_logs_timestamp_id", "timestamp", "id"),
+    )
+
+
+class DailyStat(Base):
+    """Per-day admin counters, maintained by backend/stats.py rollups."""
+    __tablename__ = "daily_stats"
+
+    day = Column(Date, primary_key=True)
+    metric = Column(String, primary_key=True) # predictions, chat_messages, active_users, users_total
+    dimension = Column(String, primary_key=True, default="") # record_type for predictions
+    value = Column(Integer, nullable=False, default=0)
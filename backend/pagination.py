@@ -0,0 +1,152 @@
+"""
+Keyset Pagination
+=================
+Cursor pagination, field projection and streamed JSON arrays for the list
+endpoints (/records, /chat/history, /admin/users).
+
+A page is `WHERE (timestamp, id) > (:last_timestamp, :last_id) ORDER BY
+timestamp, id LIMIT n` (with `<` and DESC for newest-first lists). It reads
+from the index at the last row's position, so page 50 costs the same as
+page 1, and rows inserted in the meantime don't shift later pages the way
+OFFSET does.
+
+Response bodies stay plain JSON arrays. When more rows remain, the cursor
+for the next page is in the X-Next-Cursor header (and a rel="next" Link);
+clients pass it back as `?cursor=`. The cursor is the last row's sort key,
+JSON then base64url-encoded: opaque to clients, but not a secret, since
+every query is still scoped to the caller.
+
+`fields=id,timestamp` selects only those columns in SQL, which keeps large
+`data` / `content` blobs out of both the query and the payload.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import tuple_
+
+MAX_PAGE = 1000
+STREAM_BATCH = 500
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+# --- Cursors ---
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    values = [v.isoformat() if isinstance(v, datetime) else v for v in key]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: Optional[str], types: Sequence[type]) -> Optional[tuple]:
+    """Sort key from a client cursor, converted to `types`; 400 if it was not issued by us."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if len(values) != len(types):
+            raise ValueError
+        return tuple(datetime.fromisoformat(v) if t is datetime else t(v) for v, t in zip(values, types))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def seek(columns: Sequence[Any], key: Optional[tuple], descending: bool = False):
+    """Predicate for the rows after `key` in (columns) order, or None on the first page."""
+    if key is None:
+        return None
+    if len(columns) == 1:
+        return columns[0] < key[0] if descending else columns[0] > key[0]
+    return tuple_(*columns) < tuple_(*key) if descending else tuple_(*columns) > tuple_(*key)
+
+def ordering(columns: Sequence[Any], descending: bool = False) -> List[Any]:
+    return [c.desc() if descending else c.asc() for c in columns]
+
+def split_page(rows: List[Any], limit: int, key: Callable[[Any], tuple]):
+    """(page, next key) from a query run with LIMIT limit + 1; next key is None on the last page."""
+    if len(rows) > limit:
+        return rows[:limit], key(rows[limit - 1])
+    return rows, None
+
+def iter_pages(fetch: Callable[[Optional[tuple], int], List[Any]], key: Callable[[Any], tuple],
+               after: Optional[tuple] = None, batch: Optional[int] = None) -> Iterator[List[Any]]:
+    """Every row from `after` on, `batch` rows (one keyset query, default STREAM_BATCH) at a time."""
+    batch = batch or STREAM_BATCH
+    while True:
+        rows = fetch(after, batch)
+        if rows:
+            yield rows
+        if len(rows) < batch:
+            return
+        after = key(rows[-1])
+
+async def aiter_pages(fetch: Callable[[Optional[tuple], int], Any], key: Callable[[Any], tuple],
+                      after: Optional[tuple] = None, batch: Optional[int] = None) -> AsyncIterator[List[Any]]:
+    batch = batch or STREAM_BATCH
+    while True:
+        rows = await fetch(after, batch)
+        if rows:
+            yield rows
+        if len(rows) < batch:
+            return
+        after = key(rows[-1])
+
+
+# --- Projection ---
+
+def projection(fields: Optional[str], allowed: Sequence[str], default: Optional[Sequence[str]] = None) -> List[str]:
+    """Requested response fields in `allowed` order (`default`, or all, when omitted); 422 on unknown names."""
+    if not fields:
+        return list(default or allowed)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(allowed)
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(sorted(unknown))}. Allowed: {', '.join(allowed)}")
+    return [f for f in allowed if f in requested]
+
+def project(rows: Iterable[Any], fields: Sequence[str]) -> List[Dict[str, Any]]:
+    return [{f: row._mapping[f] for f in fields} for row in rows]
+
+
+# --- Responses ---
+
+def page_response(request: Request, items: List[Dict[str, Any]], next_key: Optional[Sequence[Any]]) -> JSONResponse:
+    headers = {}
+    if next_key is not None:
+        cursor = encode_cursor(next_key)
+        headers[NEXT_CURSOR_HEADER] = cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=cursor)}>; rel="next"'
+    return JSONResponse(jsonable_encoder(items), headers=headers)
+
+def _chunk(page: List[Dict[str, Any]], first: bool) -> str:
+    return ("[" if first else ",") + ",".join(json.dumps(jsonable_encoder(item)) for item in page)
+
+def stream_array(pages: Iterator[List[Dict[str, Any]]], close: Callable[[], None]) -> StreamingResponse:
+    """
+    Stream batches as one JSON array, so an export of any length holds only
+    one batch in memory. `close` runs once the body is sent (or the client
+    disconnects).
+    """
+    def body() -> Iterator[str]:
+        first = True
+        try:
+            for page in pages:
+                yield _chunk(page, first)
+                first = False
+            yield "[]" if first else "]"
+        finally:
+            close()
+    return StreamingResponse(body(), media_type="application/json")
+
+def stream_array_async(pages: AsyncIterator[List[Dict[str, Any]]], close: Callable[[], Any]) -> StreamingResponse:
+    async def body() -> AsyncIterator[str]:
+        first = True
+        try:
+            async for page in pages:
+                yield _chunk(page, first)
+                first = False
+            yield "[]" if first else "]"
+        finally:
+            await close()
+    return StreamingResponse(body(), media_type="application/json")
@@ -4,22 +4,31 @@ Payments Module (Razorpay)
 Handles order creation and signature verification.
 """
 import os
-import razorpay
 import hmac
 import hashlib
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from . import database, models, auth
+from .lazy import lazy_import
 from pydantic import BaseModel
 
+razorpay = lazy_import("razorpay")
+
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
 # Initialize Razorpay Client
 KEY_ID = os.getenv("RAZORPAY_KEY_ID", "rzp_test_placeholder") 
 KEY_SECRET = os.getenv("RAZORPAY_KEY_SECRET", "secret_placeholder")
 
-client = razorpay.Client(auth=(KEY_ID, KEY_SECRET))
+_client = None
+
+def get_client():
+    """Razorpay client, created on first payment call."""
+    global _client
+    if _client is None:
+        _client = razorpay.Client(auth=(KEY_ID, KEY_SECRET))
+    return _client
 
 # --- Schemas ---
 class OrderRequest(BaseModel):
@@ -51,7 +60,7 @@ def create_order(
                 "plan": req.plan_id
             }
         }
-        order = client.order.create(data=data)
+        order = get_client().order.create(data=data)
         return {
             "id": order["id"],
             "amount": order["amount"],
@@ -72,7 +81,7 @@ def verify_payment(
     """
     try:
         # Verify Signature
-        client.utility.verify_payment_signature({
+        get_client().utility.verify_payment_signature({
             'razorpay_order_id': req.razorpay_order_id,
             'razorpay_payment_id': req.razorpay_payment_id,
             'razorpay_signature': req.razorpay_signature
@@ -1,15 +1,27 @@
-import pickle
-import joblib
 import numpy as np
-import pandas as pd
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+import gc
 import os
+import time
 import logging
-from typing import Dict, Any, List
-from functools import lru_cache
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import json
+from typing import Dict, Any, List, Optional, Tuple
 
 # --- Custom Modules ---
-from . import explainability, schemas
+from sqlalchemy.orm import Session
+
+from . import auth, database, explainability, models, schemas, quotas, metrics, tracing
+from .calibration import POSITIVE_CLASS, calibration_path, load_calibration, positive_column
+from .features import FeaturePipeline
+from .feature_schema import SCHEMAS, load_sidecar, sidecar_path
+from .lazy import lazy_import
+from .model_registry import ModelBundle, ModelRegistry, artifact_version, FALLBACK_VERSION, UNLOADED_VERSION
+
+# Only needed once models load
+joblib = lazy_import("joblib")
 
 # --- Logging Configuration ---
 logger = logging.getLogger(__name__)
@@ -18,14 +30,17 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 # --- Global Model State ---
-diabetes_model = None
-heart_model = None
-liver_model = None
-liver_scaler = None
-kidney_model = None
-kidney_scaler = None
-lungs_model = None
-lungs_scaler = None
+# Active models live in the versioned registry (backend/model_registry.py).
+# The legacy module attributes (diabetes_model, liver_scaler, ...) are read-only
+# views of it served by __getattr__; to swap a model, publish a bundle.
+registry = ModelRegistry(history_size=int(os.getenv("MODEL_HISTORY_SIZE", "3")))
+
+def __getattr__(name: str):
+    disease, _, kind = name.rpartition("_")
+    if kind in ("model", "scaler") and disease in MODEL_FILES:
+        bundle = registry.get(disease)
+        return getattr(bundle, kind) if bundle else None
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- Path Configuration ---
 # Robustly find the models directory regardless of CWD.
@@ -44,6 +59,49 @@ class DummyScaler:
     def transform(self, X):
         raise RuntimeError("Scaler not available (DummyScaler)")
 
+def find_artifact(filenames: List[str]) -> Optional[str]:
+    """Path of the first candidate file that exists in the models directory."""
+    for f_name in filenames:
+        path = os.path.join(MODEL_DIR, f_name)
+        if os.path.exists(path):
+            return path
+    return None
+
+# --- Shared Model Memory (multi-worker deployments) ---
+# Two complementary ways to avoid one private copy of every model per worker:
+#   * gunicorn with preload (gunicorn.conf.py): the master calls preload_models()
+#     and forked workers share the loaded models copy-on-write. This is what
+#     shares tree ensembles, whose node arrays are always copied on unpickling.
+#   * MODEL_MMAP_DIR: artifacts are re-saved there uncompressed and loaded with
+#     mmap_mode="r", so numpy-backed weights (scalers, linear models) are
+#     page-cache backed and shared even by independently started workers
+#     (uvicorn --workers). Files are keyed by content hash, so a changed
+#     artifact is re-exported on the next (re)load.
+MMAP_DIR = os.getenv("MODEL_MMAP_DIR")
+preloaded = False
+
+def mmap_artifact(path: str, cache_dir: str) -> str:
+    """Uncompressed, memory-mappable copy of a (possibly compressed) joblib/pickle artifact."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    target = os.path.join(cache_dir, f"{stem}-{artifact_version([path])}.joblib")
+    if not os.path.exists(target):
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, 'rb') as f:
+            obj = joblib.load(f)
+        # Concurrent workers may export the same file; the rename is atomic
+        tmp = f"{target}.{os.getpid()}.tmp"
+        joblib.dump(obj, tmp, compress=0)
+        os.replace(tmp, target)
+        logger.info(f"Exported memory-mappable artifact: {os.path.basename(target)}")
+    return target
+
+def load_artifact(path: str):
+    if MMAP_DIR:
+        return joblib.load(mmap_artifact(path, MMAP_DIR), mmap_mode="r")
+    # Use joblib to load (supports standard pickle and compressed joblib files)
+    with open(path, 'rb') as f:
+        return joblib.load(f)
+
 def load_pkl(filenames: List[str], fallback_class=None):
     """
     Attempt to load a pickle file from a list of potential names in the models directory.
@@ -53,11 +111,9 @@ def load_pkl(filenames: List[str], fallback_class=None):
         path = os.path.join(MODEL_DIR, f_name)
         if os.path.exists(path):
             try:
-                # Use joblib to load (supports standard pickle and compressed joblib files)
-                with open(path, 'rb') as f:
-                    obj = joblib.load(f)
-                    logger.info(f"✅ Successfully loaded model: {f_name}")
-                    return obj
+                obj = load_artifact(path)
+                logger.info(f"✅ Successfully loaded model: {f_name}")
+                return obj
             except Exception as e:
                 logger.error(f"❌ Failed to load {f_name}: {e}")
     
@@ -66,203 +122,367 @@ def load_pkl(filenames: List[str], fallback_class=None):
         return fallback_class()
     return None
 
-@lru_cache(maxsize=10)
-def load_pkl_cached(filename_tuple):
-    return load_pkl(list(filename_tuple))
+# --- Feature Schemas ---
+# Declared once in backend/feature_schema.py; these views are kept for callers.
+FEATURE_NAMES: Dict[str, List[str]] = {name: schema.feature_names for name, schema in SCHEMAS.items()}
+LOG1P_FEATURES: Dict[str, List[str]] = {name: schema.log1p_features for name, schema in SCHEMAS.items() if schema.log1p_features}
+
+# Unscaled pipelines; each bundle compiles its own against its scaler (backend/features.py)
+PIPELINES: Dict[str, FeaturePipeline] = {name: schema.pipeline() for name, schema in SCHEMAS.items()}
+
+# --- Concurrent / Lazy Loading ---
+# Each disease bundle (model + optional scaler) loads independently in a thread
+# pool and is warmed with one inference, so a slow or corrupt artifact only
+# delays its own disease. Routes wait on their own disease via require_model().
+#   MODEL_LOADING=eager (default): load everything in the background at startup
+#   MODEL_LOADING=lazy:           load each disease on its first request
+
+MODEL_FILES: Dict[str, Dict[str, List[str]]] = {
+    "diabetes": {"model": ["diabetes_model.pkl"]},
+    "heart": {"model": ["heart_disease_model.pkl"]},
+    "liver": {"model": ["liver_disease_model.pkl"], "scaler": ["liver_scaler.pkl"]},
+    "kidney": {"model": ["kidney_model.pkl"], "scaler": ["kidney_scaler.pkl"]},
+    "lungs": {"model": ["lungs_model.pkl"], "scaler": ["lungs_scaler.pkl"]},
+}
+
+LOADING_MODE = os.getenv("MODEL_LOADING", "eager").lower()
+LOAD_WORKERS = int(os.getenv("MODEL_LOAD_WORKERS", "4"))
+WARMUP_WAIT_SECONDS = float(os.getenv("MODEL_WARMUP_WAIT_SECONDS", "30"))
+
+# Per-disease state: pending -> loading -> ready | unavailable | failed
+model_status: Dict[str, Dict[str, Any]] = {name: {"state": "pending"} for name in MODEL_FILES}
+_settled = {name: threading.Event() for name in MODEL_FILES}
+_load_locks = {name: threading.Lock() for name in MODEL_FILES}
+
+models_ready = threading.Event()  # Set once every eager load has settled
+warmup_error: Optional[str] = None
+_warmup_thread: Optional[threading.Thread] = None
+
+def warm_up(bundle: ModelBundle):
+    """
+    Validate a bundle with one throwaway inference before it is published; this
+    also warms lazy imports and caches so the first real request is not slow.
+    """
+    X = bundle.pipeline.transform_values(SCHEMAS[bundle.name].midpoint())
+    prediction = bundle.model.predict(X)
+    if len(prediction) != 1:
+        raise ValueError(f"Expected 1 prediction for 1 row, got {len(prediction)}")
+
+def _empty_bundle(name: str) -> ModelBundle:
+    return ModelBundle(name, UNLOADED_VERSION, None, feature_names=tuple(FEATURE_NAMES[name]), pipeline=PIPELINES[name])
 
-def initialize_models():
-    """Load all models into global state, using dummy fallbacks when files are missing."""
-    global diabetes_model, heart_model, liver_model, liver_scaler, kidney_model, kidney_scaler, lungs_model, lungs_scaler
+def build_bundle(name: str) -> ModelBundle:
+    """Load one disease's artifacts into a new, unpublished bundle (raises ValueError on a schema mismatch)."""
+    files = MODEL_FILES[name]
+    model = load_pkl(files["model"], fallback_class=DummyModel)
+    scaler = load_pkl(files["scaler"], fallback_class=DummyScaler) if "scaler" in files else None
+    paths = [p for p in (find_artifact(files[kind]) for kind in files) if p]
+    model_path = find_artifact(files["model"])
+    sidecar = load_sidecar(model_path)
+    calibrator = load_calibration(model_path)
+    if sidecar is not None:
+        paths.append(sidecar_path(model_path))
+    if calibrator is not None:
+        paths.append(calibration_path(model_path))
+    SCHEMAS[name].validate_artifacts(model, scaler, sidecar)
+    fallback = isinstance(model, DummyModel) or isinstance(scaler, DummyScaler)
+    return _empty_bundle(name)._replace(
+        version=FALLBACK_VERSION if fallback else artifact_version(paths),
+        model=model,
+        scaler=scaler,
+        pipeline=PIPELINES[name].with_scaler(scaler),
+        calibrator=calibrator,
+        files=tuple(paths),
+        loaded_at=time.time(),
+    )
+
+def _mark_loading(names: List[str]):
+    # Diseases already serving a bundle keep serving it during a reload
+    for name in names:
+        if registry.get(name) is None:
+            model_status[name] = {"state": "loading"}
+            _settled[name].clear()
+
+def load_disease(name: str, only_if_pending: bool = False) -> Dict[str, Any]:
+    """Build, validate and atomically publish one disease's bundle."""
+    with _load_locks[name]:
+        if only_if_pending and model_status[name]["state"] != "pending":
+            return model_status[name]
+        current = registry.get(name)
+        if current is None:
+            model_status[name] = {"state": "loading"}
+        status: Dict[str, Any] = {"state": "loading"}
+        start = time.perf_counter()
+        try:
+            bundle = build_bundle(name)
+            status["load_seconds"] = round(time.perf_counter() - start, 3)
+
+            warm_start = time.perf_counter()
+            try:
+                warm_up(bundle)
+                status["warmup_ms"] = round((time.perf_counter() - warm_start) * 1000, 2)
+                status["state"] = "ready"
+            except Exception as e:
+                status["state"] = "unavailable"
+                status["error"] = str(e)
+
+            if current is not None and status["state"] != "ready":
+                # Never replace a serving model with one that fails validation
+                logger.error(f"Rejected new {name} bundle {bundle.version}: {status['error']}")
+                status = dict(model_status[name], reload_error=status["error"])
+            elif current is not None and current.version == bundle.version:
+                status = dict(status, version=current.version, unchanged=True)
+            else:
+                # Dummy fallbacks are published on first load so routes fail cleanly
+                registry.publish(bundle)
+                status["version"] = bundle.version
+        except Exception as e:
+            logger.error(f"Loading {name} model failed: {e}")
+            if current is None:
+                status = {"state": "failed", "error": str(e)}
+            else:
+                status = dict(model_status[name], reload_error=str(e))
+        model_status[name] = status
+        _settled[name].set()
+        return status
+
+def rollback_model(name: str) -> ModelBundle:
+    """Reactivate the previous bundle for one disease (raises LookupError if none)."""
+    with _load_locks[name]:
+        bundle = registry.rollback(name)
+        model_status[name] = {"state": "ready", "version": bundle.version, "rolled_back": True}
+        return bundle
+
+def resolve(name: str) -> ModelBundle:
+    """The bundle to serve one request with. Fetch once and use its fields together."""
+    bundle = registry.get(name) or _empty_bundle(name)
+    if bundle.pipeline is None:
+        bundle = bundle._replace(pipeline=PIPELINES[name].with_scaler(bundle.scaler))
+    return bundle
+
+def initialize_models(names: Optional[List[str]] = None):
+    """Load (or reload) disease models concurrently; returns once all of them have settled."""
+    names = list(names or MODEL_FILES)
     logger.info("Loading models...")
-    diabetes_model = load_pkl(["diabetes_model.pkl"], fallback_class=DummyModel)
-    heart_model = load_pkl(["heart_disease_model.pkl"], fallback_class=DummyModel)
-    liver_model = load_pkl(["liver_disease_model.pkl"], fallback_class=DummyModel)
-    liver_scaler = load_pkl(["liver_scaler.pkl"], fallback_class=DummyScaler)
-    
-    # Load Kidney and Lungs models (dummy if missing)
-    kidney_model = load_pkl(["kidney_model.pkl"], fallback_class=DummyModel)
-    kidney_scaler = load_pkl(["kidney_scaler.pkl"], fallback_class=DummyScaler)
-    lungs_model = load_pkl(["lungs_model.pkl"], fallback_class=DummyModel)
-    lungs_scaler = load_pkl(["lungs_scaler.pkl"], fallback_class=DummyScaler)
-
-# Initialize on import is REMOVED to prevent startup blocking
-# initialize_models() must be called explicitly by the app startup or tests
-pass
-
-@router.post("/admin/reload_models")
-def reload_models():
-    """Force reload of all models from disk (Zero-Downtime Update)."""
+    _mark_loading(names)
+    with ThreadPoolExecutor(max_workers=max(1, min(LOAD_WORKERS, len(names))), thread_name_prefix="model-load") as pool:
+        for name, status in zip(names, pool.map(load_disease, names)):
+            logger.info(f"Model '{name}' {status['state']} (version {status.get('version', '-')}, load {status.get('load_seconds', '-')}s, warm-up {status.get('warmup_ms', '-')}ms)")
+    models_ready.set()
+
+def _run_warmup():
+    global warmup_error
+    try:
+        initialize_models()
+        warmup_error = None
+    except Exception as e:
+        warmup_error = str(e)
+        logger.error(f"Model warm-up failed: {e}")
+
+def preload_models():
+    """
+    Load every model synchronously in a pre-fork master process (see
+    gunicorn.conf.py). Loaded objects are moved out of the GC's reach so
+    collections in the workers do not write to, and thereby un-share, their pages.
+    """
+    global preloaded
     initialize_models()
+    gc.collect()
+    gc.freeze()
+    preloaded = True
+
+def start_warmup() -> Optional[threading.Thread]:
+    """Begin background loading (eager mode); a no-op if already running, preloaded or in lazy mode."""
+    global _warmup_thread
+    if preloaded:
+        return None
+    if LOADING_MODE == "lazy":
+        models_ready.set()
+        return None
+    if _warmup_thread is None or not _warmup_thread.is_alive():
+        _mark_loading(list(MODEL_FILES))
+        _warmup_thread = threading.Thread(target=_run_warmup, name="model-warmup", daemon=True)
+        _warmup_thread.start()
+    return _warmup_thread
+
+def require_model(name: str):
+    """
+    Route dependency for one disease: waits while its model is loading, or
+    loads it on first use in lazy mode. Other diseases are never waited on.
+    """
+    def dependency():
+        state = model_status[name]["state"]
+        if state == "pending" and LOADING_MODE == "lazy":
+            load_disease(name, only_if_pending=True)
+        elif state == "loading":
+            _settled[name].wait(WARMUP_WAIT_SECONDS)
+    return dependency
+
+def model_states() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of per-disease loading state for health endpoints."""
+    return {name: dict(status) for name, status in model_status.items()}
+
+def run_model(name: str, model, X, method: str = "predict"):
+    """Call model.predict (or predict_proba), recording latency and batch size for /metrics."""
+    batch_size = len(X)
+    metrics.MODEL_BATCH_SIZE.observe(batch_size, model=name)
+    with tracing.start_span("model.predict", **{"model.name": name, "model.batch_size": batch_size, "model.method": method}):
+        with metrics.MODEL_INFERENCE_LATENCY.time(model=name):
+            return getattr(model, method)(X)
+
+# --- Risk Scores ---
+# Binary models exposing predict_proba are called once through it: the label
+# is the positive-class probability (calibrated if the bundle ships a
+# calibrator) compared with the caller's threshold, so no second predict()
+# pass is made. Other models (no probabilities, multiclass) keep their hard label.
+# Thresholds default to RISK_THRESHOLD and can be set per account (tenant)
+# via PUT /predict/thresholds/{disease}.
+
+DEFAULT_THRESHOLD = float(os.getenv("RISK_THRESHOLD", "0.5"))
+
+def supports_proba(model) -> bool:
+    # Checked on the class too so mocks (which fake every attribute) keep using predict()
+    return (hasattr(type(model), "predict_proba") and hasattr(model, "predict_proba")
+            and positive_column(getattr(model, "classes_", ()), POSITIVE_CLASS) is not None)
+
+def tenant_thresholds(user: Optional[models.User]) -> Dict[str, float]:
+    raw = getattr(user, "risk_thresholds", None) if isinstance(user, models.User) else None
+    if not raw:
+        return {}
+    try:
+        return {k: float(v) for k, v in json.loads(raw).items()}
+    except (ValueError, TypeError, AttributeError):
+        logger.warning(f"Ignoring malformed risk_thresholds for user {getattr(user, 'id', '?')}")
+        return {}
+
+def resolve_threshold(name: str, user: Optional[models.User]) -> float:
+    return tenant_thresholds(user).get(name, DEFAULT_THRESHOLD)
+
+def classify(name: str, bundle: ModelBundle, X, threshold: float) -> Tuple[Any, Optional[float]]:
+    """One inference: (label, positive-class risk score or None)."""
+    model = bundle.model
+    if not supports_proba(model):
+        prediction = run_model(name, model, X)
+        if isinstance(prediction, (list, tuple, np.ndarray)):
+            prediction = prediction[0]
+        return prediction, None
+    classes = list(model.classes_)
+    column = positive_column(classes, POSITIVE_CLASS)
+    proba = float(run_model(name, model, X, method="predict_proba")[0][column])
+    if bundle.calibrator is not None:
+        proba = bundle.calibrator.apply(proba)
+    return (classes[column] if proba >= threshold else classes[1 - column]), proba
+
+def risk_fields(bundle: ModelBundle, proba: Optional[float], threshold: float) -> Dict[str, Any]:
     return {
-        "status": "Models Reloaded", 
-        "diabetes_loaded": diabetes_model is not None,
-        "heart_loaded": heart_model is not None,
-        "liver_loaded": liver_model is not None,
-        "kidney_loaded": kidney_model is not None,
-        "lungs_loaded": lungs_model is not None
+        "probability": round(proba, 4) if proba is not None else None,
+        "threshold": threshold,
+        "calibrated": proba is not None and bundle.calibrator is not None,
+        "model_version": bundle.version,
     }
 
-# --- Helper Functions for Big Data Mapping ---
-
-def get_age_bucket(age: float) -> int:
-    """Map Age (Years) to BRFSS Age Bucket (1-13)."""
-    if age <= 24: return 1
-    elif age <= 29: return 2
-    elif age <= 34: return 3
-    elif age <= 39: return 4
-    elif age <= 44: return 5
-    elif age <= 49: return 6
-    elif age <= 54: return 7
-    elif age <= 59: return 8
-    elif age <= 64: return 9
-    elif age <= 69: return 10
-    elif age <= 74: return 11
-    elif age <= 79: return 12
-    else: return 13
-
 # --- Prediction Endpoints ---
+# Model output -> (display label, raw 0/1). Kept per disease: the source
+# datasets encode their targets differently (strings, risk levels, 1/2).
+
+def _kidney_result(prediction) -> Tuple[str, int]:
+    # Handle string or int
+    raw_pred = 1 if (str(prediction) == '1' or prediction == 1 or str(prediction).lower() == 'chronic kidney disease detected') else 0
+    return ("Chronic Kidney Disease Detected" if raw_pred == 1 else "Healthy Kidney"), raw_pred
+
+def _lungs_result(prediction) -> Tuple[str, int]:
+    raw_pred = 1 if (str(prediction) == '1' or prediction == 1 or str(prediction).upper() == 'HIGH' or str(prediction).upper() == 'MEDIUM') else 0
+    return ("Respiratory Issue Detected" if raw_pred == 1 else "Healthy Lungs"), raw_pred
+
+def _diabetes_result(prediction) -> Tuple[str, int]:
+    return ("High Risk" if prediction == 1 or prediction == 2 else "Low Risk"), int(prediction)
+
+def _heart_result(prediction) -> Tuple[str, int]:
+    result = "Heart Disease Detected" if (prediction == 1 or str(prediction) == '1' or str(prediction) == 'Heart Disease Detected') else "Healthy Heart"
+    return result, 1 if result == "Heart Disease Detected" else 0
 
-@router.post("/predict/kidney", response_model=Dict[str, Any])
-def predict_kidney(data: schemas.KidneyInput) -> Dict[str, Any]:
-    if not kidney_model or not kidney_scaler:
+def _liver_result(prediction) -> Tuple[str, int]:
+    return ("Liver Disease Detected" if prediction == 1 else "Healthy Liver"), int(prediction)
+
+RESULTS = {
+    "kidney": _kidney_result,
+    "lungs": _lungs_result,
+    "diabetes": _diabetes_result,
+    "heart": _heart_result,
+    "liver": _liver_result,
+}
+
+def score(name: str, bundle: ModelBundle, X, user: Optional[models.User]) -> Dict[str, Any]:
+    """Classify one model-ready row and build the prediction response."""
+    threshold = resolve_threshold(name, user)
+    prediction, proba = classify(name, bundle, X, threshold)
+    # Handle numpy scalar
+    if hasattr(prediction, 'item'):
+        prediction = prediction.item()
+    result, raw = RESULTS[name](prediction)
+    return {"prediction": result, "raw": raw, **risk_fields(bundle, proba, threshold)}
+
+def available(name: str, bundle: ModelBundle) -> bool:
+    return bool(bundle.model) and (bool(bundle.scaler) or "scaler" not in MODEL_FILES[name])
+
+@router.post("/predict/kidney", response_model=Dict[str, Any], dependencies=[Depends(require_model("kidney"))])
+def predict_kidney(data: schemas.KidneyInput, user: Optional[models.User] = Depends(quotas.get_optional_user)) -> Dict[str, Any]:
+    bundle = resolve("kidney")
+    if not available("kidney", bundle):
          raise HTTPException(status_code=503, detail="Kidney Model not trained/loaded.")
              
     try:
-        # Features Verified: ['age', 'bp', 'sg', 'al', 'su', 'rbc', 'pc', 'pcc', 'ba', 'bgr', 'bu', 'sc', 'sod', 'pot', 'hemo', 'pcv', 'wc', 'rc', 'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
-        feature_names = ['age', 'bp', 'sg', 'al', 'su', 'rbc', 'pc', 'pcc', 'ba', 'bgr', 'bu', 'sc', 'sod', 'pot', 'hemo', 'pcv', 'wc', 'rc', 'htn', 'dm', 'cad', 'appet', 'pe', 'ane']
-        
-        input_list = [
-            data.age, data.bp, data.sg, data.al, data.su, 
-            data.rbc, data.pc, data.pcc, data.ba, 
-            data.bgr, data.bu, data.sc, data.sod, data.pot, data.hemo, data.pcv, data.wc, data.rc,
-            data.htn, data.dm, data.cad, data.appet, data.pe, data.ane
-        ]
-        
-        # DataFrame to fix StandardScaler feature checks
-        df = pd.DataFrame([input_list], columns=feature_names)
-        input_scaled = kidney_scaler.transform(df)
-        
-        prediction = kidney_model.predict(input_scaled)[0]
-        # Handle string or int
-        raw_pred = 1 if (str(prediction) == '1' or prediction == 1 or str(prediction).lower() == 'chronic kidney disease detected') else 0
-        result = "Chronic Kidney Disease Detected" if raw_pred == 1 else "Healthy Kidney"
-        return {"prediction": result, "raw": raw_pred}
-        
+        # Fields -> scaled NumPy row in training order (no per-request DataFrame)
+        return score("kidney", bundle, bundle.pipeline.transform(data), user)
     except Exception as e:
         logger.error(f"Kidney Prediction Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/predict/lungs", response_model=Dict[str, Any])
-def predict_lungs(data: schemas.LungInput) -> Dict[str, Any]:
-    if not lungs_model or not lungs_scaler:
+@router.post("/predict/lungs", response_model=Dict[str, Any], dependencies=[Depends(require_model("lungs"))])
+def predict_lungs(data: schemas.LungInput, user: Optional[models.User] = Depends(quotas.get_optional_user)) -> Dict[str, Any]:
+    bundle = resolve("lungs")
+    if not available("lungs", bundle):
          raise HTTPException(status_code=503, detail="Lung Model not trained/loaded.")
              
     try:
         # Features Verified: UPPERCASE ['GENDER', 'AGE', 'SMOKING', ...]
-        feature_names = ['GENDER', 'AGE', 'SMOKING', 'YELLOW_FINGERS', 'ANXIETY', 'PEER_PRESSURE', 'CHRONIC_DISEASE', 'FATIGUE', 'ALLERGY', 'WHEEZING', 'ALCOHOL_CONSUMING', 'COUGHING', 'SHORTNESS_OF_BREATH', 'SWALLOWING_DIFFICULTY', 'CHEST_PAIN']
-        
-        input_list = [
-            data.gender, data.age, data.smoking, data.yellow_fingers,
-            data.anxiety, data.peer_pressure, data.chronic_disease, data.fatigue,
-            data.allergy, data.wheezing, data.alcohol, data.coughing,
-            data.shortness_of_breath, data.swallowing_difficulty, data.chest_pain
-        ]
-        
-        # DataFrame to fix StandardScaler feature checks
-        df = pd.DataFrame([input_list], columns=feature_names)
-        input_scaled = lungs_scaler.transform(df)
-        
-        prediction = lungs_model.predict(input_scaled)[0]
-        # Robust handling
-        raw_pred = 1 if (str(prediction) == '1' or prediction == 1 or str(prediction).upper() == 'HIGH' or str(prediction).upper() == 'MEDIUM') else 0
-        result = "Respiratory Issue Detected" if raw_pred == 1 else "Healthy Lungs"
-        return {"prediction": result, "raw": raw_pred}
-        
+        return score("lungs", bundle, bundle.pipeline.transform(data), user)
     except Exception as e:
         logger.error(f"Lung Prediction Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/predict/diabetes", response_model=Dict[str, Any])
-def predict_diabetes(data: schemas.DiabetesInput) -> Dict[str, Any]:
-    if not diabetes_model:
+@router.post("/predict/diabetes", response_model=Dict[str, Any], dependencies=[Depends(require_model("diabetes"))])
+def predict_diabetes(data: schemas.DiabetesInput, user: Optional[models.User] = Depends(quotas.get_optional_user)) -> Dict[str, Any]:
+    bundle = resolve("diabetes")
+    if not available("diabetes", bundle):
         raise HTTPException(status_code=503, detail="Diabetes Model not available")
     try:
-        age_bucket = get_age_bucket(data.age)
-        input_list = [
-            data.hypertension, data.high_chol, data.bmi, data.smoking_history,
-            data.heart_disease, data.physical_activity, data.general_health,
-            data.gender, age_bucket
-        ]
-        # DummyModel returns [0]; ensure we handle both list and scalar
-        prediction = diabetes_model.predict([input_list])
-        if isinstance(prediction, (list, tuple, np.ndarray)):
-            prediction = prediction[0]
-        # Handle numpy scalar
-        if hasattr(prediction, 'item'):
-            prediction = prediction.item()
-        result = "High Risk" if prediction == 1 or prediction == 2 else "Low Risk"
-        return {"prediction": result, "raw": int(prediction)}
+        # AgeBucket is derived from age by the pipeline
+        return score("diabetes", bundle, bundle.pipeline.transform(data), user)
     except Exception as e:
         logger.error(f"Diabetes Prediction Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/predict/heart", response_model=Dict[str, Any])
-def predict_heart(data: schemas.HeartInput) -> Dict[str, Any]:
-    if not heart_model:
+@router.post("/predict/heart", response_model=Dict[str, Any], dependencies=[Depends(require_model("heart"))])
+def predict_heart(data: schemas.HeartInput, user: Optional[models.User] = Depends(quotas.get_optional_user)) -> Dict[str, Any]:
+    bundle = resolve("heart")
+    if not available("heart", bundle):
         raise HTTPException(status_code=503, detail="Heart Model not available")
     try:
-        age_bucket = get_age_bucket(data.age)
-        input_list = [
-            data.high_bp, data.high_chol, data.bmi, data.smoker,
-            data.stroke, data.diabetes, data.phys_activity,
-            data.hvy_alcohol, data.gen_hlth, data.gender, age_bucket
-        ]
-        prediction = heart_model.predict([input_list])
-        if isinstance(prediction, (list, tuple, np.ndarray)):
-            prediction = prediction[0]
-        # Handle numpy scalar
-        if hasattr(prediction, 'item'):
-            prediction = prediction.item()
-        result = "Heart Disease Detected" if (prediction == 1 or str(prediction) == '1' or str(prediction) == 'Heart Disease Detected') else "Healthy Heart"
-        # Return 0 or 1 for raw
-        raw_val = 1 if result == "Heart Disease Detected" else 0
-        return {"prediction": result, "raw": raw_val}
+        return score("heart", bundle, bundle.pipeline.transform(data), user)
     except Exception as e:
         logger.error(f"Heart Prediction Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/predict/liver", response_model=Dict[str, Any])
-def predict_liver(data: schemas.LiverInput) -> Dict[str, Any]:
-    if not liver_model or not liver_scaler:
+@router.post("/predict/liver", response_model=Dict[str, Any], dependencies=[Depends(require_model("liver"))])
+def predict_liver(data: schemas.LiverInput, user: Optional[models.User] = Depends(quotas.get_optional_user)) -> Dict[str, Any]:
+    bundle = resolve("liver")
+    if not available("liver", bundle):
         raise HTTPException(status_code=503, detail="Liver Model or Scaler not available")
     try:
         # Features Verified: Title Case ['Age', 'Gender', 'Total_Bilirubin', ...]
-        feature_names = ['Age', 'Gender', 'Total_Bilirubin', 'Direct_Bilirubin', 'Alkaline_Phosphotase', 'Alamine_Aminotransferase', 'Aspartate_Aminotransferase', 'Total_Proteins', 'Albumin', 'Albumin_and_Globulin_Ratio']
-        
-        # Data List
-        input_list = [
-            data.age, data.gender, data.total_bilirubin, data.direct_bilirubin,
-            data.alkaline_phosphotase, data.alamine_aminotransferase, 
-            data.aspartate_aminotransferase, data.total_proteins, 
-            data.albumin, data.albumin_and_globulin_ratio
-        ]
-        
-        # Create DataFrame
-        df = pd.DataFrame([input_list], columns=feature_names)
-        
-        # Apply Log Transform to skewed features (Use Title Case names)
-        skewed = ['Total_Bilirubin', 'Alkaline_Phosphotase', 'Alamine_Aminotransferase', 'Albumin_and_Globulin_Ratio']
-        for col in skewed:
-            df[col] = np.log1p(df[col])
-            
-        # Scale with dedicated Liver Scaler
-        X_scaled = liver_scaler.transform(df)
-        
-        # Predict
-        prediction = liver_model.predict(X_scaled)
-        val = prediction[0]
-        result = "Liver Disease Detected" if val == 1 else "Healthy Liver"
-        return {"prediction": result, "raw": int(val)}
+        # Log transform of skewed features and the liver scaler are folded into the pipeline
+        return score("liver", bundle, bundle.pipeline.transform(data), user)
 
     except Exception as e:
         import traceback
@@ -270,61 +490,116 @@ def predict_liver(data: schemas.LiverInput) -> Dict[str, Any]:
         logger.error(error_msg)
         raise HTTPException(status_code=500, detail=f"Liver Prediction Failed: {str(e)}")
 
+# --- Multi-Disease Screening ---
+# One request, one validation pass: the combined profile is mapped onto each
+# model's compiled pipeline (schema screening_fields) and the applicable models
+# run concurrently on a shared pool. Per-disease failures are reported in the
+# panel instead of failing the whole screen.
+
+SCREEN_WORKERS = int(os.getenv("SCREEN_WORKERS", str(len(MODEL_FILES))))
+_screen_pool = ThreadPoolExecutor(max_workers=max(1, SCREEN_WORKERS), thread_name_prefix="screen")
+
+def missing_fields(name: str, profile: schemas.ScreeningInput) -> List[str]:
+    return [field for field in SCHEMAS[name].screening_fields if getattr(profile, field) is None]
+
+def screen_one(name: str, profile: schemas.ScreeningInput, user: Optional[models.User]) -> Dict[str, Any]:
+    require_model(name)()
+    bundle = resolve(name)
+    if not available(name, bundle):
+        return {"error": "Model not available"}
+    try:
+        pipeline = bundle.pipeline.with_fields(SCHEMAS[name].screening_fields)
+        return score(name, bundle, pipeline.transform(profile), user)
+    except Exception as e:
+        logger.error(f"Screening Error ({name}): {e}")
+        return {"error": str(e)}
+
+@router.post("/predict/screen", response_model=Dict[str, Any])
+def screen(profile: schemas.ScreeningInput, user: Optional[models.User] = Depends(quotas.get_optional_user)) -> Dict[str, Any]:
+    """Risk panel for every disease the profile has inputs for, in one call."""
+    requested = profile.diseases or list(MODEL_FILES)
+    skipped = {name: {"missing": missing} for name in requested if (missing := missing_fields(name, profile))}
+    names = [name for name in requested if name not in skipped]
+    # Each task gets its own context copy so model spans stay under this request's trace
+    futures = {
+        name: _screen_pool.submit(contextvars.copy_context().run, screen_one, name, profile, user)
+        for name in names
+    }
+    return {"results": {name: future.result() for name, future in futures.items()}, "skipped": skipped}
+
+# --- Per-Tenant Risk Thresholds ---
+
+@router.get("/predict/thresholds", response_model=Dict[str, float])
+def get_thresholds(current_user: models.User = Depends(auth.get_current_user)) -> Dict[str, float]:
+    """Effective risk threshold per disease for the calling account."""
+    overrides = tenant_thresholds(current_user)
+    return {name: overrides.get(name, DEFAULT_THRESHOLD) for name in MODEL_FILES}
+
+@router.put("/predict/thresholds/{disease}", response_model=Dict[str, float])
+def set_threshold(
+    disease: str,
+    update: schemas.RiskThresholdUpdate,
+    current_user: models.User = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+) -> Dict[str, float]:
+    """Set (or with null, reset) the calling account's threshold for one disease."""
+    if disease not in MODEL_FILES:
+        raise HTTPException(status_code=404, detail=f"Unknown disease '{disease}'")
+    overrides = tenant_thresholds(current_user)
+    if update.threshold is None:
+        overrides.pop(disease, None)
+    else:
+        overrides[disease] = update.threshold
+    current_user.risk_thresholds = json.dumps(overrides) if overrides else None
+    db.add(current_user)
+    db.commit()
+    return {name: overrides.get(name, DEFAULT_THRESHOLD) for name in MODEL_FILES}
+
+# --- Input Schemas ---
+
+@router.get("/predict/schemas", response_model=Dict[str, Any])
+def feature_schemas() -> Dict[str, Any]:
+    """Declared inputs of every disease model (fields, dtypes, valid ranges), for clients and tooling."""
+    return {name: schema.to_dict() for name, schema in SCHEMAS.items()}
+
 # --- Explanation Endpoints (SHAP) ---
 
-@router.post("/predict/explain/diabetes")
+def with_version(explanation, bundle: ModelBundle):
+    if isinstance(explanation, dict):
+        explanation = dict(explanation, model_version=bundle.version)
+    return explanation
+
+@router.post("/predict/explain/diabetes", dependencies=[Depends(require_model("diabetes")), Depends(quotas.tier_limit("explain"))])
 def explain_diabetes(data: schemas.DiabetesInput):
-    if not diabetes_model:
+    bundle = resolve("diabetes")
+    if not bundle.model:
         raise HTTPException(status_code=503, detail="Model unavailable")
     
-    age_bucket = get_age_bucket(data.age)
-    input_list = [
-        data.hypertension, data.high_chol, data.bmi, data.smoking_history, 
-        data.heart_disease, data.physical_activity, data.general_health, 
-        data.gender, age_bucket
-    ]
-    feature_names = ['Hypertension', 'HighChol', 'BMI', 'Smoking', 'HeartDisease', 'PhysActivity', 'GenHlth', 'Gender', 'AgeBucket']
-    
-    explanation = explainability.get_shap_values(diabetes_model, np.array([input_list]), feature_names)
-    if explanation: return explanation
+    pipeline = bundle.pipeline
+    explanation = explainability.get_shap_values(bundle.model, pipeline.transform(data), pipeline.feature_names)
+    if explanation: return with_version(explanation, bundle)
     raise HTTPException(status_code=500, detail="Explanation Generation Failed")
 
-@router.post("/predict/explain/heart")
+@router.post("/predict/explain/heart", dependencies=[Depends(require_model("heart")), Depends(quotas.tier_limit("explain"))])
 def explain_heart(data: schemas.HeartInput):
-    if not heart_model:
+    bundle = resolve("heart")
+    if not bundle.model:
         raise HTTPException(status_code=503, detail="Model unavailable")
     
-    age_bucket = get_age_bucket(data.age)
-    input_list = [
-        data.high_bp, data.high_chol, data.bmi, data.smoker, 
-        data.stroke, data.diabetes, data.phys_activity, 
-        data.hvy_alcohol, data.gen_hlth, data.gender, age_bucket
-    ]
-    feature_names = ['HighBP', 'HighChol', 'BMI', 'Smoker', 'Stroke', 'Diabetes', 'PhysActivity', 'HvyAlcohol', 'GenHlth', 'Gender', 'AgeBucket']
-    
-    explanation = explainability.get_shap_values(heart_model, np.array([input_list]), feature_names)
-    if explanation: return explanation
+    pipeline = bundle.pipeline
+    explanation = explainability.get_shap_values(bundle.model, pipeline.transform(data), pipeline.feature_names)
+    if explanation: return with_version(explanation, bundle)
     raise HTTPException(status_code=500, detail="Explanation Generation Failed")
 
-@router.post("/predict/explain/liver")
+@router.post("/predict/explain/liver", dependencies=[Depends(require_model("liver")), Depends(quotas.tier_limit("explain"))])
 def explain_liver(data: schemas.LiverInput):
-    if not liver_model or not liver_scaler:
+    bundle = resolve("liver")
+    if not bundle.model or not bundle.scaler:
          raise HTTPException(status_code=503, detail="Model unavailable")
     
-    feature_names = ['Age', 'Gender', 'Total_Bilirubin', 'Direct_Bilirubin', 'Alkaline_Phosphotase', 'Alamine_Aminotransferase', 'Aspartate_Aminotransferase', 'Total_Proteins', 'Albumin', 'Albumin_and_Globulin_Ratio']
-    input_list = [
-        data.age, data.gender, data.total_bilirubin, data.direct_bilirubin,
-        data.alkaline_phosphotase, data.alamine_aminotransferase, 
-        data.aspartate_aminotransferase, data.total_proteins, 
-        data.albumin, data.albumin_and_globulin_ratio
-    ]
-    df = pd.DataFrame([input_list], columns=feature_names)
-    skewed = ['Total_Bilirubin', 'Alkaline_Phosphotase', 'Alamine_Aminotransferase', 'Albumin_and_Globulin_Ratio']
-    for col in skewed:
-        df[col] = np.log1p(df[col])
-    
-    X_scaled = liver_scaler.transform(df)
+    pipeline = bundle.pipeline
+    X_scaled = pipeline.transform(data)
     
-    explanation = explainability.get_shap_values(liver_model, X_scaled, feature_names)
-    if explanation: return explanation
+    explanation = explainability.get_shap_values(bundle.model, X_scaled, pipeline.feature_names)
+    if explanation: return with_version(explanation, bundle)
     raise HTTPException(status_code=500, detail="Explanation Generation Failed")
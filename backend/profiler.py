@@ -0,0 +1,183 @@
+"""
+Sampling Profiler
+=================
+Opt-in, low-overhead statistical profiler for live traffic.
+
+An admin starts a time-boxed session (see /admin/profile) that selects a
+fraction of requests, optionally restricted to one route. While at least one
+selected request is in flight, a background thread snapshots the Python
+stacks of all threads every `interval_ms` via sys._current_frames() and
+counts them; nothing is traced per call, so profiled requests run at
+normal speed. Only stacks passing through application code are kept, which
+drops idle threads (event loop waiting on I/O, log/span exporters, parked
+threadpool workers).
+
+Samples are process-wide: concurrent unselected requests executing at the same
+moment are counted too. Output uses the collapsed-stack format
+(`frame;frame;frame count`) read by flamegraph.pl, speedscope and inferno.
+"""
+import os
+import sys
+import time
+import random
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+MAX_DURATION_SECONDS = 600
+MAX_UNIQUE_STACKS = 20000
+_SAMPLER_THREAD_NAME = "profiler-sampler"
+_IGNORED_THREADS = {_SAMPLER_THREAD_NAME, "span-exporter"}
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    short = os.path.join(os.path.basename(os.path.dirname(filename)), os.path.basename(filename))
+    return f"{code.co_name} ({short}:{code.co_firstlineno})"
+
+
+class ProfileSession:
+    """Selection criteria for one profiling window."""
+
+    def __init__(self, sample_rate: float, route: Optional[str], duration_seconds: float, interval_ms: float):
+        self.sample_rate = sample_rate
+        self.route = (route.rstrip("/") or "/") if route else None
+        self.interval = interval_ms / 1000.0
+        self.started_at = time.time()
+        self.deadline = time.monotonic() + duration_seconds
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() >= self.deadline
+
+    def matches(self, path: str) -> bool:
+        if self.route is not None and path != self.route and not path.startswith(self.route + "/"):
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+
+class SamplingProfiler:
+    """Aggregates sampled stacks of in-flight profiled requests."""
+
+    def __init__(self, app_root: str = APP_ROOT, excluded_paths=("/admin/profile",)):
+        self.app_root = app_root
+        self.excluded_paths = tuple(excluded_paths)
+        self.session: Optional[ProfileSession] = None
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.profiled_requests = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    # --- Session control ---
+
+    def start(self, sample_rate: float = 0.1, route: Optional[str] = None,
+              duration_seconds: float = 60, interval_ms: float = 5.0) -> Dict:
+        """Begin a new session, discarding previous samples."""
+        self.stop()
+        with self._lock:
+            self.stacks.clear()
+            self.samples = 0
+            self.profiled_requests = 0
+            self.session = ProfileSession(sample_rate, route, min(duration_seconds, MAX_DURATION_SECONDS), interval_ms)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=_SAMPLER_THREAD_NAME, daemon=True)
+        self._thread.start()
+        logger.info("Profiling session started: rate=%s route=%s duration=%ss", sample_rate, route, duration_seconds)
+        return self.status()
+
+    def stop(self) -> None:
+        """End the session; collected samples stay available for download."""
+        self.session = None
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2)
+        self._thread = None
+
+    @property
+    def active(self) -> bool:
+        session = self.session
+        return session is not None and not session.expired
+
+    def status(self) -> Dict:
+        session = self.session
+        return {
+            "active": self.active,
+            "sample_rate": session.sample_rate if session else None,
+            "route": session.route if session else None,
+            "remaining_seconds": round(max(0.0, session.deadline - time.monotonic()), 1) if session else 0,
+            "profiled_requests": self.profiled_requests,
+            "samples": self.samples,
+            "unique_stacks": len(self.stacks),
+        }
+
+    # --- Request hooks (called from ProfilingMiddleware) ---
+
+    def should_profile(self, path: str) -> bool:
+        session = self.session
+        if session is None or session.expired or path.startswith(self.excluded_paths):
+            return False
+        return session.matches(path)
+
+    def begin_request(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            self.profiled_requests += 1
+
+    def end_request(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+
+    # --- Sampling ---
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.is_set():
+            session = self.session
+            if session is None or session.expired:
+                break
+            if self._in_flight > 0:
+                self.sample(exclude={own_ident})
+            self._stop.wait(session.interval)
+        self.session = None
+
+    def sample(self, exclude=()) -> None:
+        """Record one snapshot of every busy application thread."""
+        ignored = {t.ident for t in threading.enumerate() if t.name in _IGNORED_THREADS}
+        collected = []
+        for ident, frame in sys._current_frames().items():
+            if ident in exclude or ident in ignored:
+                continue
+            labels = []
+            in_app = False
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename.startswith(self.app_root):
+                    in_app = True
+                labels.append(_frame_label(code))
+                frame = frame.f_back
+            if in_app:
+                labels.reverse()
+                collected.append(";".join(labels))
+        with self._lock:
+            for stack in collected:
+                if stack in self.stacks or len(self.stacks) < MAX_UNIQUE_STACKS:
+                    self.stacks[stack] += 1
+                else:
+                    self.stacks["[truncated]"] += 1
+            self.samples += len(collected)
+
+    def collapsed(self) -> str:
+        """Aggregated samples in collapsed-stack (flamegraph) format."""
+        with self._lock:
+            items = self.stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in items)
+
+
+profiler = SamplingProfiler()
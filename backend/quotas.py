@@ -0,0 +1,265 @@
+"""
+Plan Tier Quotas & Fair-Share Scheduling
+========================================
+Per-tier request quotas and concurrency caps for the Gemini-backed endpoints
+(/chat, /explain/, /analyze/report, /predict/explain/*).
+
+All expensive calls share a fixed number of execution slots. When the slots
+are busy, waiters are queued and granted slots in weighted-fair order
+(virtual finish time = start + 1/weight), so clinic accounts keep low latency
+while free users are queued behind them and shed first when their queue fills.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy.orm import Session
+
+from . import auth, database, metrics, models, security
+
+logger = logging.getLogger(__name__)
+
+
+class TierPolicy(NamedTuple):
+    """Limits applied to every account on a plan tier."""
+    requests_per_minute: int
+    max_concurrent: int      # In-flight expensive calls per account
+    weight: int              # Share of the slots under contention
+    max_waiting: int         # Queue depth for the whole tier before shedding
+    queue_timeout: float     # Seconds a request may wait for a slot
+
+
+TIER_POLICIES: Dict[str, TierPolicy] = {
+    "free": TierPolicy(requests_per_minute=10, max_concurrent=1, weight=1, max_waiting=4, queue_timeout=5.0),
+    "pro": TierPolicy(requests_per_minute=60, max_concurrent=3, weight=4, max_waiting=16, queue_timeout=15.0),
+    "clinic": TierPolicy(requests_per_minute=300, max_concurrent=10, weight=16, max_waiting=64, queue_timeout=30.0),
+}
+DEFAULT_TIER = "free"
+
+# Total concurrent Gemini-backed calls per worker process.
+MAX_CONCURRENCY = int(os.getenv("EXPENSIVE_MAX_CONCURRENCY", "4"))
+
+
+def resolve_tier(user: Optional[models.User]) -> str:
+    """Return the effective plan tier; expired subscriptions fall back to free."""
+    if user is None:
+        return DEFAULT_TIER
+    tier = getattr(user, "plan_tier", None)
+    if tier not in TIER_POLICIES:
+        return DEFAULT_TIER
+    expiry = getattr(user, "subscription_expiry", None)
+    if tier != DEFAULT_TIER and isinstance(expiry, datetime) and expiry < datetime.utcnow():
+        return DEFAULT_TIER
+    return tier
+
+
+class QueueFullError(Exception):
+    """Raised when a tier's wait queue is at capacity."""
+
+
+class FairScheduler:
+    """
+    Weighted-fair slot scheduler for the event loop.
+    Not thread-safe by design: acquire/release always run on the loop thread
+    (FastAPI resolves async dependencies there even for sync endpoints).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.active = 0
+        self.waiting: Dict[str, int] = defaultdict(int)
+        self._heap: list = []
+        self._seq = itertools.count()
+        self._virtual_time = 0.0
+        self._last_finish: Dict[str, float] = defaultdict(float)
+
+    async def acquire(self, tier: str, policy: TierPolicy) -> float:
+        """Wait for a slot. Returns the time spent queued in seconds."""
+        while self._heap and self._heap[0][2].done():
+            heapq.heappop(self._heap)
+        if self.active < self.capacity and not self._heap:
+            self.active += 1
+            return 0.0
+
+        if self.waiting[tier] >= policy.max_waiting:
+            raise QueueFullError(tier)
+
+        start = max(self._virtual_time, self._last_finish[tier])
+        finish = start + 1.0 / policy.weight
+        self._last_finish[tier] = finish
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (finish, next(self._seq), future))
+        self.waiting[tier] += 1
+        queued_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(future, timeout=policy.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # The slot may have been handed over just as we gave up
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+        finally:
+            self.waiting[tier] -= 1
+        return time.perf_counter() - queued_at
+
+    def release(self) -> None:
+        """Hand the slot to the waiter with the smallest finish tag, or free it."""
+        while self._heap:
+            finish, _, future = heapq.heappop(self._heap)
+            if future.done():
+                continue  # Timed out or cancelled while queued
+            self._virtual_time = finish
+            future.set_result(None)
+            return
+        self.active -= 1
+
+    def reset(self) -> None:
+        self.active = 0
+        self.waiting.clear()
+        self._heap.clear()
+        self._virtual_time = 0.0
+        self._last_finish.clear()
+
+
+class UsageCounters:
+    """Per tier/scope counters surfaced on /admin/stats."""
+
+    FIELDS = ("admitted", "rejected_quota", "rejected_concurrency", "shed", "queued", "queue_wait_ms")
+
+    def __init__(self):
+        self._counts: Dict[str, Dict[str, Dict[str, float]]] = {}
+        self.in_flight: Dict[str, int] = defaultdict(int)
+
+    def incr(self, tier: str, scope: str, field: str, amount: float = 1) -> None:
+        scopes = self._counts.setdefault(tier, {})
+        counters = scopes.setdefault(scope, dict.fromkeys(self.FIELDS, 0))
+        counters[field] += amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            tier: {
+                "scopes": {scope: dict(c) for scope, c in self._counts.get(tier, {}).items()},
+                "in_flight": self.in_flight.get(tier, 0),
+                "waiting": scheduler.waiting.get(tier, 0),
+            }
+            for tier in TIER_POLICIES
+        }
+
+    def reset(self) -> None:
+        self._counts.clear()
+        self.in_flight.clear()
+
+
+scheduler = FairScheduler(MAX_CONCURRENCY)
+usage = UsageCounters()
+_account_in_flight: Dict[str, int] = defaultdict(int)
+
+
+def usage_snapshot() -> Dict[str, Any]:
+    return usage.snapshot()
+
+
+def reset() -> None:
+    """Clear scheduler and counters (tests / admin)."""
+    scheduler.reset()
+    usage.reset()
+    _account_in_flight.clear()
+
+
+# --- Dependencies ---
+
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+
+
+def get_optional_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    db: Session = Depends(database.get_db)
+) -> Optional[models.User]:
+    """Resolve the caller if a valid bearer token is present, else None."""
+    if not token:
+        return None
+    try:
+        return auth.get_current_user(token, db)
+    except HTTPException:
+        return None
+
+
+@asynccontextmanager
+async def tier_slot(account: str, tier: str, scope: str):
+    """Enforce quota + concurrency for one expensive call and hold a slot."""
+    policy = TIER_POLICIES[tier]
+
+    retry_after = await security.acquire_async(
+        security.limiter.backend, f"{account}|tier", security.RateLimitRule(requests=policy.requests_per_minute), time.time()
+    )
+    if retry_after > 0:
+        usage.incr(tier, scope, "rejected_quota")
+        metrics.RATE_LIMIT_REJECTIONS.inc(limiter="tier", bucket=tier)
+        raise HTTPException(
+            status_code=429,
+            detail=f"'{tier}' plan quota exceeded. Upgrade for higher limits.",
+            headers={"Retry-After": str(max(int(retry_after), 1))}
+        )
+
+    if _account_in_flight[account] >= policy.max_concurrent:
+        usage.incr(tier, scope, "rejected_concurrency")
+        metrics.RATE_LIMIT_REJECTIONS.inc(limiter="tier", bucket=tier)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Too many concurrent requests for the '{tier}' plan."
+        )
+
+    _account_in_flight[account] += 1
+    try:
+        try:
+            waited = await scheduler.acquire(tier, policy)
+        except (QueueFullError, asyncio.TimeoutError):
+            usage.incr(tier, scope, "shed")
+            metrics.RATE_LIMIT_REJECTIONS.inc(limiter="tier", bucket=tier)
+            raise HTTPException(
+                status_code=503,
+                detail="Server is busy. Please retry shortly.",
+                headers={"Retry-After": "5"}
+            )
+
+        usage.incr(tier, scope, "admitted")
+        if waited:
+            usage.incr(tier, scope, "queued")
+            usage.incr(tier, scope, "queue_wait_ms", waited * 1000)
+        usage.in_flight[tier] += 1
+        try:
+            yield
+        finally:
+            usage.in_flight[tier] -= 1
+            scheduler.release()
+    finally:
+        _account_in_flight[account] -= 1
+        if _account_in_flight[account] <= 0:
+            del _account_in_flight[account]
+
+
+def tier_limit(scope: str, user_dependency=get_optional_user):
+    """
+    Build a route dependency enforcing tier quotas for `scope`.
+    Anonymous callers are limited as free tier, keyed by client IP.
+    """
+    async def dependency(request: Request, user: Optional[models.User] = Depends(user_dependency)):
+        tier = resolve_tier(user)
+        if user is not None:
+            account = f"user:{user.id}"
+        else:
+            account = f"ip:{request.client.host if request.client else 'unknown'}"
+        async with tier_slot(account, tier, scope):
+            yield
+
+    return dependency
@@ -8,9 +8,11 @@ import json
 import pickle
 import numpy as np
 import logging
-from typing import List, Dict, Optional, Any
-from sklearn.metrics.pairwise import cosine_similarity
-import google.generativeai as genai
+from typing import List, Dict, Optional, Any, Tuple
+from . import metrics, tracing
+from .lazy import lazy_import
+
+genai = lazy_import("google.generativeai")
 
 # --- Logging ---
 logger = logging.getLogger(__name__)
@@ -19,9 +21,15 @@ logger = logging.getLogger(__name__)
 DB_FILE = os.path.join(os.path.dirname(__file__), "..", "models", "vector_store.pkl")
 EMBEDDING_MODEL = "models/text-embedding-004"  # Free Gemini embedding model
 
+def cosine_similarity(X, Y):
+    """sklearn's cosine_similarity, imported on first search rather than at startup."""
+    from sklearn.metrics.pairwise import cosine_similarity as _cosine_similarity
+    return _cosine_similarity(X, Y)
+
 # --- Gemini Embedding (FREE, no local model needed) ---
 _configured = False
 
+@tracing.traced("rag.embed_document")
 def get_embedding(text: str) -> List[float]:
     """
     Generate embedding using FREE Gemini API.
@@ -39,16 +47,18 @@ def get_embedding(text: str) -> List[float]:
         _configured = True
     
     try:
-        result = genai.embed_content(
-            model=EMBEDDING_MODEL,
-            content=text,
-            task_type="retrieval_document"
-        )
+        with metrics.track(metrics.EMBEDDING_LATENCY, metrics.EMBEDDING_ERRORS, task="document"):
+            result = genai.embed_content(
+                model=EMBEDDING_MODEL,
+                content=text,
+                task_type="retrieval_document"
+            )
         return result['embedding']
     except Exception as e:
         logger.error(f"Embedding failed: {e}")
         return [0.0] * 768  # Fallback
 
+@tracing.traced("rag.embed_query")
 def get_query_embedding(text: str) -> List[float]:
     """Generate embedding for search query."""
     global _configured
@@ -62,11 +72,12 @@ def get_query_embedding(text: str) -> List[float]:
         _configured = True
     
     try:
-        result = genai.embed_content(
-            model=EMBEDDING_MODEL,
-            content=text,
-            task_type="retrieval_query"
-        )
+        with metrics.track(metrics.EMBEDDING_LATENCY, metrics.EMBEDDING_ERRORS, task="query"):
+            result = genai.embed_content(
+                model=EMBEDDING_MODEL,
+                content=text,
+                task_type="retrieval_query"
+            )
         return result['embedding']
     except Exception as e:
         logger.error(f"Query embedding failed: {e}")
@@ -100,6 +111,7 @@ class SimpleVectorStore:
             except Exception as e:
                 logger.error(f"Failed to load vector store: {e}")
 
+    @tracing.traced("rag.save")
     def save(self) -> None:
         """Persist to pickle file."""
         try:
@@ -114,8 +126,20 @@ class SimpleVectorStore:
         except Exception as e:
             logger.error(f"Failed to save vector store: {e}")
 
+    @tracing.traced("rag.add")
     def add(self, text: str, metadata: Dict[str, Any], record_id: str) -> None:
         """Add or update a document."""
+        self._put(text, metadata, record_id)
+        self.save()
+
+    @tracing.traced("rag.add_many")
+    def add_many(self, items: List[Tuple[str, Dict[str, Any], str]]) -> None:
+        """Add or update several (text, metadata, id) documents with a single save."""
+        for text, metadata, record_id in items:
+            self._put(text, metadata, record_id)
+        self.save()
+
+    def _put(self, text: str, metadata: Dict[str, Any], record_id: str) -> None:
         vector = get_embedding(text)
         
         if record_id in self.ids:
@@ -128,8 +152,6 @@ class SimpleVectorStore:
             self.metadatas.append(metadata)
             self.vectors.append(vector)
             self.ids.append(record_id)
-        
-        self.save()
 
     def delete(self, record_id: str) -> bool:
         """Delete by ID."""
@@ -143,6 +165,7 @@ class SimpleVectorStore:
             return True
         return False
 
+    @tracing.traced("rag.search")
     def search(self, query: str, filter_meta: Optional[Dict[str, Any]] = None, k: int = 3) -> List[str]:
         """Semantic search with user filtering."""
         if not self.vectors:
@@ -217,21 +240,32 @@ def add_checkup_to_db(user_id: str, record_id: str, record_type: str, data: dict
         logger.error(f"Error saving Checkup to RAG: {e}")
         return False
 
+def _interaction_document(user_id: str, interaction_id: str, role: str, content: str, timestamp: str) -> Tuple[str, Dict[str, Any], str]:
+    document_text = (
+        f"Date: {timestamp}. "
+        f"Interaction: {role.upper()}: {content}"
+    )
+    return document_text, {
+        "user_id": str(user_id),
+        "interaction_id": str(interaction_id),
+        "type": "chat_log",
+        "timestamp": timestamp,
+        "role": role
+    }, f"chat_{interaction_id}"
+
 def add_interaction_to_db(user_id: str, interaction_id: str, role: str, content: str, timestamp: str) -> bool:
     """Index a chat interaction."""
     try:
-        document_text = (
-            f"Date: {timestamp}. "
-            f"Interaction: {role.upper()}: {content}"
-        )
-        
-        get_vector_store().add(document_text, {
-            "user_id": str(user_id),
-            "interaction_id": str(interaction_id),
-            "type": "chat_log",
-            "timestamp": timestamp,
-            "role": role
-        }, f"chat_{interaction_id}")
+        get_vector_store().add(*_interaction_document(user_id, interaction_id, role, content, timestamp))
+        return True
+    except Exception as e:
+        logger.error(f"Error saving Interaction to RAG: {e}")
+        return False
+
+def add_interactions_to_db(user_id: str, interactions: List[Tuple[str, str, str, str]]) -> bool:
+    """Index (interaction_id, role, content, timestamp) chat messages, e.g. both sides of a turn, with one store save."""
+    try:
+        get_vector_store().add_many([_interaction_document(user_id, *interaction) for interaction in interactions])
         return True
     except Exception as e:
         logger.error(f"Error saving Interaction to RAG: {e}")
@@ -240,7 +274,8 @@ def add_interaction_to_db(user_id: str, interaction_id: str, role: str, content:
 def search_similar_records(user_id: str, query: str, n_results: int = 3) -> List[str]:
     """Retrieve relevant context for a user."""
     try:
-        return get_vector_store().search(query, filter_meta={"user_id": str(user_id)}, k=n_results)
+        with metrics.RAG_SEARCH_LATENCY.time():
+            return get_vector_store().search(query, filter_meta={"user_id": str(user_id)}, k=n_results)
     except Exception as e:
         logger.error(f"Error querying RAG: {e}")
         return []
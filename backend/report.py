@@ -7,10 +7,10 @@ from uploaded medical report images (PNG/JPG).
 
 Author: Pavan Badempet
 """
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException
 from typing import Dict, Any
 import logging
-from . import vision_service
+from . import vision_service, quotas
 
 # --- Logging ---
 # logging.basicConfig(level=logging.INFO) # Handled in main.py
@@ -18,7 +18,7 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-@router.post("/analyze/report", response_model=Dict[str, Any])
+@router.post("/analyze/report", response_model=Dict[str, Any], dependencies=[Depends(quotas.tier_limit("report"))])
 async def analyze_report(file: UploadFile = File(...)) -> Dict[str, Any]:
     """
     Analyze an uploaded medical report image.
@@ -0,0 +1,475 @@
+"""
+Data Retention
+==============
+Moves chat_logs and audit_logs rows that are older than their retention
+period out of the database and into compressed archive files. A background
+job does this in small batches, so the tables and their indexes stop
+growing without bound.
+
+    RETENTION_CHAT_LOGS_DAYS=0       # 0 (the default) keeps rows forever
+    RETENTION_AUDIT_LOGS_DAYS=0
+
+Nothing is archived until a policy is set. Every worker starts the job, but
+only one runs it at a time: on Postgres the holder of an advisory lock, on
+SQLite the holder of an flock on <database>.retention.lock, next to the
+database file. The others skip that run.
+
+SQLite, and any table that is not partitioned: each batch selects the
+oldest RETENTION_BATCH expired rows through the (timestamp, id) index,
+writes them to an archive file and deletes them, all in one short
+transaction. It then pauses for RETENTION_BATCH_PAUSE seconds so request
+writers can get the lock.
+
+Postgres: migration 10 turns both tables into monthly range partitions,
+named <table>_pYYYYMM, plus <table>_default for rows outside them, with
+PRIMARY KEY (id, timestamp) and the model's indexes. A month is
+archived once all of it is past the cutoff: the job reads the partition in
+batches, then detaches and drops it. Nothing is DELETEd, so there is no
+vacuum debt, and retention on Postgres is rounded up to whole months. Each
+run also creates partitions PARTITIONS_AHEAD months ahead for every
+partitioned table, with or without a retention policy.
+
+Archives live under RETENTION_ARCHIVE_DIR/<table>/<YYYY-MM>/. A relative
+RETENTION_ARCHIVE_DIR is resolved against the repository root, not the
+working directory, so every worker and the CLI share one tree. They are zstd
+Parquet files, or gzip JSON Lines when pyarrow is not installed or
+RETENTION_ARCHIVE_FORMAT=jsonl. A file is written before its rows are
+deleted and is named after their id range. Readers drop duplicate ids, so
+an interrupted batch that is redone never loses or doubles rows.
+search_archive() reads the files back for /admin/audit.
+
+    python -m backend.retention        # one run now (cron / manual)
+"""
+import argparse
+import gzip
+import importlib.util
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Table, create_engine, delete, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from . import models
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+RETENTION_DAYS: Dict[str, int] = {
+    "chat_logs": int(os.getenv("RETENTION_CHAT_LOGS_DAYS", "0")),
+    "audit_logs": int(os.getenv("RETENTION_AUDIT_LOGS_DAYS", "0")),
+}
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVE_DIR = os.path.join(ROOT_DIR, os.getenv("RETENTION_ARCHIVE_DIR", "archive"))  # Absolute paths are kept as-is
+ARCHIVE_FORMAT = os.getenv("RETENTION_ARCHIVE_FORMAT", "parquet").lower()  # parquet | jsonl
+BATCH = int(os.getenv("RETENTION_BATCH", "1000"))
+BATCH_PAUSE = float(os.getenv("RETENTION_BATCH_PAUSE", "0.05"))
+INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+PARTITIONS_AHEAD = 2
+ADVISORY_LOCK_KEY = 726_300_049  # One retention run at a time across workers (Postgres)
+
+TABLES: Dict[str, Table] = {"chat_logs": models.ChatLog.__table__, "audit_logs": models.AuditLog.__table__}
+EXTENSIONS = {"parquet": ".parquet", "jsonl": ".jsonl.gz"}
+
+
+def cutoff(days: int, now: Optional[datetime] = None) -> datetime:
+    """Rows before this (naive UTC, like the stored timestamps) are expired."""
+    now = now or datetime.now(timezone.utc)
+    return now.replace(tzinfo=None) - timedelta(days=days)
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Client-supplied datetimes in the stored form (timestamps are saved as naive UTC)."""
+    return value.astimezone(timezone.utc).replace(tzinfo=None) if value and value.tzinfo else value
+
+def _month(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+def _next_month(month: datetime) -> datetime:
+    return datetime(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+def _months_ahead(now: datetime, months: int) -> datetime:
+    month = _month(now)
+    for _ in range(months):
+        month = _next_month(month)
+    return month
+
+
+# --- Archive Files ---
+
+def archive_format() -> str:
+    if ARCHIVE_FORMAT == "parquet" and importlib.util.find_spec("pyarrow") is None:
+        return "jsonl"
+    return ARCHIVE_FORMAT
+
+def _json_default(value: Any) -> str:
+    return value.isoformat() if isinstance(value, (datetime, date)) else str(value)
+
+def _write_file(path: str, rows: List[Dict[str, Any]], fmt: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + ".tmp"
+    if fmt == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pylist(rows), tmp, compression="zstd")
+    else:
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(row, default=_json_default) + "\n")
+    os.replace(tmp, path)  # Readers never see a partial file
+
+def _read_file(path: str) -> List[Dict[str, Any]]:
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+        return pq.read_table(path).to_pylist()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        rows = [json.loads(line) for line in f]
+    for row in rows:
+        if row.get("timestamp"):
+            row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+    return rows
+
+def write_archive(table_name: str, rows: List[Dict[str, Any]], archive_dir: Optional[str] = None) -> List[str]:
+    """Write rows to one file per month under <archive_dir>/<table>/<YYYY-MM>/; returns the paths."""
+    archive_dir = archive_dir or ARCHIVE_DIR
+    fmt = archive_format()
+    by_month: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        by_month[row["timestamp"].strftime("%Y-%m")].append(row)
+    paths = []
+    for month, month_rows in sorted(by_month.items()):
+        ids = [row["id"] for row in month_rows]
+        path = os.path.join(archive_dir, table_name, month, f"{table_name}-{min(ids)}-{max(ids)}{EXTENSIONS[fmt]}")
+        _write_file(path, month_rows, fmt)
+        paths.append(path)
+    return paths
+
+def search_archive(table_name: str, match: Optional[Callable[[Dict[str, Any]], bool]] = None,
+                   before: Optional[Tuple[datetime, int]] = None, since: Optional[datetime] = None,
+                   until: Optional[datetime] = None, limit: int = 100,
+                   archive_dir: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Archived rows newest first: (timestamp, id) < `before`, since <= timestamp
+    < until, accepted by `match`; at most `limit`. Only the month directories
+    in range are read.
+    """
+    root = os.path.join(archive_dir or ARCHIVE_DIR, table_name)
+    if not os.path.isdir(root):
+        return []
+    found: List[Dict[str, Any]] = []
+    seen = set()
+    for month_dir in sorted(os.listdir(root), reverse=True):
+        try:
+            month = datetime.strptime(month_dir, "%Y-%m")
+        except ValueError:
+            continue
+        if (before and month > before[0]) or (until and month >= until):
+            continue
+        if since and _next_month(month) <= since:
+            break
+        directory = os.path.join(root, month_dir)
+        rows = [row for name in sorted(os.listdir(directory)) if name.endswith(tuple(EXTENSIONS.values()))
+                for row in _read_file(os.path.join(directory, name))]
+        rows.sort(key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+        for row in rows:
+            key = (row["timestamp"], row["id"])
+            if row["id"] in seen or (before and key >= tuple(before)):
+                continue
+            if (since and row["timestamp"] < since) or (until and row["timestamp"] >= until):
+                continue
+            if match is None or match(row):
+                seen.add(row["id"])
+                found.append(row)
+                if len(found) >= limit:
+                    return found
+    return found
+
+
+# --- Batched Archival (SQLite / unpartitioned tables) ---
+
+def archive_batch(conn: Connection, table: Table, before: datetime, batch: Optional[int] = None,
+                  archive_dir: Optional[str] = None) -> int:
+    """Archive and delete the oldest `batch` rows older than `before`. Returns rows moved."""
+    query = select(table).where(table.c.timestamp < before).order_by(table.c.timestamp, table.c.id).limit(batch or BATCH)
+    rows = [dict(row) for row in conn.execute(query).mappings()]
+    if rows:
+        write_archive(table.name, rows, archive_dir)
+        conn.execute(delete(table).where(table.c.id.in_([row["id"] for row in rows])))
+    return len(rows)
+
+
+# --- Postgres Partitions ---
+
+def is_partitioned(conn: Connection, table_name: str) -> bool:
+    if conn.dialect.name != "postgresql":
+        return False
+    return conn.execute(text("SELECT 1 FROM pg_class WHERE relname = :t AND relkind = 'p'"), {"t": table_name}).first() is not None
+
+def partition_name(table_name: str, month: datetime) -> str:
+    return f"{table_name}_p{month:%Y%m}"
+
+def ensure_partitions(conn: Connection, table_name: str, first: datetime, last: datetime) -> None:
+    """Monthly partitions covering first..last (inclusive months)."""
+    default = f"{table_name}_default"
+    has_default = conn.execute(text("SELECT to_regclass(:t)"), {"t": default}).scalar() is not None
+    existing = {name for name, _ in partitions(conn, table_name)}
+    month = _month(first)
+    while month <= last:
+        name = partition_name(table_name, month)
+        if name not in existing:
+            bounds = f"FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+            in_month = f""""timestamp" >= '{month:%Y-%m-%d}' AND "timestamp" < '{_next_month(month):%Y-%m-%d}'"""
+            if has_default and conn.execute(text(f"SELECT 1 FROM {default} WHERE {in_month} LIMIT 1")).first():
+                # The month cannot be created while the default partition holds rows in
+                # its range (it fell behind): move them into a new table, then attach it
+                conn.execute(text(f"CREATE TABLE {name} (LIKE {table_name} INCLUDING DEFAULTS)"))
+                conn.execute(text(
+                    f"WITH moved AS (DELETE FROM {default} WHERE {in_month} RETURNING *) "
+                    f"INSERT INTO {name} SELECT * FROM moved"
+                ))
+                conn.execute(text(f"ALTER TABLE {table_name} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+            else:
+                conn.execute(text(f"CREATE TABLE {name} PARTITION OF {table_name} FOR VALUES {bounds}"))
+        month = _next_month(month)
+
+def maintain_partitions(engine: Engine, now: Optional[datetime] = None) -> List[str]:
+    """Create the next PARTITIONS_AHEAD months for every partitioned table, whatever its retention policy."""
+    now = naive_utc(now) or datetime.now(timezone.utc).replace(tzinfo=None)
+    maintained = []
+    with engine.begin() as conn:
+        for table_name in TABLES:
+            if is_partitioned(conn, table_name):
+                ensure_partitions(conn, table_name, now, _months_ahead(now, PARTITIONS_AHEAD))
+                maintained.append(table_name)
+    return maintained
+
+def partitions(conn: Connection, table_name: str) -> List[Tuple[str, datetime]]:
+    """(partition, month) for the monthly partitions of `table_name`, oldest first."""
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent WHERE p.relname = :t"
+    ), {"t": table_name}).scalars()
+    prefix = f"{table_name}_p"
+    months = []
+    for name in names:
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            months.append((name, datetime.strptime(suffix, "%Y%m")))
+    return sorted(months, key=lambda p: p[1])
+
+def partition_table(conn: Connection, table_name: str) -> None:
+    """Convert an existing Postgres table into monthly range partitions on timestamp (migration 10)."""
+    if conn.dialect.name != "postgresql" or is_partitioned(conn, table_name):
+        return
+    inspector = inspect(conn)
+    # Unique indexes would have to include the partition key; ids stay unique via the sequence
+    indexes = [ix for ix in inspector.get_indexes(table_name) if not ix["unique"]]
+    foreign_keys = inspector.get_foreign_keys(table_name)
+    primary_key = inspector.get_pk_constraint(table_name).get("name")
+    old = f"{table_name}_unpartitioned"
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+
+    conn.execute(text(f"ALTER TABLE {table_name} RENAME TO {old}"))
+    if primary_key:
+        conn.execute(text(f"ALTER TABLE {old} RENAME CONSTRAINT {primary_key} TO {old}_pkey"))
+    # The primary key has to include the partition key, so timestamp becomes NOT NULL
+    conn.execute(text(f'UPDATE {old} SET "timestamp" = :now WHERE "timestamp" IS NULL'), {"now": now})
+    conn.execute(text(
+        f'CREATE TABLE {table_name} (LIKE {old} INCLUDING DEFAULTS, '
+        f'CONSTRAINT {table_name}_pkey PRIMARY KEY (id, "timestamp")) PARTITION BY RANGE ("timestamp")'
+    ))
+    first = conn.execute(text(f'SELECT MIN("timestamp") FROM {old}')).scalar() or now
+    ensure_partitions(conn, table_name, first, _months_ahead(now, PARTITIONS_AHEAD))
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT"))
+    conn.execute(text(f"INSERT INTO {table_name} SELECT * FROM {old}"))
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {table_name}_id_seq OWNED BY {table_name}.id"))
+    conn.execute(text(f"DROP TABLE {old}"))
+    for ix in indexes:
+        columns = ", ".join(f'"{c}"' for c in ix["column_names"])
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {ix['name']} ON {table_name} ({columns})"))
+    for index in TABLES[table_name].indexes:
+        index.create(conn, checkfirst=True)
+    for fk in foreign_keys:
+        conn.execute(text(
+            f"ALTER TABLE {table_name} ADD FOREIGN KEY ({', '.join(fk['constrained_columns'])}) "
+            f"REFERENCES {fk['referred_table']} ({', '.join(fk['referred_columns'])})"
+        ))
+    verify_table(conn, table_name)
+
+def verify_table(conn: Connection, table_name: str) -> None:
+    """Raise if the table lacks a column, index or id key that its ORM model maps."""
+    table, inspector = TABLES[table_name], inspect(conn)
+    missing = {c.name for c in table.columns} - {c["name"] for c in inspector.get_columns(table_name)}
+    missing |= {ix.name for ix in table.indexes} - {ix["name"] for ix in inspector.get_indexes(table_name)}
+    if "id" not in inspector.get_pk_constraint(table_name)["constrained_columns"]:
+        missing.add("primary key on id")
+    if missing:
+        raise RuntimeError(f"{table_name} no longer matches its model: missing {sorted(missing)}")
+
+def archive_partition(conn: Connection, table_name: str, partition: str, batch: Optional[int] = None,
+                      archive_dir: Optional[str] = None) -> int:
+    """Copy a whole expired partition to archive files (keyset batches on id), then drop it."""
+    batch = batch or BATCH
+    after, total = 0, 0
+    while True:
+        rows = [dict(row) for row in conn.execute(
+            text(f"SELECT * FROM {partition} WHERE id > :after ORDER BY id LIMIT :n"), {"after": after, "n": batch}).mappings()]
+        if rows:
+            write_archive(table_name, rows, archive_dir)
+            total += len(rows)
+            after = rows[-1]["id"]
+        if len(rows) < batch:
+            break
+    conn.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {partition}"))
+    conn.execute(text(f"DROP TABLE {partition}"))
+    return total
+
+
+# --- Job ---
+
+def _try_flock(fd: int) -> bool:
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+@contextmanager
+def _run_lock(engine: Engine) -> Iterator[bool]:
+    """True if this process may run retention now, False while another worker is running it."""
+    if engine.dialect.name == "sqlite":
+        database = engine.url.database
+        if not database or database == ":memory:" or database.startswith("file:"):
+            yield True  # Private to this process
+            return
+        # The kernel releases the lock if the holder dies mid-run
+        fd = os.open(f"{os.path.abspath(database)}.retention.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            yield _try_flock(fd)
+        finally:
+            os.close(fd)
+        return
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    with engine.connect() as conn:
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}).scalar()
+        conn.commit()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY})
+                conn.commit()
+
+def archive_table(engine: Engine, table_name: str, before: datetime, batch: Optional[int] = None,
+                  pause: Optional[float] = None, stop: Optional[threading.Event] = None) -> int:
+    """Archive every row of `table_name` older than `before`, one short transaction per batch or partition."""
+    batch = batch or BATCH
+    pause = BATCH_PAUSE if pause is None else pause
+    with engine.begin() as conn:
+        partitioned = is_partitioned(conn, table_name)
+        if partitioned:
+            expired = [name for name, month in partitions(conn, table_name) if _next_month(month) <= before]
+    total = 0
+    if partitioned:
+        for name in expired:
+            with engine.begin() as conn:
+                total += archive_partition(conn, table_name, name, batch)
+        # Rows still before the first kept month are in the default partition (e.g. backfilled history)
+        before = _month(before)
+    while True:
+        with engine.begin() as conn:
+            moved = archive_batch(conn, TABLES[table_name], before, batch)
+        total += moved
+        if moved < batch or (stop.wait(pause) if stop else time.sleep(pause)):
+            return total
+
+def run_once(engine: Engine, now: Optional[datetime] = None, batch: Optional[int] = None,
+             pause: Optional[float] = None, stop: Optional[threading.Event] = None) -> Dict[str, int]:
+    """Apply every retention policy once; returns rows archived per table."""
+    archived: Dict[str, int] = {}
+    with _run_lock(engine) as acquired:
+        if not acquired:
+            logger.info("[RETENTION] Another worker is running retention; skipping")
+            return archived
+        maintain_partitions(engine, now)
+        for table_name, days in RETENTION_DAYS.items():
+            if days <= 0:
+                continue
+            before = cutoff(days, now)
+            archived[table_name] = archive_table(engine, table_name, before, batch, pause, stop)
+            if archived[table_name]:
+                logger.info(f"[RETENTION] Archived {archived[table_name]} {table_name} rows older than {before:%Y-%m-%d}")
+    return archived
+
+
+class RetentionJob:
+    """
+    Runs the retention policies every INTERVAL_SECONDS from a background
+    thread. On Postgres it runs without any policy too, to keep creating
+    monthly partitions.
+    """
+
+    def __init__(self, interval_seconds: float = INTERVAL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, engine: Engine) -> Optional[threading.Thread]:
+        if not any(days > 0 for days in RETENTION_DAYS.values()) and engine.dialect.name != "postgresql":
+            return None
+        if archive_format() != ARCHIVE_FORMAT:
+            logger.warning("[RETENTION] pyarrow is not installed; archiving as gzip JSON Lines")
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(engine,), name="retention", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, engine: Engine) -> None:
+        while not self._stop.is_set():
+            try:
+                run_once(engine, stop=self._stop)
+            except Exception as e:
+                logger.warning(f"[RETENTION] Run failed: {e}")
+            self._stop.wait(self.interval_seconds)
+
+
+job = RetentionJob()
+
+
+# --- CLI ---
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m backend.retention", description="Archive expired chat and audit logs")
+    parser.add_argument("--database-url", help="Defaults to DATABASE_URL / the app's database")
+    args = parser.parse_args(argv)
+    if args.database_url:
+        engine = create_engine(args.database_url)
+    else:
+        from .database import engine
+    print(run_once(engine, pause=0) or "No retention policy enabled")
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    sys.exit(main())
@@ -1,7 +1,9 @@
-from pydantic import BaseModel, Field, ConfigDict
-from typing import Optional, List
+from pydantic import BaseModel, Field, ConfigDict, ValidationInfo, field_validator
+from typing import ClassVar, Dict, Optional, List, Literal, Tuple
 from datetime import datetime
 
+from .feature_schema import SCHEMAS, screening_ranges
+
 # --- Authentication & User Schemas ---
 
 class Token(BaseModel):
@@ -66,8 +68,25 @@ class UserFullResponse(UserResponse):
 
 # --- Prediction Schemas ---
 
-class DiabetesInput(BaseModel):
+class FeatureInput(BaseModel):
+    """
+    Base for model inputs. Values outside the valid range declared in the
+    feature_schema registry are rejected with a 422 naming the field.
+    """
+    ranges: ClassVar[Dict[str, Tuple[float, float]]] = {}
+
+    @field_validator("*")
+    @classmethod
+    def in_range(cls, value, info: ValidationInfo):
+        bounds = cls.ranges.get(info.field_name)
+        if value is not None and bounds and not bounds[0] <= value <= bounds[1]:
+            raise ValueError(f"must be between {bounds[0]:g} and {bounds[1]:g}")
+        return value
+
+class DiabetesInput(FeatureInput):
     """Schema for Diabetes Prediction (BRFSS 2015 Big Data)"""
+    ranges = SCHEMAS["diabetes"].field_ranges()
+
     gender: int = Field(..., description="0: Female, 1: Male")
     age: float = Field(..., description="Age in years")
     hypertension: int = Field(..., description="0: No, 1: Yes")
@@ -78,11 +97,13 @@ class DiabetesInput(BaseModel):
     physical_activity: int = Field(..., description="0: No, 1: Yes (Past 30 days)")
     general_health: int = Field(..., description="1 (Excellent) to 5 (Poor)")
 
-class HeartInput(BaseModel):
+class HeartInput(FeatureInput):
     """
     Schema for Heart Disease Prediction (CDC BRFSS - 90%+ Accuracy).
     Feature Logic: Focuses on Risk Factors (History) rather than just current Vitals.
     """
+    ranges = SCHEMAS["heart"].field_ranges()
+
     age: float = Field(..., description="Age in years.")
     gender: int = Field(..., description="0: Female, 1: Male")
     high_bp: int = Field(..., description="0: Normal, 1: High BP")
@@ -95,8 +116,10 @@ class HeartInput(BaseModel):
     hvy_alcohol: int = Field(..., description="1 if heavy drinker (Men >14/wk, Women >7/wk), else 0")
     gen_hlth: int = Field(..., description="Self-rated health: 1 (Excellent) to 5 (Poor)")
 
-class LiverInput(BaseModel):
+class LiverInput(FeatureInput):
     """Schema for Liver Disease Prediction (ILPD)."""
+    ranges = SCHEMAS["liver"].field_ranges()
+
     age: float
     gender: int # 0: Female, 1: Male
     total_bilirubin: float
@@ -108,8 +131,10 @@ class LiverInput(BaseModel):
     albumin: float
     albumin_and_globulin_ratio: float
 
-class KidneyInput(BaseModel):
+class KidneyInput(FeatureInput):
     """Schema for Kidney Disease Prediction (24 Features)."""
+    ranges = SCHEMAS["kidney"].field_ranges()
+
     age: float
     bp: float
     sg: float
@@ -135,8 +160,10 @@ class KidneyInput(BaseModel):
     pe: int
     ane: int
 
-class LungInput(BaseModel):
+class LungInput(FeatureInput):
     """Schema for Respiratory/Lung Health."""
+    ranges = SCHEMAS["lungs"].field_ranges()
+
     gender: int # 1:Male, 0:Female
     age: float
     smoking: int
@@ -152,3 +179,91 @@ class LungInput(BaseModel):
     shortness_of_breath: int
     swallowing_difficulty: int
     chest_pain: int
+
+class ScreeningInput(FeatureInput):
+    """
+    Combined patient profile for multi-disease screening (/predict/screen).
+    Each model runs if every field it needs is present; shared inputs (age,
+    BMI, hypertension, smoking, ...) are given once. See
+    feature_schema.SCREENING_ALIASES for how they map to the per-disease fields.
+    A shared field must be in range for every model it feeds.
+    """
+    ranges = screening_ranges()
+
+    diseases: Optional[List[Literal["diabetes", "heart", "liver", "kidney", "lungs"]]] = Field(
+        None, description="Only screen for these (default: every disease the profile covers)"
+    )
+    age: float = Field(..., description="Age in years")
+    gender: int = Field(..., description="0: Female, 1: Male")
+
+    # Lifestyle and history (diabetes, heart; smoker also lungs, hypertension/diabetes also kidney)
+    bmi: Optional[float] = None
+    hypertension: Optional[int] = Field(None, description="0: No, 1: Yes")
+    high_chol: Optional[int] = Field(None, description="0: No, 1: Yes")
+    smoker: Optional[int] = Field(None, description="0: No, 1: Yes")
+    heart_disease: Optional[int] = Field(None, description="0: No, 1: Yes")
+    stroke: Optional[int] = Field(None, description="0: No, 1: Yes")
+    diabetes: Optional[int] = Field(None, description="0: No, 1: Pre-Diabetes or Diabetes")
+    physical_activity: Optional[int] = Field(None, description="0: No, 1: Yes (Past 30 days)")
+    hvy_alcohol: Optional[int] = Field(None, description="0: No, 1: Yes")
+    general_health: Optional[int] = Field(None, description="1 (Excellent) to 5 (Poor)")
+
+    # Liver panel
+    total_bilirubin: Optional[float] = None
+    direct_bilirubin: Optional[float] = None
+    alkaline_phosphotase: Optional[float] = None
+    alamine_aminotransferase: Optional[float] = None
+    aspartate_aminotransferase: Optional[float] = None
+    total_proteins: Optional[float] = None
+    albumin: Optional[float] = None
+    albumin_and_globulin_ratio: Optional[float] = None
+
+    # Kidney panel
+    bp: Optional[float] = None
+    sg: Optional[float] = None
+    al: Optional[float] = None
+    su: Optional[float] = None
+    rbc: Optional[int] = None
+    pc: Optional[int] = None
+    pcc: Optional[int] = None
+    ba: Optional[int] = None
+    bgr: Optional[float] = None
+    bu: Optional[float] = None
+    sc: Optional[float] = None
+    sod: Optional[float] = None
+    pot: Optional[float] = None
+    hemo: Optional[float] = None
+    pcv: Optional[float] = None
+    wc: Optional[float] = None
+    rc: Optional[float] = None
+    cad: Optional[int] = None
+    appet: Optional[int] = None
+    pe: Optional[int] = None
+    ane: Optional[int] = None
+
+    # Respiratory symptoms
+    yellow_fingers: Optional[int] = None
+    anxiety: Optional[int] = None
+    peer_pressure: Optional[int] = None
+    chronic_disease: Optional[int] = None
+    fatigue: Optional[int] = None
+    allergy: Optional[int] = None
+    wheezing: Optional[int] = None
+    alcohol: Optional[int] = None
+    coughing: Optional[int] = None
+    shortness_of_breath: Optional[int] = None
+    swallowing_difficulty: Optional[int] = None
+    chest_pain: Optional[int] = None
+
+class RiskThresholdUpdate(BaseModel):
+    """Schema for setting an account's risk threshold for one disease (null resets it)."""
+    threshold: Optional[float] = Field(..., ge=0, le=1, description="Positive when risk probability >= threshold")
+
+# --- Admin Schemas ---
+
+class ProfileSessionRequest(BaseModel):
+    """Schema for starting a sampling-profiler session."""
+    sample_rate: float = Field(0.1, gt=0, le=1, description="Fraction of eligible requests to profile")
+    route: Optional[str] = Field(None, description="Only profile this path (prefix match on segments)")
+    duration_seconds: float = Field(60, gt=0, le=600, description="Session auto-stops after this long")
+    interval_ms: float = Field(5.0, ge=1, le=1000, description="Stack sampling interval")
@@ -4,11 +4,16 @@ Security & Compliance Module
 Handles Audit Logging and Rate Limiting logic.
 """
 from sqlalchemy.orm import Session
-from . import models
+from . import audit
 from fastapi import Request, HTTPException
-from datetime import datetime
+from fastapi.concurrency import run_in_threadpool
+from collections import OrderedDict
+import math
+import os
+import sqlite3
+import threading
 import time
-from typing import Dict, Tuple
+from typing import Dict, NamedTuple, Optional, Tuple
 
 # --- Audit Logging ---
 
@@ -29,66 +34,196 @@ def log_audit_event(
         admin_id: ID of admin performing action (optional)
         details: JSON string or text details
     """
-    try:
-        log_entry = models.AuditLog(
-            admin_id=admin_id, # Can be None if system action
-            target_user_id=target_user_id,
-            action=action,
-            details=details,
-            timestamp=datetime.utcnow()
+    # Buffered and written in batches by backend/audit.py (synchronous until the sink starts)
+    audit.record(db, action, target_user_id=target_user_id, admin_id=admin_id, details=details)
+
+
+# --- Rate Limiting (GCRA) ---
+# Generic Cell Rate Algorithm: each key stores a single "theoretical arrival
+# time" (TAT), so a check is O(1) regardless of the window size and no sweep
+# over stored timestamps is ever needed.
+# The in-memory backend is per-process; point RATE_LIMIT_BACKEND=sqlite at a
+# shared file so every uvicorn/gunicorn worker enforces the same budget.
+# Backends with `blocking = True` do file I/O, so async callers go through
+# acquire_async(), which runs them in the threadpool.
+
+class RateLimitRule(NamedTuple):
+    """Quota expressed as `requests` per `period` seconds with a `burst` allowance."""
+    requests: int
+    period: float = 60.0
+    burst: Optional[int] = None
+
+    @property
+    def interval(self) -> float:
+        """Seconds between two requests at the steady-state rate."""
+        return self.period / self.requests
+
+    @property
+    def tolerance(self) -> float:
+        """How far ahead of `now` the TAT may run before requests are rejected."""
+        return self.interval * (self.burst or self.requests)
+
+
+class InMemoryRateLimitBackend:
+    """
+    Process-local TAT store.
+    Bounded LRU: when `max_keys` is exceeded the least recently seen key is
+    dropped in O(1) instead of sweeping the whole table.
+    """
+
+    blocking = False
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        self.storage: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, rule: RateLimitRule, now: float) -> float:
+        """Consume one request. Returns 0 when allowed, else seconds to wait."""
+        with self._lock:
+            tat = max(self.storage.get(key, now), now)
+            new_tat = tat + rule.interval
+            allow_at = new_tat - rule.tolerance
+            if allow_at > now:
+                return allow_at - now
+
+            self.storage[key] = new_tat
+            self.storage.move_to_end(key)
+            if len(self.storage) > self.max_keys:
+                self.storage.popitem(last=False)
+            return 0.0
+
+    def reset(self) -> None:
+        with self._lock:
+            self.storage.clear()
+
+
+class SQLiteRateLimitBackend:
+    """
+    TAT store shared by every worker process through a SQLite file.
+    The check-and-update is a single UPSERT statement, so it is atomic across
+    processes without an explicit transaction or application-level lock.
+    """
+
+    blocking = True  # sqlite3 calls may wait on the file lock (up to 5 s)
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, tat REAL NOT NULL)"
         )
-        db.add(log_entry)
-        db.commit()
-    except Exception as e:
-        print(f"FAILED TO AUDIT LOG: {e}")
-        # Don't crash the app if logging fails, but print strict error
-        pass
 
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def acquire(self, key: str, rule: RateLimitRule, now: float) -> float:
+        """Consume one request. Returns 0 when allowed, else seconds to wait."""
+        conn = self._connect()
+        row = conn.execute(
+            """
+            INSERT INTO rate_limits (key, tat) VALUES (:key, :now + :interval)
+            ON CONFLICT(key) DO UPDATE
+                SET tat = max(tat, :now) + :interval
+                WHERE max(tat, :now) + :interval - :tolerance <= :now
+            RETURNING tat
+            """,
+            {"key": key, "now": now, "interval": rule.interval, "tolerance": rule.tolerance},
+        ).fetchone()
+        if row is not None:
+            return 0.0
+
+        current = conn.execute("SELECT tat FROM rate_limits WHERE key = ?", (key,)).fetchone()
+        tat = current[0] if current else now
+        return max(tat + rule.interval - rule.tolerance - now, 0.0)
+
+    def reset(self) -> None:
+        self._connect().execute("DELETE FROM rate_limits")
+
+
+async def acquire_async(backend, key: str, rule: RateLimitRule, now: float) -> float:
+    """backend.acquire() from the event loop, in the threadpool if the backend blocks."""
+    if getattr(backend, "blocking", False):
+        return await run_in_threadpool(backend.acquire, key, rule, now)
+    return backend.acquire(key, rule, now)
+
+
+# Tighter quotas for routes that fan out to Gemini / vision calls.
+# Keyed "METHOD /path" (or "/path" for any method) and matched exactly, so
+# e.g. GET /chat/history stays on the default rule.
+ROUTE_QUOTAS: Dict[str, RateLimitRule] = {
+    "POST /chat": RateLimitRule(requests=20, period=60.0, burst=5),
+    "POST /analyze/report": RateLimitRule(requests=10, period=60.0, burst=3),
+}
 
-# --- Simple In-Memory Rate Limiter ---
-# For scalable prod, use Redis. For MVP/Free Tier, this suffices.
 
 class RateLimiter:
-    def __init__(self, requests_per_minute: int = 60):
+    def __init__(
+        self,
+        requests_per_minute: int = 60,
+        backend=None,
+        route_quotas: Optional[Dict[str, RateLimitRule]] = None,
+    ):
         self.requests_per_minute = requests_per_minute
-        self.storage: Dict[str, list] = {}
-        
+        self.default_rule = RateLimitRule(requests=requests_per_minute, period=60.0)
+        self.backend = backend or InMemoryRateLimitBackend()
+        self.route_quotas = route_quotas if route_quotas is not None else dict(ROUTE_QUOTAS)
+
+    def resolve(self, path: str, method: str = "GET") -> Tuple[str, RateLimitRule]:
+        """Return the (bucket name, rule) that governs `method path`."""
+        for route in (f"{method.upper()} {path}", path):
+            rule = self.route_quotas.get(route)
+            if rule is not None:
+                return route, rule
+        return "*", self.default_rule
+
     def check(self, request: Request, identifier: str):
         """
         Check if request is allowed. Raises 429 if not.
-        Uses a sliding window algorithm.
+        Each (identifier, route bucket) pair is limited independently.
         """
-        now = time.time()
-        
-        # Cleanup old entries occasionally (simple garbage collection)
-        if len(self.storage) > 1000:
-            self._cleanup(now)
-            
-        history = self.storage.get(identifier, [])
-        
-        # Filter timestamps older than 60 seconds
-        valid_history = [t for t in history if now - t < 60]
-        
-        if len(valid_history) >= self.requests_per_minute:
+        self.check_path(request.url.path, identifier, request.method)
+
+    def check_path(self, path: str, identifier: str, method: str = "GET"):
+        """Same as `check`, for callers holding only the raw ASGI path."""
+        bucket, rule = self.resolve(path, method)
+        self._raise_if_limited(self.backend.acquire(f"{identifier}|{bucket}", rule, time.time()))
+
+    async def check_path_async(self, path: str, identifier: str, method: str = "GET"):
+        """`check_path` for the ASGI middleware: never blocks the event loop."""
+        bucket, rule = self.resolve(path, method)
+        self._raise_if_limited(await acquire_async(self.backend, f"{identifier}|{bucket}", rule, time.time()))
+
+    @staticmethod
+    def _raise_if_limited(retry_after: float):
+        if retry_after > 0:
             raise HTTPException(
-                status_code=429, 
-                detail="Too many requests. Please slow down."
+                status_code=429,
+                detail="Too many requests. Please slow down.",
+                headers={"Retry-After": str(math.ceil(retry_after))}
             )
-            
-        valid_history.append(now)
-        self.storage[identifier] = valid_history
-        
-    def _cleanup(self, now: float):
-        keys_to_delete = []
-        for key, history in self.storage.items():
-            valid = [t for t in history if now - t < 60]
-            if not valid:
-                keys_to_delete.append(key)
-            else:
-                self.storage[key] = valid
-        
-        for k in keys_to_delete:
-            del self.storage[k]
+
+    def reset(self) -> None:
+        self.backend.reset()
+
+
+def create_rate_limit_backend():
+    """Build the backend selected by RATE_LIMIT_BACKEND (memory | sqlite)."""
+    kind = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+    if kind == "sqlite":
+        path = os.getenv("RATE_LIMIT_DB_PATH", "./rate_limits.db")
+        return SQLiteRateLimitBackend(path)
+    return InMemoryRateLimitBackend()
 
 # Global instance
-limiter = RateLimiter(requests_per_minute=60)
+limiter = RateLimiter(
+    requests_per_minute=int(os.getenv("RATE_LIMIT_PER_MINUTE", "60")),
+    backend=create_rate_limit_backend()
+)
@@ -0,0 +1,214 @@
+"""
+Admin Statistics
+================
+Materialized counters for /admin/stats, so a dashboard load never runs
+COUNT(*) over users, health_records or chat_logs.
+
+`daily_stats` holds one row per (day, metric, dimension):
+
+    predictions     health records saved that day, per record_type
+    chat_messages   chat messages logged that day
+    active_users    distinct users with a record or message that day
+    users_total     registered accounts, as of the last rollup (today's row)
+
+A rollup recomputes whole days from the base tables and upserts their rows
+(INSERT ... ON CONFLICT DO UPDATE), then drops the keys of those days that
+no longer have data. It is idempotent, and workers refreshing concurrently
+never conflict on the primary key. The background refresher recomputes only
+the last RECENT_DAYS days every STATS_REFRESH_SECONDS (range scans on the
+timestamp indexes, cost independent of table size). A full rollup runs on an
+empty table and every STATS_FULL_ROLLUP_SECONDS, which picks up deletions of
+older rows. Days are UTC.
+
+Chat messages older than the chat_logs retention cutoff have been moved to
+archive files (backend/retention.py), so no rollup recomputes chat_messages
+or active_users for those days: their stored rows are kept as history.
+Predictions come from health_records, which are never archived, and are
+always recomputed.
+
+Each refresh reloads a small in-memory snapshot (totals plus the last
+STATS_DAYS days) that the endpoint serves with its `as_of` time. If no
+refresher is running (tests, scripts) or the snapshot is stale, the request
+refreshes it inline.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, delete, distinct, func, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from . import models, retention
+
+logger = logging.getLogger(__name__)
+
+REFRESH_SECONDS = float(os.getenv("STATS_REFRESH_SECONDS", "60"))
+FULL_ROLLUP_SECONDS = float(os.getenv("STATS_FULL_ROLLUP_SECONDS", "86400"))
+STATS_DAYS = int(os.getenv("STATS_DAYS", "30"))
+RECENT_DAYS = 2  # Today and yesterday: covers writes that straddle midnight
+
+
+# --- Rollup ---
+
+def _as_date(value: Any) -> date:
+    # func.date() is a DATE on Postgres and an ISO string on SQLite
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+def archived_before(now: Optional[datetime] = None) -> Optional[date]:
+    """First day whose chat_logs are all still in the database (None without a chat retention policy)."""
+    days = retention.RETENTION_DAYS["chat_logs"]
+    return retention.cutoff(days, now).date() + timedelta(days=1) if days > 0 else None
+
+def _upsert(conn: Connection, rows: List[Dict[str, Any]]) -> None:
+    stats = models.DailyStat.__table__
+    stmt = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}[conn.dialect.name](stats)
+    conn.execute(stmt.on_conflict_do_update(index_elements=[stats.c.day, stats.c.metric, stats.c.dimension],
+                                            set_={"value": stmt.excluded.value}), rows)
+
+def rollup(conn: Connection, since: Optional[date] = None) -> int:
+    """
+    Recompute daily_stats for every day from `since` (all days when None),
+    except chat-derived days already archived by retention. Returns rows written.
+    """
+    records, logs, stats = models.HealthRecord.__table__, models.ChatLog.__table__, models.DailyStat.__table__
+    floor = archived_before()
+    log_since = max(since, floor) if since and floor else since or floor
+
+    def daily(table, first, *columns):
+        day = func.date(table.c.timestamp).label("day")
+        query = select(day, *columns)
+        if first:
+            return query.where(table.c.timestamp >= datetime.combine(first, datetime.min.time()))
+        return query.where(table.c.timestamp.is_not(None))
+
+    rows: List[Dict[str, Any]] = []
+    predictions = daily(records, since, records.c.record_type, func.count()).group_by("day", records.c.record_type)
+    for day, record_type, n in conn.execute(predictions):
+        rows.append({"day": _as_date(day), "metric": "predictions", "dimension": record_type or "unknown", "value": n})
+    for day, n in conn.execute(daily(logs, log_since, func.count()).group_by("day")):
+        rows.append({"day": _as_date(day), "metric": "chat_messages", "dimension": "", "value": n})
+    activity = union_all(daily(records, log_since, records.c.user_id.label("user_id")),
+                         daily(logs, log_since, logs.c.user_id.label("user_id"))).subquery()
+    active = select(activity.c.day, func.count(distinct(activity.c.user_id))).group_by(activity.c.day)
+    for day, n in conn.execute(active):
+        rows.append({"day": _as_date(day), "metric": "active_users", "dimension": "", "value": n})
+    users_total = conn.execute(select(func.count()).select_from(models.User.__table__)).scalar()
+    rows.append({"day": datetime.now(timezone.utc).date(), "metric": "users_total", "dimension": "", "value": users_total})
+
+    # Keys of recomputed days that no longer have data (e.g. all their records were deleted)
+    fresh = {(row["day"], row["metric"], row["dimension"]) for row in rows}
+    gone = []
+    for metric, first in (("predictions", since), ("chat_messages", log_since), ("active_users", log_since)):
+        query = select(stats.c.day, stats.c.dimension).where(stats.c.metric == metric)
+        for day, dimension in conn.execute(query.where(stats.c.day >= first) if first else query):
+            if (day, metric, dimension) not in fresh:
+                gone.append({"d": day, "m": metric, "dim": dimension})
+    if gone:
+        conn.execute(delete(stats).where(stats.c.day == bindparam("d"), stats.c.metric == bindparam("m"),
+                                         stats.c.dimension == bindparam("dim")), gone)
+    _upsert(conn, rows)
+    return len(rows)
+
+def load(conn: Connection, days: int = STATS_DAYS) -> Dict[str, Any]:
+    """Snapshot served by /admin/stats: all-time totals plus the last `days` days."""
+    stats = models.DailyStat.__table__
+    totals = conn.execute(
+        select(stats.c.metric, stats.c.dimension, func.sum(stats.c.value))
+        .where(stats.c.metric.in_(("predictions", "chat_messages")))
+        .group_by(stats.c.metric, stats.c.dimension)
+    ).all()
+    by_disease = {dimension: int(n) for metric, dimension, n in totals if metric == "predictions"}
+    users_total = conn.execute(
+        select(stats.c.value).where(stats.c.metric == "users_total").order_by(stats.c.day.desc()).limit(1)
+    ).scalar()
+
+    first_day = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    daily: Dict[date, Dict[str, Any]] = {}
+    recent = select(stats.c.day, stats.c.metric, stats.c.dimension, stats.c.value).where(
+        stats.c.day >= first_day, stats.c.metric != "users_total").order_by(stats.c.day)
+    for day, metric, dimension, value in conn.execute(recent):
+        entry = daily.setdefault(day, {"day": day.isoformat(), "predictions": {}, "chat_messages": 0, "active_users": 0})
+        if metric == "predictions":
+            entry["predictions"][dimension] = value
+        else:
+            entry[metric] = value
+
+    return {
+        "total_users": users_total or 0,
+        "total_predictions": sum(by_disease.values()),
+        "total_messages": int(sum(n for metric, _, n in totals if metric == "chat_messages")),
+        "predictions_by_disease": by_disease,
+        "daily": list(daily.values()),
+        "as_of": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+# --- Snapshot Service ---
+
+class StatsService:
+    """Keeps the in-memory snapshot fresh from a background thread (one per worker)."""
+
+    def __init__(self, refresh_seconds: float = REFRESH_SECONDS, full_rollup_seconds: float = FULL_ROLLUP_SECONDS,
+                 days: int = STATS_DAYS):
+        self.refresh_seconds = refresh_seconds
+        self.full_rollup_seconds = full_rollup_seconds
+        self.days = days
+        self.snapshot: Optional[Dict[str, Any]] = None
+        self._refreshed_at = 0.0
+        self._full_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def refresh(self, conn: Connection, full: bool = False) -> Dict[str, Any]:
+        """Roll up recent days (everything if `full` or never rolled up) and reload the snapshot. Caller commits."""
+        with self._lock:
+            stats = models.DailyStat.__table__
+            if full or conn.execute(select(stats.c.day).limit(1)).first() is None:
+                rollup(conn)
+                self._full_at = time.monotonic()
+            else:
+                rollup(conn, datetime.now(timezone.utc).date() - timedelta(days=RECENT_DAYS - 1))
+            self.snapshot = load(conn, self.days)
+            self._refreshed_at = time.monotonic()
+            return self.snapshot
+
+    def stale(self) -> bool:
+        return self.snapshot is None or time.monotonic() - self._refreshed_at > 2 * self.refresh_seconds
+
+    def current(self, session: Session) -> Dict[str, Any]:
+        """Snapshot for a request; refreshed inline only if the refresher is not keeping it fresh."""
+        if self.stale() and (self.snapshot is None or not self._lock.locked()):
+            self.refresh(session.connection())
+            session.commit()
+        return self.snapshot
+
+    def start(self, engine: Engine) -> threading.Thread:
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._full_at = self._full_at or time.monotonic()
+            self._thread = threading.Thread(target=self._run, args=(engine,), name="stats-refresh", daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self, engine: Engine) -> None:
+        wait = 0.0
+        while not self._stop.wait(wait):
+            wait = self.refresh_seconds
+            full = self._full_at is not None and time.monotonic() - self._full_at > self.full_rollup_seconds
+            try:
+                with engine.begin() as conn:
+                    self.refresh(conn, full)
+            except Exception as e:
+                logger.warning(f"[STATS] Refresh failed: {e}")
+
+
+service = StatsService()
@@ -0,0 +1,237 @@
+"""
+Request Tracing
+===============
+Lightweight span instrumentation compatible with OpenTelemetry conventions:
+W3C `traceparent` propagation, 128-bit trace IDs / 64-bit span IDs, and spans
+exported as JSON lines in the same shape as the OTel console exporter, so the
+files can be loaded by any OTLP/Jaeger JSON importer. Works fully offline.
+
+The active span lives in a ContextVar, so child spans opened in sync endpoints
+(which run in the threadpool with a copied context) nest correctly.
+
+Environment:
+    TRACING_EXPORTER   none | console | file (default none; IDs are still
+                       generated and returned in headers)
+    TRACING_FILE       Output path for the file exporter (default traces.jsonl)
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import secrets
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "kind")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, kind: str = "INTERNAL"):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = {}
+        self.status = "UNSET"
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "ERROR"
+        self.attributes["exception.type"] = type(exc).__name__
+        self.attributes["exception.message"] = str(exc)[:500]
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            if exporter is not None:
+                exporter.export(self)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "context": {"trace_id": f"0x{self.trace_id}", "span_id": f"0x{self.span_id}"},
+            "kind": f"SpanKind.{self.kind}",
+            "parent_id": f"0x{self.parent_id}" if self.parent_id else None,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "duration_ms": round(((self.end_ns or self.start_ns) - self.start_ns) / 1e6, 3),
+            "status": {"status_code": self.status},
+            "attributes": self.attributes,
+            "resource": {"service.name": SERVICE_NAME},
+        }
+
+
+class SpanExporter:
+    """Writes finished spans as JSON lines from a background thread."""
+
+    def __init__(self, stream_factory):
+        self._stream_factory = stream_factory
+        self._start()
+        # Threads do not survive fork (gunicorn preload); restart in each worker
+        if hasattr(os, "register_at_fork"):  # POSIX only
+            os.register_at_fork(after_in_child=self._start)
+
+    def _start(self) -> None:
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        self._queue.put(span)
+
+    def _run(self) -> None:
+        stream = self._stream_factory()
+        while True:
+            span = self._queue.get()
+            if span is None:
+                break
+            try:
+                stream.write(json.dumps(span.to_dict(), default=str) + "\n")
+                if self._queue.empty():
+                    stream.flush()
+            except Exception as e:
+                logger.warning(f"Span export failed: {e}")
+        stream.flush()
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+
+SERVICE_NAME = "aio-health-backend"
+
+
+def _build_exporter() -> Optional[SpanExporter]:
+    kind = os.getenv("TRACING_EXPORTER", "none").lower()
+    if kind == "console":
+        return SpanExporter(lambda: sys.stderr)
+    if kind == "file":
+        path = os.getenv("TRACING_FILE", "traces.jsonl")
+        return SpanExporter(lambda: open(path, "a", encoding="utf-8"))
+    return None
+
+
+exporter: Optional[SpanExporter] = _build_exporter()
+if exporter is not None:
+    atexit.register(exporter.shutdown)
+
+
+# --- Public API ---
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def parse_traceparent(header: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Return (trace_id, parent_span_id) from a W3C traceparent header."""
+    if not header:
+        return None, None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16 or parts[1] == "0" * 32:
+        return None, None
+    return parts[1].lower(), parts[2].lower()
+
+
+def new_span(name: str, kind: str = "INTERNAL", traceparent: Optional[str] = None, **attributes: Any) -> Span:
+    """Create a span parented to the active span (or to `traceparent` for a root)."""
+    parent = _current_span.get()
+    if parent is not None:
+        trace_id, parent_id = parent.trace_id, parent.span_id
+    else:
+        trace_id, parent_id = parse_traceparent(traceparent)
+        trace_id = trace_id or secrets.token_hex(16)
+    span = Span(name, trace_id, parent_id, kind)
+    if attributes:
+        span.attributes.update(attributes)
+    return span
+
+
+@contextmanager
+def start_span(name: str, kind: str = "INTERNAL", traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+    """Open a span, make it current for the block, and end it on exit."""
+    span = new_span(name, kind, traceparent, **attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        span.end()
+
+
+@contextmanager
+def use_span(span: Span) -> Iterator[Span]:
+    """Make an existing span current without ending it on exit."""
+    token = _current_span.set(span)
+    try:
+        yield span
+    finally:
+        _current_span.reset(token)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator form of start_span for sync functions."""
+    def decorator(func):
+        span_name = name or f"{func.__module__}.{func.__qualname__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with start_span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# --- SQLAlchemy Instrumentation ---
+
+def instrument_sqlalchemy(engine_or_class) -> None:
+    """Emit a `db.query` span for every statement executed on the engine(s)."""
+    from sqlalchemy import event
+
+    @event.listens_for(engine_or_class, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        span = new_span("db.query", kind="CLIENT")
+        span.set_attribute("db.system", conn.dialect.name)
+        span.set_attribute("db.statement", statement[:1000])
+        conn.info.setdefault("_trace_spans", []).append(span)
+
+    @event.listens_for(engine_or_class, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        spans = conn.info.get("_trace_spans")
+        if spans:
+            span = spans.pop()
+            if cursor is not None and cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.set_attribute("db.rowcount", cursor.rowcount)
+            span.end()
+
+    @event.listens_for(engine_or_class, "handle_error")
+    def _error(exception_context):
+        conn = exception_context.connection
+        spans = conn.info.get("_trace_spans") if conn is not None else None
+        if spans:
+            span = spans.pop()
+            span.record_exception(exception_context.original_exception)
+            span.end()
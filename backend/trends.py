@@ -0,0 +1,133 @@
+"""
+Health Trends
+=============
+Downsampled per-metric time series for the dashboard (GET /records/trends),
+aggregated in SQL over `health_measurements`.
+
+A user's history for the requested metrics is split into at most `buckets`
+equal time windows, and each window is reduced to count/min/max/mean. So the
+payload size depends only on the number of metrics and buckets, not on how
+many records the user has. Both queries are range scans on
+(user_id, name, timestamp).
+
+Results are cached per process and user. Saving or deleting a record bumps
+that user's generation, so this worker never serves a payload computed
+before the write. Other workers can serve it for up to TRENDS_CACHE_TTL
+seconds.
+"""
+import calendar
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import BigInteger, cast, extract, func, select
+from sqlalchemy.sql import Select
+
+from . import metrics, models
+
+DEFAULT_METRICS = ("bmi", "blood_glucose_level", "total_bilirubin")
+DEFAULT_BUCKETS = 60
+MAX_BUCKETS = 500
+MAX_METRICS = 10
+
+CACHE_SIZE = int(os.getenv("TRENDS_CACHE_SIZE", "1024"))
+CACHE_TTL = float(os.getenv("TRENDS_CACHE_TTL", "300"))
+
+
+# --- SQL ---
+
+def epoch_seconds(column, dialect: str):
+    """Unix seconds of a naive-UTC DateTime column, as an integer expression."""
+    if dialect == "sqlite":
+        return cast(func.strftime("%s", column), BigInteger)
+    return cast(extract("epoch", column), BigInteger)
+
+def _filtered(query: Select, user_id: int, names: Sequence[str], record_type: Optional[str]) -> Select:
+    m = models.Measurement
+    query = query.where(m.user_id == user_id, m.name.in_(names))
+    if record_type:
+        query = query.where(m.record_type == record_type)
+    return query
+
+def span_query(user_id: int, names: Sequence[str], record_type: Optional[str] = None) -> Select:
+    m = models.Measurement
+    return _filtered(select(func.min(m.timestamp), func.max(m.timestamp)), user_id, names, record_type)
+
+def to_epoch(value: datetime) -> int:
+    return calendar.timegm(value.utctimetuple())
+
+def window(first: datetime, last: datetime, buckets: int) -> Tuple[int, int]:
+    """(start epoch, bucket width in seconds) covering first..last in `buckets` windows."""
+    start = to_epoch(first)
+    return start, max(1, math.ceil((to_epoch(last) - start + 1) / buckets))
+
+def bucket_query(user_id: int, names: Sequence[str], record_type: Optional[str],
+                 start: int, width: int, dialect: str) -> Select:
+    m = models.Measurement
+    bucket = ((epoch_seconds(m.timestamp, dialect) - start) // width).label("bucket")
+    query = select(m.name, bucket, func.count(), func.min(m.value), func.max(m.value), func.avg(m.value))
+    return _filtered(query, user_id, names, record_type).group_by(m.name, bucket).order_by(m.name, bucket)
+
+
+def payload(names: Sequence[str], buckets: int, span: Optional[Tuple[int, int]], rows: List[Tuple]) -> Dict[str, Any]:
+    series: Dict[str, List[Dict[str, Any]]] = {name: [] for name in names}
+    start, width = span or (None, None)
+    for name, bucket, count, low, high, mean in rows:
+        series[name].append({
+            "time": datetime.fromtimestamp(start + int(bucket) * width, tz=timezone.utc).isoformat(),
+            "count": count, "min": low, "max": high, "mean": round(float(mean), 4),
+        })
+    return {"buckets": buckets, "bucket_seconds": width, "metrics": series}
+
+
+# --- Cache ---
+
+class TrendCache:
+    """Per-process LRU of trend payloads keyed by user, invalidated by record writes."""
+
+    def __init__(self, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL, clock=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._clock = clock or time.monotonic
+        self._entries: "OrderedDict[Tuple, Tuple[float, int, Dict[str, Any]]]" = OrderedDict()
+        self._generations: Dict[int, int] = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int, params: Tuple) -> Tuple[Optional[Dict[str, Any]], int]:
+        """Cached payload (or None) and the generation to store a fresh one under."""
+        with self._lock:
+            generation = self._generations[user_id]
+            entry = self._entries.get((user_id, params))
+            if entry and entry[1] == generation and self._clock() - entry[0] < self.ttl:
+                self._entries.move_to_end((user_id, params))
+                metrics.TRENDS_CACHE_REQUESTS.inc(result="hit")
+                return entry[2], generation
+        metrics.TRENDS_CACHE_REQUESTS.inc(result="miss")
+        return None, generation
+
+    def put(self, user_id: int, params: Tuple, generation: int, value: Dict[str, Any]) -> None:
+        with self._lock:
+            if generation != self._generations[user_id]:
+                return  # A write landed while this was computed
+            self._entries[(user_id, params)] = (self._clock(), generation, value)
+            self._entries.move_to_end((user_id, params))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self._generations[user_id] += 1
+            for key in [k for k in self._entries if k[0] == user_id]:
+                del self._entries[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+
+
+cache = TrendCache()
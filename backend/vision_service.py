@@ -1,5 +1,4 @@
 
-import google.generativeai as genai
 import os
 import json
 import logging
@@ -8,6 +7,10 @@ from PIL import Image
 import io
 from typing import Dict, Any, Union
 from fastapi import HTTPException
+from . import metrics
+from .lazy import lazy_import
+
+genai = lazy_import("google.generativeai")
 
 # --- Logging ---
 # logging.basicConfig(level=logging.INFO)
@@ -89,7 +92,8 @@ def analyze_lab_report(image_bytes: bytes) -> Dict[str, Any]:
         if not model:
             raise HTTPException(status_code=503, detail="Vision Model Unavailable")
             
-        response = model.generate_content([prompt, image])
+        with metrics.track(metrics.LLM_LATENCY, metrics.LLM_ERRORS, caller="vision"):
+            response = model.generate_content([prompt, image])
         
 
         text = response.text.replace("```json", "").replace("```", "").strip()
@@ -42,6 +42,28 @@ def render_radar_chart(input_data: dict):
     
     st.plotly_chart(fig, use_container_width=True)
 
+def render_trend_series(points: list, label: str):
+    """
+    Renders a pre-aggregated series from api.fetch_trends(): the bucket mean as
+    a line, with the min-max range shaded when a bucket holds several checkups.
+    """
+    if not points:
+        st.warning(f"No data found for {label}")
+        return
+
+    df = pd.DataFrame(points)
+    df["time"] = pd.to_datetime(df["time"])
+    fig = go.Figure()
+    if (df["count"] > 1).any():
+        fig.add_trace(go.Scatter(x=df["time"], y=df["max"], mode="lines", line_width=0, showlegend=False, hoverinfo="skip"))
+        fig.add_trace(go.Scatter(x=df["time"], y=df["min"], mode="lines", line_width=0, fill="tonexty",
+                                 fillcolor="rgba(255, 75, 75, 0.2)", name="Range"))
+    fig.add_trace(go.Scatter(x=df["time"], y=df["mean"], mode="lines+markers", line_color="#FF4B4B", name=label,
+                             customdata=df["count"], hovertemplate="%{y:.2f} (%{customdata} checkups)<extra></extra>"))
+    fig.update_layout(title=f"{label} Over Time", xaxis_title="Checkup Date", yaxis_title=label, showlegend=False)
+
+    st.plotly_chart(fig, use_container_width=True)
+
 def render_trend_chart(records: list, metric_key: str, label: str):
     """
     Renders a Line Chart for a specific metric over time.
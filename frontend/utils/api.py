@@ -153,6 +153,18 @@ def fetch_records(record_type: Optional[str] = None) -> List[Dict[str, Any]]:
         st.error(f"Failed to fetch records: {e}")
     return []
 
+def fetch_trends(metrics: List[str], buckets: int = 60) -> Dict[str, List[Dict[str, Any]]]:
+    """Server-side downsampled series per metric: [{"time", "count", "min", "max", "mean"}]."""
+    if 'token' not in st.session_state: return {}
+    headers = {"Authorization": f"Bearer {st.session_state['token']}"}
+    try:
+        resp = requests.get(f"{BACKEND_URL}/records/trends", params={"metrics": metrics, "buckets": buckets}, headers=headers)
+        if resp.status_code == 200:
+            return resp.json()["metrics"]
+    except Exception as e:
+        st.error(f"Failed to fetch trends: {e}")
+    return {}
+
 def delete_record(record_id: int):
     headers = {"Authorization": f"Bearer {st.session_state['token']}"}
     try:
@@ -5,6 +5,7 @@ System analytics and user management.
 """
 import streamlit as st
 import requests
+import pandas as pd
 from frontend.utils import api
 
 def render_admin_page():
@@ -39,6 +40,18 @@ def render_admin_page():
         c1.metric("Total Users", stats.get("total_users", 0))
         c2.metric("Total Predictions", stats.get("total_predictions", 0))
         c3.metric("Total Chats", stats.get("total_messages", 0))
+        if stats.get("as_of"):
+            st.caption(f"Counts as of {stats['as_of'][:19].replace('T', ' ')} UTC")
+        
+        daily = stats.get("daily", [])
+        if daily:
+            st.subheader("📈 Daily Activity")
+            st.line_chart(pd.DataFrame([{
+                "day": d["day"],
+                "Predictions": sum(d["predictions"].values()),
+                "Chat Messages": d["chat_messages"],
+                "Active Users": d["active_users"],
+            } for d in daily]).set_index("day"))
         
         st.markdown("---")
         
@@ -61,5 +74,13 @@ def render_admin_page():
             else:
                 st.caption("No users found.")
         
+        # 5. Audit Log (includes archived events)
+        with st.expander("🧾 Audit Log"):
+            audit_resp = requests.get(f"{backend_url}/admin/audit", params={"limit": 50}, headers=headers, timeout=10)
+            if audit_resp.status_code == 200 and audit_resp.json():
+                st.dataframe(pd.DataFrame(audit_resp.json()), use_container_width=True)
+            else:
+                st.caption("No audit events found.")
+        
     except Exception as e:
         st.error(f"Connection Error: {e}")
@@ -15,12 +15,13 @@ def render_dashboard():
     """, unsafe_allow_html=True)
     
     st.subheader("📊 Your Health Trends")
-    records = api.fetch_records()
-    if records:
+    # Aggregated server-side: payload size is fixed however long the history is
+    series = api.fetch_trends(["bmi", "blood_glucose_level", "total_bilirubin"])
+    if any(series.values()):
         tab1, tab2, tab3 = st.tabs(["BMI", "Glucose", "Bilirubin"])
-        with tab1: charts.render_trend_chart(records, "bmi", "BMI")
-        with tab2: charts.render_trend_chart(records, "blood_glucose_level", "Glucose")
-        with tab3: charts.render_trend_chart(records, "total_bilirubin", "Bilirubin")
+        with tab1: charts.render_trend_series(series.get("bmi", []), "BMI")
+        with tab2: charts.render_trend_series(series.get("blood_glucose_level", []), "Glucose")
+        with tab3: charts.render_trend_series(series.get("total_bilirubin", []), "Bilirubin")
     else:
         st.info("No records found. Take a prediction test to track your health!")
 
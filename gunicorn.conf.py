@@ -0,0 +1,42 @@
+"""
+Gunicorn configuration for multi-worker deployments.
+
+    gunicorn backend.main:app -c gunicorn.conf.py
+
+Pending schema migrations are applied once in the master before anything
+else (backend/migrations.py). The app is then imported once in the master and every disease model is loaded
+there before the workers are forked, so all workers share one copy of the
+model weights (copy-on-write) instead of each holding its own. Measure with
+scripts/benchmarks/model_memory.py. The master's DB pool is disposed before
+the fork, and the logging listener thread is restarted in each worker
+(backend/logging_config.py).
+
+Environment:
+    WEB_CONCURRENCY   Number of worker processes (default 4)
+    PORT              Bind port (default 8000)
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "4"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = 120
+
+
+def on_starting(server):
+    # Runs once in the master before the app is imported: workers start with a
+    # current schema and only read its version
+    from backend import database, migrations
+    applied = migrations.upgrade(database.engine)
+    server.log.info(f"Schema migrations applied: {applied or 'none'}")
+
+
+def when_ready(server):
+    # Runs in the master after the app is imported and before the first fork
+    from backend import database, prediction
+    prediction.preload_models()
+    server.log.info(f"Models preloaded for sharing: {prediction.model_states()}")
+    # Close the master's pooled connections (migrations, app import) so no
+    # worker inherits, and shares, a DB socket; each worker opens its own
+    database.engine.dispose()
@@ -16,6 +16,10 @@ from lightgbm import LGBMClassifier
 from sklearn.metrics import accuracy_score
 from sklearn.preprocessing import StandardScaler
 
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from backend.feature_schema import SCHEMAS
+from backend import calibration
+
 # --- Logging Configuration (Standardized) ---
 logging.basicConfig(
     level=logging.INFO, 
@@ -39,6 +43,24 @@ gb_params = {'n_estimators': 300, 'learning_rate': 0.05, 'max_depth': 5, 'random
 lgbm_params = {'n_estimators': 500, 'learning_rate': 0.03, 'num_leaves': 31, 'random_state': 42}
 cat_params = {'iterations': 500, 'learning_rate': 0.03, 'depth': 6, 'verbose': False, 'random_state': 42}
 
+def save_model(model, filename, schema, X_holdout=None, y_holdout=None):
+    """
+    Write a model artifact plus its feature-schema sidecar (checked by the backend at load)
+    and, given held-out data, a probability calibrator for the risk scores.
+    """
+    path = os.path.join(MODEL_DIR, filename)
+    with open(path, 'wb') as f: joblib.dump(model, f, compress=3)
+    schema.save(path)
+    if X_holdout is not None and hasattr(model, 'predict_proba'):
+        try:
+            calibrator = calibration.fit_model(model, X_holdout, y_holdout)
+        except ValueError as e:
+            # Serving reports no probability for such models, so there is nothing to calibrate
+            logger.warning(f"[{schema.name.title()}] No calibration saved: {e}")
+            return
+        calibrator.save(path)
+        logger.info(f"[{schema.name.title()}] Saved {calibrator.method} calibration ({len(y_holdout)} held-out rows)")
+
 def train_diabetes():
     logger.info("Training Diabetes Ensemble (Big Data - BRFSS)...")
     parquet_path = os.path.join(PROCESSED_DIR, 'diabetes.parquet')
@@ -47,11 +69,9 @@ def train_diabetes():
     df = pd.read_parquet(parquet_path)
     target = 'diabetes'
     
-    # Select only the features available in the Web UI/API
-    # Mapped from original: HighBP, HighChol, BMI, Smoker, HeartDiseaseorAttack, PhysActivity, GenHlth, Sex, Age
-    feature_cols = ['HighBP', 'HighChol', 'BMI', 'Smoker', 'HeartDiseaseorAttack', 'PhysActivity', 'GenHlth', 'Sex', 'Age']
-    
-    X = df[feature_cols]
+    # Select only the features available in the Web UI/API, in serving order
+    schema = SCHEMAS['diabetes']
+    X = df[schema.source_columns]
     y = df[target]
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
@@ -64,7 +84,7 @@ def train_diabetes():
     
     acc = accuracy_score(y_test, eclf.predict(X_test))
     logger.info(f"[Diabetes] Accuracy: {acc:.4f}")
-    with open(os.path.join(MODEL_DIR, 'diabetes_model.pkl'), 'wb') as f: joblib.dump(eclf, f, compress=3)
+    save_model(eclf, 'diabetes_model.pkl', schema, X_test, y_test)
 
 def train_heart():
     logger.info("Training Heart Ensemble (CDC BRFSS - 250k Rows)...")
@@ -76,7 +96,8 @@ def train_heart():
     # No clinical cleaning needed as BRFSS is already cleaned/categorical.
     
     target = 'target'
-    X = df.drop(columns=[target])
+    schema = SCHEMAS['heart']
+    X = df[schema.source_columns]
     y = df[target]
     
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
@@ -94,8 +115,7 @@ def train_heart():
     acc = accuracy_score(y_test, eclf.predict(X_test))
     logger.info(f"[Heart] CDC Ensemble Accuracy: {acc:.4f}")
 
-    with open(os.path.join(MODEL_DIR, 'heart_disease_model.pkl'), 'wb') as f:
-        joblib.dump(eclf, f, compress=3)
+    save_model(eclf, 'heart_disease_model.pkl', schema, X_test, y_test)
 
 def train_liver():
     logger.info("Training Liver Ensemble...")
@@ -104,17 +124,18 @@ def train_liver():
 
     df = pd.read_parquet(parquet_path)
     target = 'target'
-    skewed = ['total_bilirubin', 'alkaline_phosphotase', 'alamine_aminotransferase', 'albumin_and_globulin_ratio']
-    skewed = [c for c in skewed if c in df.columns]
+    schema = SCHEMAS['liver']
+    df.rename(columns={'total_protiens': 'total_proteins'}, inplace=True)  # Typo in the ILPD source CSV
+    skewed = [src for src, feature in zip(schema.source_columns, schema.features) if feature.transform == 'log1p']
     for col in skewed: df[col] = np.log1p(df[col])
 
     scaler = StandardScaler()
-    feature_cols = [c for c in df.columns if c != target]
-    X = df[feature_cols]
+    X = df[schema.source_columns]
     y = df[target]
     X_scaled = scaler.fit_transform(X)
     
-    with open(os.path.join(MODEL_DIR, 'scaler.pkl'), 'wb') as f: joblib.dump(scaler, f, compress=3)
+    # Serving loads the scaler as liver_scaler.pkl
+    with open(os.path.join(MODEL_DIR, 'liver_scaler.pkl'), 'wb') as f: joblib.dump(scaler, f, compress=3)
     
     X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
     eclf = VotingClassifier(estimators=[
@@ -125,7 +146,7 @@ def train_liver():
     eclf.fit(X_train, y_train)
     acc = accuracy_score(y_test, eclf.predict(X_test))
     logger.info(f"[Liver] Accuracy: {acc:.4f}")
-    with open(os.path.join(MODEL_DIR, 'liver_disease_model.pkl'), 'wb') as f: joblib.dump(eclf, f, compress=3)
+    save_model(eclf, 'liver_disease_model.pkl', schema, X_test, y_test)
 
 def train_kidney():
     logger.info("Training Kidney Model (XGBoost - User Requested)...")
@@ -135,8 +156,9 @@ def train_kidney():
     df = pd.read_parquet(parquet_path)
     if 'classification' in df.columns: df.drop(columns=['classification'], inplace=True)
     target = 'target'
+    schema = SCHEMAS['kidney']
     
-    X = df.drop(columns=[target])
+    X = df[schema.source_columns]
     y = df[target]
     
     # Scale because some values (WBC) are large
@@ -159,7 +181,7 @@ def train_kidney():
     acc = accuracy_score(y_test, model.predict(X_test))
     logger.info(f"[Kidney] XGBoost Accuracy: {acc:.4f}")
     
-    with open(os.path.join(MODEL_DIR, 'kidney_model.pkl'), 'wb') as f: joblib.dump(model, f, compress=3)
+    save_model(model, 'kidney_model.pkl', schema, X_test, y_test)
 
 def train_lungs():
     logger.info("Training Lung Health Model (XGBoost)...")
@@ -168,8 +190,9 @@ def train_lungs():
 
     df = pd.read_parquet(parquet_path)
     target = 'target'
+    schema = SCHEMAS['lungs']
     
-    X = df.drop(columns=[target])
+    X = df[schema.source_columns]
     y = df[target]
     
     # 0/1 Scaling (MinMax is fine or Standard)
@@ -191,7 +214,7 @@ def train_lungs():
     acc = accuracy_score(y_test, model.predict(X_test))
     logger.info(f"[Lungs] XGBoost Accuracy: {acc:.4f}")
     
-    with open(os.path.join(MODEL_DIR, 'lungs_model.pkl'), 'wb') as f: joblib.dump(model, f, compress=3)
+    save_model(model, 'lungs_model.pkl', schema, X_test, y_test)
 
 if __name__ == "__main__":
     train_diabetes() 
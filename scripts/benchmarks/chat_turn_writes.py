@@ -0,0 +1,132 @@
+"""
+Chat Turn Write Benchmark
+=========================
+Throughput of persisting chat turns (user message + assistant reply) to
+chat_logs from concurrent request threads, as backend/chat.py does:
+
+    per_message   add / commit / refresh for each message: 2 commits,
+                  2 re-selects per turn (the previous chat_endpoint)
+    turn          chat_store.save_turn: one INSERT ... RETURNING, one commit
+    group_<ms>    save_turn through the group-commit writer with a <ms> window
+
+SQLite runs in WAL mode, as in production (database.set_sqlite_pragma). Each
+commit is an fsync, so on SQLite the commit count dominates. On Postgres
+round trips also count, and group commit trades up to the window in added
+latency per turn for fewer commits under load.
+
+Usage:
+    python scripts/benchmarks/chat_turn_writes.py [--turns 2000] [--threads 16] [--windows 2,10] [--database-url URL]
+
+--database-url must point at a disposable database: chat_logs is written to.
+The default is a temporary SQLite file.
+"""
+import os
+import sys
+import logging
+import argparse
+import tempfile
+import statistics
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, delete, event, insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+
+def per_message(db, user_id: int, turn) -> None:
+    from backend import models
+    for role, content, timestamp in turn:
+        log = models.ChatLog(user_id=user_id, role=role, content=content, timestamp=timestamp)
+        db.add(log)
+        db.commit()
+        db.refresh(log)
+
+
+def run(engine: Engine, write: Callable, turns: int, threads: int) -> Dict[str, float]:
+    sessions = sessionmaker(bind=engine)
+    latencies: List[float] = []
+    lock = threading.Lock()
+    per_thread = turns // threads
+
+    def worker(n: int) -> None:
+        mine = []
+        with sessions() as db:
+            for i in range(per_thread):
+                now = datetime.now(timezone.utc)
+                turn = [("user", f"Question {n}-{i}", now), ("assistant", "A fairly typical reply. " * 20, now)]
+                t0 = time.perf_counter()
+                write(db, n + 1, turn)
+                mine.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    t0 = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "turns_per_s": len(latencies) / elapsed,
+        "p50": statistics.median(latencies),
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+    }
+
+
+def main(turns: int, threads: int, windows: List[float], database_url: str) -> None:
+    from backend import chat_store, database, migrations, models
+
+    logging.disable(logging.CRITICAL)
+    tmp = tempfile.TemporaryDirectory()
+    url = database_url or f"sqlite:///{os.path.join(tmp.name, 'turns.db')}"
+    sqlite = url.startswith("sqlite")
+    engine = create_engine(url, connect_args={"check_same_thread": False} if sqlite else {},
+                           pool_size=threads + 2, max_overflow=0)
+    if sqlite:
+        event.listen(engine, "connect", database.set_sqlite_pragma)
+    commits = [0]
+    event.listen(engine, "commit", lambda conn: commits.__setitem__(0, commits[0] + 1))
+    try:
+        migrations.upgrade(engine)
+        with engine.begin() as conn:
+            conn.execute(insert(models.User), [{"id": i, "username": f"bench{i}", "hashed_password": "x"}
+                                               for i in range(1, threads + 1)])
+
+        modes: Dict[str, Callable] = {"per_message": per_message, "turn": chat_store.save_turn}
+        modes.update({f"group_{w:g}ms": chat_store.save_turn for w in windows})
+        results = {}
+        for name, write in modes.items():
+            with engine.begin() as conn:
+                conn.execute(delete(models.ChatLog))
+            commits[0] = 0
+            if name.startswith("group_"):
+                chat_store.start(engine, window_ms=float(name[len("group_"):-2]))
+            try:
+                results[name] = dict(run(engine, write, turns, threads), commits=commits[0])
+            finally:
+                chat_store.stop()
+
+        print(f"\n{engine.dialect.name}: {turns:,} turns from {threads} threads")
+        print(f"{'mode':<14} {'turns/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'commits':>8}")
+        for name, r in results.items():
+            print(f"{name:<14} {r['turns_per_s']:>9.0f} {r['p50']:>8.2f} {r['p95']:>8.2f} {r['commits']:>8,}")
+    finally:
+        engine.dispose()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000, help="Turns written per mode (split across threads)")
+    parser.add_argument("--threads", type=int, default=16, help="Concurrent request threads")
+    parser.add_argument("--windows", default="2,10", help="Comma-separated group-commit windows in ms")
+    parser.add_argument("--database-url", help="Disposable database (default: temporary SQLite file)")
+    args = parser.parse_args()
+    main(args.turns, args.threads, [float(w) for w in args.windows.split(",") if w], args.database_url)
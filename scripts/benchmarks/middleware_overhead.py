@@ -0,0 +1,143 @@
+"""
+Middleware Overhead Microbenchmark
+==================================
+Compares per-request overhead of the previous BaseHTTPMiddleware stack with
+the pure ASGI middleware in backend/middleware.py.
+
+Requests are driven straight through the ASGI callable (no sockets), so the
+numbers isolate middleware cost. Also reports how many body messages a
+streaming response arrives in (1 = buffered).
+
+Usage:
+    python scripts/benchmarks/middleware_overhead.py [--requests 5000]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import logging
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+
+from backend.middleware import RequestContextMiddleware, RateLimitMiddleware, SECURITY_HEADERS
+from backend.security import RateLimiter
+
+
+# --- Previous stack (BaseHTTPMiddleware), kept here for comparison only ---
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, limiter):
+        super().__init__(app)
+        self.limiter = limiter
+
+    async def dispatch(self, request: Request, call_next):
+        self.limiter.check(request, request.client.host if request.client else "unknown")
+        return await call_next(request)
+
+
+class LegacySecurityHeadersMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        for name, value in SECURITY_HEADERS:
+            response.headers[name] = value
+        return response
+
+
+class LegacyCatchExceptionsMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        try:
+            return await call_next(request)
+        except Exception:
+            return ORJSONResponse(status_code=500, content={"detail": "Internal Server Error"})
+
+
+class LegacyRequestLoggingMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        response.headers["X-Process-Time"] = str((time.time() - start_time) * 1000)
+        return response
+
+
+def build_app(stack: str) -> FastAPI:
+    app = FastAPI(default_response_class=ORJSONResponse)
+
+    @app.get("/ping")
+    def ping():
+        return {"ok": True}
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(5):
+                yield f"data: {i}\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    limiter = RateLimiter(requests_per_minute=10**9, route_quotas={})
+    if stack == "legacy":
+        app.add_middleware(LegacyRateLimitMiddleware, limiter=limiter)
+        app.add_middleware(LegacySecurityHeadersMiddleware)
+        app.add_middleware(LegacyCatchExceptionsMiddleware)
+        app.add_middleware(LegacyRequestLoggingMiddleware)
+    elif stack == "asgi":
+        app.add_middleware(RateLimitMiddleware, limiter=limiter)
+        app.add_middleware(RequestContextMiddleware)
+    return app
+
+
+def make_scope(path: str) -> dict:
+    return {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 12345), "server": ("localhost", 80),
+    }
+
+
+async def call(app, path: str) -> list:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(make_scope(path), receive, send)
+    return messages
+
+
+async def measure(app, n: int) -> float:
+    for _ in range(200):  # Warm-up
+        await call(app, "/ping")
+    start = time.perf_counter()
+    for _ in range(n):
+        await call(app, "/ping")
+    return (time.perf_counter() - start) / n * 1e6
+
+
+async def main(n: int) -> None:
+    logging.disable(logging.CRITICAL)
+    results = {}
+    for stack in ("none", "legacy", "asgi"):
+        app = build_app(stack)
+        per_request = await measure(app, n)
+        body_msgs = sum(1 for m in await call(app, "/stream") if m["type"] == "http.response.body" and m.get("body"))
+        results[stack] = (per_request, body_msgs)
+
+    baseline = results["none"][0]
+    print(f"{'stack':<8} {'us/request':>12} {'overhead us':>12} {'stream chunks':>14}")
+    for stack, (per_request, body_msgs) in results.items():
+        print(f"{stack:<8} {per_request:>12.1f} {per_request - baseline:>12.1f} {body_msgs:>14}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.requests))
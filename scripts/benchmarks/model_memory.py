@@ -0,0 +1,164 @@
+"""
+Model Memory Benchmark
+======================
+Total memory used by N API workers holding the disease models, for three
+loading strategies:
+
+    independent  every worker loads its own copy (uvicorn --workers)
+    mmap         every worker loads memory-mapped artifacts (MODEL_MMAP_DIR)
+    preload      the master loads once, workers are forked (gunicorn.conf.py)
+
+Each scenario runs in a fresh interpreter that imports backend.prediction and
+then forks its workers, so interpreter and library pages are shared alike in
+every mode and the difference is the models. Memory comes from
+/proc/<pid>/smaps_rollup (Linux only): PSS divides shared pages between the
+processes sharing them, USS is memory private to one worker.
+
+The checked-in placeholder models are tiny, so by default synthetic
+RandomForest models are generated per disease (compressed like
+mlops/model_training.py). Pass --model-dir backend to measure real artifacts.
+
+Usage:
+    python scripts/benchmarks/model_memory.py [--workers 1 4 8] [--trees 100] [--model-dir DIR]
+"""
+import os
+import sys
+import logging
+import argparse
+import tempfile
+import warnings
+import multiprocessing
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+import numpy as np
+
+MODES = ("independent", "mmap", "preload")
+
+
+def read_memory(pid: int) -> Dict[str, int]:
+    """PSS and USS of one process in kB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {"pss": fields["Pss"], "uss": fields["Private_Clean"] + fields["Private_Dirty"]}
+
+
+def generate_models(model_dir: str, trees: int, rows: int) -> None:
+    import joblib
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.preprocessing import StandardScaler
+    from backend import prediction
+
+    rng = np.random.default_rng(42)
+    for name, files in prediction.MODEL_FILES.items():
+        n_features = len(prediction.FEATURE_NAMES[name])
+        X = rng.random((rows, n_features))
+        y = rng.integers(0, 2, rows)
+        model = RandomForestClassifier(n_estimators=trees, max_depth=12, random_state=42, n_jobs=-1).fit(X, y)
+        joblib.dump(model, os.path.join(model_dir, files["model"][0]), compress=3)
+        if "scaler" in files:
+            joblib.dump(StandardScaler().fit(X), os.path.join(model_dir, files["scaler"][0]), compress=3)
+        print(f"Generated {name}: {trees} trees, {n_features} features")
+
+
+def exercise(prediction) -> None:
+    """One inference per disease, as a worker serving traffic would."""
+    for name in prediction.MODEL_FILES:
+        bundle = prediction.resolve(name)
+        X = np.zeros((1, len(bundle.feature_names)))
+        if bundle.scaler is not None:
+            X = bundle.scaler.transform(X)
+        bundle.model.predict(X)
+
+
+def worker(mode: str, ready, stop) -> None:
+    from backend import prediction
+    if mode != "preload":
+        prediction.initialize_models()
+    exercise(prediction)
+    ready.set()
+    stop.wait()
+
+
+def scenario(mode: str, n_workers: int, model_dir: str, mmap_dir: str, results) -> None:
+    """Runs in a fresh (spawned) interpreter acting as the server master."""
+    logging.disable(logging.CRITICAL)
+    warnings.simplefilter("ignore")
+    if mode == "mmap":
+        os.environ["MODEL_MMAP_DIR"] = mmap_dir
+    from backend import prediction
+    prediction.MODEL_DIR = model_dir
+    import sklearn.ensemble  # noqa: F401  (imported before fork in every mode)
+    if mode == "preload":
+        prediction.preload_models()
+
+    ctx = multiprocessing.get_context("fork")
+    stop = ctx.Event()
+    procs, readies = [], []
+    for _ in range(n_workers):
+        ready = ctx.Event()
+        proc = ctx.Process(target=worker, args=(mode, ready, stop))
+        proc.start()
+        procs.append(proc)
+        readies.append(ready)
+    for ready in readies:
+        ready.wait()
+
+    workers = [read_memory(p.pid) for p in procs]
+    master = read_memory(os.getpid())
+    stop.set()
+    for proc in procs:
+        proc.join()
+    results.put({
+        "total_pss": master["pss"] + sum(w["pss"] for w in workers),
+        "worker_uss": sum(w["uss"] for w in workers) / n_workers,
+    })
+
+
+def main(worker_counts: List[int], trees: int, rows: int, model_dir: str) -> None:
+    from backend import prediction
+
+    warnings.simplefilter("ignore")
+    tmp = tempfile.TemporaryDirectory()
+    mmap_dir = os.path.join(tmp.name, "mmap")
+    if not model_dir:
+        model_dir = os.path.join(tmp.name, "models")
+        os.makedirs(model_dir)
+        generate_models(model_dir, trees, rows)
+
+    # Export mmap copies up front so the mmap scenario measures steady state
+    logging.disable(logging.CRITICAL)
+    for files in prediction.MODEL_FILES.values():
+        for names in files.values():
+            path = os.path.join(model_dir, names[0])
+            if os.path.exists(path):
+                prediction.mmap_artifact(path, mmap_dir)
+
+    spawn = multiprocessing.get_context("spawn")
+    print(f"\n{'mode':<12} {'workers':>7} {'total PSS MB':>13} {'USS/worker MB':>14}")
+    try:
+        for mode in MODES:
+            for n in worker_counts:
+                results = spawn.Queue()
+                master = spawn.Process(target=scenario, args=(mode, n, model_dir, mmap_dir, results))
+                master.start()
+                r = results.get()
+                master.join()
+                print(f"{mode:<12} {n:>7} {r['total_pss'] / 1024:>13.1f} {r['worker_uss'] / 1024:>14.1f}")
+    finally:
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--trees", type=int, default=100, help="Trees per synthetic model")
+    parser.add_argument("--rows", type=int, default=20000, help="Training rows per synthetic model")
+    parser.add_argument("--model-dir", help="Measure existing artifacts instead of synthetic ones")
+    args = parser.parse_args()
+    main(args.workers, args.trees, args.rows, args.model_dir)
@@ -0,0 +1,164 @@
+"""
+Timeline Query Benchmark
+========================
+Latency of the per-user timeline reads in backend/chat.py with and without
+the composite (user_id, [record_type,] timestamp, id) indexes (migrations 6, 8):
+
+    history         chat_logs, newest LOG_LIMIT        (/chat/history)
+    records         first streamed batch, oldest first (/records)
+    records_type    same, one record_type              (/records?record_type=)
+    recent_records  newest 50 health_records           (/chat context, PDF report)
+
+Seeds --rows health records and --rows chat messages spread over --users
+accounts and two years, runs ANALYZE, then times each query for random users.
+With only the single-column timestamp indexes every query walks the whole
+timestamp index and filters by user; with the composite indexes it reads
+exactly the rows it returns, already in order.
+
+Usage:
+    python scripts/benchmarks/timeline_queries.py [--rows 1000000] [--users 5000] [--database-url URL]
+
+--database-url must point at a disposable database: its tables are filled
+with synthetic data. The default is a temporary SQLite file.
+"""
+import os
+import sys
+import random
+import logging
+import argparse
+import tempfile
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.engine import Engine
+
+RECORD_TYPES = ("diabetes", "heart", "liver", "kidney", "lungs")
+CHUNK = 50_000
+
+
+def timeline_indexes():
+    from backend import models
+    tables = (models.HealthRecord.__table__, models.ChatLog.__table__)
+    return [index for table in tables for index in table.indexes if index.name.startswith(f"ix_{table.name}_user_")]
+
+
+def queries(user_id: int) -> Dict[str, object]:
+    from backend import chat, models, pagination
+    HR = models.HealthRecord
+    fields = list(chat.RECORD_FIELDS)
+    return {
+        "history": chat.history_query(user_id, list(chat.HISTORY_DEFAULT_FIELDS), None, chat.LOG_LIMIT + 1),
+        "records": chat.records_query(user_id, None, fields, None, pagination.STREAM_BATCH),
+        "records_type": chat.records_query(user_id, "heart", fields, None, pagination.STREAM_BATCH),
+        "recent_records": select(HR).where(HR.user_id == user_id).order_by(HR.timestamp.desc()).limit(50),
+    }
+
+
+def seed(engine: Engine, rows: int, users: int) -> None:
+    from backend import models
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    span = int(timedelta(days=730).total_seconds())
+
+    def when() -> datetime:
+        return start + timedelta(seconds=rng.randrange(span))
+
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"id": i, "username": f"bench{i}", "hashed_password": "x"} for i in range(1, users + 1)
+        ])
+    for offset in range(0, rows, CHUNK):
+        n = min(CHUNK, rows - offset)
+        with engine.begin() as conn:
+            conn.execute(insert(models.HealthRecord), [{
+                "user_id": rng.randint(1, users), "record_type": rng.choice(RECORD_TYPES),
+                "data": '{"age": 50}', "prediction": "Low Risk", "timestamp": when(),
+            } for _ in range(n)])
+            conn.execute(insert(models.ChatLog), [{
+                "user_id": rng.randint(1, users), "role": rng.choice(("user", "assistant")),
+                "content": "How is my blood pressure trending?", "timestamp": when(),
+            } for _ in range(n)])
+        print(f"\rSeeded {offset + n:,}/{rows:,} rows per table", end="", flush=True)
+    print()
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def plan(engine: Engine, statement) -> str:
+    compiled = statement.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            return "; ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}"))
+        lines = [row[0] for row in conn.exec_driver_sql(f"EXPLAIN {compiled}")]
+    return "; ".join(line.strip().split("  (")[0] for line in lines if "cost=" in line)
+
+
+def measure(engine: Engine, users: int, repeat: int) -> Dict[str, Dict[str, object]]:
+    rng = random.Random(7)
+    sample = [rng.randint(1, users) for _ in range(repeat)]
+    results = {}
+    for name in queries(1):
+        timings: List[float] = []
+        with engine.connect() as conn:
+            for user_id in sample:
+                t0 = time.perf_counter()
+                conn.execute(queries(user_id)[name]).fetchall()
+                timings.append((time.perf_counter() - t0) * 1000)
+        timings.sort()
+        results[name] = {
+            "p50": statistics.median(timings),
+            "p95": timings[int(len(timings) * 0.95) - 1],
+            "plan": plan(engine, queries(sample[0])[name]),
+        }
+    return results
+
+
+def main(rows: int, users: int, repeat: int, database_url: str) -> None:
+    from backend import migrations
+
+    logging.disable(logging.CRITICAL)
+    tmp = tempfile.TemporaryDirectory()
+    engine = create_engine(database_url or f"sqlite:///{os.path.join(tmp.name, 'timeline.db')}")
+    try:
+        migrations.upgrade(engine)
+        seed(engine, rows, users)
+        indexes = timeline_indexes()
+
+        with engine.begin() as conn:
+            for index in indexes:
+                index.drop(conn, checkfirst=True)
+            conn.execute(text("ANALYZE"))
+        without = measure(engine, users, repeat)
+
+        with engine.begin() as conn:
+            for index in indexes:
+                index.create(conn, checkfirst=True)
+            conn.execute(text("ANALYZE"))
+        with_ = measure(engine, users, repeat)
+
+        print(f"\n{engine.dialect.name}: {rows:,} rows per table, {users:,} users, {repeat} queries each")
+        print(f"{'query':<15} {'p50 ms before':>13} {'p50 ms after':>12} {'p95 ms before':>13} {'p95 ms after':>12}")
+        for name in without:
+            b, a = without[name], with_[name]
+            print(f"{name:<15} {b['p50']:>13.2f} {a['p50']:>12.2f} {b['p95']:>13.2f} {a['p95']:>12.2f}")
+        print("\nPlans (before -> after):")
+        for name in without:
+            print(f"  {name}:\n    {without[name]['plan']}\n    {with_[name]['plan']}")
+    finally:
+        engine.dispose()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Rows seeded into health_records and into chat_logs")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=30, help="Timed queries per query shape")
+    parser.add_argument("--database-url", help="Disposable database to seed (default: temporary SQLite file)")
+    args = parser.parse_args()
+    main(args.rows, args.users, args.repeat, args.database_url)
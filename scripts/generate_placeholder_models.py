@@ -1,23 +1,29 @@
 
 import pickle
 import os
+import sys
 import numpy as np
 import pandas as pd
 from sklearn.dummy import DummyClassifier
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
 
-# Define model paths
-BACKEND_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend")
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT_DIR)
+
+from backend.feature_schema import SCHEMAS
+
+# Define model paths (feature counts come from the schema registry)
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
 MODELS = {
-    "diabetes_model.pkl": {"type": "classifier", "classes": [0, 1], "features": 9},
-    "heart_disease_model.pkl": {"type": "classifier", "classes": [0, 1], "features": 11}, # Fixed: Backend expects int 0/1, not strings
-    "liver_disease_model.pkl": {"type": "classifier", "classes": [1, 2], "features": 10},
-    "liver_scaler.pkl": {"type": "scaler", "features": 10},
-    "kidney_model.pkl": {"type": "classifier", "classes": [0, 1], "features": 24}, # Fixed classes to 0/1 for consistency if needed, checking backend
-    "kidney_scaler.pkl": {"type": "scaler", "features": 24},
-    "lungs_model.pkl": {"type": "classifier", "classes": [0, 1], "features": 15}, # Backend expects 0/1 (Healthy/Respiratory Issue)
-    "lungs_scaler.pkl": {"type": "scaler", "features": 15},
+    "diabetes_model.pkl": {"type": "classifier", "classes": [0, 1], "schema": "diabetes"},
+    "heart_disease_model.pkl": {"type": "classifier", "classes": [0, 1], "schema": "heart"}, # Fixed: Backend expects int 0/1, not strings
+    "liver_disease_model.pkl": {"type": "classifier", "classes": [1, 2], "schema": "liver"},
+    "liver_scaler.pkl": {"type": "scaler", "schema": "liver"},
+    "kidney_model.pkl": {"type": "classifier", "classes": [0, 1], "schema": "kidney"}, # Fixed classes to 0/1 for consistency if needed, checking backend
+    "kidney_scaler.pkl": {"type": "scaler", "schema": "kidney"},
+    "lungs_model.pkl": {"type": "classifier", "classes": [0, 1], "schema": "lungs"}, # Backend expects 0/1 (Healthy/Respiratory Issue)
+    "lungs_scaler.pkl": {"type": "scaler", "schema": "lungs"},
 }
 
 def generate_placeholders():
@@ -38,7 +44,7 @@ def generate_placeholders():
         obj = None
         if config["type"] == "classifier":
             # Create a simple dummy classifier
-            n_features = config.get("features", 1)
+            n_features = len(SCHEMAS[config["schema"]].features)
             X = np.zeros((2, n_features)) # Create at least 2 samples to be safe
             y = np.array(config["classes"][:2]) if len(config["classes"]) >=2 else np.array([config["classes"][0]] * 2)
             # Ensure y matches X length
@@ -49,7 +55,7 @@ def generate_placeholders():
             obj = clf
             
         elif config["type"] == "scaler":
-            n_features = config.get("features", 1)
+            n_features = len(SCHEMAS[config["schema"]].features)
             scaler = StandardScaler()
             # Fit on zero array of correct shape
             scaler.fit(np.zeros((1, n_features)))
@@ -57,6 +63,8 @@ def generate_placeholders():
 
         with open(filepath, "wb") as f:
             pickle.dump(obj, f)
+        if config["type"] == "classifier":
+            SCHEMAS[config["schema"]].save(filepath)
         print(f"CREATED placeholder: {filename}")
 
 if __name__ == "__main__":
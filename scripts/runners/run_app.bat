@@ -9,6 +9,7 @@ echo.
 echo ========================================
 echo      Starting Backend Server...
 echo ========================================
+python -m backend.migrations upgrade
 start cmd /k "uvicorn backend.main:app --reload"
 
 echo.
@@ -8,6 +8,7 @@ for /f "tokens=5" %%a in ('netstat -aon ^| find ":8501" ^| find "LISTENING"') do
 for /f "tokens=5" %%a in ('netstat -aon ^| find ":8000" ^| find "LISTENING"') do taskkill /f /pid %%a >nul 2>&1
 
 echo [2/3] Starting Secure Backend API...
+python -m backend.migrations upgrade || exit /b 1
 start /B "Backend API" cmd /c "uvicorn backend.main:app --host 127.0.0.1 --port 8000 --no-server-header --log-level debug"
 
 echo Waiting for backend (Model Loading)...
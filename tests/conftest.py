@@ -1,3 +1,8 @@
+import os
+
+# The app lifespan migrates the test database instead of refusing to start
+os.environ.setdefault("DB_MIGRATE_ON_START", "true")
+
 import pytest
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
@@ -41,3 +46,11 @@ def client(db_session):
     with TestClient(app, base_url="http://localhost") as c:
         yield c
     app.dependency_overrides.clear()
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits():
+    """Rate-limit and tier-quota state is process-global; isolate each test."""
+    from backend import security, quotas
+    security.limiter.reset()
+    quotas.reset()
+    yield
@@ -58,7 +58,7 @@ def test_diabetes_prediction():
         "age": 45.0,
         "hypertension": 0,
         "heart_disease": 0,
-        "smoking_history": 3, # Former
+        "smoking_history": 1, # Former (0: No, 1: Yes)
         "bmi": 27.5,
         "high_chol": 1,
         "physical_activity": 1,
@@ -0,0 +1,144 @@
+"""
+Tests for materialized admin statistics (backend/stats.py): daily rollups,
+incremental refresh and the /admin/stats snapshot.
+"""
+import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, delete, event, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import admin, database, migrations, models, retention, stats
+
+TODAY = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None, hour=12, minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}", connect_args={"check_same_thread": False})
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{"id": i, "username": f"user{i}"} for i in (1, 2, 3)])
+        conn.execute(insert(models.HealthRecord.__table__), [
+            {"user_id": 1, "record_type": "heart", "data": "{}", "prediction": "x", "timestamp": TODAY - datetime.timedelta(days=40)},
+            {"user_id": 1, "record_type": "heart", "data": "{}", "prediction": "x", "timestamp": TODAY - datetime.timedelta(days=1)},
+            {"user_id": 2, "record_type": "liver", "data": "{}", "prediction": "x", "timestamp": TODAY - datetime.timedelta(days=1)},
+        ])
+        conn.execute(insert(models.ChatLog.__table__), [
+            {"user_id": 2, "role": "user", "content": "hi", "timestamp": TODAY - datetime.timedelta(days=1)},
+            {"user_id": 3, "role": "user", "content": "hi", "timestamp": TODAY},
+        ])
+    return engine
+
+
+@pytest.fixture
+def http(engine, monkeypatch):
+    sessions = sessionmaker(bind=engine)
+
+    def override_get_db():
+        with sessions() as db:
+            yield db
+
+    monkeypatch.setattr(stats, "service", stats.StatsService())
+    app = FastAPI()
+    app.include_router(admin.router)
+    app.dependency_overrides[database.get_db] = override_get_db
+    app.dependency_overrides[admin.get_current_admin] = lambda: models.User(id=99, username="admin")
+    return TestClient(app)
+
+
+def day(offset):
+    return (TODAY - datetime.timedelta(days=offset)).date().isoformat()
+
+
+def test_rollup_builds_daily_counters(engine):
+    with engine.begin() as conn:
+        stats.rollup(conn)
+        snapshot = stats.load(conn, days=30)
+
+    assert (snapshot["total_users"], snapshot["total_predictions"], snapshot["total_messages"]) == (3, 3, 2)
+    assert snapshot["predictions_by_disease"] == {"heart": 2, "liver": 1}
+    # The 40-day-old record counts in the totals but not in the daily window
+    assert snapshot["daily"] == [
+        {"day": day(1), "predictions": {"heart": 1, "liver": 1}, "chat_messages": 1, "active_users": 2},
+        {"day": day(0), "predictions": {}, "chat_messages": 1, "active_users": 1},
+    ]
+
+
+def test_endpoint_serves_the_snapshot_without_counting(http, engine):
+    first = http.get("/admin/stats").json()
+    assert (first["total_users"], first["total_predictions"], first["total_messages"]) == (3, 3, 2)
+    assert {"server_status", "database_status", "tier_usage", "as_of", "daily"} <= set(first)
+
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *a: statements.append(sql))
+    with engine.begin() as conn:
+        conn.execute(insert(models.ChatLog.__table__), [{"user_id": 1, "role": "user", "content": "new", "timestamp": TODAY}])
+    statements.clear()
+
+    second = http.get("/admin/stats").json()
+    assert statements == []  # Fresh snapshot: no SQL at all
+    assert second["total_messages"] == 2 and second["as_of"] == first["as_of"]
+
+
+def test_incremental_refresh_only_rewrites_recent_days(http, engine):
+    http.get("/admin/stats")
+    with engine.begin() as conn:
+        conn.execute(insert(models.HealthRecord.__table__), [
+            {"user_id": 3, "record_type": "kidney", "data": "{}", "prediction": "x", "timestamp": TODAY}])
+        # Deleting an old row is only picked up by the next full rollup
+        conn.execute(delete(models.HealthRecord.__table__).where(models.HealthRecord.__table__.c.timestamp < TODAY - datetime.timedelta(days=30)))
+
+    with engine.begin() as conn:
+        snapshot = stats.service.refresh(conn)
+        stored = conn.execute(select(models.DailyStat.__table__.c.day)).scalars().all()
+    assert snapshot["predictions_by_disease"] == {"heart": 2, "liver": 1, "kidney": 1}
+    assert min(stored) == (TODAY - datetime.timedelta(days=40)).date()
+
+    with engine.begin() as conn:
+        snapshot = stats.service.refresh(conn, full=True)
+    assert snapshot["predictions_by_disease"] == {"heart": 1, "liver": 1, "kidney": 1}
+    assert snapshot["total_predictions"] == 3
+
+
+def test_full_rollup_keeps_the_history_of_archived_days(engine, monkeypatch):
+    chat_logs = models.ChatLog.__table__
+    with engine.begin() as conn:
+        conn.execute(insert(chat_logs), [{"user_id": 1, "role": "user", "content": "old", "timestamp": TODAY - datetime.timedelta(days=40)}])
+        stats.rollup(conn)
+
+    # Retention moves the 40-day-old message to the archive
+    monkeypatch.setitem(retention.RETENTION_DAYS, "chat_logs", 30)
+    with engine.begin() as conn:
+        conn.execute(delete(chat_logs).where(chat_logs.c.timestamp < retention.cutoff(30)))
+        stats.rollup(conn)
+        stats.rollup(conn)  # Upserts over the rows it just wrote
+        snapshot = stats.load(conn, days=60)
+    assert snapshot["total_messages"] == 3
+    assert snapshot["daily"][0] == {"day": day(40), "predictions": {"heart": 1}, "chat_messages": 1, "active_users": 1}
+
+
+def test_stale_snapshot_is_refreshed_inline(http, engine, monkeypatch):
+    http.get("/admin/stats")
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{"id": 4, "username": "user4"}])
+
+    monkeypatch.setattr(stats.service, "_refreshed_at", stats.service._refreshed_at - 3 * stats.service.refresh_seconds)
+    assert http.get("/admin/stats").json()["total_users"] == 4
+
+
+def test_background_refresher(engine):
+    service = stats.StatsService(refresh_seconds=0.05)
+    service.start(engine)
+    try:
+        for _ in range(100):
+            if service.snapshot is not None:
+                break
+            service._stop.wait(0.05)
+        assert service.snapshot["total_predictions"] == 3
+    finally:
+        service.stop()
+        service._thread.join(timeout=5)
+    assert not service._thread.is_alive()
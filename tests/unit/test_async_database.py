@@ -0,0 +1,133 @@
+"""
+Tests for the async session layer (DB_ASYNC): async CRUD routes in auth.py,
+chat.py and admin.py, route replacement in main.py and pool metrics.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from backend import admin, auth, chat, database, metrics, models, stats
+from backend.main import include_crud_routes
+
+pytest.importorskip("aiosqlite")
+from sqlalchemy.ext.asyncio import async_sessionmaker  # noqa: E402
+
+
+@pytest.fixture
+def http(tmp_path, monkeypatch):
+    url = f"sqlite:///{tmp_path / 'async.db'}"
+    models.Base.metadata.create_all(bind=create_engine(url))
+    engine = database.create_async_db_engine(url)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def override_get_async_db():
+        async with sessions() as db:
+            yield db
+
+    monkeypatch.setattr(chat.rag, "add_checkup_to_db", lambda **kwargs: None)
+    monkeypatch.setattr(chat.rag, "delete_record_from_db", lambda record_id: None)
+    monkeypatch.setattr(stats, "service", stats.StatsService())
+    app = FastAPI()
+    for module in (auth, chat, admin):
+        app.include_router(module.async_router)
+    app.dependency_overrides[database.get_async_db] = override_get_async_db
+    # One client context = one event loop for the pooled aiosqlite connections
+    with TestClient(app) as client:
+        yield client
+
+
+def signup_body(username, password="secret123"):
+    return {"username": username, "password": password, "email": f"{username}@example.com", "full_name": username.title(), "dob": "1990-01-01"}
+
+
+def login(http, username, password="secret123"):
+    assert http.post("/signup", json=signup_body(username, password)).status_code == 200
+    token = http.post("/token", data={"username": username, "password": password}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_auth_profile_and_records_round_trip(http):
+    headers = login(http, "alice")
+    assert http.post("/signup", json=signup_body("alice")).status_code == 400
+    assert http.post("/token", data={"username": "alice", "password": "wrong1234"}).status_code == 401
+
+    assert http.put("/profile", json={"diet": "Keto", "allow_data_collection": False}, headers=headers).json()["user"]["diet"] == "Keto"
+    assert http.get("/profile", headers=headers).json()["allow_data_collection"] is False
+
+    for kind in ("heart", "liver"):
+        resp = http.post("/records", json={"record_type": kind, "data": {"age": 50}, "prediction": "Low Risk"}, headers=headers)
+        assert resp.status_code == 200
+    records = http.get("/records", headers=headers).json()
+    assert [r["record_type"] for r in records] == ["heart", "liver"]
+    assert [r["record_type"] for r in http.get("/records?record_type=liver", headers=headers).json()] == ["liver"]
+    page = http.get("/records?limit=1&fields=id,record_type", headers=headers)
+    assert page.json() == [{"id": records[0]["id"], "record_type": "heart"}]
+    assert http.get("/records", params={"limit": 1, "cursor": page.headers["X-Next-Cursor"]}, headers=headers).json()[0]["record_type"] == "liver"
+    trend = http.get("/records/trends?metrics=age", headers=headers).json()["metrics"]["age"]
+    assert [(p["count"], p["mean"]) for p in trend] == [(2, 50.0)]
+
+    assert http.delete(f"/records/{records[0]['id']}", headers=headers).status_code == 200
+    assert http.delete(f"/records/{records[0]['id']}", headers=headers).status_code == 404
+    assert len(http.get("/records", headers=headers).json()) == 1
+
+    assert http.get("/chat/history", headers=headers).json() == []
+    assert http.delete("/chat/history", headers=headers).json()["status"] == "success"
+
+
+def test_admin_routes(http):
+    user_headers = login(http, "bob")
+    admin_headers = login(http, "admin")
+    assert http.get("/admin/stats", headers=user_headers).status_code == 403
+
+    stats = http.get("/admin/stats", headers=admin_headers).json()
+    assert (stats["total_users"], stats["total_predictions"], stats["total_messages"]) == (2, 0, 0)
+    assert [u["username"] for u in http.get("/admin/users", headers=admin_headers).json()] == ["admin", "bob"]
+    first = http.get("/admin/users?limit=1&fields=username", headers=admin_headers)
+    assert first.json() == [{"username": "admin"}]
+    assert http.get("/admin/users", params={"cursor": first.headers["X-Next-Cursor"]}, headers=admin_headers).json()[0]["username"] == "bob"
+
+    bob_id = http.get("/users", headers=admin_headers).json()[0]["id"]
+    full = http.get(f"/users/{bob_id}/full", headers=admin_headers).json()
+    assert full["username"] == "bob" and full["health_records"] == []
+
+
+def operation(app, path, method):
+    return app.openapi()["paths"][path][method]["operationId"]
+
+
+def test_async_routes_replace_sync_crud_routes(monkeypatch):
+    monkeypatch.setattr(database, "ASYNC_DB", True)
+    app = FastAPI()
+    include_crud_routes(app, chat.router, chat.async_router)
+
+    assert operation(app, "/records", "get").startswith("get_health_records_async")
+    assert operation(app, "/chat", "post").startswith("chat_endpoint")  # Agent turn stays sync
+
+    monkeypatch.setattr(database, "ASYNC_DB", False)
+    app = FastAPI()
+    include_crud_routes(app, chat.router, chat.async_router)
+    assert operation(app, "/records", "get").startswith("get_health_records_")
+    assert not operation(app, "/records", "get").startswith("get_health_records_async")
+
+
+def test_async_url():
+    assert database.async_url("sqlite:///./healthcare.db") == "sqlite+aiosqlite:///./healthcare.db"
+    assert database.async_url("postgresql://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+
+
+def test_pool_records_checkout_waits_and_timeouts(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'pool.db'}", poolclass=database.TimedQueuePool,
+        pool_size=1, max_overflow=0, pool_timeout=0.05
+    )
+    waits = metrics.DB_POOL_CHECKOUT_WAIT.count(engine="sync")
+    timeouts = metrics.DB_POOL_TIMEOUTS.value(engine="sync")
+
+    with engine.connect():
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+
+    assert metrics.DB_POOL_CHECKOUT_WAIT.count(engine="sync") == waits + 2
+    assert metrics.DB_POOL_TIMEOUTS.value(engine="sync") == timeouts + 1
@@ -0,0 +1,149 @@
+"""
+Tests for the batched audit writer (backend/audit.py): size and interval
+flushes, the crash spool, retries, and the synchronous fallback.
+"""
+import os
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import audit, auth, database, migrations, models
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'audit.db'}", connect_args={"check_same_thread": False})
+    migrations.upgrade(engine)
+    return engine
+
+
+def count(engine):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(models.AuditLog.__table__)).scalar()
+
+
+def record_commits(engine):
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    return commits
+
+
+def test_events_are_written_in_one_transaction_per_batch(engine):
+    sink = audit.AuditSink(flush_size=10, flush_interval=60, spool_dir="")
+    sink.start(engine)
+    commits = record_commits(engine)
+    try:
+        for n in range(25):
+            sink.record(audit.event("LOGIN_SUCCESS", n, n))
+        deadline = time.time() + 5
+        while count(engine) < 20 and time.time() < deadline:
+            time.sleep(0.01)
+        assert count(engine) >= 20  # Two full batches, without waiting for the interval
+    finally:
+        sink.stop()
+    assert count(engine) == 25  # The rest on stop
+    assert len(commits) <= 3
+
+
+def test_interval_flushes_a_partial_batch(engine):
+    sink = audit.AuditSink(flush_size=100, flush_interval=0.05, spool_dir="")
+    sink.start(engine)
+    try:
+        sink.record(audit.event("VIEW_SENSITIVE_DATA", 2, 1, "Accessed full dossier"))
+        deadline = time.time() + 5
+        while not count(engine) and time.time() < deadline:
+            time.sleep(0.01)
+        assert count(engine) == 1
+    finally:
+        sink.stop()
+
+
+def test_spool_segments_are_removed_only_after_commit(engine, tmp_path):
+    spool = tmp_path / "spool"
+    sink = audit.AuditSink(flush_size=100, flush_interval=60, spool_dir=str(spool), fsync=False)
+    sink.engine = engine
+    sink._open_spool()
+    for n in range(3):
+        sink.record(audit.event("LOGIN_SUCCESS", n, n))
+    assert len((spool / f"audit-{sink.owner}.jsonl").read_text().splitlines()) == 3
+
+    # A failed flush keeps the events buffered and their segment on disk
+    sink.engine = create_engine(f"sqlite:///{tmp_path / 'missing' / 'x.db'}")
+    assert sink.flush() == 0
+    assert len(sink._buffer) == 3 and len(sink._segments) == 1
+    assert os.path.exists(sink._segments[0])
+
+    sink.engine = engine
+    assert sink.flush() == 3
+    assert count(engine) == 3
+    assert sorted(os.listdir(spool)) == [f"audit-{sink.owner}.jsonl"]
+
+
+def test_orphaned_spools_are_replayed_even_when_the_pid_is_reused(engine, tmp_path):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    lines = [audit._dumps(audit.event("LOGIN_SUCCESS", n, n)) for n in range(5)]
+    (spool / "audit-999999999.jsonl").write_text("\n".join(lines[:3]) + "\n")
+    (spool / "audit-999999999.jsonl.1.flushing").write_text(lines[3] + "\n")
+    # A crashed worker whose pid this process now has (containers restart with the same pids)
+    crashed = f"{os.getpid()}-0badc0de"
+    (spool / f"audit-{crashed}.jsonl").write_text(lines[4] + "\n")
+    (spool / f"audit-{crashed}.lock").write_text("")
+
+    sink = audit.AuditSink(spool_dir=str(spool))
+    sink.start(engine)
+    try:
+        assert count(engine) == 5
+        assert sorted(os.listdir(spool)) == sorted([f"audit-{sink.owner}.jsonl", f"audit-{sink.owner}.lock"])
+        sink.record(audit.event("LOGIN_SUCCESS"))
+        # Another worker's replay leaves a running owner's spool alone
+        other = audit.AuditSink(spool_dir=str(spool))
+        other.engine = engine
+        assert other.replay_orphans() == 0
+    finally:
+        sink.stop()
+    assert count(engine) == 6
+    assert os.listdir(spool) == []
+
+
+def test_record_writes_through_the_session_until_the_sink_starts(engine, monkeypatch):
+    monkeypatch.setattr(audit, "sink", audit.AuditSink())
+    with sessionmaker(bind=engine)() as db:
+        audit.record(db, "VIEW_SENSITIVE_DATA", target_user_id=2, admin_id=1)
+    assert count(engine) == 1
+
+    db = MagicMock()
+    db.commit.side_effect = Exception("DB Down")
+    audit.record(db, "LOGIN_SUCCESS")  # Logged, never raised
+
+
+def test_login_does_not_commit_on_the_request_path(engine, monkeypatch):
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db:
+        db.add(models.User(username="alice", hashed_password=auth.get_password_hash("secret")))
+        db.commit()
+    sink = audit.AuditSink(flush_size=100, flush_interval=60, spool_dir="")
+    monkeypatch.setattr(audit, "sink", sink)
+    sink.start(engine)
+
+    def override_get_db():
+        with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(auth.router)
+    app.dependency_overrides[database.get_db] = override_get_db
+    commits = record_commits(engine)
+    try:
+        resp = TestClient(app).post("/token", data={"username": "alice", "password": "secret"})
+        assert resp.status_code == 200 and "access_token" in resp.json()
+        assert not commits and count(engine) == 0
+    finally:
+        sink.stop()
+    with sessions() as db:
+        assert [e.action for e in db.query(models.AuditLog)] == ["LOGIN_SUCCESS"]
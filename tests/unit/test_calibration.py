@@ -0,0 +1,207 @@
+"""
+Tests for probability calibration (backend/calibration.py) and the risk-score
+fields / per-account thresholds on the prediction endpoints.
+"""
+import json
+
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import auth, database, models, prediction
+from backend.calibration import Calibrator, calibration_path, fit, fit_model, load_calibration, positive_column
+from backend.model_registry import ModelBundle, ModelRegistry
+
+DIABETES = {
+    "gender": 1, "age": 50, "hypertension": 0, "heart_disease": 0,
+    "smoking_history": 1, "bmi": 25.0, "high_chol": 0,
+    "physical_activity": 1, "general_health": 2
+}
+
+
+class ProbaModel:
+    """Binary classifier with a fixed positive-class probability."""
+    classes_ = np.array([0, 1])
+
+    def __init__(self, p):
+        self.p = p
+        self.calls = []
+
+    def predict(self, X):
+        self.calls.append("predict")
+        return np.array([int(self.p >= 0.5)] * len(X))
+
+    def predict_proba(self, X):
+        self.calls.append("predict_proba")
+        return np.array([[1 - self.p, self.p]] * len(X))
+
+
+class ReversedProbaModel(ProbaModel):
+    """Same classifier with classes_ in the opposite order (positive class first)."""
+    classes_ = np.array([1, 0])
+
+    def predict_proba(self, X):
+        self.calls.append("predict_proba")
+        return np.array([[self.p, 1 - self.p]] * len(X))
+
+
+class MulticlassModel(ProbaModel):
+    classes_ = np.array([0, 1, 2])
+
+    def predict(self, X):
+        self.calls.append("predict")
+        return np.array([2] * len(X))
+
+    def predict_proba(self, X):
+        self.calls.append("predict_proba")
+        return np.array([[0.1, 0.2, 0.7]] * len(X))
+
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    monkeypatch.setattr(prediction, "registry", ModelRegistry())
+    monkeypatch.setattr(prediction, "model_status", {n: {"state": "pending"} for n in prediction.MODEL_FILES})
+
+
+def client():
+    app = FastAPI()
+    app.include_router(prediction.router)
+    return app, TestClient(app)
+
+
+@pytest.mark.parametrize("method", ["platt", "isotonic"])
+def test_fit_improves_miscalibrated_scores(method):
+    rng = np.random.default_rng(0)
+    true_p = rng.uniform(0, 1, 4000)
+    labels = (rng.uniform(0, 1, 4000) < true_p).astype(int)
+    scores = true_p ** 3  # systematically under-confident
+
+    calibrator = fit(scores, labels, method)
+    calibrated = np.array([calibrator.apply(s) for s in scores])
+
+    assert calibrator.method == method
+    assert np.mean((calibrated - labels) ** 2) < np.mean((scores - labels) ** 2)
+    assert 0.0 <= calibrated.min() and calibrated.max() <= 1.0
+
+
+def test_method_follows_dataset_size():
+    assert fit([0.1, 0.9] * 10, [0, 1] * 10).method == "platt"
+    assert fit([0.1, 0.9] * 500, [0, 1] * 500).method == "isotonic"
+
+
+def test_calibration_sidecar_round_trip(tmp_path):
+    model_path = str(tmp_path / "heart_disease_model.pkl")
+    calibrator = Calibrator("isotonic", {"x": [0.0, 1.0], "y": [0.2, 0.8]})
+    assert calibrator.save(model_path) == calibration_path(model_path)
+    assert load_calibration(model_path) == calibrator
+    assert load_calibration(str(tmp_path / "missing.pkl")) is None
+    assert load_calibration(model_path).apply(0.5) == pytest.approx(0.5)
+
+
+def test_classify_makes_one_probability_call_and_applies_threshold():
+    model = ProbaModel(0.3)
+    bundle = ModelBundle("heart", "v1", model)
+    X = np.zeros((1, 11))
+
+    assert prediction.classify("heart", bundle, X, 0.5) == (0, pytest.approx(0.3))
+    assert prediction.classify("heart", bundle, X, 0.25) == (1, pytest.approx(0.3))
+    assert model.calls == ["predict_proba", "predict_proba"]
+
+
+def test_positive_column_is_read_from_classes():
+    assert positive_column([0, 1]) == 1
+    assert positive_column([1, 0]) == 0
+    assert positive_column([1, 2]) == 0  # ILPD-style 1 = disease, 2 = healthy
+    assert positive_column([0, 1, 2]) is None
+    assert positive_column(["NO", "YES"]) is None
+
+
+def test_classify_uses_the_positive_column_not_the_second():
+    model = ReversedProbaModel(0.8)
+    bundle = ModelBundle("heart", "v1", model)
+    assert prediction.classify("heart", bundle, np.zeros((1, 11)), 0.5) == (1, pytest.approx(0.8))
+    assert prediction.classify("heart", bundle, np.zeros((1, 11)), 0.9) == (0, pytest.approx(0.8))
+
+
+def test_multiclass_model_keeps_its_hard_label():
+    model = MulticlassModel(0.0)
+    bundle = ModelBundle("diabetes", "v1", model, calibrator=Calibrator("platt", {"a": 0.0, "b": 2.0}))
+    assert prediction.classify("diabetes", bundle, np.zeros((1, 9)), 0.5) == (2, None)
+    assert model.calls == ["predict"]
+
+
+def test_fit_model_binarizes_labels_and_rejects_multiclass():
+    rng = np.random.default_rng(1)
+    X = rng.uniform(0, 1, (200, 1))
+    y = np.where(rng.uniform(0, 1, 200) < X[:, 0], 1, 2)  # 1 = positive, listed first in classes_
+
+    class Model:
+        classes_ = np.array([1, 2])
+
+        def predict_proba(self, X):
+            return np.column_stack([X[:, 0], 1 - X[:, 0]])
+
+    calibrator = fit_model(Model(), X, y)
+    assert calibrator.apply(0.9) > calibrator.apply(0.1)  # Rising with the positive-class score
+    with pytest.raises(ValueError, match="binary"):
+        fit_model(MulticlassModel(0.0), X, y)
+
+
+def test_calibrated_bundle_reports_calibrated_probability(fresh_registry):
+    calibrator = Calibrator("platt", {"a": 0.0, "b": 2.0})  # sigmoid(2) ~= 0.88 for any input
+    prediction.registry.publish(ModelBundle("diabetes", "v1", ProbaModel(0.2), calibrator=calibrator))
+    _, http = client()
+
+    body = http.post("/predict/diabetes", json=DIABETES).json()
+
+    assert body["raw"] == 1 and body["prediction"] == "High Risk"
+    assert body["probability"] == pytest.approx(0.8808, abs=1e-4)
+    assert body["calibrated"] is True and body["model_version"] == "v1"
+
+
+def test_account_threshold_overrides_default(fresh_registry):
+    prediction.registry.publish(ModelBundle("diabetes", "v1", ProbaModel(0.4)))
+    app, http = client()
+    user = models.User(username="clinic", risk_thresholds=json.dumps({"diabetes": 0.35}))
+
+    assert http.post("/predict/diabetes", json=DIABETES).json()["raw"] == 0
+
+    app.dependency_overrides[prediction.quotas.get_optional_user] = lambda: user
+    body = http.post("/predict/diabetes", json=DIABETES).json()
+    assert (body["raw"], body["threshold"]) == (1, 0.35)
+
+
+def test_malformed_account_thresholds_are_ignored():
+    user = models.User(username="x", risk_thresholds="not json")
+    assert prediction.resolve_threshold("heart", user) == prediction.DEFAULT_THRESHOLD
+
+
+class FakeSession:
+    def __init__(self):
+        self.commits = 0
+
+    def add(self, obj):
+        pass
+
+    def commit(self):
+        self.commits += 1
+
+
+def test_threshold_endpoints():
+    app, http = client()
+    user = models.User(username="clinic")
+    db = FakeSession()
+    app.dependency_overrides[auth.get_current_user] = lambda: user
+    app.dependency_overrides[database.get_db] = lambda: db
+
+    resp = http.put("/predict/thresholds/heart", json={"threshold": 0.3})
+    assert resp.status_code == 200 and resp.json()["heart"] == 0.3
+    assert json.loads(user.risk_thresholds) == {"heart": 0.3} and db.commits == 1
+    assert http.get("/predict/thresholds").json()["liver"] == prediction.DEFAULT_THRESHOLD
+
+    assert http.put("/predict/thresholds/heart", json={"threshold": None}).json()["heart"] == prediction.DEFAULT_THRESHOLD
+    assert user.risk_thresholds is None
+
+    assert http.put("/predict/thresholds/spleen", json={"threshold": 0.3}).status_code == 404
+    assert http.put("/predict/thresholds/heart", json={"threshold": 1.5}).status_code == 422
@@ -0,0 +1,104 @@
+"""
+Tests for turn-level chat persistence (backend/chat_store.py): one INSERT and
+one commit per turn, and optional group commit across concurrent requests.
+"""
+import datetime
+import threading
+from unittest.mock import MagicMock, patch
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend import chat, chat_store, migrations, models
+
+NOW = datetime.datetime(2024, 1, 1, 12)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'chat.db'}", connect_args={"check_same_thread": False})
+    migrations.upgrade(engine)
+    with sessionmaker(bind=engine)() as db:
+        db.add(models.User(id=1, username="alice", hashed_password="x", allow_data_collection=True))
+        db.commit()
+    return engine
+
+
+def record_statements(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *a: statements.append(sql.split()[0].upper()))
+    event.listen(engine, "commit", lambda conn: statements.append("COMMIT"))
+    return statements
+
+
+def test_chat_turn_is_one_insert_and_one_commit(engine):
+    db = sessionmaker(bind=engine)()
+    user = db.get(models.User, 1)
+    statements = record_statements(engine)
+    indexed = []
+
+    with patch("backend.chat.agent.medical_agent.invoke", return_value={"messages": [MagicMock(content="Drink water.")]}), \
+            patch.object(chat.rag, "search_similar_records", return_value=[]), \
+            patch.object(chat.rag, "add_interactions_to_db", lambda user_id, items: indexed.extend(items)):
+        assert chat.chat_endpoint(chat.ChatRequest(message="Tips?"), current_user=user, db=db) == {"response": "Drink water."}
+
+    writes = [s for s in statements if s != "SELECT"]
+    assert writes == ["INSERT", "COMMIT"]  # No per-message commit, no refresh
+    logs = db.query(models.ChatLog).order_by(models.ChatLog.id).all()
+    assert [(log.role, log.content) for log in logs] == [("user", "Tips?"), ("assistant", "Drink water.")]
+    assert [(i, role) for i, role, _, _ in indexed] == [(str(logs[0].id), "user"), (str(logs[1].id), "assistant")]
+    db.close()
+
+
+def test_agent_failure_still_saves_the_question(engine):
+    db = sessionmaker(bind=engine)()
+    with patch("backend.chat.agent.medical_agent.invoke", side_effect=Exception("Agent Down")), \
+            patch.object(chat.rag, "search_similar_records", return_value=[]), \
+            patch.object(chat.rag, "add_interactions_to_db"):
+        chat.chat_endpoint(chat.ChatRequest(message="Hi"), current_user=db.get(models.User, 1), db=db)
+    assert [log.role for log in db.query(models.ChatLog)] == ["user"]
+    db.close()
+
+
+def test_group_commit_shares_transactions(engine):
+    writer = chat_store.GroupCommitWriter(engine, window_ms=200, max_turns=8)
+    statements = record_statements(engine)
+    results = {}
+
+    def turn(n):
+        results[n] = writer.submit(chat_store.rows_for(1, [("user", f"q{n}", NOW), ("assistant", f"a{n}", NOW)]))
+
+    threads = [threading.Thread(target=turn, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    writer.stop()
+
+    assert statements.count("COMMIT") < 8
+    with sessionmaker(bind=engine)() as db:
+        content = {log.id: log.content for log in db.query(models.ChatLog)}
+    # Every turn got back the ids of its own two rows
+    assert all([content[i] for i in results[n]] == [f"q{n}", f"a{n}"] for n in range(8))
+
+
+def test_group_commit_failure_reaches_every_caller(engine):
+    writer = chat_store.GroupCommitWriter(engine, window_ms=1)
+    with pytest.raises(Exception):
+        writer.submit(chat_store.rows_for(1, [("user", "bad", "not a datetime")]))
+    assert writer.submit(chat_store.rows_for(1, [("user", "ok", NOW)]))  # Writer survives
+    writer.stop()
+
+
+def test_save_turn_uses_the_writer_when_started(engine, monkeypatch):
+    monkeypatch.setattr(chat_store, "_writer", None)
+    assert chat_store.start(engine, window_ms=0) is None
+    writer = chat_store.start(engine, window_ms=5)
+    try:
+        db = MagicMock()
+        ids = chat_store.save_turn(db, 1, [("user", "hello", NOW)])
+        assert len(ids) == 1 and not db.commit.called
+    finally:
+        chat_store.stop()
+    assert not writer._thread.is_alive()
@@ -0,0 +1,102 @@
+"""
+Tests for the declarative feature-schema registry (backend/feature_schema.py)
+and the load-time artifact validation built on it.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sklearn.dummy import DummyClassifier
+from sklearn.preprocessing import StandardScaler
+
+from backend import prediction, schemas
+from backend.feature_schema import SCHEMAS, DiseaseSchema, load_sidecar
+from backend.model_registry import ModelRegistry
+
+REQUEST_SCHEMAS = {
+    "diabetes": schemas.DiabetesInput,
+    "heart": schemas.HeartInput,
+    "liver": schemas.LiverInput,
+    "kidney": schemas.KidneyInput,
+    "lungs": schemas.LungInput,
+}
+
+
+@pytest.mark.parametrize("name", list(SCHEMAS))
+def test_schema_fields_exist_on_request_models(name):
+    fields = REQUEST_SCHEMAS[name].model_fields
+    assert set(SCHEMAS[name].input_fields) <= set(fields)
+    assert len(set(SCHEMAS[name].feature_names)) == len(SCHEMAS[name].features)
+
+
+def test_sidecar_round_trip(tmp_path):
+    model_path = tmp_path / "liver_disease_model.pkl"
+    SCHEMAS["liver"].save(str(model_path))
+    assert load_sidecar(str(model_path)) == SCHEMAS["liver"]
+    assert load_sidecar(str(tmp_path / "missing.pkl")) is None
+
+
+def classifier(n_features, columns=None):
+    X = pd.DataFrame(np.zeros((2, n_features)), columns=columns) if columns else np.zeros((2, n_features))
+    return DummyClassifier(strategy="constant", constant=0).fit(X, [0, 1])
+
+
+def test_validate_accepts_serving_or_training_column_names():
+    schema = SCHEMAS["diabetes"]
+    schema.validate_artifacts(classifier(9))
+    schema.validate_artifacts(classifier(9, schema.feature_names))
+    schema.validate_artifacts(classifier(9, schema.source_columns))
+
+
+def test_validate_rejects_mismatched_artifacts():
+    schema = SCHEMAS["liver"]
+    with pytest.raises(ValueError, match="expects 9 features"):
+        schema.validate_artifacts(classifier(9))
+
+    shuffled = list(reversed(schema.feature_names))
+    with pytest.raises(ValueError, match="fitted on columns"):
+        schema.validate_artifacts(classifier(10), StandardScaler().fit(pd.DataFrame(np.zeros((2, 10)), columns=shuffled)))
+
+    reordered = DiseaseSchema("liver", tuple(reversed(schema.features)))
+    with pytest.raises(ValueError, match="does not match"):
+        schema.validate_artifacts(classifier(10), sidecar=reordered)
+
+
+def test_load_rejects_model_with_wrong_column_count(monkeypatch):
+    monkeypatch.setattr(prediction, "registry", ModelRegistry())
+    monkeypatch.setattr(prediction, "model_status", {n: {"state": "pending"} for n in prediction.MODEL_FILES})
+    monkeypatch.setattr(prediction, "load_pkl", lambda names, fallback_class=None: classifier(5))
+
+    status = prediction.load_disease("heart")
+
+    assert status["state"] == "failed"
+    assert "expects 5 features" in status["error"]
+
+
+def test_schemas_endpoint():
+    app = FastAPI()
+    app.include_router(prediction.router)
+    body = TestClient(app).get("/predict/schemas").json()
+    assert set(body) == set(SCHEMAS)
+    age = next(f for f in body["diabetes"]["features"] if f["name"] == "AgeBucket")
+    assert (age["field"], age["encoder"], age["min"], age["max"]) == ("age", "age_bucket", 1, 13)
+
+
+@pytest.mark.parametrize("name", list(SCHEMAS))
+def test_request_models_enforce_registry_ranges(name):
+    # Encoded columns (AgeBucket) are bounded after encoding, not on the raw field
+    expected = {f.field: (f.min, f.max) for f in SCHEMAS[name].features if not f.encoder}
+    assert REQUEST_SCHEMAS[name].ranges == expected
+
+
+def test_out_of_range_value_is_rejected_with_its_field_name():
+    app = FastAPI()
+    app.include_router(prediction.router)
+    payload = {"age": 45, "gender": 1, "total_bilirubin": 1.0, "direct_bilirubin": 0.5, "alkaline_phosphotase": 100,
+               "alamine_aminotransferase": 30, "aspartate_aminotransferase": 30, "total_proteins": 6.0,
+               "albumin": 35.0, "albumin_and_globulin_ratio": 1.0}
+    resp = TestClient(app).post("/predict/liver", json=payload)
+    assert resp.status_code == 422
+    [error] = resp.json()["detail"]
+    assert error["loc"] == ["body", "albumin"] and "between 0 and 10" in error["msg"]
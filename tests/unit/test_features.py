@@ -0,0 +1,106 @@
+"""
+Parity tests: compiled feature pipelines (backend/features.py) must produce the
+same model input as the previous per-request DataFrame path.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+
+from backend import prediction, schemas
+from backend.feature_schema import get_age_bucket
+from backend.prediction import FEATURE_NAMES, LOG1P_FEATURES, PIPELINES
+
+# Feature lists exactly as the endpoints built them before the pipelines
+LEGACY_INPUTS = {
+    "diabetes": lambda d: [d.hypertension, d.high_chol, d.bmi, d.smoking_history, d.heart_disease,
+                           d.physical_activity, d.general_health, d.gender, get_age_bucket(d.age)],
+    "heart": lambda d: [d.high_bp, d.high_chol, d.bmi, d.smoker, d.stroke, d.diabetes, d.phys_activity,
+                        d.hvy_alcohol, d.gen_hlth, d.gender, get_age_bucket(d.age)],
+    "liver": lambda d: [d.age, d.gender, d.total_bilirubin, d.direct_bilirubin, d.alkaline_phosphotase,
+                        d.alamine_aminotransferase, d.aspartate_aminotransferase, d.total_proteins,
+                        d.albumin, d.albumin_and_globulin_ratio],
+    "kidney": lambda d: [d.age, d.bp, d.sg, d.al, d.su, d.rbc, d.pc, d.pcc, d.ba, d.bgr, d.bu, d.sc, d.sod,
+                         d.pot, d.hemo, d.pcv, d.wc, d.rc, d.htn, d.dm, d.cad, d.appet, d.pe, d.ane],
+    "lungs": lambda d: [d.gender, d.age, d.smoking, d.yellow_fingers, d.anxiety, d.peer_pressure,
+                        d.chronic_disease, d.fatigue, d.allergy, d.wheezing, d.alcohol, d.coughing,
+                        d.shortness_of_breath, d.swallowing_difficulty, d.chest_pain],
+}
+
+SCHEMAS = {
+    "diabetes": schemas.DiabetesInput,
+    "heart": schemas.HeartInput,
+    "liver": schemas.LiverInput,
+    "kidney": schemas.KidneyInput,
+    "lungs": schemas.LungInput,
+}
+
+
+def random_value(info, bounds, rng):
+    if info.annotation is int:
+        low, high = bounds or (0, 2)
+        return int(rng.integers(low, high + 1))
+    low, high = bounds or (0.1, 90)
+    return float(rng.uniform(low, high))
+
+
+def random_input(name, rng):
+    schema = SCHEMAS[name]
+    return schema(**{field: random_value(info, schema.ranges.get(field), rng) for field, info in schema.model_fields.items()})
+
+
+def legacy_transform(name, data, scaler):
+    df = pd.DataFrame([LEGACY_INPUTS[name](data)], columns=FEATURE_NAMES[name])
+    for col in LOG1P_FEATURES.get(name, ()):
+        df[col] = np.log1p(df[col])
+    return scaler.transform(df) if scaler is not None else df.to_numpy(dtype=np.float64)
+
+
+def fitted(scaler_class, name, rng):
+    columns = FEATURE_NAMES[name]
+    return scaler_class().fit(pd.DataFrame(rng.uniform(0, 50, (200, len(columns))), columns=columns))
+
+
+@pytest.mark.parametrize("name", list(FEATURE_NAMES))
+def test_folded_pipeline_matches_dataframe_path(name):
+    rng = np.random.default_rng(7)
+    scaler = fitted(StandardScaler, name, rng) if name in ("liver", "kidney", "lungs") else None
+    pipeline = PIPELINES[name].with_scaler(scaler)
+    assert pipeline.folded == (scaler is not None)
+
+    for _ in range(25):
+        data = random_input(name, rng)
+        np.testing.assert_allclose(pipeline.transform(data), legacy_transform(name, data, scaler), rtol=1e-12, atol=1e-12)
+
+
+def test_unfoldable_scaler_is_applied_directly():
+    rng = np.random.default_rng(3)
+    scaler = fitted(MinMaxScaler, "liver", rng)
+    pipeline = PIPELINES["liver"].with_scaler(scaler)
+    assert not pipeline.folded
+
+    data = random_input("liver", rng)
+    np.testing.assert_allclose(pipeline.transform(data), legacy_transform("liver", data, scaler))
+
+
+def test_bundles_compile_pipeline_against_their_scaler(monkeypatch):
+    scaler = fitted(StandardScaler, "kidney", np.random.default_rng(1))
+    monkeypatch.setattr(prediction, "load_pkl", lambda names, fallback_class=None: scaler if "scaler" in names[0] else None)
+    bundle = prediction.build_bundle("kidney")
+    assert bundle.pipeline.scaler is scaler and bundle.pipeline.folded
+
+
+@pytest.mark.parametrize("scaler_class", [StandardScaler, MinMaxScaler])
+def test_scaler_fitted_on_training_column_names(scaler_class):
+    # mlops/model_training.py fits the liver scaler on the lowercase source columns
+    from backend.feature_schema import SCHEMAS as FEATURE_SCHEMAS
+    rng = np.random.default_rng(5)
+    source = FEATURE_SCHEMAS["liver"].source_columns
+    scaler = scaler_class().fit(pd.DataFrame(rng.uniform(0, 50, (200, len(source))), columns=source))
+    FEATURE_SCHEMAS["liver"].validate_artifacts(None, scaler)
+
+    pipeline = PIPELINES["liver"].with_scaler(scaler)
+    assert pipeline.folded == (scaler_class is StandardScaler)
+    data = random_input("liver", rng)
+    expected = legacy_transform("liver", data, None)
+    np.testing.assert_allclose(pipeline.transform(data), scaler.transform(pd.DataFrame(expected, columns=source)))
@@ -0,0 +1,127 @@
+"""
+Tests for backend/logging_config.py: JSON records, request-ID propagation,
+sampling and the queue-based pipeline with size-based rotation.
+"""
+import json
+import logging
+import logging.handlers
+import os
+from unittest.mock import patch
+
+import pytest
+
+from backend import logging_config
+from backend.logging_config import JsonFormatter, RequestIdFilter, request_id_var
+
+
+def make_record(msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("backend.test", logging.INFO, __file__, 10, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_json_formatter_includes_extra_fields():
+    record = make_record(status=200, latency_ms=1.5)
+    RequestIdFilter().filter(record)
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload["msg"] == "hello world"
+    assert payload["level"] == "INFO"
+    assert payload["status"] == 200
+    assert payload["latency_ms"] == 1.5
+    assert payload["request_id"] == "-"
+
+
+def test_request_id_filter_reads_context():
+    token = request_id_var.set("req-123")
+    try:
+        record = make_record()
+        RequestIdFilter().filter(record)
+        assert record.request_id == "req-123"
+    finally:
+        request_id_var.reset(token)
+
+
+def test_sampling_respects_rate():
+    with patch.object(logging_config, "SAMPLE_RATE", 1.0):
+        assert logging_config.should_log_success() is True
+    with patch.object(logging_config, "SAMPLE_RATE", 0.0):
+        assert logging_config.should_log_success() is False
+
+
+def test_queue_pipeline_writes_rotating_json_file(tmp_path, monkeypatch):
+    log_file = tmp_path / "app.log"
+    monkeypatch.setenv("LOG_FILE", str(log_file))
+    monkeypatch.setenv("LOG_MAX_BYTES", "2000")
+    monkeypatch.setenv("LOG_BACKUP_COUNT", "2")
+
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    saved_listener = logging_config._listener
+    logging_config._listener = None
+    try:
+        listener = logging_config.configure_logging()
+        assert isinstance(root.handlers[0], logging.handlers.QueueHandler)
+
+        token = request_id_var.set("abc")
+        for i in range(50):
+            logging.getLogger("backend.test").info("line %d", i, extra={"n": i})
+        request_id_var.reset(token)
+        listener.stop()
+
+        first = json.loads(log_file.read_text().splitlines()[0])
+        assert first["request_id"] == "abc"
+        assert "n" in first
+        assert (tmp_path / "app.log.1").exists()
+    finally:
+        root.handlers, root.level = saved_handlers, saved_level
+        logging_config._listener = saved_listener
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork()")
+def test_forked_worker_gets_its_own_listener(tmp_path, monkeypatch):
+    # gunicorn preload_app configures logging in the master, then forks
+    log_file = tmp_path / "app.log"
+    monkeypatch.setenv("LOG_FILE", str(log_file))
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    saved_listener = logging_config._listener
+    logging_config._listener = None
+    try:
+        logging_config.configure_logging()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                logging.getLogger("backend.test").info("from worker")
+                logging_config.shutdown_logging()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        logging_config.shutdown_logging()
+        assert [json.loads(line)["msg"] for line in log_file.read_text().splitlines()] == ["from worker"]
+    finally:
+        root.handlers, root.level = saved_handlers, saved_level
+        logging_config._listener = saved_listener
+
+
+def test_exception_traceback_survives_the_queue(tmp_path, monkeypatch):
+    log_file = tmp_path / "app.log"
+    monkeypatch.setenv("LOG_FILE", str(log_file))
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    saved_listener = logging_config._listener
+    logging_config._listener = None
+    try:
+        listener = logging_config.configure_logging()
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logging.getLogger("backend.test").exception("boom %s", "here")
+        listener.stop()
+
+        payload = json.loads(log_file.read_text().splitlines()[0])
+        assert payload["msg"] == "boom here"
+        assert "Traceback" in payload["exc"] and "ZeroDivisionError" in payload["exc"]
+    finally:
+        root.handlers, root.level = saved_handlers, saved_level
+        logging_config._listener = saved_listener
@@ -0,0 +1,74 @@
+"""
+Tests for structured health measurements (backend/measurements.py): extraction,
+population on write, cascade on delete and the migration backfill.
+"""
+import datetime
+import json
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, event, func, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from backend import chat, measurements, migrations, models
+
+
+def sqlite_engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'measurements.db'}")
+
+
+def test_numeric_values():
+    data = {"bmi": 31.5, "age": 50, "smoker": True, "albumin": "4.1", "gender": "Male",
+            "notes": {"nested": 1}, "hba1c": float("nan"), "hypertension": False}
+    assert measurements.numeric_values(data) == {"bmi": 31.5, "age": 50.0, "smoker": 1.0, "albumin": 4.1, "hypertension": 0.0}
+    assert measurements.parse_data("not json") == {}
+    assert measurements.parse_data(None) == {}
+
+
+def test_saving_and_deleting_a_record_maintains_measurements(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    migrations.upgrade(engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(username="alice", hashed_password="x")
+    db.add(user)
+    db.commit()
+
+    with patch.object(chat.rag, "add_checkup_to_db"), patch.object(chat.rag, "delete_record_from_db"):
+        chat.save_health_record(chat.RecordCreate(record_type="liver", data={"age": 45, "total_bilirubin": 1.2, "gender": "Male"},
+                                                  prediction="Healthy"), current_user=user, db=db)
+        record = db.query(models.HealthRecord).one()
+        rows = db.query(models.Measurement).order_by(models.Measurement.name).all()
+
+        assert [(m.name, m.value) for m in rows] == [("age", 45.0), ("total_bilirubin", 1.2)]
+        assert {(m.record_id, m.user_id, m.record_type, m.timestamp) for m in rows} == {
+            (record.id, user.id, "liver", record.timestamp)
+        }
+
+        chat.delete_health_record(record.id, current_user=user, db=db)
+    assert db.query(models.Measurement).count() == 0
+    db.close()
+
+
+def test_migration_backfills_existing_records_in_batches(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    migrations.upgrade(engine, target=6)
+    when = datetime.datetime(2024, 5, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{"id": 1, "username": "legacy"}])
+        conn.execute(insert(models.HealthRecord.__table__), [
+            {"user_id": 1, "record_type": "heart", "data": json.dumps({"bmi": 20 + i, "gen_hlth": 3}), "prediction": "x", "timestamp": when}
+            for i in range(7)
+        ] + [{"user_id": 1, "record_type": "heart", "data": "{broken", "prediction": "x", "timestamp": when}])
+
+    commits = []
+    event.listen(engine, "commit", lambda conn: commits.append(1))
+    with patch.object(measurements, "BACKFILL_BATCH", 3):
+        assert migrations.upgrade(engine, target=7) == [7]
+    assert len(commits) >= 4  # The schema step, then one per batch of 3 records
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.Measurement.__table__)).scalar() == 14
+        # Aggregates now run in SQL
+        avg_bmi = conn.execute(select(func.avg(models.Measurement.value)).where(
+            models.Measurement.user_id == 1, models.Measurement.name == "bmi")).scalar()
+        assert avg_bmi == 23.0
+    assert measurements.backfill(engine, batch_size=2) == 0
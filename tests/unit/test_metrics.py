@@ -0,0 +1,74 @@
+"""
+Tests for backend/metrics.py: registry primitives, exposition format and
+the instrumentation hooks wired into the app.
+"""
+import pytest
+import numpy as np
+from unittest.mock import MagicMock
+from fastapi.testclient import TestClient
+
+from backend import metrics, prediction
+from backend.metrics import Registry
+from backend.main import app
+
+
+def test_counter_and_labels():
+    registry = Registry()
+    c = registry.counter("demo_events", "Demo.", ("kind",))
+    c.inc(kind="a")
+    c.inc(2, kind="a")
+    c.inc(kind="b")
+    assert c.value(kind="a") == 3
+    text = registry.render()
+    assert "# TYPE demo_events counter" in text
+    assert 'demo_events_total{kind="a"} 3.0' in text
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    h = registry.histogram("demo_seconds", "Demo.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        h.observe(value)
+    text = registry.render()
+    assert 'demo_seconds_bucket{le="0.1"} 1.0' in text
+    assert 'demo_seconds_bucket{le="1.0"} 2.0' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 3.0' in text
+    assert "demo_seconds_count 3.0" in text
+    assert h.count() == 3
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    c = registry.counter("demo_escape", "Demo.", ("path",))
+    c.inc(path='a"b')
+    assert 'path="a\\"b"' in registry.render()
+
+
+def test_track_counts_errors():
+    registry = Registry()
+    h = registry.histogram("demo_call_seconds", "Demo.", ("caller",))
+    errors = registry.counter("demo_call_errors", "Demo.", ("caller",))
+    with pytest.raises(ValueError):
+        with metrics.track(h, errors, caller="x"):
+            raise ValueError("boom")
+    assert errors.value(caller="x") == 1
+    assert h.count(caller="x") == 1
+
+
+def test_run_model_records_inference_metrics():
+    model = MagicMock()
+    model.predict.return_value = np.array([0, 1, 0])
+    before = metrics.MODEL_INFERENCE_LATENCY.count(model="unit-test")
+    prediction.run_model("unit-test", model, np.zeros((3, 2)))
+    assert metrics.MODEL_INFERENCE_LATENCY.count(model="unit-test") == before + 1
+    assert metrics.MODEL_BATCH_SIZE.count(model="unit-test") >= 1
+
+
+def test_metrics_endpoint_reports_route_templates():
+    client = TestClient(app, base_url="http://localhost")
+    client.get("/healthz")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/healthz",status="200"' in resp.text
+    assert "# TYPE db_pool_checkout_wait_seconds histogram" in resp.text
@@ -0,0 +1,105 @@
+"""
+Tests for the pure ASGI middleware in backend/middleware.py.
+"""
+import asyncio
+import logging
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from backend.middleware import RequestContextMiddleware, RateLimitMiddleware
+from backend.security import RateLimiter
+
+
+def build_app(catch_exceptions=True, limiter=None):
+    app = FastAPI()
+
+    @app.get("/ok")
+    def ok():
+        return {"ok": True}
+
+    @app.get("/boom")
+    def boom():
+        raise ValueError("kaboom")
+
+    @app.get("/stream")
+    async def stream():
+        async def chunks():
+            for i in range(3):
+                yield f"data: {i}\n\n"
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    if limiter is not None:
+        app.add_middleware(RateLimitMiddleware, limiter=limiter)
+    app.add_middleware(RequestContextMiddleware, catch_exceptions=catch_exceptions)
+    return app
+
+
+def test_adds_security_and_tracing_headers():
+    resp = TestClient(build_app()).get("/ok")
+    assert resp.status_code == 200
+    assert resp.headers["X-Frame-Options"] == "DENY"
+    assert resp.headers["X-Content-Type-Options"] == "nosniff"
+    assert "X-Request-ID" in resp.headers
+    assert float(resp.headers["X-Process-Time"]) >= 0
+
+
+def test_unhandled_exception_returns_reference_id():
+    client = TestClient(build_app(catch_exceptions=True), raise_server_exceptions=False)
+    resp = client.get("/boom")
+    assert resp.status_code == 500
+    assert "Reference ID" in resp.json()["detail"]
+    assert resp.headers["X-Frame-Options"] == "DENY"
+
+
+def test_unhandled_exception_is_logged_once_with_traceback(caplog):
+    client = TestClient(build_app(catch_exceptions=True), raise_server_exceptions=False)
+    with caplog.at_level(logging.INFO, logger="backend.middleware"):
+        resp = client.get("/boom")
+    records = [r for r in caplog.records if r.name == "backend.middleware"]
+    assert len(records) == 1  # No extra traceback lines, no "Request Completed" for the synthetic 500
+    record = records[0]
+    assert record.levelno == logging.ERROR and record.exc_info[0] is ValueError
+    assert record.error_id in resp.json()["detail"] and record.status == 500
+
+
+def test_exceptions_propagate_when_catch_disabled():
+    client = TestClient(build_app(catch_exceptions=False))
+    try:
+        client.get("/boom")
+        assert False, "Exception should propagate"
+    except ValueError:
+        pass
+
+
+def test_streaming_response_is_not_buffered():
+    """Each chunk must reach the server as its own body message."""
+    app = build_app()
+    messages = []
+    scope = {
+        "type": "http", "asgi": {"version": "3.0", "spec_version": "2.4"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/stream", "raw_path": b"/stream",
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"localhost")],
+        "client": ("127.0.0.1", 1), "server": ("localhost", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    chunks = [m["body"] for m in messages if m["type"] == "http.response.body" and m.get("body")]
+    assert chunks == [b"data: 0\n\n", b"data: 1\n\n", b"data: 2\n\n"]
+
+
+def test_rate_limit_middleware_rejects_with_retry_after():
+    limiter = RateLimiter(requests_per_minute=1, route_quotas={})
+    client = TestClient(build_app(limiter=limiter))
+    assert client.get("/ok").status_code == 200
+    resp = client.get("/ok")
+    assert resp.status_code == 429
+    assert "Retry-After" in resp.headers
+    # 429 still carries the security headers from the outer middleware
+    assert resp.headers["X-Frame-Options"] == "DENY"
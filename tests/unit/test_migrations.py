@@ -0,0 +1,111 @@
+"""
+Tests for the versioned schema migration runner (backend/migrations.py).
+"""
+import threading
+
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+
+from backend import migrations
+
+
+def sqlite_engine(tmp_path, name="app.db"):
+    return create_engine(f"sqlite:///{tmp_path / name}", connect_args={"check_same_thread": False})
+
+
+def columns(engine, table):
+    return {c["name"] for c in inspect(engine).get_columns(table)}
+
+
+def test_fresh_database_upgrades_to_head_once(tmp_path):
+    engine = sqlite_engine(tmp_path)
+
+    assert migrations.upgrade(engine) == [m.version for m in migrations.MIGRATIONS]
+    assert migrations.upgrade(engine) == []
+
+    with engine.connect() as conn:
+        assert migrations.current_version(conn) == migrations.HEAD
+    assert {"users", "health_records", "chat_logs", "audit_logs", "schema_version"} <= set(inspect(engine).get_table_names())
+    assert {"risk_thresholds", "plan_tier", "last_analysis_date"} <= columns(engine, "users")
+
+
+def test_steps_are_idempotent_on_legacy_databases(tmp_path):
+    # Created by the old startup code: tables exist, some ALTERs already ran, no version table
+    engine = sqlite_engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, username VARCHAR, hashed_password VARCHAR, diet TEXT)"))
+
+    migrations.upgrade(engine)
+
+    assert {"diet", "about_me", "risk_thresholds"} <= columns(engine, "users")
+    assert "chat_logs" in inspect(engine).get_table_names()
+
+
+def test_upgrade_to_target_then_rest(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    assert migrations.upgrade(engine, target=2) == [1, 2]
+    with engine.connect() as conn:
+        assert migrations.current_version(conn) == 2
+    assert migrations.upgrade(engine) == [v for v in range(3, migrations.HEAD + 1)]
+
+
+def test_startup_check_runs_no_ddl_when_current(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    migrations.upgrade(engine)
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, sql, *a: statements.append(sql.strip().split()[0].upper()))
+
+    assert migrations.ensure_schema(engine, migrate=True) == migrations.HEAD
+    assert set(statements) <= {"SELECT", "PRAGMA"}
+
+
+def test_startup_check_reports_outdated_schema_without_migrating(tmp_path):
+    engine = sqlite_engine(tmp_path)
+    assert migrations.ensure_schema(engine, migrate=False) == 0
+    assert inspect(engine).get_table_names() == []
+
+
+def test_app_startup_fails_fast_on_outdated_schema(tmp_path, monkeypatch):
+    from backend import database, main
+    monkeypatch.setattr(database, "engine", sqlite_engine(tmp_path))
+    monkeypatch.setattr(migrations, "MIGRATE_ON_START", False)
+    with pytest.raises(RuntimeError, match="backend.migrations upgrade"):
+        main.init_db()
+
+    migrations.upgrade(database.engine)
+    main.init_db()
+    assert main.schema_version == migrations.HEAD
+
+
+def test_concurrent_workers_migrate_once(tmp_path):
+    engines = [sqlite_engine(tmp_path) for _ in range(4)]
+    results, errors = [], []
+    barrier = threading.Barrier(len(engines))
+
+    def worker(engine):
+        barrier.wait()
+        try:
+            results.append(migrations.upgrade(engine))
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(e,)) for e in engines]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors
+    assert sorted(v for applied in results for v in applied) == [m.version for m in migrations.MIGRATIONS]
+    with engines[0].connect() as conn:
+        assert migrations.applied_versions(conn) == [m.version for m in migrations.MIGRATIONS]
+
+
+def test_cli(tmp_path, capsys):
+    url = f"sqlite:///{tmp_path / 'cli.db'}"
+    assert migrations.main(["--database-url", url, "check"]) == 1
+    assert migrations.main(["--database-url", url, "upgrade"]) == 0
+    assert migrations.main(["--database-url", url, "check"]) == 0
+    migrations.main(["--database-url", url, "current"])
+    assert migrations.main(["--database-url", url, "backfill"]) == 0
+    assert f"current={migrations.HEAD} head={migrations.HEAD}" in capsys.readouterr().out
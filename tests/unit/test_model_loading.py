@@ -0,0 +1,130 @@
+"""
+Tests for concurrent / lazy model loading and per-disease readiness in backend/prediction.py.
+"""
+import gc
+import os
+import threading
+import time
+import joblib
+import numpy as np
+import pytest
+from sklearn.preprocessing import StandardScaler
+
+from backend import prediction
+from backend.model_registry import ModelRegistry
+
+
+class FakeModel:
+    def predict(self, X):
+        return [0] * len(X)
+
+
+class FakeScaler:
+    def transform(self, X):
+        return X
+
+
+@pytest.fixture
+def isolated_models(monkeypatch):
+    """Fresh registry and load state for each test."""
+    monkeypatch.setattr(prediction, "registry", ModelRegistry())
+    monkeypatch.setattr(prediction, "model_status", {n: {"state": "pending"} for n in prediction.MODEL_FILES})
+
+
+def fake_loader(slow=(), corrupt=(), delay=0.3, calls=None):
+    def load_pkl(filenames, fallback_class=None):
+        name = filenames[0]
+        if calls is not None:
+            calls.append(name)
+        if name in slow:
+            time.sleep(delay)
+        if name in corrupt:
+            return fallback_class()
+        return FakeScaler() if "scaler" in name else FakeModel()
+    return load_pkl
+
+
+def test_all_diseases_ready_after_initialize(isolated_models, monkeypatch):
+    monkeypatch.setattr(prediction, "load_pkl", fake_loader())
+    prediction.initialize_models()
+    states = prediction.model_states()
+    assert {s["state"] for s in states.values()} == {"ready"}
+    assert all("warmup_ms" in s for s in states.values())
+    assert isinstance(prediction.liver_scaler, FakeScaler)
+
+
+def test_models_load_concurrently(isolated_models, monkeypatch):
+    slow = {files["model"][0] for files in prediction.MODEL_FILES.values()}
+    monkeypatch.setattr(prediction, "load_pkl", fake_loader(slow=slow, delay=0.2))
+    monkeypatch.setattr(prediction, "LOAD_WORKERS", 5)
+    start = time.perf_counter()
+    prediction.initialize_models()
+    # Five 0.2s loads in parallel, not 1s in sequence
+    assert time.perf_counter() - start < 0.7
+
+
+def test_corrupt_artifact_only_affects_its_disease(isolated_models, monkeypatch):
+    monkeypatch.setattr(prediction, "load_pkl", fake_loader(corrupt={"heart_disease_model.pkl"}))
+    prediction.initialize_models()
+    states = prediction.model_states()
+    assert states["heart"]["state"] == "unavailable"
+    assert "DummyModel" in states["heart"]["error"]
+    assert states["diabetes"]["state"] == "ready"
+    assert isinstance(prediction.heart_model, prediction.DummyModel)
+
+
+def test_route_waits_only_for_its_own_disease(isolated_models, monkeypatch):
+    monkeypatch.setattr(prediction, "load_pkl", fake_loader(slow={"kidney_model.pkl"}, delay=1.0))
+    monkeypatch.setattr(prediction, "LOAD_WORKERS", 5)
+    loader = threading.Thread(target=prediction.initialize_models)
+    loader.start()
+    try:
+        time.sleep(0.05)
+        start = time.perf_counter()
+        prediction.require_model("diabetes")()
+        assert time.perf_counter() - start < 0.5
+        assert prediction.model_status["diabetes"]["state"] == "ready"
+        assert prediction.model_status["kidney"]["state"] == "loading"
+    finally:
+        loader.join()
+
+
+def test_lazy_mode_loads_on_first_use(isolated_models, monkeypatch):
+    calls = []
+    monkeypatch.setattr(prediction, "load_pkl", fake_loader(calls=calls))
+    monkeypatch.setattr(prediction, "LOADING_MODE", "lazy")
+
+    assert prediction.start_warmup() is None
+    prediction.require_model("liver")()
+    prediction.require_model("liver")()
+
+    assert calls == ["liver_disease_model.pkl", "liver_scaler.pkl"]
+    assert prediction.model_status["liver"]["state"] == "ready"
+    assert prediction.model_status["kidney"]["state"] == "pending"
+
+
+def test_mmap_artifacts_are_exported_once(tmp_path, monkeypatch):
+    joblib.dump(StandardScaler().fit(np.random.rand(20, 10)), tmp_path / "liver_scaler.pkl", compress=3)
+    monkeypatch.setattr(prediction, "MODEL_DIR", str(tmp_path))
+    monkeypatch.setattr(prediction, "MMAP_DIR", str(tmp_path / "mmap"))
+
+    first = prediction.load_pkl(["liver_scaler.pkl"])
+    second = prediction.load_pkl(["liver_scaler.pkl"])
+
+    assert isinstance(first.mean_, np.memmap)
+    np.testing.assert_array_equal(first.mean_, second.mean_)
+    assert len(os.listdir(tmp_path / "mmap")) == 1
+
+
+def test_preloaded_master_skips_worker_warmup(isolated_models, monkeypatch):
+    monkeypatch.setattr(prediction, "load_pkl", fake_loader())
+    monkeypatch.setattr(prediction, "preloaded", False)
+    try:
+        prediction.preload_models()
+    finally:
+        gc.unfreeze()
+
+    assert prediction.preloaded
+    assert {s["state"] for s in prediction.model_states().values()} == {"ready"}
+    # Forked workers inherit the loaded registry and must not load again
+    assert prediction.start_warmup() is None
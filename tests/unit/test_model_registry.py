@@ -0,0 +1,146 @@
+"""
+Tests for the versioned model registry (backend/model_registry.py) and the
+admin-only reload / rollback endpoints.
+"""
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import auth, prediction
+from backend.main import app as main_app
+from backend.model_registry import ModelBundle, ModelRegistry, artifact_version
+
+
+class FakeModel:
+    def __init__(self, label=0):
+        self.label = label
+
+    def predict(self, X):
+        return [self.label] * len(X)
+
+
+class FakeScaler:
+    def transform(self, X):
+        return X
+
+
+def bundle(version, model=None, scaler=None, name="liver"):
+    return ModelBundle(name, version, model or FakeModel(), scaler)
+
+
+# --- Registry ---
+
+def test_publish_and_rollback():
+    registry = ModelRegistry()
+    registry.publish(bundle("v1"))
+    registry.publish(bundle("v2"))
+    assert registry.get("liver").version == "v2"
+    assert registry.versions()["liver"]["previous"] == ["v1"]
+
+    assert registry.rollback("liver").version == "v1"
+    assert registry.get("liver").version == "v1"
+    with pytest.raises(LookupError):
+        registry.rollback("liver")
+
+
+def test_history_is_bounded():
+    registry = ModelRegistry(history_size=2)
+    for i in range(5):
+        registry.publish(bundle(f"v{i}"))
+    assert registry.versions()["liver"]["previous"] == ["v3", "v2"]
+
+
+def test_in_flight_bundle_keeps_matching_pair():
+    registry = ModelRegistry()
+    old_model, old_scaler = FakeModel(), FakeScaler()
+    registry.publish(bundle("v1", old_model, old_scaler))
+
+    in_flight = registry.get("liver")
+    registry.publish(bundle("v2", FakeModel(), FakeScaler()))
+
+    assert in_flight.model is old_model and in_flight.scaler is old_scaler
+    assert registry.get("liver").version == "v2"
+
+
+def test_artifact_version_is_content_hash(tmp_path):
+    a, b = tmp_path / "model.pkl", tmp_path / "model_copy.pkl"
+    a.write_bytes(b"weights-1")
+    b.write_bytes(b"weights-1")
+    assert artifact_version([str(a)]) == artifact_version([str(a)])
+    b.write_bytes(b"weights-2")
+    assert artifact_version([str(a)]) != artifact_version([str(b)])
+
+
+# --- Reload Semantics ---
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    monkeypatch.setattr(prediction, "registry", ModelRegistry())
+    monkeypatch.setattr(prediction, "model_status", {n: {"state": "pending"} for n in prediction.MODEL_FILES})
+
+
+def test_failed_validation_keeps_serving_version(fresh_registry, monkeypatch):
+    monkeypatch.setattr(prediction, "load_pkl", lambda names, fallback_class=None: FakeScaler() if "scaler" in names[0] else FakeModel())
+    prediction.load_disease("liver")
+    serving = prediction.registry.get("liver")
+
+    monkeypatch.setattr(prediction, "load_pkl", lambda names, fallback_class=None: fallback_class())
+    status = prediction.load_disease("liver")
+
+    assert prediction.registry.get("liver") is serving
+    assert status["state"] == "ready"
+    assert "reload_error" in status
+
+
+def test_prediction_response_carries_version(fresh_registry):
+    prediction.registry.publish(ModelBundle("diabetes", "abc123", FakeModel(1), feature_names=tuple(prediction.FEATURE_NAMES["diabetes"])))
+    app = FastAPI()
+    app.include_router(prediction.router)
+    resp = TestClient(app).post("/predict/diabetes", json={
+        "gender": 1, "age": 50, "hypertension": 0, "heart_disease": 0,
+        "smoking_history": 1, "bmi": 25.0, "high_chol": 0,
+        "physical_activity": 1, "general_health": 2
+    })
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "prediction": "High Risk", "raw": 1, "model_version": "abc123",
+        "probability": None, "threshold": prediction.DEFAULT_THRESHOLD, "calibrated": False,
+    }
+
+
+def test_module_attributes_mirror_registry(fresh_registry):
+    model = FakeModel()
+    prediction.registry.publish(bundle("v1", model, FakeScaler()))
+    assert prediction.liver_model is model
+    assert prediction.kidney_model is None
+
+
+# --- Admin Endpoints ---
+
+def as_user(username):
+    main_app.dependency_overrides[auth.get_current_user] = lambda: SimpleNamespace(username=username)
+    return TestClient(main_app, base_url="http://localhost")
+
+
+def test_reload_requires_admin():
+    try:
+        assert as_user("bob").post("/admin/reload_models").status_code == 403
+    finally:
+        main_app.dependency_overrides.clear()
+
+
+def test_admin_rollback_endpoint(fresh_registry):
+    prediction.registry.publish(bundle("v1", name="heart"))
+    prediction.registry.publish(bundle("v2", name="heart"))
+    try:
+        client = as_user("admin")
+        assert client.get("/admin/models").json()["versions"]["heart"]["version"] == "v2"
+        resp = client.post("/admin/models/heart/rollback")
+        assert resp.status_code == 200
+        assert resp.json()["version"] == "v1"
+        assert resp.json()["scope"] == "worker"  # Other workers are not rolled back
+        assert client.post("/admin/models/heart/rollback").status_code == 409
+        assert client.post("/admin/models/spleen/rollback").status_code == 404
+    finally:
+        main_app.dependency_overrides.clear()
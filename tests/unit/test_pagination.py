@@ -0,0 +1,124 @@
+"""
+Tests for keyset pagination, field projection and streamed exports
+(backend/pagination.py) on /records, /chat/history and /admin/users.
+"""
+import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import admin, auth, chat, database, migrations, models, pagination
+
+START = datetime.datetime(2024, 1, 1)
+
+
+@pytest.fixture
+def http(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'pages.db'}", connect_args={"check_same_thread": False})
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{"id": i, "username": f"user{i}"} for i in range(1, 31)]
+                     + [{"id": 99, "username": "admin"}])
+        # Pairs of rows share a timestamp so pages must break ties on id
+        conn.execute(insert(models.HealthRecord.__table__), [
+            {"user_id": 1, "record_type": ("heart", "liver")[i % 2], "data": '{"bmi": %d}' % i,
+             "prediction": "x", "timestamp": START + datetime.timedelta(days=i // 2)}
+            for i in range(25)
+        ])
+        conn.execute(insert(models.ChatLog.__table__), [
+            {"user_id": 1, "role": "user", "content": f"m{i}", "timestamp": START + datetime.timedelta(minutes=i // 2)}
+            for i in range(25)
+        ])
+    sessions = sessionmaker(bind=engine)
+
+    def override_get_db():
+        with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.include_router(admin.router)
+    app.dependency_overrides[database.get_db] = override_get_db
+    app.dependency_overrides[auth.get_current_user] = lambda: models.User(id=1, username="user1")
+    app.dependency_overrides[admin.get_current_admin] = lambda: models.User(id=99, username="admin")
+    client = TestClient(app)
+    client.engine = engine
+    return client
+
+
+def walk(http, url, **params):
+    """Follow X-Next-Cursor to the end; returns the pages."""
+    pages, cursor = [], None
+    while True:
+        resp = http.get(url, params=dict(params, **({"cursor": cursor} if cursor else {})))
+        assert resp.status_code == 200
+        pages.append(resp.json())
+        cursor = resp.headers.get(pagination.NEXT_CURSOR_HEADER)
+        if not cursor:
+            return pages
+
+
+def test_record_pages_cover_the_full_history_exactly_once(http):
+    full = http.get("/records").json()
+    pages = walk(http, "/records", limit=4)
+
+    assert [len(p) for p in pages] == [4] * 6 + [1]
+    assert [r["id"] for p in pages for r in p] == [r["id"] for r in full] == list(range(1, 26))
+    assert [r["record_type"] for p in walk(http, "/records", limit=3, record_type="liver") for r in p] == ["liver"] * 12
+
+
+def test_next_link_header(http):
+    resp = http.get("/records", params={"limit": 2, "fields": "id"})
+    assert 'rel="next"' in resp.headers["Link"]
+    assert f"cursor={resp.headers[pagination.NEXT_CURSOR_HEADER]}" in resp.headers["Link"]
+    assert "fields=id" in resp.headers["Link"]
+
+
+def test_full_export_streams_in_batches(http, monkeypatch):
+    monkeypatch.setattr(pagination, "STREAM_BATCH", 10)
+    statements = []
+    event.listen(http.engine, "before_cursor_execute", lambda conn, cursor, sql, *a: statements.append(sql))
+
+    body = http.get("/records", params={"fields": "id,timestamp"}).json()
+
+    assert [r["id"] for r in body] == list(range(1, 26))
+    assert sum("FROM health_records" in s for s in statements) == 3  # 10 + 10 + 5 rows
+    assert http.get("/records", params={"record_type": "kidney"}).json() == []
+
+
+def test_projection_is_applied_in_sql(http):
+    statements = []
+    event.listen(http.engine, "before_cursor_execute", lambda conn, cursor, sql, *a: statements.append(sql))
+
+    body = http.get("/records", params={"limit": 2, "fields": "id,prediction"}).json()
+
+    assert body == [{"id": 1, "prediction": "x"}, {"id": 2, "prediction": "x"}]
+    assert "health_records.data" not in statements[-1]
+    assert http.get("/records", params={"fields": "id,password"}).status_code == 422
+
+
+def test_chat_history_pages_backwards(http):
+    pages = walk(http, "/chat/history", limit=10, fields="id,content")
+
+    assert [m["content"] for m in pages[0]] == [f"m{i}" for i in range(15, 25)]  # Newest, oldest first
+    assert [m["content"] for m in pages[-1]] == [f"m{i}" for i in range(5)]
+    assert sorted(m["id"] for p in pages for m in p) == list(range(1, 26))
+    assert set(http.get("/chat/history").json()[0]) == {"role", "content", "timestamp"}
+
+
+def test_invalid_cursor(http):
+    assert http.get("/records", params={"limit": 2, "cursor": "not-a-cursor"}).status_code == 400
+    assert http.get("/records", params={"limit": 2, "cursor": pagination.encode_cursor([1])}).status_code == 400
+
+
+def test_admin_users_keyset(http):
+    pages = walk(http, "/admin/users", limit=7, fields="id,username")
+
+    ids = [u["id"] for p in pages for u in p]
+    assert ids == [99] + list(range(30, 0, -1))
+    assert set(pages[0][0]) == {"id", "username"}
+    # Deprecated OFFSET paging still works
+    assert [u["id"] for u in http.get("/admin/users", params={"skip": 1, "limit": 2}).json()] == [30, 29]
@@ -9,6 +9,7 @@ import numpy as np
 from fastapi import FastAPI
 import backend.prediction
 from backend.prediction import router
+from backend.model_registry import ModelBundle, ModelRegistry
 
 # Test app
 app = FastAPI()
@@ -16,12 +17,20 @@ app.include_router(router)
 client = TestClient(app)
 
 
+def serving(disease, model, scaler=None):
+    """Serve `model` (and `scaler`) for one disease from a fresh registry; None serves nothing."""
+    registry = ModelRegistry()
+    if model is not None:
+        registry.publish(ModelBundle(disease, "test", model, scaler))
+    return patch.object(backend.prediction, "registry", registry)
+
+
 class TestDiabetesExplanation:
     """Tests for diabetes SHAP explanation endpoint."""
     
     def test_explain_diabetes_model_unavailable(self):
         """Test error when model not available."""
-        with patch("backend.prediction.diabetes_model", None):
+        with serving("diabetes", None):
             resp = client.post("/predict/explain/diabetes", json={
                 "gender": 1, "age": 50, "hypertension": 0, "heart_disease": 0,
                 "smoking_history": 1, "bmi": 25.0, "high_chol": 0, 
@@ -34,7 +43,7 @@ class TestDiabetesExplanation:
         mock_model = MagicMock()
         mock_shap_result = {"html": "<div>SHAP Plot</div>"}
         
-        with patch("backend.prediction.diabetes_model", mock_model), \
+        with serving("diabetes", mock_model), \
              patch("backend.prediction.explainability.get_shap_values", return_value=mock_shap_result):
             
             resp = client.post("/predict/explain/diabetes", json={
@@ -50,7 +59,7 @@ class TestDiabetesExplanation:
         """Test error when SHAP generation fails."""
         mock_model = MagicMock()
         
-        with patch("backend.prediction.diabetes_model", mock_model), \
+        with serving("diabetes", mock_model), \
              patch("backend.prediction.explainability.get_shap_values", return_value=None):
             
             resp = client.post("/predict/explain/diabetes", json={
@@ -66,9 +75,9 @@ class TestHeartExplanation:
     
     def test_explain_heart_model_unavailable(self):
         """Test error when model not available."""
-        with patch("backend.prediction.heart_model", None):
+        with serving("heart", None):
             resp = client.post("/predict/explain/heart", json={
-                "age": 50, "gender": 1, "high_bp": 0, "high_chol": 200, "bmi": 25.0,
+                "age": 50, "gender": 1, "high_bp": 0, "high_chol": 1, "bmi": 25.0,
                 "smoker": 0, "stroke": 0, "diabetes": 0, "phys_activity": 1,
                 "hvy_alcohol": 0, "gen_hlth": 2
             })
@@ -79,11 +88,11 @@ class TestHeartExplanation:
         mock_model = MagicMock()
         mock_shap = {"html": "<div>Heart SHAP</div>"}
         
-        with patch("backend.prediction.heart_model", mock_model), \
+        with serving("heart", mock_model), \
              patch("backend.prediction.explainability.get_shap_values", return_value=mock_shap):
             
             resp = client.post("/predict/explain/heart", json={
-                "age": 50, "gender": 1, "high_bp": 0, "high_chol": 200, "bmi": 25.0,
+                "age": 50, "gender": 1, "high_bp": 0, "high_chol": 1, "bmi": 25.0,
                 "smoker": 0, "stroke": 0, "diabetes": 0, "phys_activity": 1,
                 "hvy_alcohol": 0, "gen_hlth": 2
             })
@@ -97,7 +106,7 @@ class TestLiverExplanation:
     
     def test_explain_liver_model_unavailable(self):
         """Test error when model or scaler not available."""
-        with patch("backend.prediction.liver_model", None):
+        with serving("liver", None):
             resp = client.post("/predict/explain/liver", json={
                 "age": 45, "gender": 1, "total_bilirubin": 1.0,
                 "alkaline_phosphotase": 100, "alamine_aminotransferase": 30,
@@ -113,8 +122,7 @@ class TestLiverExplanation:
         mock_scaler.transform.return_value = np.array([[1,2,3,4,5,6,7,8,9,10]])
         mock_shap = {"html": "<div>Liver SHAP</div>"}
         
-        with patch("backend.prediction.liver_model", mock_model), \
-             patch("backend.prediction.liver_scaler", mock_scaler), \
+        with serving("liver", mock_model, mock_scaler), \
              patch("backend.prediction.explainability.get_shap_values", return_value=mock_shap):
             
             resp = client.post("/predict/explain/liver", json={
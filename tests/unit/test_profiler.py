@@ -0,0 +1,113 @@
+"""
+Tests for the sampling profiler (backend/profiler.py) and its admin endpoints.
+"""
+import os
+import time
+from types import SimpleNamespace
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import auth
+from backend.main import app as main_app
+from backend.middleware import ProfilingMiddleware
+from backend.profiler import SamplingProfiler, profiler as global_profiler
+
+TESTS_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def busy_work(seconds):
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(200))
+    return total
+
+
+def build_app(profiler):
+    app = FastAPI()
+
+    @app.get("/hot")
+    def hot():
+        return {"total": busy_work(0.2)}
+
+    @app.get("/cold")
+    def cold():
+        return {"ok": True}
+
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+    return app
+
+
+@pytest.fixture
+def profiler():
+    prof = SamplingProfiler(app_root=TESTS_ROOT)
+    yield prof
+    prof.stop()
+
+
+def test_inactive_profiler_selects_nothing(profiler):
+    assert not profiler.should_profile("/hot")
+    TestClient(build_app(profiler)).get("/hot")
+    assert profiler.profiled_requests == 0
+
+
+def test_profiled_request_produces_collapsed_stacks(profiler):
+    profiler.start(sample_rate=1.0, duration_seconds=30, interval_ms=2)
+    TestClient(build_app(profiler)).get("/hot")
+
+    assert profiler.profiled_requests == 1
+    assert profiler.samples > 0
+    output = profiler.collapsed()
+    first = output.splitlines()[0]
+    stack, count = first.rsplit(" ", 1)
+    assert int(count) > 0
+    assert "busy_work" in output
+    # Root frame first, leaf last
+    assert stack.split(";")[-1] != stack.split(";")[0]
+
+
+def test_route_filter(profiler):
+    profiler.start(sample_rate=1.0, route="/hot", duration_seconds=30)
+    assert profiler.should_profile("/hot")
+    assert not profiler.should_profile("/cold")
+    assert not profiler.should_profile("/hotter")
+
+
+def test_session_expires(profiler):
+    profiler.start(sample_rate=1.0, duration_seconds=0.05)
+    time.sleep(0.1)
+    assert not profiler.should_profile("/hot")
+    assert profiler.status()["active"] is False
+
+
+def test_admin_endpoints_require_admin():
+    main_app.dependency_overrides[auth.get_current_user] = lambda: SimpleNamespace(username="bob")
+    try:
+        client = TestClient(main_app, base_url="http://localhost")
+        assert client.get("/admin/profile").status_code == 403
+        assert client.post("/admin/profile", json={}).status_code == 403
+    finally:
+        main_app.dependency_overrides.clear()
+
+
+def test_admin_profile_lifecycle():
+    main_app.dependency_overrides[auth.get_current_user] = lambda: SimpleNamespace(username="admin")
+    try:
+        client = TestClient(main_app, base_url="http://localhost")
+        resp = client.post("/admin/profile", json={"sample_rate": 1.0, "route": "/healthz", "duration_seconds": 30})
+        assert resp.status_code == 200
+        assert resp.json()["active"] is True
+
+        client.get("/healthz")
+        assert client.get("/admin/profile/status").json()["profiled_requests"] == 1
+
+        resp = client.get("/admin/profile")
+        assert resp.status_code == 200
+        assert "profile.collapsed" in resp.headers["content-disposition"]
+
+        assert client.delete("/admin/profile").json()["active"] is False
+        assert client.post("/admin/profile", json={"sample_rate": 2}).status_code == 422
+    finally:
+        global_profiler.stop()
+        main_app.dependency_overrides.clear()
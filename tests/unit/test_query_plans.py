@@ -0,0 +1,109 @@
+"""
+Query-plan regression tests for the per-user timeline queries in chat.py.
+
+The statements are captured from the real endpoints, so a change to a query
+(or to the indexes) that reintroduces a table scan or an explicit sort fails
+here. Postgres runs too when TEST_POSTGRES_URL points at a disposable database.
+"""
+import datetime
+import json
+import os
+import uuid
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from backend import auth, chat, database, migrations, models, pagination
+
+TIMELINE_INDEXES = {
+    "ix_health_records_user_timestamp_id",
+    "ix_health_records_user_type_timestamp_id",
+    "ix_chat_logs_user_timestamp_id",
+}
+
+
+def seed(db, user):
+    start = datetime.datetime(2024, 1, 1)
+    for i in range(30):
+        when = start + datetime.timedelta(days=i)
+        db.add(models.HealthRecord(user_id=user.id, record_type=("heart", "liver", "diabetes")[i % 3],
+                                   data=json.dumps({"age": 40}), prediction="Low Risk", timestamp=when))
+        db.add(models.ChatLog(user_id=user.id, role="user", content=f"message {i}", timestamp=when))
+    db.commit()
+
+
+def timeline_statements(engine):
+    """Run every per-user timeline read and return its (statement, parameters)."""
+    migrations.upgrade(engine)
+    db = sessionmaker(bind=engine)()
+    user = models.User(username=f"plan-{uuid.uuid4().hex[:8]}", hashed_password="x", allow_data_collection=0)
+    db.add(user)
+    db.commit()
+    seed(db, user)
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and ("FROM health_records" in statement or "FROM chat_logs" in statement):
+            captured.append((statement, parameters))
+
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.dependency_overrides[database.get_db] = lambda: db
+    app.dependency_overrides[auth.get_current_user] = lambda: user
+    http = TestClient(app)
+
+    event.listen(engine, "before_cursor_execute", capture)
+    try:
+        for url in ("/chat/history", "/records", "/records?record_type=heart", "/records?limit=10"):
+            http.get(url).raise_for_status()
+        # Second pages seek past the cursor
+        for url in ("/chat/history?limit=10", "/records?limit=10", "/records?record_type=heart&limit=4"):
+            cursor = http.get(url).headers[pagination.NEXT_CURSOR_HEADER]
+            http.get(url, params={"cursor": cursor}).raise_for_status()
+        with patch("backend.pdf_generator.generate_health_report", return_value=b"%PDF"):
+            chat.download_health_report(current_user=user, db=db)
+        with patch("backend.chat.agent.medical_agent.invoke", return_value={"messages": [MagicMock(content="ok")]}), \
+                patch.object(chat.rag, "search_similar_records", return_value=[]):
+            chat.chat_endpoint(chat.ChatRequest(message="hi"), current_user=user, db=db)
+    finally:
+        event.remove(engine, "before_cursor_execute", capture)
+        db.close()
+    assert len(captured) == 12
+    return captured
+
+
+def test_sqlite_timeline_queries_use_composite_indexes(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plans.db'}", connect_args={"check_same_thread": False})
+
+    for statement, parameters in timeline_statements(engine):
+        with engine.connect() as conn:
+            plan = [row[-1] for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+        assert any(name in step for step in plan for name in TIMELINE_INDEXES), (statement, plan)
+        assert not any("TEMP B-TREE" in step for step in plan), (statement, plan)
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+def test_postgres_timeline_queries_use_composite_indexes():
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+
+    for statement, parameters in timeline_statements(engine):
+        with engine.connect() as conn:
+            # Seeded tables are tiny; disable seq scans so the planner shows which index it would use
+            conn.exec_driver_sql("SET enable_seqscan = off")
+            plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        nodes = list(plan_nodes(plan[0]["Plan"]))
+        assert {n.get("Index Name") for n in nodes} & TIMELINE_INDEXES, (statement, nodes)
+        assert not any(n["Node Type"] in ("Sort", "Incremental Sort") for n in nodes), (statement, nodes)
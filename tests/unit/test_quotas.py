@@ -0,0 +1,124 @@
+"""
+Tests for backend/quotas.py: tier resolution, quota enforcement and
+weighted-fair slot scheduling.
+"""
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from fastapi import FastAPI, Depends
+from fastapi.testclient import TestClient
+
+from backend import quotas
+from backend.quotas import FairScheduler, TierPolicy, QueueFullError, resolve_tier
+
+
+def make_user(tier="free", expiry=None, user_id=1):
+    return SimpleNamespace(id=user_id, plan_tier=tier, subscription_expiry=expiry)
+
+
+class TestResolveTier:
+
+    def test_anonymous_is_free(self):
+        assert resolve_tier(None) == "free"
+
+    def test_known_tier(self):
+        assert resolve_tier(make_user("clinic")) == "clinic"
+
+    def test_unknown_tier_falls_back(self):
+        assert resolve_tier(make_user("platinum")) == "free"
+
+    def test_expired_subscription_is_free(self):
+        user = make_user("pro", expiry=datetime.utcnow() - timedelta(days=1))
+        assert resolve_tier(user) == "free"
+
+
+POLICY = {
+    "free": TierPolicy(requests_per_minute=100, max_concurrent=5, weight=1, max_waiting=2, queue_timeout=1.0),
+    "clinic": TierPolicy(requests_per_minute=100, max_concurrent=5, weight=16, max_waiting=10, queue_timeout=1.0),
+}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_prefers_heavier_tier():
+    sched = FairScheduler(capacity=1)
+    await sched.acquire("free", POLICY["free"])  # Occupy the only slot
+
+    order = []
+
+    async def waiter(tier):
+        await sched.acquire(tier, POLICY[tier])
+        order.append(tier)
+        sched.release()
+
+    tasks = [asyncio.create_task(waiter("free")), asyncio.create_task(waiter("free"))]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(waiter("clinic")))
+    await asyncio.sleep(0)
+
+    sched.release()
+    await asyncio.gather(*tasks)
+    assert order[0] == "clinic"
+    assert sched.active == 0
+
+
+@pytest.mark.asyncio
+async def test_scheduler_sheds_when_tier_queue_full():
+    sched = FairScheduler(capacity=1)
+    await sched.acquire("free", POLICY["free"])
+    waiters = [asyncio.create_task(sched.acquire("free", POLICY["free"])) for _ in range(2)]
+    await asyncio.sleep(0)
+
+    with pytest.raises(QueueFullError):
+        await sched.acquire("free", POLICY["free"])
+
+    for _ in waiters:
+        sched.release()
+    await asyncio.gather(*waiters)
+
+
+@pytest.mark.asyncio
+async def test_scheduler_timeout_does_not_leak_slot():
+    sched = FairScheduler(capacity=1)
+    await sched.acquire("free", POLICY["free"])
+    quick = POLICY["free"]._replace(queue_timeout=0.01)
+    with pytest.raises(asyncio.TimeoutError):
+        await sched.acquire("free", quick)
+    sched.release()
+    assert sched.active == 0
+    assert await sched.acquire("free", POLICY["free"]) == 0.0
+
+
+# --- Route Dependency ---
+
+app = FastAPI()
+current = {"user": make_user("free")}
+
+
+@app.post("/expensive", dependencies=[Depends(quotas.tier_limit("chat", lambda: current["user"]))])
+def expensive():
+    return {"ok": True}
+
+
+client = TestClient(app)
+
+
+def test_free_tier_quota_enforced():
+    current["user"] = make_user("free", user_id=7)
+    limit = quotas.TIER_POLICIES["free"].requests_per_minute
+    for _ in range(limit):
+        assert client.post("/expensive").status_code == 200
+    resp = client.post("/expensive")
+    assert resp.status_code == 429
+    assert "Retry-After" in resp.headers
+
+    snapshot = quotas.usage_snapshot()["free"]["scopes"]["chat"]
+    assert snapshot["admitted"] == limit
+    assert snapshot["rejected_quota"] == 1
+
+
+def test_clinic_tier_has_higher_quota():
+    current["user"] = make_user("clinic", user_id=8)
+    for _ in range(quotas.TIER_POLICIES["free"].requests_per_minute + 1):
+        assert client.post("/expensive").status_code == 200
+    assert quotas.usage_snapshot()["clinic"]["in_flight"] == 0
@@ -0,0 +1,133 @@
+"""
+Tests for the GCRA rate limiter in backend/security.py.
+Covers both the in-memory and the shared SQLite backends plus per-route quotas.
+"""
+import asyncio
+import threading
+
+import pytest
+from unittest.mock import MagicMock
+from fastapi import HTTPException
+
+from backend.security import (
+    RateLimiter,
+    RateLimitRule,
+    InMemoryRateLimitBackend,
+    SQLiteRateLimitBackend,
+    acquire_async,
+)
+
+
+def make_request(path: str, method: str = "GET"):
+    request = MagicMock()
+    request.url.path = path
+    request.method = method
+    return request
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryRateLimitBackend()
+    return SQLiteRateLimitBackend(str(tmp_path / "limits.db"))
+
+
+class TestRateLimitBackends:
+
+    def test_allows_burst_then_rejects(self, backend):
+        rule = RateLimitRule(requests=5, period=60.0)
+        now = 1000.0
+        for _ in range(5):
+            assert backend.acquire("ip", rule, now) == 0.0
+        wait = backend.acquire("ip", rule, now)
+        assert wait == pytest.approx(12.0)
+
+    def test_refills_at_steady_rate(self, backend):
+        rule = RateLimitRule(requests=5, period=60.0)
+        now = 1000.0
+        for _ in range(5):
+            backend.acquire("ip", rule, now)
+        assert backend.acquire("ip", rule, now + 11.0) > 0
+        assert backend.acquire("ip", rule, now + 12.0) == 0.0
+
+    def test_keys_are_independent(self, backend):
+        rule = RateLimitRule(requests=1, period=60.0)
+        assert backend.acquire("a", rule, 1000.0) == 0.0
+        assert backend.acquire("a", rule, 1000.0) > 0
+        assert backend.acquire("b", rule, 1000.0) == 0.0
+
+    def test_reset(self, backend):
+        rule = RateLimitRule(requests=1, period=60.0)
+        backend.acquire("a", rule, 1000.0)
+        backend.reset()
+        assert backend.acquire("a", rule, 1000.0) == 0.0
+
+
+def test_sqlite_backend_shared_between_instances(tmp_path):
+    """Two backends on the same file behave like two workers sharing one quota."""
+    path = str(tmp_path / "limits.db")
+    worker_a = SQLiteRateLimitBackend(path)
+    worker_b = SQLiteRateLimitBackend(path)
+    rule = RateLimitRule(requests=2, period=60.0)
+
+    assert worker_a.acquire("ip", rule, 1000.0) == 0.0
+    assert worker_b.acquire("ip", rule, 1000.0) == 0.0
+    assert worker_a.acquire("ip", rule, 1000.0) > 0
+
+
+def test_sqlite_backend_runs_off_the_event_loop(tmp_path):
+    backend = SQLiteRateLimitBackend(str(tmp_path / "limits.db"))
+    callers = []
+    acquire = backend.acquire
+    backend.acquire = lambda *args: callers.append(threading.get_ident()) or acquire(*args)
+
+    async def check():
+        return threading.get_ident(), await acquire_async(backend, "ip", RateLimitRule(requests=1), 1000.0)
+
+    loop_thread, wait = asyncio.run(check())
+    assert wait == 0.0
+    assert callers and callers[0] != loop_thread
+
+
+def test_memory_backend_evicts_oldest_key():
+    backend = InMemoryRateLimitBackend(max_keys=2)
+    rule = RateLimitRule(requests=1, period=60.0)
+    backend.acquire("a", rule, 1000.0)
+    backend.acquire("b", rule, 1000.0)
+    backend.acquire("c", rule, 1000.0)
+    assert list(backend.storage) == ["b", "c"]
+
+
+class TestRateLimiter:
+
+    def test_raises_429_with_retry_after(self):
+        limiter = RateLimiter(requests_per_minute=1, route_quotas={})
+        limiter.check(make_request("/predict/heart"), "1.2.3.4")
+        with pytest.raises(HTTPException) as exc:
+            limiter.check(make_request("/predict/heart"), "1.2.3.4")
+        assert exc.value.status_code == 429
+        assert int(exc.value.headers["Retry-After"]) >= 1
+
+    def test_route_quota_is_separate_bucket(self):
+        limiter = RateLimiter(
+            requests_per_minute=100,
+            route_quotas={"/chat": RateLimitRule(requests=1, period=60.0)}
+        )
+        limiter.check(make_request("/chat"), "ip")
+        with pytest.raises(HTTPException):
+            limiter.check(make_request("/chat"), "ip")
+        # Default bucket is unaffected by the exhausted /chat bucket
+        limiter.check(make_request("/records"), "ip")
+
+    def test_resolve_matches_exact_path_only(self):
+        limiter = RateLimiter(route_quotas={"/chat": RateLimitRule(requests=1)})
+        assert limiter.resolve("/chat")[0] == "/chat"
+        assert limiter.resolve("/chat/history")[0] == "*"
+        assert limiter.resolve("/chatter")[0] == "*"
+
+    def test_default_quotas_only_cover_the_llm_calls(self):
+        limiter = RateLimiter()
+        assert limiter.resolve("/chat", "POST")[0] == "POST /chat"
+        assert limiter.resolve("/analyze/report", "POST")[0] == "POST /analyze/report"
+        for method, path in [("GET", "/chat/history"), ("DELETE", "/chat/history"), ("GET", "/chat")]:
+            assert limiter.resolve(path, method)[0] == "*"
@@ -0,0 +1,202 @@
+"""
+Tests for chat/audit log retention (backend/retention.py): batched archival,
+archive files, and archived events in /admin/audit. The Postgres partition
+path runs when TEST_POSTGRES_URL points at a disposable database.
+"""
+import datetime
+import os
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, func, insert, inspect, select, text
+from sqlalchemy.orm import sessionmaker
+
+from backend import admin, database, migrations, models, retention
+
+NOW = datetime.datetime(2024, 6, 15, 12)
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(retention, "ARCHIVE_FORMAT", "jsonl")
+    monkeypatch.setitem(retention.RETENTION_DAYS, "chat_logs", 0)
+    monkeypatch.setitem(retention.RETENTION_DAYS, "audit_logs", 30)
+    engine = create_engine(f"sqlite:///{tmp_path / 'retention.db'}", connect_args={"check_same_thread": False})
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User.__table__), [{"id": 1, "username": "admin"}, {"id": 2, "username": "bob"}])
+        # One event a day for 100 days, the newest today
+        conn.execute(insert(models.AuditLog.__table__), [
+            {"admin_id": 2, "target_user_id": 2, "action": "LOGIN" if day % 10 else "VIEW_FULL",
+             "timestamp": NOW - datetime.timedelta(days=99 - day), "details": f"day {day}"}
+            for day in range(100)
+        ])
+        conn.execute(insert(models.ChatLog.__table__), [
+            {"user_id": 2, "role": "user", "content": "old", "timestamp": NOW - datetime.timedelta(days=400)}])
+    return engine
+
+
+def count(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(table)).scalar()
+
+
+def test_expired_rows_move_to_archive_files_in_batches(engine):
+    deletes = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, sql, *a: deletes.append(sql) if sql.startswith("DELETE") else None)
+
+    assert retention.run_once(engine, now=NOW, batch=25, pause=0) == {"audit_logs": 69}
+
+    assert count(engine, models.AuditLog.__table__) == 31
+    assert count(engine, models.ChatLog.__table__) == 1  # chat_logs policy is off
+    assert len(deletes) == 3  # 25 + 25 + 19
+    months = sorted(os.listdir(os.path.join(retention.ARCHIVE_DIR, "audit_logs")))
+    assert months == ["2024-03", "2024-04", "2024-05"]
+    assert all(name.endswith(".jsonl.gz") for m in months for name in os.listdir(os.path.join(retention.ARCHIVE_DIR, "audit_logs", m)))
+    # Nothing left to do on the next run
+    assert retention.run_once(engine, now=NOW, batch=25, pause=0) == {"audit_logs": 0}
+
+
+def test_search_archive_reads_back_rows_newest_first(engine):
+    retention.run_once(engine, now=NOW, pause=0)
+    # A redone batch writes the same rows again; readers drop the duplicates
+    rows = retention.search_archive("audit_logs", limit=1000)
+    retention.write_archive("audit_logs", rows[:5])
+
+    rows = retention.search_archive("audit_logs", limit=1000)
+    assert len(rows) == 69 and len({r["id"] for r in rows}) == 69
+    assert rows[0]["timestamp"] == NOW - datetime.timedelta(days=31) and rows[0]["details"] == "day 68"
+    assert [r["details"] for r in retention.search_archive("audit_logs", lambda r: r["action"] == "VIEW_FULL", limit=3)] == \
+        ["day 60", "day 50", "day 40"]
+    since = NOW - datetime.timedelta(days=35)
+    assert len(retention.search_archive("audit_logs", since=since)) == 5
+
+
+def test_parquet_archives_round_trip(engine, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setattr(retention, "ARCHIVE_FORMAT", "parquet")
+    retention.run_once(engine, now=NOW, pause=0)
+    rows = retention.search_archive("audit_logs", limit=1000)
+    assert len(rows) == 69 and isinstance(rows[0]["timestamp"], datetime.datetime)
+
+
+def test_admin_audit_view_continues_into_the_archive(engine):
+    retention.run_once(engine, now=NOW, pause=0)
+    sessions = sessionmaker(bind=engine)
+
+    def override_get_db():
+        with sessions() as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(admin.router)
+    app.dependency_overrides[database.get_db] = override_get_db
+    app.dependency_overrides[admin.get_current_admin] = lambda: models.User(id=1, username="admin")
+    http = TestClient(app)
+
+    details, cursor = [], None
+    while True:
+        resp = http.get("/admin/audit", params={"limit": 40, **({"cursor": cursor} if cursor else {})})
+        details += [e["details"] for e in resp.json()]
+        cursor = resp.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert details == [f"day {d}" for d in range(99, -1, -1)]  # 31 live, then 69 archived
+
+    views = http.get("/admin/audit", params={"action": "VIEW_FULL", "user_id": 2}).json()
+    assert [e["details"] for e in views] == [f"day {d}" for d in range(90, -1, -10)]
+    assert len(http.get("/admin/audit", params={"archived": False}).json()) == 31
+    since = (NOW - datetime.timedelta(days=40)).isoformat() + "Z"
+    assert len(http.get("/admin/audit", params={"since": since}).json()) == 41
+
+
+def test_archive_query_uses_the_timestamp_index(engine):
+    table = models.AuditLog.__table__
+    query = select(table).where(table.c.timestamp < NOW).order_by(table.c.timestamp, table.c.id).limit(10)
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}"))
+    assert "ix_audit_logs_timestamp_id" in plan and "TEMP B-TREE" not in plan
+
+
+def test_job_does_nothing_without_policies(engine, monkeypatch):
+    monkeypatch.setitem(retention.RETENTION_DAYS, "audit_logs", 0)
+    assert retention.RetentionJob().start(engine) is None
+    assert retention.run_once(engine, now=NOW) == {}
+
+
+def test_only_one_worker_runs_retention_on_sqlite(engine):
+    with retention._run_lock(engine) as acquired:
+        assert acquired
+        # Another worker (a separate open of the lock file) skips this run
+        assert retention.run_once(engine, now=NOW, pause=0) == {}
+    assert retention.run_once(engine, now=NOW, pause=0) == {"audit_logs": 69}
+
+
+def test_archive_dir_does_not_depend_on_the_working_directory():
+    assert os.path.isabs(retention.ARCHIVE_DIR)
+
+
+def test_verify_table_checks_the_model_mapping(engine):
+    with engine.begin() as conn:
+        retention.verify_table(conn, "audit_logs")
+        conn.exec_driver_sql("DROP INDEX ix_audit_logs_timestamp_id")
+        with pytest.raises(RuntimeError, match="ix_audit_logs_timestamp_id"):
+            retention.verify_table(conn, "audit_logs")
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+def test_postgres_expired_partitions_are_archived_and_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(retention, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    monkeypatch.setattr(retention, "ARCHIVE_FORMAT", "jsonl")
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    migrations.upgrade(engine)
+    month, marker = datetime.datetime(2001, 1, 1), uuid.uuid4().hex
+    with engine.begin() as conn:
+        assert retention.is_partitioned(conn, "audit_logs") and retention.is_partitioned(conn, "chat_logs")
+        retention.ensure_partitions(conn, "audit_logs", month, month)
+        conn.execute(insert(models.AuditLog.__table__), [
+            {"action": "LOGIN", "details": marker, "timestamp": month + datetime.timedelta(days=d)} for d in range(10)])
+
+    assert retention.archive_table(engine, "audit_logs", datetime.datetime(2001, 3, 1), pause=0) >= 10
+
+    with engine.connect() as conn:
+        assert "audit_logs_p200101" not in {name for name, _ in retention.partitions(conn, "audit_logs")}
+    archived = retention.search_archive("audit_logs", lambda r: r["details"] == marker, limit=100)
+    assert len(archived) == 10
+
+
+@pytest.mark.skipif(not os.getenv("TEST_POSTGRES_URL"), reason="TEST_POSTGRES_URL not set")
+def test_postgres_partitioned_tables_keep_keys_indexes_and_new_months(monkeypatch):
+    monkeypatch.setitem(retention.RETENTION_DAYS, "chat_logs", 0)
+    monkeypatch.setitem(retention.RETENTION_DAYS, "audit_logs", 0)
+    engine = create_engine(os.environ["TEST_POSTGRES_URL"])
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        for table_name in retention.TABLES:
+            retention.verify_table(conn, table_name)
+            assert inspect(conn).get_pk_constraint(table_name)["constrained_columns"] == ["id", "timestamp"]
+    # The ORM still maps the partitioned table
+    marker = uuid.uuid4().hex
+    with sessionmaker(bind=engine)() as db:
+        db.add(models.AuditLog(action="LOGIN", details=marker))
+        db.commit()
+        assert db.query(models.AuditLog).filter_by(details=marker).one().id
+
+    # A month that fell into the default partition is still created, with its rows moved into it
+    month = datetime.datetime(2199, 1, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(models.AuditLog.__table__), [{"action": "LOGIN", "details": marker, "timestamp": month}])
+    assert "audit_logs" in retention.maintain_partitions(engine, now=month)
+    with engine.begin() as conn:
+        partition = retention.partition_name("audit_logs", month)
+        assert conn.execute(text(f"SELECT count(*) FROM {partition} WHERE details = :m"), {"m": marker}).scalar() == 1
+        assert not conn.execute(text("SELECT count(*) FROM audit_logs_default WHERE details = :m"), {"m": marker}).scalar()
+    # The job keeps maintaining partitions without any retention policy
+    job = retention.RetentionJob(interval_seconds=3600)
+    assert job.start(engine) is not None
+    job.stop()
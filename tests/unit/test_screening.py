@@ -0,0 +1,129 @@
+"""
+Tests for the multi-disease screening endpoint (/predict/screen).
+"""
+import numpy as np
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from backend import prediction, schemas
+from backend.feature_schema import SCHEMAS, SCREENING_ALIASES
+from backend.model_registry import ModelBundle, ModelRegistry
+
+REQUEST_SCHEMAS = {
+    "diabetes": schemas.DiabetesInput,
+    "heart": schemas.HeartInput,
+    "liver": schemas.LiverInput,
+    "kidney": schemas.KidneyInput,
+    "lungs": schemas.LungInput,
+}
+
+BRFSS_PROFILE = {
+    "age": 52, "gender": 1, "bmi": 31.5, "hypertension": 1, "high_chol": 0, "smoker": 1,
+    "heart_disease": 0, "stroke": 0, "diabetes": 1, "physical_activity": 0,
+    "hvy_alcohol": 0, "general_health": 4,
+}
+
+
+class ProbaModel:
+    classes_ = np.array([0, 1])
+
+    def __init__(self, p):
+        self.p = p
+        self.rows = []
+
+    def predict(self, X):
+        return np.array([int(self.p >= 0.5)] * len(X))
+
+    def predict_proba(self, X):
+        self.rows.append(np.array(X))
+        return np.array([[1 - self.p, self.p]] * len(X))
+
+
+class BrokenModel:
+    def predict(self, X):
+        raise RuntimeError("boom")
+
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    monkeypatch.setattr(prediction, "registry", ModelRegistry())
+    monkeypatch.setattr(prediction, "model_status", {n: {"state": "ready"} for n in prediction.MODEL_FILES})
+
+
+def client():
+    app = FastAPI()
+    app.include_router(prediction.router)
+    return TestClient(app)
+
+
+def full_profile(rng):
+    values = {}
+    for field, info in schemas.ScreeningInput.model_fields.items():
+        if field == "diseases":
+            continue
+        low, high = schemas.ScreeningInput.ranges.get(field, (1, 90))
+        values[field] = int(rng.integers(low, high + 1)) if "int" in str(info.annotation) else float(rng.uniform(low, high))
+    return schemas.ScreeningInput(**values)
+
+
+@pytest.mark.parametrize("name", list(SCHEMAS))
+def test_screening_profile_covers_every_model(name):
+    assert set(SCHEMAS[name].screening_fields) <= set(schemas.ScreeningInput.model_fields)
+    assert set(SCREENING_ALIASES.get(name, {})) <= set(SCHEMAS[name].input_fields)
+
+
+@pytest.mark.parametrize("name", list(SCHEMAS))
+def test_screening_rows_match_single_disease_rows(name):
+    profile = full_profile(np.random.default_rng(11))
+    schema = SCHEMAS[name]
+    single = REQUEST_SCHEMAS[name](**{
+        field: getattr(profile, alias) for field, alias in zip(schema.input_fields, schema.screening_fields)
+    })
+    pipeline = prediction.PIPELINES[name]
+    np.testing.assert_array_equal(pipeline.with_fields(schema.screening_fields).transform(profile), pipeline.transform(single))
+
+
+def test_screen_runs_covered_models_and_skips_the_rest(fresh_registry):
+    diabetes, heart = ProbaModel(0.7), ProbaModel(0.2)
+    prediction.registry.publish(ModelBundle("diabetes", "d1", diabetes, pipeline=prediction.PIPELINES["diabetes"]))
+    prediction.registry.publish(ModelBundle("heart", "h1", heart, pipeline=prediction.PIPELINES["heart"]))
+
+    body = client().post("/predict/screen", json=BRFSS_PROFILE).json()
+
+    assert set(body["results"]) == {"diabetes", "heart"}
+    assert body["results"]["diabetes"]["prediction"] == "High Risk"
+    assert body["results"]["heart"] == {
+        "prediction": "Healthy Heart", "raw": 0, "probability": 0.2,
+        "threshold": prediction.DEFAULT_THRESHOLD, "calibrated": False, "model_version": "h1",
+    }
+    assert set(body["skipped"]) == {"liver", "kidney", "lungs"}
+    assert "total_bilirubin" in body["skipped"]["liver"]["missing"]
+    # Shared inputs feed both models: hypertension -> HighBP, smoker -> Smoking
+    assert diabetes.rows[0][0][0] == 1 and heart.rows[0][0][0] == 1
+
+
+def test_screen_reports_per_disease_failures(fresh_registry):
+    prediction.registry.publish(ModelBundle("diabetes", "d1", BrokenModel(), pipeline=prediction.PIPELINES["diabetes"]))
+    prediction.registry.publish(ModelBundle("heart", "h1", ProbaModel(0.9), pipeline=prediction.PIPELINES["heart"]))
+
+    resp = client().post("/predict/screen", json=dict(BRFSS_PROFILE, diseases=["diabetes", "heart", "liver"]))
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["results"]["diabetes"] == {"error": "boom"}
+    assert body["results"]["heart"]["raw"] == 1
+    assert set(body["skipped"]) == {"liver"}
+
+
+def test_screen_rejects_unknown_disease():
+    assert client().post("/predict/screen", json=dict(BRFSS_PROFILE, diseases=["spleen"])).status_code == 422
+
+
+def test_screen_rejects_out_of_range_values():
+    # A shared field must be valid for every model it feeds: smoker is 0/1 for diabetes and lungs
+    assert schemas.ScreeningInput.ranges["smoker"] == (0, 1)
+    assert schemas.ScreeningInput.ranges["age"] == (1, 120)  # Liver/kidney 1..120, lungs 0..120
+    resp = client().post("/predict/screen", json=dict(BRFSS_PROFILE, smoker=3))
+    assert resp.status_code == 422
+    assert resp.json()["detail"][0]["loc"] == ["body", "smoker"]
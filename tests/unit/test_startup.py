@@ -0,0 +1,87 @@
+"""
+Cold-start guards: import-time budget for backend.main (python -X importtime)
+and the liveness/readiness split.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import main, prediction
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Generous so slow CI runners pass; a regression that re-imports an SDK eagerly
+# is caught by the deny-list below rather than by the wall-clock number.
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "3000"))
+
+# Must only load on first use, never while importing the app. (Parent packages
+# such as `google` or `langchain_core` may be touched to locate the module.)
+DEFERRED_MODULES = (
+    "langgraph", "langchain_core.messages", "google.generativeai", "shap", "matplotlib.pyplot",
+    "sklearn", "pandas", "razorpay", "fpdf", "joblib",
+)
+
+PROBE = (
+    "import backend.main, backend.agent;"
+    "assert 'medical_agent' not in vars(backend.agent), 'agent graph compiled at import'"
+)
+
+
+def import_profile():
+    env = dict(os.environ, LOG_FILE="", TRACING_EXPORTER="none")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum_us, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        cumulative[name] = int(cum_us)
+    return cumulative
+
+
+@pytest.fixture(scope="module")
+def profile():
+    return import_profile()
+
+
+def test_heavy_dependencies_are_deferred(profile):
+    eager = sorted(m for m in profile if any(m == d or m.startswith(d + ".") for d in DEFERRED_MODULES))
+    assert not eager, f"Imported at startup: {eager[:10]}"
+
+
+def test_import_time_budget(profile):
+    total_ms = profile["backend.main"] / 1000
+    assert total_ms < IMPORT_BUDGET_MS, f"backend.main import took {total_ms:.0f}ms (budget {IMPORT_BUDGET_MS:.0f}ms)"
+
+
+def test_agent_graph_compiles_on_first_access():
+    from backend import agent
+    assert hasattr(agent.medical_agent, "invoke")
+    assert "medical_agent" in vars(agent)
+
+
+def test_readiness_reports_warming_until_startup(monkeypatch):
+    monkeypatch.setattr(main, "startup_complete", False)
+    client = TestClient(main.app, base_url="http://localhost")
+    assert client.get("/healthz").status_code == 200
+    resp = client.get("/readyz")
+    assert resp.status_code == 503
+    assert resp.json()["status"] == "warming"
+
+
+def test_readiness_after_warmup():
+    with TestClient(main.app, base_url="http://localhost") as client:
+        prediction.start_warmup().join(30)
+        resp = client.get("/readyz")
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["status"] == "ready"
+    assert set(body["models"]) == {"diabetes", "heart", "liver", "kidney", "lungs"}
+    assert "loading" not in body["models"].values()
@@ -5,10 +5,11 @@ import numpy as np
 
 # Import app to get router, but we might need to patch dependencies
 # backend.main includes prediction router.
-# Let's import prediction module directly to patch globals.
+# Let's import prediction module directly to patch its model registry.
 from fastapi import FastAPI
 import backend.prediction
 from backend.prediction import router
+from backend.model_registry import ModelBundle, ModelRegistry
 
 # Wrap router in App to avoid middleware scope issues
 app = FastAPI()
@@ -16,6 +17,14 @@ app.include_router(router)
 
 client = TestClient(app)
 
+
+def serving(disease, model, scaler=None):
+    """Serve `model` (and `scaler`) for one disease from a fresh registry; None serves nothing."""
+    registry = ModelRegistry()
+    if model is not None:
+        registry.publish(ModelBundle(disease, "test", model, scaler))
+    return patch.object(backend.prediction, "registry", registry)
+
 # --- Diabetes Tests ---
 
 def test_predict_diabetes_success():
@@ -23,7 +32,7 @@ def test_predict_diabetes_success():
     mock_model = MagicMock()
     mock_model.predict.return_value = np.array([1]) # High Risk
     
-    with patch("backend.prediction.diabetes_model", mock_model):
+    with serving("diabetes", mock_model):
         resp = client.post("/predict/diabetes", json={
             "gender": 1, "age": 50, "hypertension": 0, "heart_disease": 0,
             "smoking_history": 1, "bmi": 25.0, "high_chol": 0, "physical_activity": 1, "general_health": 2
@@ -33,7 +42,7 @@ def test_predict_diabetes_success():
 
 def test_predict_diabetes_model_unavailable():
     # Force model to be None to hit 503
-    with patch("backend.prediction.diabetes_model", None):
+    with serving("diabetes", None):
         resp = client.post("/predict/diabetes", json={
             "gender": 1, "age": 50, "hypertension": 0, "heart_disease": 0,
             "smoking_history": 1, "bmi": 25.0, "high_chol": 0, "physical_activity": 1, "general_health": 2
@@ -46,7 +55,7 @@ def test_predict_diabetes_exception():
     mock_model = MagicMock()
     mock_model.predict.side_effect = Exception("Model Failure")
     
-    with patch("backend.prediction.diabetes_model", mock_model):
+    with serving("diabetes", mock_model):
         resp = client.post("/predict/diabetes", json={
             "gender": 1, "age": 50, "hypertension": 0, "heart_disease": 0,
             "smoking_history": 1, "bmi": 25.0, "high_chol": 0, "physical_activity": 1, "general_health": 2
@@ -60,18 +69,18 @@ def test_predict_heart_success():
     mock_model = MagicMock()
     mock_model.predict.return_value = np.array([1]) # Disease
     
-    with patch("backend.prediction.heart_model", mock_model):
+    with serving("heart", mock_model):
         resp = client.post("/predict/heart", json={
-            "age": 50, "gender": 1, "high_bp": 0, "high_chol": 200, "bmi": 25.0, 
+            "age": 50, "gender": 1, "high_bp": 0, "high_chol": 1, "bmi": 25.0, 
             "smoker": 0, "stroke": 0, "diabetes": 0, "phys_activity": 1, "hvy_alcohol": 0, "gen_hlth": 2
         })
         assert resp.status_code == 200
         assert resp.json()["prediction"] == "Heart Disease Detected"
 
 def test_predict_heart_model_unavailable():
-    with patch("backend.prediction.heart_model", None):
+    with serving("heart", None):
         resp = client.post("/predict/heart", json={
-            "age": 50, "gender": 1, "high_bp": 0, "high_chol": 200, "bmi": 25.0, 
+            "age": 50, "gender": 1, "high_bp": 0, "high_chol": 1, "bmi": 25.0, 
             "smoker": 0, "stroke": 0, "diabetes": 0, "phys_activity": 1, "hvy_alcohol": 0, "gen_hlth": 2
         })
         assert resp.status_code == 503
@@ -80,9 +89,9 @@ def test_predict_heart_exception():
     mock_model = MagicMock()
     mock_model.predict.side_effect = Exception("Boom")
     
-    with patch("backend.prediction.heart_model", mock_model):
+    with serving("heart", mock_model):
         resp = client.post("/predict/heart", json={
-            "age": 50, "gender": 1, "high_bp": 0, "high_chol": 200, "bmi": 25.0, 
+            "age": 50, "gender": 1, "high_bp": 0, "high_chol": 1, "bmi": 25.0, 
             "smoker": 0, "stroke": 0, "diabetes": 0, "phys_activity": 1, "hvy_alcohol": 0, "gen_hlth": 2
         })
         assert resp.status_code == 500
@@ -95,8 +104,7 @@ def test_predict_liver_success():
     mock_scaler = MagicMock()
     mock_scaler.transform.return_value = np.array([[1,2,3,4,5,6]])
     
-    with patch("backend.prediction.liver_model", mock_model), \
-         patch("backend.prediction.liver_scaler", mock_scaler):
+    with serving("liver", mock_model, mock_scaler):
         
         resp = client.post("/predict/liver", json={
             "age": 45, "gender": 1, "total_bilirubin": 1.0,
@@ -109,7 +117,7 @@ def test_predict_liver_success():
 
 def test_predict_liver_unavailable():
     # Test both model and scaler missing
-    with patch("backend.prediction.liver_model", None):
+    with serving("liver", None):
         resp = client.post("/predict/liver", json={
             "age": 45, "gender": 1, "total_bilirubin": 1.0,
             "alkaline_phosphotase": 100, "alamine_aminotransferase": 30,
@@ -124,8 +132,7 @@ def test_predict_liver_exception():
     mock_scaler = MagicMock()
     mock_scaler.transform.return_value = np.array([[1,2,3,4,5,6]])
     
-    with patch("backend.prediction.liver_model", mock_model), \
-         patch("backend.prediction.liver_scaler", mock_scaler):
+    with serving("liver", mock_model, mock_scaler):
          
         resp = client.post("/predict/liver", json={
             "age": 45, "gender": 1, "total_bilirubin": 1.0,
@@ -159,9 +166,8 @@ def test_model_loading_failure():
         assert backend.prediction.heart_model is not None
         assert type(backend.prediction.heart_model).__name__ == "DummyModel"
         
-    # Restore module (reload again without patch) to fix state for other tests?
-    # Actually, other tests rely on patching the GLOBAL variable, so if it is None, strict patching works fine.
-    # But let's try to restore just in case.
+    # Restore module (reload again without patch) to fix state for other tests.
+    # Other tests serve their own models through serving(), so any state left here is fine.
     try:
         importlib.reload(backend.prediction)
     except:
@@ -0,0 +1,116 @@
+"""
+Tests for backend/tracing.py: span nesting, W3C propagation, exporters and
+the SQLAlchemy / HTTP instrumentation.
+"""
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from backend import tracing
+from backend.middleware import RequestContextMiddleware
+
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+
+@pytest.fixture
+def collected(monkeypatch):
+    exporter = CollectingExporter()
+    monkeypatch.setattr(tracing, "exporter", exporter)
+    return exporter.spans
+
+
+def test_child_spans_share_trace_and_parent(collected):
+    with tracing.start_span("outer") as outer:
+        with tracing.start_span("inner") as inner:
+            assert tracing.current_span() is inner
+        assert tracing.current_span() is outer
+    assert tracing.current_span() is None
+
+    assert [s.name for s in collected] == ["inner", "outer"]
+    assert inner.trace_id == outer.trace_id
+    assert inner.parent_id == outer.span_id
+    assert outer.parent_id is None
+
+
+def test_exception_marks_span_error(collected):
+    with pytest.raises(RuntimeError):
+        with tracing.start_span("failing"):
+            raise RuntimeError("boom")
+    assert collected[0].status == "ERROR"
+    assert collected[0].attributes["exception.type"] == "RuntimeError"
+
+
+def test_traced_decorator(collected):
+    @tracing.traced("unit.work")
+    def work(x):
+        return x * 2
+
+    assert work(3) == 6
+    assert collected[0].name == "unit.work"
+
+
+def test_parse_traceparent():
+    trace_id, parent = tracing.parse_traceparent("00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01")
+    assert trace_id == "4bf92f3577b34da6a3ce929d0e0e4736"
+    assert parent == "00f067aa0ba902b7"
+    assert tracing.parse_traceparent("garbage") == (None, None)
+    assert tracing.parse_traceparent(None) == (None, None)
+
+
+def test_sqlalchemy_queries_emit_spans(collected):
+    engine = create_engine("sqlite:///:memory:")
+    tracing.instrument_sqlalchemy(engine)
+    with tracing.start_span("request"):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+    db_spans = [s for s in collected if s.name == "db.query"]
+    assert db_spans and db_spans[0].attributes["db.statement"] == "SELECT 1"
+    assert db_spans[0].parent_id == collected[-1].span_id
+
+
+def test_file_exporter_writes_json_lines(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = tracing.SpanExporter(lambda: open(path, "a", encoding="utf-8"))
+    span = tracing.Span("exported", "a" * 32)
+    span.end_ns = span.start_ns + 1_000_000
+    exporter.export(span)
+    exporter.shutdown()
+    record = json.loads(path.read_text().splitlines()[0])
+    assert record["name"] == "exported"
+    assert record["context"]["trace_id"] == "0x" + "a" * 32
+    assert record["duration_ms"] == 1.0
+
+
+def test_http_middleware_returns_trace_id_and_continues_trace(collected):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        with tracing.start_span("handler"):
+            return {"id": item_id}
+
+    app.add_middleware(RequestContextMiddleware)
+    client = TestClient(app)
+    incoming = "00-4bf92f3577b34da6a3ce929d0e0e4736-00f067aa0ba902b7-01"
+    resp = client.get("/items/5", headers={"traceparent": incoming})
+
+    assert resp.headers["X-Trace-ID"] == "4bf92f3577b34da6a3ce929d0e0e4736"
+    root = next(s for s in collected if s.kind == "SERVER")
+    assert root.name == "GET /items/{item_id}"
+    assert root.parent_id == "00f067aa0ba902b7"
+    handler = next(s for s in collected if s.name == "handler")
+    assert handler.parent_id == root.span_id
+
+
+def test_exporter_builds_without_fork_hooks(tmp_path, monkeypatch):
+    # Windows has no os.register_at_fork
+    monkeypatch.delattr(tracing.os, "register_at_fork")
+    tracing.SpanExporter(lambda: open(tmp_path / "traces.jsonl", "a", encoding="utf-8"))
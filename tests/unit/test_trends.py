@@ -0,0 +1,127 @@
+"""
+Tests for the aggregated health-trend endpoint (/records/trends) and its
+per-user cache (backend/trends.py).
+"""
+import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event, insert
+from sqlalchemy.orm import sessionmaker
+
+from backend import auth, chat, database, migrations, models, trends
+
+
+@pytest.fixture
+def http(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'trends.db'}", connect_args={"check_same_thread": False})
+    migrations.upgrade(engine)
+    sessions = sessionmaker(bind=engine)
+    with sessions() as db:
+        db.add(models.User(id=1, username="alice", hashed_password="x"))
+        db.commit()
+
+    def override_get_db():
+        with sessions() as db:
+            yield db
+
+    monkeypatch.setattr(trends, "cache", trends.TrendCache())
+    monkeypatch.setattr(chat.rag, "add_checkup_to_db", lambda **kwargs: None)
+    monkeypatch.setattr(chat.rag, "delete_record_from_db", lambda record_id: None)
+    app = FastAPI()
+    app.include_router(chat.router)
+    app.dependency_overrides[database.get_db] = override_get_db
+    app.dependency_overrides[auth.get_current_user] = lambda: models.User(id=1, username="alice")
+    client = TestClient(app)
+    client.engine = engine
+    return client
+
+
+def seed_bmi(engine, days):
+    start = datetime.datetime(2024, 1, 1)
+    with engine.begin() as conn:
+        record_ids = conn.execute(insert(models.HealthRecord.__table__).returning(models.HealthRecord.__table__.c.id), [
+            {"user_id": 1, "record_type": "diabetes", "data": "{}", "prediction": "x", "timestamp": start + datetime.timedelta(days=d)}
+            for d in range(days)
+        ]).scalars().all()
+        conn.execute(insert(models.Measurement.__table__), [
+            {"record_id": rid, "user_id": 1, "record_type": "diabetes", "name": "bmi",
+             "value": 20.0 + d, "timestamp": start + datetime.timedelta(days=d)}
+            for d, rid in enumerate(record_ids)
+        ])
+
+
+def test_series_are_bucketed_in_sql(http):
+    seed_bmi(http.engine, 100)
+
+    body = http.get("/records/trends", params={"metrics": ["bmi", "total_bilirubin"], "buckets": 10}).json()
+
+    points = body["metrics"]["bmi"]
+    assert len(points) == 10 and body["metrics"]["total_bilirubin"] == []
+    assert sum(p["count"] for p in points) == 100
+    assert (points[0]["min"], points[0]["max"], points[0]["mean"]) == (20.0, 29.0, 24.5)
+    assert points[-1]["max"] == 119.0
+    assert points[0]["time"].startswith("2024-01-01T00:00:00")
+
+
+def test_payload_size_is_bounded_by_buckets(http):
+    seed_bmi(http.engine, 400)
+    assert len(http.get("/records/trends", params={"metrics": ["bmi"], "buckets": 25}).json()["metrics"]["bmi"]) == 25
+
+
+def test_empty_history(http):
+    body = http.get("/records/trends").json()
+    assert body["metrics"] == {name: [] for name in trends.DEFAULT_METRICS}
+
+
+def test_cache_is_invalidated_by_record_writes(http):
+    statements = []
+    event.listen(http.engine, "before_cursor_execute", lambda conn, cursor, sql, *a: statements.append(sql))
+
+    def trend_queries():
+        return sum("health_measurements" in s and s.lstrip().startswith("SELECT") for s in statements)
+
+    params = {"metrics": ["bmi"]}
+    assert http.get("/records/trends", params=params).json()["metrics"]["bmi"] == []
+    assert http.get("/records/trends", params=params).json()["metrics"]["bmi"] == []
+    assert trend_queries() == 1  # Second call served from cache (empty history: span query only)
+
+    http.post("/records", json={"record_type": "diabetes", "data": {"bmi": 27.5}, "prediction": "Low Risk"})
+    points = http.get("/records/trends", params=params).json()["metrics"]["bmi"]
+    assert [(p["count"], p["mean"]) for p in points] == [(1, 27.5)]
+
+    record_id = http.get("/records").json()[0]["id"]
+    http.delete(f"/records/{record_id}")
+    assert http.get("/records/trends", params=params).json()["metrics"]["bmi"] == []
+
+
+def test_cache_entries_expire_and_ignore_stale_puts():
+    now = [0.0]
+    cache = trends.TrendCache(max_entries=2, ttl=10, clock=lambda: now[0])
+
+    value, generation = cache.get(1, ("a",))
+    assert value is None
+    cache.invalidate(1)  # A write lands while the miss is being computed
+    cache.put(1, ("a",), generation, {"stale": True})
+    assert cache.get(1, ("a",))[0] is None
+
+    cache.put(1, ("a",), cache.get(1, ("a",))[1], {"fresh": True})
+    assert cache.get(1, ("a",))[0] == {"fresh": True}
+    now[0] = 11
+    assert cache.get(1, ("a",))[0] is None
+
+
+def test_too_many_metrics_rejected(http):
+    assert http.get("/records/trends", params={"metrics": [f"m{i}" for i in range(trends.MAX_METRICS + 1)]}).status_code == 422
+    assert http.get("/records/trends", params={"buckets": 0}).status_code == 422
+
+
+def test_bucket_query_uses_the_measurement_index(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'plan.db'}")
+    migrations.upgrade(engine)
+    query = trends.bucket_query(1, ("bmi",), None, 0, 86400, "sqlite")
+    compiled = query.compile(engine, compile_kwargs={"literal_binds": True})
+    with engine.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}"))
+    assert "ix_health_measurements_user_name_timestamp" in plan